@@ -6,6 +6,12 @@ from app import db
 
 
 class Comment(db.Model):
+    # Keyset pages of a dataset's top-level comments and of a comment's replies, oldest first
+    __table_args__ = (
+        db.Index("ix_comment_dataset_parent_created", "dataset_id", "parent_id", "created_at", "id"),
+        db.Index("ix_comment_parent_created", "parent_id", "created_at", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -36,6 +42,22 @@ class Comment(db.Model):
 
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone("Europe/Madrid")))
 
+    def get_author_name(self):
+        profile = self.user.profile if self.user else None
+        return f"{profile.surname}, {profile.name}" if profile else "Anonymous"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "author": self.get_author_name(),
+            "dataset_id": self.dataset_id,
+            "parent_id": self.parent_id,
+            "content": self.content,
+            "visible": self.visible,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
     def __repr__(self):
         return (
             f"Comment<{self.id}, User={self.user.profile.name}, "
@@ -1,7 +1,32 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import joinedload
+
+from app.modules.auth.models import User
 from app.modules.comment.models import Comment
 from core.repositories.BaseRepository import BaseRepository
 
 
+def encode_cursor(comment: Comment) -> str:
+    """Opaque keyset cursor pointing right after the given comment."""
+    # Stored datetimes are naive; a comment created in this session may still hold its aware value
+    payload = json.dumps([comment.created_at.replace(tzinfo=None).isoformat(), comment.id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return the (created_at, id) pair of a cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, comment_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
 class CommentRepository(BaseRepository):
     def __init__(self):
         super().__init__(Comment)
@@ -15,26 +40,90 @@ class CommentRepository(BaseRepository):
     def count_comments_by_dataset(self, dataset_id):
         return Comment.query.filter_by(dataset_id=dataset_id).count()
 
-    def update_children_visibility(self, parent_id, visible: bool) -> int:
-        """Set the visible flag for all direct replies of parent_id.
+    def get_page(self, limit: int, cursor=None, dataset_id=None, parent_id=None, include_hidden: bool = False):
+        """One keyset page of the top-level comments of dataset_id, or of the direct replies of parent_id,
+        oldest first and with their authors. Returns (comments, next_cursor)."""
+        if parent_id is not None:
+            query = Comment.query.filter(Comment.parent_id == parent_id)
+        else:
+            query = Comment.query.filter(Comment.dataset_id == dataset_id, Comment.parent_id.is_(None))
+        if not include_hidden:
+            query = query.filter(Comment.visible.is_(True))
+        if cursor:
+            created_at, comment_id = decode_cursor(cursor)
+            query = query.filter(
+                or_(Comment.created_at > created_at, and_(Comment.created_at == created_at, Comment.id > comment_id))
+            )
+
+        # One extra row tells whether there is a next page
+        page = self._with_authors(query).limit(limit + 1).all()
+        next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return page[:limit], next_cursor
+
+    def count_replies(self, comment_ids, include_hidden: bool = False) -> dict:
+        """Number of direct replies of each comment, in one grouped query (comments without replies are left
+        out)."""
+        if not comment_ids:
+            return {}
+        query = select(Comment.parent_id, func.count(Comment.id)).where(Comment.parent_id.in_(comment_ids))
+        if not include_hidden:
+            query = query.where(Comment.visible.is_(True))
+        return dict(self.session.execute(query.group_by(Comment.parent_id)).all())
+
+    @staticmethod
+    def _thread(comment_id: int, include_root: bool = True, nesting: bool = False):
+        """Recursive CTE with the ids of comment_id (unless include_root is False) and all its replies,
+        at any depth."""
+        start = Comment.id == comment_id if include_root else Comment.parent_id == comment_id
+        thread = select(Comment.id).where(start).cte("thread", recursive=True, nesting=nesting)
+        return thread.union_all(select(Comment.id).join(thread, Comment.parent_id == thread.c.id))
+
+    @staticmethod
+    def _with_authors(query):
+        return query.options(joinedload(Comment.user).joinedload(User.profile)).order_by(Comment.created_at, Comment.id)
+
+    def get_dataset_thread(self, dataset_id):
+        """Every comment of a dataset, replies included, with their authors, oldest first: one query."""
+        return self._with_authors(Comment.query.filter_by(dataset_id=dataset_id)).all()
+
+    def get_thread(self, comment_id):
+        """A comment and all its replies at any depth, with their authors, oldest first: one query."""
+        thread = self._thread(comment_id)
+        return self._with_authors(Comment.query.join(thread, Comment.id == thread.c.id)).all()
+
+    def update_thread_visibility(self, comment_id, visible: bool, include_root: bool = True) -> int:
+        """Set the visible flag of a comment and all its replies at any depth in one UPDATE.
 
         Returns the number of rows updated.
         """
+        from app.modules.comment.services import pending_comment_counts
 
-        to_process = [parent_id]
-        total_updated = 0
-        while to_process:
-            children = self.session.query(Comment).filter(Comment.parent_id.in_(to_process)).all()
-            if not children:
-                break
-            ids = [c.id for c in children]
-            updated = (
-                self.session.query(Comment)
-                .filter(Comment.id.in_(ids))
-                .update({"visible": visible}, synchronize_session=False)
-            )
-            total_updated += updated
-            to_process = ids
+        # How many comments of the thread change, for the dataset's visible_comment_count
+        counted = self._thread(comment_id, include_root=include_root)
+        dataset_id, changing = self.session.execute(
+            select(func.max(Comment.dataset_id), func.count(Comment.id))
+            .join(counted, Comment.id == counted.c.id)
+            .where(Comment.visible.isnot(visible))
+        ).one()
 
+        # The CTE is nested in a derived table so MariaDB accepts it in an UPDATE of the same table
+        thread = self._thread(comment_id, include_root=include_root, nesting=True)
+        ids = select(thread.c.id).subquery("descendants")
+        statement = (
+            update(Comment)
+            .where(Comment.id.in_(select(ids.c.id)))
+            .values(visible=visible)
+            .execution_options(synchronize_session=False)
+        )
+        updated = self.session.execute(statement).rowcount
+        if changing:
+            pending_comment_counts(self.session)[dataset_id][1] += changing if visible else -changing
         self.session.commit()
-        return total_updated
+        return updated
+
+    def update_children_visibility(self, parent_id, visible: bool) -> int:
+        """Set the visible flag for all replies of parent_id, at any depth.
+
+        Returns the number of rows updated.
+        """
+        return self.update_thread_visibility(parent_id, visible, include_root=False)
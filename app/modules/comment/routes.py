@@ -1,11 +1,30 @@
-from flask import abort, jsonify, render_template, request
+from flask import abort, current_app, jsonify, render_template, request
 from flask_login import current_user, login_required
 
 from app.modules.comment import comment_bp
 from app.modules.comment.forms import CommentForm
-from app.modules.comment.services import CommentService
+from app.modules.comment.services import CommentService, comment_tree, flatten_tree
+from app.modules.dataset.services import DataSetService
 
 comment_service = CommentService()
+dataset_service = DataSetService()
+
+
+def _page_args():
+    """Validated (limit, cursor) of a comments page request."""
+    max_page_size = current_app.config.get("COMMENTS_MAX_PAGE_SIZE", 100)
+    value = request.args.get("limit", current_app.config.get("COMMENTS_PAGE_SIZE", 20))
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"limit must be an integer between 1 and {max_page_size}")
+    if not 1 <= limit <= max_page_size:
+        raise ValueError(f"limit must be an integer between 1 and {max_page_size}")
+    return limit, request.args.get("cursor") or None
+
+
+def _is_owner(dataset) -> bool:
+    return current_user.is_authenticated and dataset is not None and current_user.id == dataset.user_id
 
 
 @comment_bp.route("/comment", methods=["GET"])
@@ -21,13 +40,63 @@ def index_by_dataset(dataset_id):
     return render_template("comment/index.html", dataset_id=dataset_id, filter_by="dataset")
 
 
+@comment_bp.route("/comment/api/dataset/<int:dataset_id>", methods=["GET"])
+def api_dataset_comments(dataset_id):
+    """One page of the top-level comments of a dataset, oldest first, each with its number of replies.
+
+    Query parameters: `limit` (COMMENTS_PAGE_SIZE by default) and `cursor` (the `next_cursor` of the
+    previous page). Hidden comments are only listed for the dataset owner.
+    """
+    dataset = dataset_service.get_by_id(dataset_id)
+    if not dataset:
+        return jsonify({"message": "Dataset not found"}), 404
+    is_owner = _is_owner(dataset)
+
+    try:
+        limit, cursor = _page_args()
+        comments, next_cursor = comment_service.get_page(limit, cursor, dataset_id=dataset_id, show_hidden=is_owner)
+    except ValueError as exc:
+        return jsonify({"message": str(exc)}), 400
+
+    return jsonify(
+        {
+            "comments": [comment.to_dict() for comment in comments],
+            "next_cursor": next_cursor,
+            # Replies included; read from the counters kept on the dataset row
+            "comment_count": dataset.comment_count if is_owner else dataset.visible_comment_count,
+        }
+    )
+
+
+@comment_bp.route("/comment/api/parent/<int:parent_id>/replies", methods=["GET"])
+def api_comment_replies(parent_id):
+    """One page of the direct replies of a comment, oldest first, each with its number of replies, so
+    threads can be expanded one level and one page at a time. Same parameters as the dataset endpoint.
+    """
+    parent = comment_service.get_by_id(parent_id)
+    if not parent:
+        return jsonify({"message": "Parent comment not found"}), 404
+    is_owner = _is_owner(parent.dataset)
+    if not parent.visible and not is_owner:
+        return jsonify({"message": "Comment is hidden"}), 403
+
+    try:
+        limit, cursor = _page_args()
+        replies, next_cursor = comment_service.get_page(limit, cursor, parent_id=parent_id, show_hidden=is_owner)
+    except ValueError as exc:
+        return jsonify({"message": str(exc)}), 400
+
+    return jsonify({"comments": [reply.to_dict() for reply in replies], "next_cursor": next_cursor})
+
+
 @comment_bp.route("/comment/parent/<int:parent_id>", methods=["GET"])
 def index_by_parent(parent_id):
     """Show a page for a parent comment: reply UI (if logged in) and list of replies.
 
     This view is accessible to anonymous users; reply/create actions still require login.
     """
-    parent = comment_service.get_by_id(parent_id)
+    # The comment and its whole thread, with authors, in one query
+    parent = comment_service.get_thread(parent_id)
     if not parent:
         abort(404)
 
@@ -41,10 +110,8 @@ def index_by_parent(parent_id):
     if not getattr(parent, "visible", True) and not is_owner:
         abort(403)
 
-    # Get replies and apply visibility filter for anonymous/non-owner users
-    replies = comment_service.get_comments_by_parent(parent_id) or []
-    if not is_owner:
-        replies = [r for r in replies if getattr(r, "visible", True)]
+    # Nested replies, without the hidden ones for anonymous/non-owner users
+    replies = flatten_tree(comment_tree(parent.replies, show_hidden=is_owner))
 
     return render_template(
         "comment/index.html",
@@ -1,6 +1,64 @@
+from collections import defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.modules.comment.models import Comment
 from app.modules.comment.repositories import CommentRepository
+from app.modules.dataset.repositories import DataSetRepository
 from core.services.BaseService import BaseService
 
+_COUNTS_KEY = "dataset_comment_counts"
+
+
+class CommentNode:
+    """A comment with the replies one visitor may see, already loaded. Other attributes read through to the
+    comment, so templates use it like a Comment. Pages of comments carry reply_count instead of their replies."""
+
+    def __init__(self, comment, reply_count: Optional[int] = None):
+        self.comment = comment
+        self.replies: List["CommentNode"] = []
+        self._reply_count = reply_count
+
+    @property
+    def reply_count(self) -> int:
+        return len(self.replies) if self._reply_count is None else self._reply_count
+
+    def to_dict(self):
+        return {**self.comment.to_dict(), "reply_count": self.reply_count}
+
+    def __getattr__(self, name):
+        return getattr(self.comment, name)
+
+
+def comment_tree(comments: Iterable, show_hidden: bool = False) -> List[CommentNode]:
+    """Wrap comments whose replies were loaded by CommentService for display: hidden comments (and, since
+    hiding propagates, their replies) are left out unless show_hidden. Built without recursion, so deep
+    threads do not hit the interpreter's recursion limit."""
+    roots: List[CommentNode] = []
+    pending = [(comment, roots) for comment in reversed(list(comments))]
+    while pending:
+        comment, siblings = pending.pop()
+        if not (show_hidden or comment.visible):
+            continue
+        node = CommentNode(comment)
+        siblings.append(node)
+        pending.extend((reply, node.replies) for reply in reversed(comment.replies))
+    return roots
+
+
+def flatten_tree(nodes: List[CommentNode]) -> List[Tuple[int, CommentNode]]:
+    """(depth, node) pairs of a tree in display order, for rendering nested threads as one list."""
+    flat = []
+    pending = [(0, node) for node in reversed(nodes)]
+    while pending:
+        depth, node = pending.pop()
+        flat.append((depth, node))
+        pending.extend((depth + 1, reply) for reply in reversed(node.replies))
+    return flat
+
 
 class CommentService(BaseService):
     def __init__(self):
@@ -15,5 +73,96 @@ class CommentService(BaseService):
     def count_comments_by_dataset(self, dataset_id):
         return self.repository.count_comments_by_dataset(dataset_id)
 
+    def get_page(
+        self, limit: int, cursor=None, dataset_id=None, parent_id=None, show_hidden: bool = False
+    ) -> Tuple[List[CommentNode], Optional[str]]:
+        """One keyset page of a dataset's top-level comments or of a comment's direct replies, each with its
+        number of replies, in two queries. Returns (nodes, next_cursor); next_cursor is None on the last page.
+        Raises ValueError if the cursor is malformed."""
+        comments, next_cursor = self.repository.get_page(
+            limit, cursor, dataset_id=dataset_id, parent_id=parent_id, include_hidden=show_hidden
+        )
+        counts = self.repository.count_replies([comment.id for comment in comments], include_hidden=show_hidden)
+        return [CommentNode(comment, counts.get(comment.id, 0)) for comment in comments], next_cursor
+
+    @staticmethod
+    def _link(comments) -> list:
+        # Fill parent and replies of the loaded comments from the rows themselves, so walking the tree
+        # does not lazy-load each level. Returns the comments whose parent was not loaded.
+        by_id = {comment.id: comment for comment in comments}
+        replies = {comment.id: [] for comment in comments}
+        roots = []
+        for comment in comments:
+            parent = by_id.get(comment.parent_id)
+            if parent is None:
+                roots.append(comment)
+            else:
+                replies[parent.id].append(comment)
+                set_committed_value(comment, "parent", parent)
+        for comment in comments:
+            set_committed_value(comment, "replies", replies[comment.id])
+        return roots
+
+    def get_dataset_tree(self, dataset_id, show_hidden: bool = False) -> List[CommentNode]:
+        """Top-level comments of a dataset with their replies at any depth, loaded in one query."""
+        roots = self._link(self.repository.get_dataset_thread(dataset_id))
+        return comment_tree([comment for comment in roots if comment.parent_id is None], show_hidden)
+
+    def get_thread(self, comment_id) -> Optional[Comment]:
+        """A comment with its replies at any depth loaded in one query (wrap it with comment_tree to display
+        it), or None if it does not exist."""
+        comments = self.repository.get_thread(comment_id)
+        self._link(comments)
+        return next((comment for comment in comments if comment.id == comment_id), None)
+
+    def update_thread_visibility(self, comment_id, visible: bool) -> int:
+        return self.repository.update_thread_visibility(comment_id, visible)
+
     def update_children_visibility(self, parent_id, visible: bool) -> int:
         return self.repository.update_children_visibility(parent_id, visible)
+
+
+def pending_comment_counts(session) -> dict:
+    """(comments, visible comments) deltas per dataset, applied to DataSet right before the session commits."""
+    return session.info.setdefault(_COUNTS_KEY, defaultdict(lambda: [0, 0]))
+
+
+def _visible_toggled(comment) -> int:
+    """+1 if the comment was just unhidden, -1 if it was just hidden, 0 otherwise."""
+    history = inspect(comment).attrs.visible.history
+    if not history.has_changes() or not history.deleted:
+        return 0
+    return int(bool(history.added and history.added[0])) - int(bool(history.deleted[0]))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_comment_counts(session, flush_context):
+    """Turn flushed comment inserts, deletes and visibility changes into per-dataset counter deltas."""
+    counts = None
+    for sign, objects in ((1, session.new), (-1, session.deleted)):
+        for obj in objects:
+            if isinstance(obj, Comment) and obj.dataset_id is not None:
+                counts = counts if counts is not None else pending_comment_counts(session)
+                counts[obj.dataset_id][0] += sign
+                counts[obj.dataset_id][1] += sign * int(obj.visible is not False)
+    for obj in session.dirty:
+        if isinstance(obj, Comment):
+            toggled = _visible_toggled(obj)
+            if toggled:
+                counts = counts if counts is not None else pending_comment_counts(session)
+                counts[obj.dataset_id][1] += toggled
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_comment_counts(session):
+    session.flush()
+    counts = session.info.pop(_COUNTS_KEY, None)
+    if counts:
+        DataSetRepository(session).increment_comment_counts(
+            {dataset_id: tuple(delta) for dataset_id, delta in counts.items()}, commit=False
+        )
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_comment_counts(session, previous_transaction):
+    session.info.pop(_COUNTS_KEY, None)
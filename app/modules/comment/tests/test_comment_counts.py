@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.comment.models import Comment
+from app.modules.comment.services import CommentService
+from app.modules.conftest import login, logout
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.dataset.repositories import DataSetRepository
+
+comment_service = CommentService()
+
+
+@pytest.fixture()
+def dataset(test_client):
+    owner = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="counted", description="comment counters", publication_type=PublicationType.NONE)
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=owner.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+    return dataset
+
+
+def counters(dataset_id):
+    db.session.expire_all()
+    dataset = db.session.get(DataSet, dataset_id)
+    live = Comment.query.filter_by(dataset_id=dataset_id)
+    assert dataset.comment_count == live.count()
+    assert dataset.visible_comment_count == live.filter_by(visible=True).count()
+    return dataset.comment_count, dataset.visible_comment_count
+
+
+def test_counters_follow_creates_hides_and_deletes(test_client, dataset):
+    owner_id = dataset.user_id
+    login(test_client, "test@example.com", "test1234")
+    try:
+        root_id = test_client.post(f"/comment/dataset/{dataset.id}/create", json={"content": "root"}).get_json()[
+            "comment"
+        ]["id"]
+        reply_id = test_client.post(f"/comment/parent/{root_id}/reply", json={"content": "reply"}).get_json()[
+            "comment"
+        ]["id"]
+        comment_service.create(user_id=owner_id, dataset_id=dataset.id, parent_id=reply_id, content="nested")
+        other = comment_service.create(user_id=owner_id, dataset_id=dataset.id, parent_id=None, content="other")
+        assert counters(dataset.id) == (4, 4)
+
+        # Hiding the root hides its thread with one bulk UPDATE
+        test_client.post(f"/dataset/comment/{root_id}/hide")
+        assert counters(dataset.id) == (4, 1)
+        # Hiding a single comment through the ORM
+        comment_service.update(other.id, visible=False)
+        assert counters(dataset.id) == (4, 0)
+        test_client.post(f"/dataset/comment/{root_id}/hide")
+        assert counters(dataset.id) == (4, 3)
+
+        # Deleting a comment deletes its replies too
+        test_client.post(f"/dataset/comment/{root_id}/delete")
+        assert counters(dataset.id) == (1, 0)
+    finally:
+        logout(test_client)
+
+
+def test_rolled_back_comments_are_not_counted(test_client, dataset):
+    db.session.add(Comment(dataset_id=dataset.id, user_id=dataset.user_id, content="discarded"))
+    db.session.flush()
+    db.session.rollback()
+
+    assert counters(dataset.id) == (0, 0)
+
+
+def test_total_comments_reads_the_column_and_recount_repairs_it(test_client, dataset):
+    for i in range(3):
+        db.session.add(Comment(dataset_id=dataset.id, user_id=dataset.user_id, content=f"c{i}", visible=i != 0))
+    db.session.commit()
+    assert counters(dataset.id) == (3, 2)
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    loaded = db.session.get(DataSet, dataset.id)
+    _ = loaded.comment_count
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        assert loaded.total_comments == 3
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert statements == []
+
+    db.session.execute(
+        DataSet.__table__.update().where(DataSet.id == dataset.id).values(comment_count=40, visible_comment_count=0)
+    )
+    db.session.commit()
+    assert DataSetRepository().recount_comments() >= 1
+    assert counters(dataset.id) == (3, 2)
+    assert DataSetRepository().recount_comments() == 0
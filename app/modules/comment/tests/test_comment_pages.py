@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.comment.models import Comment
+from app.modules.conftest import login, logout
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+
+SAME_TIME = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(scope="module")
+def paged_dataset(test_client):
+    """A dataset with 25 top-level comments (all created at the same instant, so pages are split by id) and a
+    thread of 12 replies, 2 of them hidden, under the first one."""
+    owner = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="paged", description="comment pages", publication_type=PublicationType.NONE, tags="test")
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=owner.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+
+    top = [
+        Comment(dataset_id=dataset.id, user_id=owner.id, content=f"top {i}", created_at=SAME_TIME) for i in range(25)
+    ]
+    db.session.add_all(top)
+    db.session.flush()
+    replies = [
+        Comment(dataset_id=dataset.id, user_id=owner.id, parent_id=top[0].id, content=f"reply {i}", visible=i < 10)
+        for i in range(12)
+    ]
+    db.session.add_all(replies)
+    db.session.flush()
+    db.session.add(Comment(dataset_id=dataset.id, user_id=owner.id, parent_id=replies[0].id, content="nested"))
+    db.session.commit()
+    return dataset.id, top[0].id, replies[10].id
+
+
+def pages(client, url, limit):
+    contents, cursor = [], None
+    while True:
+        query = f"?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url + query)
+        assert response.status_code == 200
+        data = response.get_json()
+        contents.append([comment["content"] for comment in data["comments"]])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return contents, data
+
+
+def test_top_level_comments_are_paged_with_reply_counts(test_client, paged_dataset):
+    dataset_id, first_id, _ = paged_dataset
+
+    contents, last = pages(test_client, f"/comment/api/dataset/{dataset_id}", limit=10)
+
+    assert [len(page) for page in contents] == [10, 10, 5]
+    assert sum(contents, []) == [f"top {i}" for i in range(25)]
+    # Replies are not top-level comments; the total counts them (visitors: visible ones only)
+    assert last["comment_count"] == 25 + 10 + 1
+
+    first = test_client.get(f"/comment/api/dataset/{dataset_id}?limit=2").get_json()["comments"]
+    assert first[0]["id"] == first_id and first[0]["reply_count"] == 10 and first[1]["reply_count"] == 0
+    assert first[0]["author"] and first[0]["visible"] is True
+
+
+def test_replies_are_paged_and_hidden_ones_are_only_for_the_owner(test_client, paged_dataset):
+    dataset_id, first_id, hidden_id = paged_dataset
+    url = f"/comment/api/parent/{first_id}/replies"
+
+    contents, _ = pages(test_client, url, limit=4)
+    assert sum(contents, []) == [f"reply {i}" for i in range(10)]
+    reply = test_client.get(url + "?limit=1").get_json()["comments"][0]
+    assert reply["content"] == "reply 0" and reply["reply_count"] == 1
+    assert test_client.get(f"/comment/api/parent/{hidden_id}/replies").status_code == 403
+
+    login(test_client, "test@example.com", "test1234")
+    try:
+        contents, _ = pages(test_client, url, limit=5)
+        assert len(sum(contents, [])) == 12
+        top = test_client.get(f"/comment/api/dataset/{dataset_id}?limit=1").get_json()
+        assert top["comments"][0]["reply_count"] == 12 and top["comment_count"] == 25 + 12 + 1
+        assert test_client.get(f"/comment/api/parent/{hidden_id}/replies").status_code == 200
+    finally:
+        logout(test_client)
+
+
+@pytest.mark.parametrize("query", ["?limit=0", "?limit=1000", "?limit=ten", "?cursor=not-a-cursor"])
+def test_invalid_page_requests_are_rejected(test_client, paged_dataset, query):
+    dataset_id, first_id, _ = paged_dataset
+
+    assert test_client.get(f"/comment/api/dataset/{dataset_id}{query}").status_code == 400
+    assert test_client.get(f"/comment/api/parent/{first_id}/replies{query}").status_code == 400
+
+
+def test_unknown_dataset_or_comment(test_client):
+    assert test_client.get("/comment/api/dataset/999999").status_code == 404
+    assert test_client.get("/comment/api/parent/999999/replies").status_code == 404
+
+
+def test_dataset_page_renders_only_the_first_page(test_client, paged_dataset):
+    dataset_id, _, _ = paged_dataset
+    test_client.application.config["COMMENTS_PAGE_SIZE"] = 20
+    login(test_client, "test@example.com", "test1234")
+    try:
+        page = test_client.get(f"/dataset/unsynchronized/{dataset_id}/").get_data(as_text=True)
+    finally:
+        logout(test_client)
+
+    assert "top 19<" in page and "top 20<" not in page
+    assert 'data-next-cursor=""' not in page
@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.comment.models import Comment
+from app.modules.comment.services import CommentService, comment_tree, flatten_tree
+from app.modules.conftest import login, logout
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.profile.models import UserProfile
+
+comment_service = CommentService()
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture(scope="module")
+def thread_dataset(test_client):
+    owner = User.query.filter_by(email="test@example.com").first()
+    commenter = User(email="tree-commenter@example.com", password="test1234")
+    db.session.add(commenter)
+    db.session.flush()
+    db.session.add(UserProfile(user_id=commenter.id, name="Tree", surname="Commenter"))
+    meta = DSMetaData(title="threads", description="comment trees", publication_type=PublicationType.NONE)
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=owner.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+    return dataset.id, commenter.id
+
+
+def add(dataset_id, user_id, content, parent=None):
+    comment = Comment(dataset_id=dataset_id, user_id=user_id, content=content, parent_id=parent.id if parent else None)
+    db.session.add(comment)
+    db.session.flush()
+    return comment
+
+
+def build_thread(dataset_id, user_id, depth, fanout, label):
+    """A root comment with a chain of `depth` replies, each also answered by `fanout` leaf replies."""
+    root = node = add(dataset_id, user_id, f"{label} root")
+    for level in range(depth):
+        for leaf in range(fanout):
+            add(dataset_id, user_id, f"{label} leaf {level}.{leaf}", node)
+        node = add(dataset_id, user_id, f"{label} level {level + 1}", node)
+    db.session.commit()
+    return root.id, node.id
+
+
+def walk(nodes):
+    # Touch what the templates read from every comment of the tree
+    for depth, node in flatten_tree(nodes):
+        _ = (node.content, node.visible, node.user.profile.name, len(node.replies))
+
+
+def test_thread_page_renders_in_constant_queries(test_client, thread_dataset):
+    dataset_id, user_id = thread_dataset
+    small_root, _ = build_thread(dataset_id, user_id, depth=1, fanout=1, label="small")
+    large_root, deepest = build_thread(dataset_id, user_id, depth=25, fanout=3, label="large")
+
+    def render(root_id):
+        db.session.expunge_all()
+        with count_queries() as statements:
+            response = test_client.get(f"/comment/parent/{root_id}")
+        assert response.status_code == 200
+        return response.get_data(as_text=True), len(statements)
+
+    small_page, small_queries = render(small_root)
+    large_page, large_queries = render(large_root)
+
+    assert "small leaf 0.0" in small_page
+    assert "large level 25" in large_page and "large leaf 24.2" in large_page
+    assert large_queries == small_queries
+    # The deepest reply's page works too, from a thread of one comment
+    assert test_client.get(f"/comment/parent/{deepest}").status_code == 200
+
+
+def test_dataset_tree_is_loaded_in_one_query(test_client, thread_dataset):
+    dataset_id, user_id = thread_dataset
+    build_thread(dataset_id, user_id, depth=10, fanout=2, label="tree")
+    db.session.expunge_all()
+
+    with count_queries() as statements:
+        roots = comment_service.get_dataset_tree(dataset_id)
+        walk(roots)
+
+    assert len(statements) == 1
+    assert all(root.parent_id is None for root in roots)
+    assert sum(1 for _ in flatten_tree(roots)) == Comment.query.filter_by(dataset_id=dataset_id).count()
+
+
+def test_hiding_propagates_with_one_update(test_client, thread_dataset):
+    dataset_id, user_id = thread_dataset
+    root_id, _ = build_thread(dataset_id, user_id, depth=6, fanout=1, label="hide")
+    thread = comment_service.get_thread(root_id)
+    middle = thread.replies[1]
+    assert middle.content == "hide level 1"
+
+    login(test_client, "test@example.com", "test1234")
+    try:
+        with count_queries() as statements:
+            response = test_client.post(f"/dataset/comment/{middle.id}/hide")
+        assert response.get_json() == {"id": middle.id, "visible": False}
+        assert len([s for s in statements if s.lstrip().upper().startswith("UPDATE COMMENT ")]) == 1
+    finally:
+        logout(test_client)
+
+    db.session.expunge_all()
+    thread = comment_service.get_thread(root_id)
+    hidden = [depth_node[1].content for depth_node in flatten_tree(comment_tree([thread], show_hidden=True))]
+    shown = [depth_node[1].content for depth_node in flatten_tree(comment_tree([thread]))]
+    assert len(hidden) == 13
+    assert shown == ["hide root", "hide leaf 0.0"]
+    assert all(not c.visible for c in Comment.query.filter(Comment.content.like("hide %")) if c.content not in shown)
+
+    # Visitors do not see the hidden part of the thread; the owner does
+    page = test_client.get(f"/comment/parent/{root_id}").get_data(as_text=True)
+    assert "hide leaf 0.0" in page and "hide level 1" not in page and "hide level 6" not in page
+    login(test_client, "test@example.com", "test1234")
+    try:
+        page = test_client.get(f"/comment/parent/{root_id}").get_data(as_text=True)
+        assert "hide level 6" in page and "Hidden" in page
+    finally:
+        logout(test_client)
+
+    assert comment_service.update_thread_visibility(middle.id, True) == 11
+    assert Comment.query.filter(Comment.content.like("hide %"), Comment.visible.is_(False)).count() == 0
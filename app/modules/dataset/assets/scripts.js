@@ -236,4 +236,76 @@ var currentId = 0;
         function isValidOrcid(orcid) {
             let orcidRegex = /^\d{4}-\d{4}-\d{4}-\d{4}$/;
             return orcidRegex.test(orcid);
-        }
\ No newline at end of file
+        }
+
+        /*
+            Resumable uploads: files larger than one chunk are sent as numbered chunks
+            (POST /dataset/file/uploads, PUT .../chunks/<n>, POST .../finalize). The upload id is kept
+            in localStorage, so after a failure or a page reload only the missing chunks are sent again.
+        */
+        async function sha256_hex(blob) {
+            if (!window.crypto || !window.crypto.subtle) {
+                return null;  // not a secure context: the server still checks offsets and lengths
+            }
+            const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+            return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+        }
+
+        async function json_or_throw(response) {
+            const data = await response.json().catch(() => ({}));
+            if (!response.ok) {
+                throw new Error(data.message || data.error || ('HTTP ' + response.status));
+            }
+            return data;
+        }
+
+        async function resumable_upload(file, onProgress, retries = 3) {
+            const storageKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+            let status = null;
+
+            const previousId = localStorage.getItem(storageKey);
+            if (previousId) {
+                const response = await fetch(`/dataset/file/uploads/${previousId}`);
+                status = response.ok ? await response.json() : null;
+            }
+            if (!status) {
+                status = await json_or_throw(await fetch('/dataset/file/uploads', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({filename: file.name, size: file.size}),
+                }));
+                localStorage.setItem(storageKey, status.upload_id);
+            }
+
+            const base = `/dataset/file/uploads/${status.upload_id}`;
+            onProgress(status.progress, status.received_bytes);
+
+            for (const index of status.missing_chunks) {
+                const start = index * status.chunk_size;
+                const chunk = file.slice(start, Math.min(start + status.chunk_size, file.size));
+                const headers = {'Content-Range': `bytes ${start}-${start + chunk.size - 1}/${file.size}`};
+                const checksum = await sha256_hex(chunk);
+                if (checksum) {
+                    headers['X-Chunk-SHA256'] = checksum;
+                }
+
+                for (let attempt = 1; ; attempt++) {
+                    try {
+                        status = await json_or_throw(await fetch(`${base}/chunks/${index}`, {
+                            method: 'PUT', headers: headers, body: chunk,
+                        }));
+                        break;
+                    } catch (error) {
+                        if (attempt >= retries) {
+                            throw error;
+                        }
+                        await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+                    }
+                }
+                onProgress(status.progress, status.received_bytes);
+            }
+
+            const result = await json_or_throw(await fetch(`${base}/finalize`, {method: 'POST'}));
+            localStorage.removeItem(storageKey);
+            return result;
+        }
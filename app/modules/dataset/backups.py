@@ -0,0 +1,299 @@
+import base64
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Progress is committed at most this often while blobs are being sent
+PROGRESS_INTERVAL = 1.0
+
+# Serializes claims of the threads of this process, so per-user limits are not overrun by two workers at once
+_claim_lock = threading.Lock()
+
+
+def _fernet() -> Fernet:
+    secret = current_app.config["SECRET_KEY"]
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret + b":github-backup-token").digest()))
+
+
+def seal_token(token: str) -> str:
+    """Encrypt a GitHub OAuth token with a key derived from SECRET_KEY before it is stored."""
+    return _fernet().encrypt(token.encode()).decode("ascii")
+
+
+def open_token(sealed: Optional[str]) -> Optional[str]:
+    """The token sealed by seal_token, or None if there is none or SECRET_KEY changed since."""
+    if not sealed:
+        return None
+    try:
+        return _fernet().decrypt(sealed.encode("ascii")).decode()
+    except InvalidToken:
+        return None
+
+
+def backup_is_current(dataset, backup) -> bool:
+    """Whether the dataset folder still matches the manifest of backup, judging by file names, sizes and
+    mtimes (or Hubfile checksums) only: no content is read and GitHub is not contacted."""
+    from app.modules.dataset.repositories import GitHubBackupRepository
+    from app.modules.dataset.services import dataset_backup_files
+    from app.modules.hubfile.compression import content_name, content_size
+
+    entries = {entry.path: entry for entry in backup.files}
+    files = dataset_backup_files(dataset)
+    if {repo_path for repo_path, _ in files} != set(entries):
+        return False
+    hubfiles = GitHubBackupRepository().hubfile_checksums(dataset.id)
+    for repo_path, full_path in files:
+        stat = os.stat(full_path)
+        entry = entries[repo_path]
+        if entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            continue
+        # Hubfiles describe the content of files compressed at rest, as the manifest does
+        if hubfiles.get(content_name(full_path)) == (entry.checksum, content_size(full_path)):
+            continue
+        return False
+    return True
+
+
+def run_backup(job_id: int) -> Optional[dict]:
+    """Back up the dataset of a job: reuse the repository of its last backup (or create one), push the changes
+    and remember the token for scheduled backups. Progress is written to the job row; returns that row."""
+    from app.modules.dataset.models import GitHubBackupJob
+    from app.modules.dataset.repositories import GitHubBackupJobRepository, GitHubBackupRepository
+    from app.modules.dataset.services import (
+        DataSetService,
+        GitHubContentService,
+        GitHubRepoService,
+        repo_name_formatting,
+    )
+
+    jobs = GitHubBackupJobRepository()
+    backups = GitHubBackupRepository()
+    job = jobs.get_by_id(job_id)
+    if job is None:
+        return None
+
+    def advance(**changes):
+        for key, value in changes.items():
+            setattr(job, key, value)
+        jobs.session.commit()
+
+    last_progress = 0.0
+
+    def progress(sent, total):
+        nonlocal last_progress
+        if sent in (0, total) or time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+            last_progress = time.monotonic()
+            advance(files_uploaded=sent, files_total=total)
+
+    try:
+        advance(state=GitHubBackupJob.RUNNING, started_at=job.started_at or datetime.now(timezone.utc))
+        dataset = DataSetService().get_by_id(job.dataset_id)
+        token = open_token(job.token)
+        if dataset is None:
+            raise LookupError(f"Dataset {job.dataset_id} does not exist")
+        if token is None:
+            raise RuntimeError("The GitHub token of this backup is no longer available; start it again.")
+
+        repo_service = GitHubRepoService(token=token)
+        previous = backups.latest_for_dataset(dataset.id)
+        repo_info = repo_service.get_repo(previous.repository) if previous else None
+        if repo_info is None:
+            title = dataset.ds_meta_data.title or f"dataset-{dataset.id}"
+            repo_info = repo_service.create_repo(
+                name=repo_name_formatting(title), private=True, description=f"Backup for dataset {dataset.id}"
+            )
+        full_name = repo_info.get("full_name")
+        advance(repository=full_name, html_url=repo_info.get("html_url"))
+
+        content_service = GitHubContentService(
+            token=token, repo_full_name=full_name, branch=repo_info.get("default_branch", "main")
+        )
+        result = content_service.upload_dataset(dataset, on_progress=progress) or {}
+
+        backup = backups.get_for(dataset.id, full_name)
+        if backup is not None:
+            backup.token = job.token
+        advance(
+            state=GitHubBackupJob.DONE,
+            files_uploaded=result.get("uploaded", 0),
+            files_total=max(job.files_total, result.get("uploaded", 0)),
+            deleted=result.get("deleted", 0),
+            unchanged=result.get("unchanged", 0),
+            commit_sha=result.get("commit"),
+            token=None,
+            finished_at=datetime.now(timezone.utc),
+        )
+    except Exception as exc:
+        logger.exception(f"GitHub backup of dataset {job.dataset_id} failed: {exc}")
+        jobs.session.rollback()
+        advance(state=GitHubBackupJob.FAILED, error=str(exc), token=None, finished_at=datetime.now(timezone.utc))
+
+    return job.to_dict()
+
+
+def drain_backups(per_user: int, timeout: int) -> int:
+    """Run queued backups until none can start; returns how many ran. Shared by the thread pool and RQ."""
+    from app.modules.dataset.repositories import GitHubBackupJobRepository
+
+    jobs = GitHubBackupJobRepository()
+    jobs.expire_stale(datetime.now(timezone.utc) - timedelta(seconds=timeout))
+    ran = 0
+    while True:
+        with _claim_lock:
+            job = jobs.claim_next(per_user)
+        if job is None:
+            return ran
+        run_backup(job.id)
+        ran += 1
+
+
+def backup_drain_job(per_user: int, timeout: int) -> int:
+    """RQ job entry point: run queued backups from a worker process."""
+    import app
+
+    with app.app.app_context():
+        return drain_backups(per_user, timeout)
+
+
+class BackupQueue:
+    """Runs GitHub backups off the request path.
+
+    Jobs are rows of github_backup_job; a worker claims the oldest queued job whose user is running fewer
+    than GITHUB_BACKUP_PER_USER backups, so one user backing up many datasets cannot take every worker.
+    Modes (GITHUB_BACKUP_MODE):
+      - "thread": a pool of GITHUB_BACKUP_JOB_WORKERS threads in the web process (default).
+      - "rq": workers drain the table as RQ jobs on REDIS_URL.
+      - "inline": run the backup before returning, used by the test suite.
+    """
+
+    def __init__(self, flask_app, mode: str = "thread", workers: int = 2, per_user: int = 1):
+        self.app = flask_app
+        self.mode = mode
+        self.workers = workers
+        self.per_user = per_user
+        self.timeout = flask_app.config.get("GITHUB_BACKUP_JOB_TIMEOUT", 3600)
+        self._rq_queue = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        if self.mode == "rq":
+            self._rq_queue = self._connect_rq()
+            if self._rq_queue is None:
+                self.mode = "thread"
+
+    def _connect_rq(self):
+        redis_url = self.app.config.get("REDIS_URL")
+        if not redis_url:
+            logger.warning("GITHUB_BACKUP_MODE=rq but REDIS_URL is not set; using the in-process pool")
+            return None
+        try:
+            from redis import Redis
+            from rq import Queue
+        except ImportError:
+            logger.warning("redis/rq are not installed; using the in-process pool")
+            return None
+        return Queue(
+            self.app.config.get("GITHUB_BACKUP_RQ_QUEUE", "github-backup"), connection=Redis.from_url(redis_url)
+        )
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        # Created lazily and per process, so gunicorn workers forked after app creation get their own.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="github-backup")
+                self._pid = os.getpid()
+            return self._executor
+
+    def _drain_in_app(self) -> int:
+        with self.app.app_context():
+            return drain_backups(self.per_user, self.timeout)
+
+    def enqueue(self, dataset_id: int, user_id: int, token: str, trigger: Optional[str] = None):
+        """Queue a backup of dataset_id with token; returns its job row, or the row of the backup of the
+        dataset that is already queued or running."""
+        from app.modules.dataset.models import GitHubBackupJob
+        from app.modules.dataset.repositories import GitHubBackupJobRepository
+
+        jobs = GitHubBackupJobRepository()
+        job = jobs.active_for_dataset(dataset_id)
+        if job is not None:
+            if job.state == GitHubBackupJob.QUEUED:
+                job.token = seal_token(token)
+                jobs.session.commit()
+            return job
+
+        job = jobs.create(
+            dataset_id=dataset_id,
+            user_id=user_id,
+            token=seal_token(token),
+            trigger=trigger or GitHubBackupJob.MANUAL,
+        )
+        self._submit(job.id)
+        return job
+
+    def _submit(self, job_id: int) -> Optional[Future]:
+        if self.mode == "inline":
+            run_backup(job_id)
+            return None
+        if self._rq_queue is not None:
+            self._rq_queue.enqueue(backup_drain_job, self.per_user, self.timeout, job_timeout=self.timeout)
+            return None
+        return self._ensure_executor().submit(self._drain_in_app)
+
+
+def get_backup_queue() -> BackupQueue:
+    """Return the backup queue bound to the current Flask app, creating it on first use."""
+    backup_queue = current_app.extensions.get("github_backup_queue")
+    if backup_queue is None:
+        config = current_app.config
+        backup_queue = BackupQueue(
+            current_app._get_current_object(),
+            mode=config.get("GITHUB_BACKUP_MODE", "thread"),
+            workers=config.get("GITHUB_BACKUP_JOB_WORKERS", 2),
+            per_user=config.get("GITHUB_BACKUP_PER_USER", 1),
+        )
+        current_app.extensions["github_backup_queue"] = backup_queue
+    return backup_queue
+
+
+def schedule_changed_backups() -> list:
+    """Queue a backup of every dataset whose folder changed since its last backup, with the token stored then.
+
+    Datasets with a backup already queued or running, a missing folder or a token that can no longer be
+    decrypted are skipped. Returns the queued jobs.
+    """
+    from app.modules.dataset.models import GitHubBackupJob
+    from app.modules.dataset.repositories import GitHubBackupJobRepository, GitHubBackupRepository
+    from app.modules.dataset.services import DataSetService
+
+    active = GitHubBackupJobRepository().active_dataset_ids()
+    dataset_service = DataSetService()
+    queue = get_backup_queue()
+    queued = []
+    for backup in GitHubBackupRepository().schedulable():
+        if backup.dataset_id in active:
+            continue
+        dataset = dataset_service.get_by_id(backup.dataset_id)
+        token = open_token(backup.token)
+        if dataset is None or token is None:
+            continue
+        try:
+            if backup_is_current(dataset, backup):
+                continue
+        except RuntimeError as exc:
+            logger.warning(f"Skipping scheduled backup of dataset {dataset.id}: {exc}")
+            continue
+        queued.append(queue.enqueue(dataset.id, dataset.user_id, token, trigger=GitHubBackupJob.SCHEDULED))
+    return queued
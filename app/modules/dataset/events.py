@@ -0,0 +1,370 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DATASET_DOWNLOAD = "dataset_download"
+DATASET_VIEW = "dataset_view"
+FILE_DOWNLOAD = "file_download"
+FILE_VIEW = "file_view"
+
+
+def _event_specs() -> Dict[str, dict]:
+    """Per event type: record model, dedup key columns (None = always insert), counter column and the
+    SiteStats counter it feeds."""
+    from app.modules.dataset.models import DSDownloadRecord, DSViewRecord
+    from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+
+    return {
+        DATASET_DOWNLOAD: {
+            "model": DSDownloadRecord,
+            "dedup": None,
+            "counter": "dataset_id",
+            "stat": "dataset_downloads",
+        },
+        DATASET_VIEW: {
+            "model": DSViewRecord,
+            "dedup": ("user_id", "dataset_id", "view_cookie"),
+            "counter": None,
+            "stat": "dataset_views",
+        },
+        FILE_DOWNLOAD: {
+            "model": HubfileDownloadRecord,
+            "dedup": ("user_id", "file_id", "download_cookie"),
+            "counter": None,
+            "stat": "feature_model_downloads",
+        },
+        FILE_VIEW: {
+            "model": HubfileViewRecord,
+            "dedup": ("user_id", "file_id", "view_cookie"),
+            "counter": None,
+            "stat": "feature_model_views",
+        },
+    }
+
+
+def _dedup(model, key_columns: Tuple[str, ...], rows: List[dict], session) -> List[dict]:
+    """Drop rows whose key repeats inside the batch or already exists in the table (one SELECT)."""
+    unique = {}
+    for row in rows:
+        unique.setdefault(tuple(row.get(col) for col in key_columns), row)
+    if not unique:
+        return []
+
+    # NULL user ids never match an IN tuple, so look them up by the remaining columns and
+    # compare the full key in Python.
+    non_user_columns = [col for col in key_columns if col != "user_id"]
+    candidates = {tuple(row.get(col) for col in non_user_columns) for row in unique.values()}
+    existing = (
+        session.query(*[getattr(model, col) for col in key_columns])
+        .filter(tuple_(*[getattr(model, col) for col in non_user_columns]).in_(list(candidates)))
+        .all()
+    )
+    existing_keys = {tuple(row) for row in existing}
+    return [row for key, row in unique.items() if key not in existing_keys]
+
+
+def write_batch(events: List[Tuple[str, dict]]) -> Dict[str, int]:
+    """Persist a batch of events in one transaction: one bulk INSERT per record table, one
+    aggregated UPDATE for dataset download counters and one for the SiteStats snapshot.
+    Returns inserted rows per event type."""
+    from app import db
+    from app.modules.dataset.repositories import DataSetRepository, DSDownloadDailyRepository, download_day
+    from app.modules.public.repositories import SiteStatsRepository
+    from core.repositories.BaseRepository import BaseRepository
+
+    specs = _event_specs()
+    grouped: Dict[str, List[dict]] = {}
+    for event_type, row in events:
+        if event_type not in specs:
+            logger.warning(f"Dropping unknown event type {event_type!r}")
+            continue
+        grouped.setdefault(event_type, []).append(row)
+
+    inserted = {}
+    try:
+        for event_type, rows in grouped.items():
+            spec = specs[event_type]
+            if spec["dedup"]:
+                rows = _dedup(spec["model"], spec["dedup"], rows, db.session)
+            inserted[event_type] = BaseRepository(spec["model"]).bulk_insert(rows, commit=False)
+            if spec["counter"]:
+                counts = Counter(row[spec["counter"]] for row in rows)
+                DataSetRepository().increment_download_counts(dict(counts), commit=False)
+            if event_type == DATASET_DOWNLOAD:
+                daily = Counter((row["dataset_id"], download_day(row["download_date"])) for row in rows)
+                DSDownloadDailyRepository().add_counts(dict(daily), commit=False)
+        # Bulk inserts bypass the ORM, so the snapshot counters are bumped here
+        SiteStatsRepository().increment({specs[t]["stat"]: n for t, n in inserted.items()}, commit=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return inserted
+
+
+_DAILY_KEY = "dataset_download_daily"
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_daily_downloads(session, flush_context, instances):
+    """Download records written through the ORM (rather than write_batch) also feed the daily rollup."""
+    from app.modules.dataset.models import DSDownloadRecord
+    from app.modules.dataset.repositories import download_day
+
+    daily = Counter()
+    for sign, objects in ((1, session.new), (-1, session.deleted)):
+        for obj in objects:
+            if isinstance(obj, DSDownloadRecord) and obj.dataset_id is not None:
+                download_date = obj.download_date or datetime.now(timezone.utc)
+                daily[(obj.dataset_id, download_day(download_date))] += sign
+    if daily:
+        session.info.setdefault(_DAILY_KEY, Counter()).update(daily)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_daily_downloads(session):
+    session.flush()
+    daily = session.info.pop(_DAILY_KEY, None)
+    if daily:
+        from app.modules.dataset.repositories import DSDownloadDailyRepository
+
+        DSDownloadDailyRepository(session).add_counts(dict(daily), commit=False)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_daily_downloads(session, previous_transaction):
+    session.info.pop(_DAILY_KEY, None)
+
+
+def write_isolated(events: List[Tuple[str, dict]]) -> List[Tuple[str, dict]]:
+    """write_batch, falling back to one transaction per event when the batch fails, so one bad row (e.g. an event
+    of a dataset or file deleted meanwhile) does not take the rest of the batch with it. Returns the events that
+    could not be written."""
+    try:
+        write_batch(events)
+        return []
+    except Exception as exc:
+        if len(events) == 1:
+            logger.warning(f"Failed to write a {events[0][0]} event: {exc}")
+            return events
+        logger.warning(f"Failed to write a batch of {len(events)} events ({exc}); writing them one by one")
+
+    failed = []
+    for event_ in events:
+        try:
+            write_batch([event_])
+        except Exception as exc:
+            logger.warning(f"Failed to write a {event_[0]} event: {exc}")
+            failed.append(event_)
+    return failed
+
+
+def ingest_batch(events: List[Tuple[str, dict]], attempt: int = 0) -> int:
+    """RQ job entry point: write a batch from a worker process. Events that fail are enqueued again as a job of
+    their own, up to EVENT_MAX_RETRIES times. Returns the number of events written."""
+    import app
+
+    with app.app.app_context():
+        failed = write_isolated(events)
+        if failed:
+            if attempt < app.app.config.get("EVENT_MAX_RETRIES", 3):
+                from rq import Queue, get_current_job
+
+                job = get_current_job()
+                Queue(job.origin, connection=job.connection).enqueue(ingest_batch, failed, attempt + 1)
+            else:
+                logger.error(f"Dropping {len(failed)} events after {attempt + 1} attempts")
+        return len(events) - len(failed)
+
+
+class EventPipeline:
+    """Buffers download/view events and writes them in batches off the request path.
+
+    Modes (EVENT_PIPELINE_MODE):
+      - "thread": an in-process queue drained by a background flusher thread (default).
+      - "rq": same queue, but each batch is enqueued as an RQ job on REDIS_URL.
+      - "inline": write every event immediately, used by the test suite.
+
+    A batch that cannot be written (or enqueued) is written event by event, and the events that still fail are
+    retried on the following flushes, up to max_retries times, before they are dropped.
+    """
+
+    def __init__(
+        self,
+        flask_app,
+        mode: str = "thread",
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        max_retries: int = 3,
+    ):
+        self.app = flask_app
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        # (events, attempts so far) to retry on the next flush
+        self._retrying: List[Tuple[List[Tuple[str, dict]], int]] = []
+        self.queue: "queue.Queue[Tuple[str, dict]]" = queue.Queue(maxsize=batch_size * 20)
+        self._rq_queue = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        if self.mode == "rq":
+            self._rq_queue = self._connect_rq()
+            if self._rq_queue is None:
+                self.mode = "thread"
+        if self.mode != "inline":
+            atexit.register(self.stop)
+
+    def _connect_rq(self):
+        redis_url = self.app.config.get("REDIS_URL")
+        if not redis_url:
+            logger.warning("EVENT_PIPELINE_MODE=rq but REDIS_URL is not set; using the in-process flusher")
+            return None
+        try:
+            from redis import Redis
+            from rq import Queue
+        except ImportError:
+            logger.warning("redis/rq are not installed; using the in-process flusher")
+            return None
+        return Queue(self.app.config.get("EVENT_RQ_QUEUE", "events"), connection=Redis.from_url(redis_url))
+
+    def record(self, event_type: str, **row):
+        if self.mode == "inline":
+            write_batch([(event_type, row)])
+            return
+
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait((event_type, row))
+        except queue.Full:
+            # Backpressure: the flusher is behind, so this request pays for one batch write.
+            logger.warning("Event queue full; flushing on the request path")
+            self.flush()
+            self.queue.put_nowait((event_type, row))
+        if self.queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def record_dataset_download(self, dataset_id: int, user_id: Optional[int], cookie: str):
+        self.record(
+            DATASET_DOWNLOAD,
+            user_id=user_id,
+            dataset_id=dataset_id,
+            download_date=datetime.now(timezone.utc),
+            download_cookie=cookie,
+        )
+
+    def record_dataset_view(self, dataset_id: int, user_id: Optional[int], cookie: str):
+        self.record(
+            DATASET_VIEW,
+            user_id=user_id,
+            dataset_id=dataset_id,
+            view_date=datetime.now(timezone.utc),
+            view_cookie=cookie,
+        )
+
+    def record_file_download(self, file_id: int, user_id: Optional[int], cookie: str):
+        self.record(
+            FILE_DOWNLOAD,
+            user_id=user_id,
+            file_id=file_id,
+            download_date=datetime.now(timezone.utc),
+            download_cookie=cookie,
+        )
+
+    def record_file_view(self, file_id: int, user_id: Optional[int], cookie: str):
+        self.record(
+            FILE_VIEW, user_id=user_id, file_id=file_id, view_date=datetime.now(timezone.utc), view_cookie=cookie
+        )
+
+    def _drain(self) -> List[Tuple[str, dict]]:
+        events = []
+        while len(events) < self.batch_size:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self) -> int:
+        """Write everything currently buffered. Returns the number of events handed off."""
+        total = 0
+        with self._lock:
+            retrying, self._retrying = self._retrying, []
+            for events, attempts in retrying:
+                self._hand_off(events, attempts)
+            while True:
+                events = self._drain()
+                if not events:
+                    return total
+                total += len(events)
+                self._hand_off(events)
+
+    def _hand_off(self, events: List[Tuple[str, dict]], attempts: int = 0):
+        try:
+            if self._rq_queue is not None:
+                self._rq_queue.enqueue(ingest_batch, events)
+                return
+            with self.app.app_context():
+                failed = write_isolated(events)
+        except Exception as exc:
+            logger.warning(f"Failed to hand off {len(events)} buffered events: {exc}")
+            failed = events
+        if not failed:
+            return
+        if attempts < self.max_retries:
+            self._retrying.append((failed, attempts + 1))
+        else:
+            logger.error(f"Dropping {len(failed)} events after {attempts + 1} attempts")
+
+    def _ensure_worker(self):
+        # Started lazily and per process, so gunicorn workers forked after app creation get their own.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="event-pipeline-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
+
+
+def get_event_pipeline() -> EventPipeline:
+    """Return the pipeline bound to the current Flask app, creating it on first use."""
+    pipeline = current_app.extensions.get("event_pipeline")
+    if pipeline is None:
+        config = current_app.config
+        pipeline = EventPipeline(
+            current_app._get_current_object(),
+            mode=config.get("EVENT_PIPELINE_MODE", "thread"),
+            batch_size=config.get("EVENT_BATCH_SIZE", 500),
+            flush_interval=config.get("EVENT_FLUSH_INTERVAL", 2.0),
+            max_retries=config.get("EVENT_MAX_RETRIES", 3),
+        )
+        current_app.extensions["event_pipeline"] = pipeline
+    return pipeline
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 
 from flask import request
@@ -58,6 +58,10 @@ class DataSet(db.Model):
     ds_meta_data_id = db.Column(db.Integer, db.ForeignKey("ds_meta_data.id"), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.now())
     download_count = db.Column(db.Integer, nullable=False, default=0)
+    # Maintained from comment inserts, deletes and visibility changes (see app.modules.comment.services);
+    # `rosemary comments:recount` recomputes them
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    visible_comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     ds_meta_data = db.relationship("DSMetaData", backref=db.backref("data_set", uselist=False))
     feature_models = db.relationship("FeatureModel", backref="data_set", lazy=True, cascade="all, delete")
@@ -101,14 +105,19 @@ class DataSet(db.Model):
         from app.modules.dataset.services import DataSetService
 
         return DataSetService().get_uvlhub_doi(self)
-    
+
     @property
     def total_comments(self) -> int:
-        """Total de comentarios del dataset"""
-        from app.modules.dataset.services import DataSetService
-        return DataSetService.get_total_comments(self.id)
+        """Total de comentarios del dataset (contador mantenido en la propia fila, sin consultas)"""
+        return self.comment_count or 0
 
     def to_dict(self):
+        # Single pass over the files: count, size and serialization share the same list
+        files = self.files()
+        total_size = sum(file.size for file in files)
+
+        from app.modules.dataset.services import SizeService
+
         return {
             "title": self.ds_meta_data.title,
             "id": self.id,
@@ -123,10 +132,10 @@ class DataSet(db.Model):
             "url": self.get_uvlhub_doi(),
             "download": f'{request.host_url.rstrip("/")}/dataset/download/{self.id}',
             "zenodo": self.get_zenodo_url(),
-            "files": [file.to_dict() for fm in self.feature_models for file in fm.files],
-            "files_count": self.get_files_count(),
-            "total_size_in_bytes": self.get_file_total_size(),
-            "total_size_in_human_format": self.get_file_total_size_for_human(),
+            "files": [file.to_dict() for file in files],
+            "files_count": len(files),
+            "total_size_in_bytes": total_size,
+            "total_size_in_human_format": SizeService().get_human_readable_size(total_size),
             "download_count": self.download_count,
         }
 
@@ -138,7 +147,7 @@ class DSDownloadRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id"))
-    download_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    download_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     download_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
 
     def __repr__(self):
@@ -150,6 +159,22 @@ class DSDownloadRecord(db.Model):
         )
 
 
+class DSDownloadDaily(db.Model):
+    """Downloads per dataset and UTC day, kept current from download events (see dataset/events.py)."""
+
+    __tablename__ = "dataset_download_daily"
+
+    dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Trending scans a day range and groups by dataset
+    __table_args__ = (db.Index("ix_dataset_download_daily_day", "day", "dataset_id"),)
+
+    def __repr__(self):
+        return f"<DownloadDaily dataset_id={self.dataset_id} day={self.day} count={self.count}>"
+
+
 class DSViewRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
@@ -169,3 +194,109 @@ class DOIMapping(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     dataset_doi_old = db.Column(db.String(120))
     dataset_doi_new = db.Column(db.String(120))
+
+
+class GitHubBackup(db.Model):
+    """Last backup of a dataset to a GitHub repository. Its files are the manifest later backups diff against."""
+
+    __tablename__ = "github_backup"
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), nullable=False, index=True)
+    repository = db.Column(db.String(255), nullable=False)
+    branch = db.Column(db.String(255), nullable=False)
+    # Branch head written by the last backup; if the branch moved since, the manifest is not trusted
+    commit_sha = db.Column(db.String(40))
+    backed_up_at = db.Column(db.DateTime)
+    # OAuth token of the last backup, encrypted with SECRET_KEY, so scheduled backups can run without a session
+    token = db.Column(db.Text)
+
+    files = db.relationship("GitHubBackupFile", backref="backup", lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (db.UniqueConstraint("dataset_id", "repository", name="uq_github_backup_dataset_repository"),)
+
+    def __repr__(self):
+        return f"<GitHubBackup dataset_id={self.dataset_id} repository={self.repository} commit={self.commit_sha}>"
+
+
+class GitHubBackupFile(db.Model):
+    """One file as it was pushed: content checksum (MD5, like Hubfile.checksum), git blob SHA and the size and
+    mtime it had on disk, so unchanged files are recognised without reading them."""
+
+    __tablename__ = "github_backup_file"
+
+    id = db.Column(db.Integer, primary_key=True)
+    backup_id = db.Column(db.Integer, db.ForeignKey("github_backup.id", ondelete="CASCADE"), nullable=False)
+    path = db.Column(db.String(512), nullable=False)
+    checksum = db.Column(db.String(120), nullable=False)
+    blob_sha = db.Column(db.String(40), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    backed_up_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint("backup_id", "path", name="uq_github_backup_file_path"),)
+
+    def __repr__(self):
+        return f"<GitHubBackupFile path={self.path} blob={self.blob_sha}>"
+
+
+class GitHubBackupJob(db.Model):
+    """A queued or finished backup of a dataset to GitHub, with the progress polled by the backup popup."""
+
+    __tablename__ = "github_backup_job"
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    ACTIVE = (QUEUED, RUNNING)
+    FINISHED = (DONE, FAILED)
+
+    MANUAL = "manual"
+    SCHEDULED = "scheduled"
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    state = db.Column(db.String(20), nullable=False, default=QUEUED, index=True)
+    trigger = db.Column(db.String(20), nullable=False, default=MANUAL)
+    # Encrypted OAuth token the job runs with; cleared once the job has finished
+    token = db.Column(db.Text)
+    repository = db.Column(db.String(255))
+    html_url = db.Column(db.String(512))
+    files_total = db.Column(db.Integer, nullable=False, default=0)
+    files_uploaded = db.Column(db.Integer, nullable=False, default=0)
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    unchanged = db.Column(db.Integer, nullable=False, default=0)
+    commit_sha = db.Column(db.String(40))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "dataset_id": self.dataset_id,
+            "state": self.state,
+            "trigger": self.trigger,
+            "repo": self.repository,
+            "url": self.html_url,
+            "files_total": self.files_total,
+            "uploaded": self.files_uploaded,
+            "deleted": self.deleted,
+            "unchanged": self.unchanged,
+            "commit": self.commit_sha,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<GitHubBackupJob id={self.id} dataset_id={self.dataset_id} state={self.state}>"
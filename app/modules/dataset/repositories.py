@@ -1,16 +1,48 @@
 import logging
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
 
 from flask_login import current_user
-from sqlalchemy import desc, func
-
-from app.modules.dataset.models import Author, DataSet, DOIMapping, DSDownloadRecord, DSMetaData, DSViewRecord
+from sqlalchemy import bindparam, delete, desc, func, insert, select, tuple_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.modules.dataset.models import (
+    Author,
+    DataSet,
+    DOIMapping,
+    DSDownloadDaily,
+    DSDownloadRecord,
+    DSMetaData,
+    DSViewRecord,
+    GitHubBackup,
+    GitHubBackupJob,
+)
+from app.modules.featuremodel.models import FeatureModel
 from core.repositories.BaseRepository import BaseRepository
 
 logger = logging.getLogger(__name__)
 
 
+def dataset_load_options(profile: str) -> tuple:
+    """Named eager-loading option sets for DataSet queries.
+
+    - "summary": metadata and its authors (dataset lists).
+    - "detail": summary plus feature models, their metadata and files (to_dict, homepage cards).
+    Collections use selectinload so the main query does not fan out rows.
+    """
+    summary = (joinedload(DataSet.ds_meta_data).selectinload(DSMetaData.authors),)
+    if profile == "summary":
+        return summary
+    if profile == "detail":
+        feature_models = selectinload(DataSet.feature_models)
+        return summary + (
+            feature_models.joinedload(FeatureModel.fm_meta_data),
+            feature_models.selectinload(FeatureModel.files),
+        )
+    raise ValueError(f"Unknown dataset load profile: {profile}")
+
+
 class AuthorRepository(BaseRepository):
     def __init__(self):
         super().__init__(Author)
@@ -52,6 +84,106 @@ class DSDownloadRecordRepository(BaseRepository):
         return query.group_by(self.model.dataset_id).order_by(desc("cnt")).limit(limit).all()
 
 
+def download_day(download_date: datetime) -> date:
+    """UTC day a download belongs to (naive datetimes are already UTC)."""
+    if download_date.tzinfo is not None:
+        download_date = download_date.astimezone(timezone.utc)
+    return download_date.date()
+
+
+class DSDownloadDailyRepository(BaseRepository):
+    def __init__(self, session=None):
+        super().__init__(DSDownloadDaily)
+        if session is not None:
+            self.session = session
+
+    def add_counts(self, counts: Dict[Tuple[int, date], int], commit: bool = True) -> int:
+        """Add counts[(dataset_id, day)] to the rollup, creating missing rows. Negative counts subtract."""
+        counts = {key: n for key, n in counts.items() if n and key[0] is not None}
+        if not counts:
+            return 0
+
+        rows = [{"dataset_id": dataset_id, "day": day, "count": n} for (dataset_id, day), n in counts.items()]
+        # Native upserts keep concurrent writers (several workers flushing the same day) from colliding
+        dialect = self.session.get_bind().dialect.name
+        if dialect in ("mysql", "mariadb"):
+            stmt = mysql.insert(self.model)
+            stmt = stmt.on_duplicate_key_update(count=self.model.count + stmt.inserted["count"])
+            self.session.execute(stmt, rows)
+        elif dialect in ("sqlite", "postgresql"):
+            stmt = (sqlite if dialect == "sqlite" else postgresql).insert(self.model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["dataset_id", "day"], set_={"count": self.model.count + stmt.excluded["count"]}
+            )
+            self.session.execute(stmt, rows)
+        else:
+            self._add_counts_portable(rows)
+        if commit:
+            self.session.commit()
+        return len(counts)
+
+    def _add_counts_portable(self, rows: List[dict]):
+        existing = set(
+            self.session.execute(
+                select(self.model.dataset_id, self.model.day).where(
+                    tuple_(self.model.dataset_id, self.model.day).in_([(r["dataset_id"], r["day"]) for r in rows])
+                )
+            ).all()
+        )
+        updates = [
+            {"b_dataset_id": r["dataset_id"], "b_day": r["day"], "b_count": r["count"]}
+            for r in rows
+            if (r["dataset_id"], r["day"]) in existing
+        ]
+        inserts = [r for r in rows if (r["dataset_id"], r["day"]) not in existing]
+        if updates:
+            stmt = (
+                update(self.model)
+                .where(self.model.dataset_id == bindparam("b_dataset_id"), self.model.day == bindparam("b_day"))
+                .values(count=self.model.count + bindparam("b_count"))
+            )
+            self.session.connection().execute(stmt, updates)
+        if inserts:
+            self.session.execute(insert(self.model), inserts)
+
+    def top_downloaded_in_period(self, since: datetime, limit: int = 3, until: datetime = None) -> List[tuple]:
+        """Same contract as DSDownloadRecordRepository.top_downloaded_in_period, read from the daily rollup.
+
+        Bounds are taken at day granularity (the trending windows start at midnight UTC).
+        """
+        total = func.sum(self.model.count).label("cnt")
+        query = self.session.query(self.model.dataset_id, total).filter(self.model.day >= download_day(since))
+        if until:
+            query = query.filter(self.model.day < download_day(until))
+        return (
+            query.group_by(self.model.dataset_id)
+            .having(total > 0)
+            .order_by(desc("cnt"), self.model.dataset_id)
+            .limit(limit)
+            .all()
+        )
+
+    def rebuild(self, commit: bool = True) -> int:
+        """Recompute the whole rollup from ds_download_record. Returns the number of rollup rows."""
+        day = func.date(DSDownloadRecord.download_date)
+        rows = (
+            self.session.query(DSDownloadRecord.dataset_id, day, func.count(DSDownloadRecord.id))
+            .filter(DSDownloadRecord.dataset_id.isnot(None))
+            .group_by(DSDownloadRecord.dataset_id, day)
+            .all()
+        )
+        self.session.execute(delete(self.model))
+        values = [
+            {"dataset_id": dataset_id, "day": day if isinstance(day, date) else date.fromisoformat(day), "count": n}
+            for dataset_id, day, n in rows
+        ]
+        if values:
+            self.session.execute(insert(self.model), values)
+        if commit:
+            self.session.commit()
+        return len(values)
+
+
 class DSMetaDataRepository(BaseRepository):
     def __init__(self):
         super().__init__(DSMetaData)
@@ -85,12 +217,21 @@ class DSViewRecordRepository(BaseRepository):
 
 
 class DataSetRepository(BaseRepository):
-    def __init__(self):
+    def __init__(self, session=None):
         super().__init__(DataSet)
+        if session is not None:
+            self.session = session
+
+    def get_many(self, ids: List[int], profile: str = "summary") -> List[DataSet]:
+        """Datasets with the given ids in one query (order not guaranteed)."""
+        if not ids:
+            return []
+        return self.model.query.options(*dataset_load_options(profile)).filter(self.model.id.in_(ids)).all()
 
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return (
             self.model.query.join(DSMetaData)
+            .options(*dataset_load_options("summary"))
             .filter(DataSet.user_id == current_user_id, DSMetaData.dataset_doi.isnot(None))
             .order_by(self.model.created_at.desc())
             .all()
@@ -99,6 +240,7 @@ class DataSetRepository(BaseRepository):
     def get_unsynchronized(self, current_user_id: int) -> DataSet:
         return (
             self.model.query.join(DSMetaData)
+            .options(*dataset_load_options("summary"))
             .filter(DataSet.user_id == current_user_id, DSMetaData.dataset_doi.is_(None))
             .order_by(self.model.created_at.desc())
             .all()
@@ -117,9 +259,71 @@ class DataSetRepository(BaseRepository):
     def count_unsynchronized_datasets(self):
         return self.model.query.join(DSMetaData).filter(DSMetaData.dataset_doi.is_(None)).count()
 
+    def increment_download_counts(self, counts: Dict[int, int], commit: bool = True) -> int:
+        """Add counts[dataset_id] to each dataset's download_count with one executemany UPDATE."""
+        if not counts:
+            return 0
+        stmt = (
+            update(self.model)
+            .where(self.model.id == bindparam("b_id"))
+            .values(download_count=self.model.download_count + bindparam("b_count"))
+        )
+        params = [{"b_id": dataset_id, "b_count": count} for dataset_id, count in counts.items()]
+        self.session.connection().execute(stmt, params)
+        if commit:
+            self.session.commit()
+        return len(params)
+
+    def increment_comment_counts(self, deltas: Dict[int, Tuple[int, int]], commit: bool = True) -> int:
+        """Add (comments, visible comments) deltas[dataset_id] to each dataset's counters with one executemany
+        UPDATE."""
+        params = [
+            {"b_id": dataset_id, "b_total": total, "b_visible": visible}
+            for dataset_id, (total, visible) in deltas.items()
+            if total or visible
+        ]
+        if not params:
+            return 0
+        stmt = (
+            update(self.model)
+            .where(self.model.id == bindparam("b_id"))
+            .values(
+                comment_count=self.model.comment_count + bindparam("b_total"),
+                visible_comment_count=self.model.visible_comment_count + bindparam("b_visible"),
+            )
+        )
+        self.session.connection().execute(stmt, params)
+        if commit:
+            self.session.commit()
+        return len(params)
+
+    def recount_comments(self, commit: bool = True) -> int:
+        """Recompute comment_count and visible_comment_count from the comment table with one UPDATE.
+
+        Returns the number of datasets whose counters were wrong.
+        """
+        from app.modules.comment.models import Comment
+
+        total = select(func.count(Comment.id)).where(Comment.dataset_id == self.model.id).scalar_subquery()
+        visible = (
+            select(func.count(Comment.id))
+            .where(Comment.dataset_id == self.model.id, Comment.visible.is_(True))
+            .scalar_subquery()
+        )
+        result = self.session.execute(
+            update(self.model)
+            .where((self.model.comment_count != total) | (self.model.visible_comment_count != visible))
+            .values(comment_count=total, visible_comment_count=visible)
+            .execution_options(synchronize_session=False)
+        )
+        if commit:
+            self.session.commit()
+        return result.rowcount
+
     def latest_synchronized(self):
         return (
             self.model.query.join(DSMetaData)
+            .options(*dataset_load_options("detail"))
             .filter(DSMetaData.dataset_doi.isnot(None))
             .order_by(desc(self.model.id))
             .limit(5)
@@ -133,3 +337,103 @@ class DOIMappingRepository(BaseRepository):
 
     def get_new_doi(self, old_doi: str) -> str:
         return self.model.query.filter_by(dataset_doi_old=old_doi).first()
+
+
+class GitHubBackupRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(GitHubBackup)
+
+    def get_for(self, dataset_id: int, repository: str) -> Optional[GitHubBackup]:
+        return self.model.query.filter_by(dataset_id=dataset_id, repository=repository).first()
+
+    def latest_for_dataset(self, dataset_id: int) -> Optional[GitHubBackup]:
+        return (
+            self.model.query.filter_by(dataset_id=dataset_id)
+            .order_by(desc(self.model.backed_up_at), desc(self.model.id))
+            .first()
+        )
+
+    def hubfile_checksums(self, dataset_id: int) -> Dict[str, Tuple[str, int]]:
+        """{file name: (checksum, size)} of the Hubfiles of a dataset."""
+        from app.modules.hubfile.models import Hubfile
+
+        rows = (
+            self.session.query(Hubfile.name, Hubfile.checksum, Hubfile.size)
+            .join(FeatureModel, Hubfile.feature_model_id == FeatureModel.id)
+            .filter(FeatureModel.data_set_id == dataset_id)
+            .all()
+        )
+        return {name: (checksum, size) for name, checksum, size in rows}
+
+    def schedulable(self) -> List[GitHubBackup]:
+        """Latest backup of every dataset that has a stored token, i.e. that can be backed up again unattended."""
+        latest = (
+            select(func.max(self.model.id))
+            .where(self.model.token.isnot(None), self.model.backed_up_at.isnot(None))
+            .group_by(self.model.dataset_id)
+        )
+        return self.model.query.filter(self.model.id.in_(latest)).order_by(self.model.dataset_id).all()
+
+
+class GitHubBackupJobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(GitHubBackupJob)
+
+    def active_for_dataset(self, dataset_id: int) -> Optional[GitHubBackupJob]:
+        return (
+            self.model.query.filter(self.model.dataset_id == dataset_id, self.model.state.in_(GitHubBackupJob.ACTIVE))
+            .order_by(self.model.id)
+            .first()
+        )
+
+    def active_dataset_ids(self) -> set:
+        rows = self.session.query(self.model.dataset_id).filter(self.model.state.in_(GitHubBackupJob.ACTIVE))
+        return {dataset_id for (dataset_id,) in rows}
+
+    def expire_stale(self, older_than: datetime) -> int:
+        """Fail running jobs not updated since older_than: their worker died, and they would hold a user's slot."""
+        result = self.session.execute(
+            update(self.model)
+            .where(self.model.state == GitHubBackupJob.RUNNING, self.model.updated_at < older_than)
+            .values(
+                state=GitHubBackupJob.FAILED,
+                error="The backup worker stopped responding",
+                token=None,
+                finished_at=datetime.now(timezone.utc),
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+        self.session.commit()
+        return result.rowcount
+
+    def claim_next(self, per_user: int) -> Optional[GitHubBackupJob]:
+        """Mark the oldest queued job whose user runs fewer than per_user jobs as running and return it.
+
+        The claim is a conditional UPDATE, so concurrent workers (threads or RQ processes) never run the
+        same job twice; a job lost to another worker is skipped and the next one is tried.
+        """
+        running = dict(
+            self.session.query(self.model.user_id, func.count(self.model.id))
+            .filter(self.model.state == GitHubBackupJob.RUNNING)
+            .group_by(self.model.user_id)
+            .all()
+        )
+        queued = (
+            self.session.query(self.model.id, self.model.user_id)
+            .filter(self.model.state == GitHubBackupJob.QUEUED)
+            .order_by(self.model.id)
+            .all()
+        )
+        for job_id, user_id in queued:
+            if running.get(user_id, 0) >= per_user:
+                continue
+            now = datetime.now(timezone.utc)
+            claimed = self.session.execute(
+                update(self.model)
+                .where(self.model.id == job_id, self.model.state == GitHubBackupJob.QUEUED)
+                .values(state=GitHubBackupJob.RUNNING, started_at=now, updated_at=now)
+            ).rowcount
+            self.session.commit()
+            if claimed:
+                return self.session.get(self.model, job_id, populate_existing=True)
+        return None
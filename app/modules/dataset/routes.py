@@ -1,30 +1,31 @@
 import json
 import logging
 import os
-import shutil
-import tempfile
+import re
 import uuid
-from datetime import datetime, timezone
 from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
-from zipfile import ZipFile
 
 from flask import (
+    Response,
     abort,
+    current_app,
     jsonify,
     make_response,
     redirect,
     render_template,
     request,
-    send_from_directory,
     session,
     url_for,
 )
 from flask_login import current_user, login_required
 
-from app import db
 from app.modules.comment.services import CommentService
 from app.modules.dataset import dataset_bp
+from app.modules.dataset.backups import get_backup_queue
+from app.modules.dataset.events import get_event_pipeline
 from app.modules.dataset.forms import DataSetForm
+from app.modules.dataset.models import GitHubBackupJob
+from app.modules.dataset.repositories import GitHubBackupJobRepository
 from app.modules.dataset.services import (
     AuthorService,
     DataSetService,
@@ -32,10 +33,21 @@ from app.modules.dataset.services import (
     DSDownloadRecordService,
     DSMetaDataService,
     DSViewRecordService,
-    GitHubContentService,
-    GitHubRepoService,
 )
-from app.modules.zenodo.services import ZenodoService
+from app.modules.dataset.uploads import (
+    InvalidUpload,
+    ResumableUpload,
+    UploadNotFound,
+    clear_temp_folder,
+    forget_upload,
+    purge_stale_uploads,
+    record_upload,
+    save_json_upload,
+    unique_filename,
+)
+from app.modules.dataset.zip_cache import DatasetZipCache
+from app.modules.hubfile.delivery import send_upload
+from app.modules.zenodo.jobs import get_deposition_queue
 
 logger = logging.getLogger(__name__)
 
@@ -43,10 +55,10 @@ logger = logging.getLogger(__name__)
 dataset_service = DataSetService()
 author_service = AuthorService()
 dsmetadata_service = DSMetaDataService()
-zenodo_service = ZenodoService()
 doi_mapping_service = DOIMappingService()
 ds_view_record_service = DSViewRecordService()
 ds_download_record_service = DSDownloadRecordService()
+github_backup_job_repository = GitHubBackupJobRepository()
 
 comment_service = CommentService()
 
@@ -71,46 +83,20 @@ def create_dataset():
             logger.exception(f"Exception while create dataset data in local {exc}")
             return jsonify({"Exception while create dataset data in local: ": str(exc)}), 400
 
-        # send dataset as deposition to Zenodo
-        data = {}
+        # Deposit on Zenodo in the background; progress is reported by /zenodo/deposition/<dataset_id>
         try:
-            zenodo_response_json = zenodo_service.create_new_deposition(dataset)
-            response_data = json.dumps(zenodo_response_json)
-            data = json.loads(response_data)
+            get_deposition_queue().enqueue(dataset.id)
         except Exception as exc:
-            data = {}
-            zenodo_response_json = {}
-            logger.exception(f"Exception while create dataset data in Zenodo {exc}")
-
-        if data.get("conceptrecid"):
-            deposition_id = data.get("id")
-
-            # update dataset with deposition id in Zenodo
-            dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
-
-            try:
-                # iterate for each feature model (one feature model = one
-                # request to Zenodo)
-                for feature_model in dataset.feature_models:
-                    zenodo_service.upload_file(dataset, deposition_id, feature_model)
+            logger.exception(f"Exception while queueing the Zenodo deposition {exc}")
 
-                # publish deposition
-                zenodo_service.publish_deposition(deposition_id)
-
-                # update DOI
-                deposition_doi = zenodo_service.get_doi(deposition_id)
-                dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
-            except Exception as e:
-                msg = f"it has not been possible upload feature models in Zenodo and update the DOI: {e}"
-                return jsonify({"message": msg}), 200
-
-        # Delete temp folder
-        file_path = current_user.temp_folder()
-        if os.path.exists(file_path) and os.path.isdir(file_path):
-            shutil.rmtree(file_path)
+        # Empty the temp folder, keeping the resumable uploads in progress
+        clear_temp_folder(current_user.temp_folder())
 
         msg = "Everything works!"
-        return jsonify({"message": msg}), 200
+        return (
+            jsonify({"message": msg, "deposition_status": url_for("zenodo.deposition_status", dataset_id=dataset.id)}),
+            200,
+        )
 
     return render_template("dataset/upload_dataset.html", form=form)
 
@@ -138,41 +124,25 @@ def upload():
     if not os.path.exists(temp_folder):
         os.makedirs(temp_folder)
 
-    file_path = os.path.join(temp_folder, file.filename)
-
-    if os.path.exists(file_path):
-        # Generate unique filename (by recursion)
-        base_name, extension = os.path.splitext(file.filename)
-        i = 1
-        while os.path.exists(os.path.join(temp_folder, f"{base_name} ({i}){extension}")):
-            i += 1
-        new_filename = f"{base_name} ({i}){extension}"
-        file_path = os.path.join(temp_folder, new_filename)
-    else:
-        new_filename = file.filename
+    new_filename = unique_filename(temp_folder, file.filename)
+    file_path = os.path.join(temp_folder, new_filename)
 
+    # Single pass: stream to disk while hashing and validating; the result is kept for create_from_form
     try:
-        file.save(file_path)
+        info = save_json_upload(file.stream, file_path)
+        record_upload(temp_folder, new_filename, info)
+    except InvalidUpload as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-    # Validate JSON format after saving
-    try:
-        with open(file_path, "r") as f:
-            json.load(f)
-    except json.JSONDecodeError as e:
-        os.remove(file_path)  # Remove invalid file
-        error_msg = f"Invalid JSON format at line {e.lineno}, column {e.colno}: {e.msg}"
-        return jsonify({"error": error_msg}), 400
-    except Exception as e:
-        os.remove(file_path)
-        return jsonify({"error": str(e)}), 500
-
     return (
         jsonify(
             {
                 "message": "JSON uploaded and validated successfully",
                 "filename": new_filename,
+                "size": info["size"],
+                "item_count": info["item_count"],
             }
         ),
         200,
@@ -188,66 +158,138 @@ def delete():
 
     if os.path.exists(filepath):
         os.remove(filepath)
+        forget_upload(temp_folder, filename)
         return jsonify({"message": "File deleted successfully"})
 
     return jsonify({"error": "Error: File not found"})
 
 
-@dataset_bp.route("/dataset/download/<int:dataset_id>", methods=["GET"])
-def download_dataset(dataset_id):
-    dataset = dataset_service.get_or_404(dataset_id)
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
 
-    file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
 
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
+def _load_resumable_upload(upload_id):
+    try:
+        return ResumableUpload.load(current_user.temp_folder(), upload_id)
+    except UploadNotFound:
+        abort(404, description="Upload not found")
 
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
 
-                relative_path = os.path.relpath(full_path, file_path)
+@dataset_bp.route("/dataset/file/uploads", methods=["POST"])
+@login_required
+def initiate_upload():
+    """Start a resumable upload: {"filename", "size"} -> upload id and the chunk size to use."""
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename")
+    size = data.get("size")
+    if not isinstance(filename, str) or not isinstance(size, int):
+        return jsonify({"message": "filename and size are required"}), 400
+    if size > current_app.config["UPLOAD_MAX_SIZE"]:
+        return jsonify({"message": f"File exceeds the {current_app.config['UPLOAD_MAX_SIZE']} bytes limit"}), 413
+
+    temp_folder = current_user.temp_folder()
+    purge_stale_uploads(temp_folder, current_app.config["UPLOAD_RESUMABLE_TTL"])
+    try:
+        upload = ResumableUpload.create(temp_folder, filename, size, current_app.config["UPLOAD_CHUNK_SIZE"])
+    except InvalidUpload as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify(upload.progress()), 201
+
+
+@dataset_bp.route("/dataset/file/uploads/<upload_id>", methods=["GET"])
+@login_required
+def upload_status(upload_id):
+    """Progress of an upload; a client resuming after a failure sends only the missing chunks."""
+    return jsonify(_load_resumable_upload(upload_id).progress())
 
-                zipf.write(
-                    full_path,
-                    arcname=os.path.join(os.path.basename(zip_path[:-4]), relative_path),
-                )
+
+@dataset_bp.route("/dataset/file/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+@login_required
+def upload_chunk(upload_id, index):
+    """Store one chunk. Content-Range gives its offset and X-Chunk-SHA256 (optional) its checksum."""
+    upload = _load_resumable_upload(upload_id)
+    match = _CONTENT_RANGE.match(request.headers.get("Content-Range", ""))
+    if not match:
+        return jsonify({"message": "Content-Range: bytes <start>-<end>/<size> is required"}), 400
+    start, end, size = (int(value) for value in match.groups())
+
+    try:
+        if size != upload.size or end - start + 1 != upload.expected_range(index)[1]:
+            raise InvalidUpload(f"Content-Range does not match chunk {index}")
+        progress = upload.write_chunk(index, start, request.stream, request.headers.get("X-Chunk-SHA256"))
+    except InvalidUpload as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify(progress)
+
+
+@dataset_bp.route("/dataset/file/uploads/<upload_id>/finalize", methods=["POST"])
+@login_required
+def finalize_upload(upload_id):
+    """Assemble the chunks; answers like /dataset/file/upload so the dropzone handlers work unchanged."""
+    upload = _load_resumable_upload(upload_id)
+    progress = upload.progress()
+    if progress["missing_chunks"]:
+        return jsonify(dict(progress, message="Upload is incomplete")), 409
+
+    try:
+        filename, info = upload.finalize()
+    except InvalidUpload as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(
+        {
+            "message": "JSON uploaded and validated successfully",
+            "filename": filename,
+            "size": info["size"],
+            "item_count": info["item_count"],
+        }
+    )
+
+
+@dataset_bp.route("/dataset/file/uploads/<upload_id>", methods=["DELETE"])
+@login_required
+def abort_upload(upload_id):
+    _load_resumable_upload(upload_id).abort()
+    return jsonify({"message": "Upload aborted"})
+
+
+@dataset_bp.route("/dataset/download/<int:dataset_id>", methods=["GET"])
+def download_dataset(dataset_id):
+    dataset = dataset_service.get_or_404(dataset_id)
+
+    zip_cache = DatasetZipCache()
+    cache_key = zip_cache.cache_key(dataset)
+    download_name = zip_cache.archive_name(dataset)
+    cached_path = zip_cache.lookup(cache_key)
+
+    if cached_path:
+        # Cache hit: served from disk with Range and conditional (ETag) support, by the app or by nginx
+        resp = send_upload(cached_path, download_name=download_name, mimetype="application/zip", etag=cache_key)
+    else:
+        # Cache miss: stream the archive to the client while it is written to the cache
+        resp = Response(
+            zip_cache.stream_build(dataset, cache_key),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={download_name}"},
+        )
+        resp.set_etag(cache_key)
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
         # Generate a new unique identifier if it does not exist
         user_cookie = str(uuid.uuid4())
         # Save the cookie to the user's browser
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
-
-    # Record every download in the database
-    # Always record the download (count each download separately)
-    DSDownloadRecordService().create(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        dataset_id=dataset_id,
-        download_date=datetime.now(timezone.utc),
-        download_cookie=user_cookie,
-    )
 
-    # Increment the download count for every download
-    dataset.download_count += 1
-    db.session.commit()
+    # Only whole downloads are recorded: not revalidations of a copy the client has (304) nor the parts a
+    # download manager or a resumed transfer asks for (206), which nginx answers too when it sends the file.
+    # The record and the download_count increment are written in batches by the event pipeline
+    revalidation = request.if_none_match.contains_weak(cache_key)
+    if resp.status_code != 304 and not revalidation and "Range" not in request.headers:
+        get_event_pipeline().record_dataset_download(
+            dataset_id=dataset_id,
+            user_id=current_user.id if current_user.is_authenticated else None,
+            cookie=user_cookie,
+        )
 
     return resp
 
@@ -297,6 +339,12 @@ def api_trending():
     return jsonify(trending)
 
 
+def _first_comments_page(dataset, is_owner):
+    return comment_service.get_page(
+        current_app.config.get("COMMENTS_PAGE_SIZE", 20), dataset_id=dataset.id, show_hidden=is_owner
+    )
+
+
 @dataset_bp.route("/doi/<path:doi>/", methods=["GET"])
 def subdomain_index(doi):
 
@@ -319,15 +367,19 @@ def subdomain_index(doi):
     # Determine ownership for filtering comments
     is_owner = current_user.is_authenticated and (current_user.id == dataset.user_id)
 
-    # Prepare comments to show: only top-level and visible, unless owner
-    comments = [
-        c for c in dataset.comments if getattr(c, "parent", None) is None and (getattr(c, "visible", True) or is_owner)
-    ]
+    # First page of top-level comments, visible ones only (all for the owner); the rest load as the list scrolls
+    comments, comments_cursor = _first_comments_page(dataset, is_owner)
 
     # Save the cookie to the user's browser
     user_cookie = ds_view_record_service.create_cookie(dataset=dataset)
     resp = make_response(
-        render_template("dataset/view_dataset.html", dataset=dataset, comments=comments, is_owner=is_owner)
+        render_template(
+            "dataset/view_dataset.html",
+            dataset=dataset,
+            comments=comments,
+            comments_cursor=comments_cursor,
+            is_owner=is_owner,
+        )
     )
     resp.set_cookie("view_cookie", user_cookie)
 
@@ -345,10 +397,14 @@ def get_unsynchronized_dataset(dataset_id):
         abort(404)
 
     is_owner = current_user.is_authenticated and (current_user.id == dataset.user_id)
-    comments = [
-        c for c in dataset.comments if getattr(c, "parent", None) is None and (getattr(c, "visible", True) or is_owner)
-    ]
-    return render_template("dataset/view_dataset.html", dataset=dataset, comments=comments, is_owner=is_owner)
+    comments, comments_cursor = _first_comments_page(dataset, is_owner)
+    return render_template(
+        "dataset/view_dataset.html",
+        dataset=dataset,
+        comments=comments,
+        comments_cursor=comments_cursor,
+        is_owner=is_owner,
+    )
 
 
 @dataset_bp.route("/dataset/<int:dataset_id>/backup/authorised-user", methods=["GET"])
@@ -365,7 +421,8 @@ def backup_dataset_can(dataset_id):
 @dataset_bp.route("/dataset/<int:dataset_id>/backup/github", methods=["POST"])
 @login_required
 def backup_dataset_to_github(dataset_id):
-    # Crea el repo y sube los archivos en caso de que ya se esté autenticado con GitHub
+    # Encola la copia (crear/reutilizar el repo y subir los cambios) en caso de que ya se esté autenticado
+    # con GitHub. Si termina antes de responder se devuelve el resultado; si no, 202 y la URL de su estado
     dataset = dataset_service.get_or_404(dataset_id)
     # Vuelve a comprobar si el usuario actual está autorizado para hacer backup del dataset por si acaso
     if current_user.id != dataset.user_id:
@@ -378,37 +435,96 @@ def backup_dataset_to_github(dataset_id):
         if not token:
             return jsonify({"error": "Not authenticated with GitHub"}), 401
 
-        title = dataset.ds_meta_data.title or f"dataset-{dataset.id}"
-        from app.modules.dataset.services import repo_name_formatting
-
-        # Creamos el repo con el nombre formateado
-        repo_name = repo_name_formatting(title)
-        repo_service = GitHubRepoService(token=token)
-        repo_info = repo_service.create_repo(
-            name=repo_name, private=True, description=f"Backup for dataset {dataset.id}"
-        )
-
-        full_name = repo_info.get("full_name")
-        html_url = repo_info.get("html_url")
-        default_branch = repo_info.get("default_branch", "main")
-
-        content_service = GitHubContentService(token=token, repo_full_name=full_name, branch=default_branch)
-        result = content_service.upload_dataset(dataset, prefix="")
+        job = get_backup_queue().enqueue(dataset.id, current_user.id, token)
+    except Exception as exc:
+        logger.exception(f"GitHub backup failed: {exc}")
+        return jsonify({"error": str(exc)}), 400
 
+    if job.state == GitHubBackupJob.DONE:
         return (
             jsonify(
                 {
                     "message": "Backup completed",
-                    "repo": full_name,
-                    "url": html_url,
-                    "uploaded": result.get("uploaded", 0),
+                    "repo": job.repository,
+                    "url": job.html_url,
+                    "uploaded": job.files_uploaded,
+                    "job": job.to_dict(),
                 }
             ),
             200,
         )
-    except Exception as exc:
-        logger.exception(f"GitHub backup failed: {exc}")
-        return jsonify({"error": str(exc)}), 400
+    if job.state == GitHubBackupJob.FAILED:
+        return jsonify({"error": job.error, "job": job.to_dict()}), 400
+    return (
+        jsonify(
+            {
+                "message": "Backup queued",
+                "job": job.to_dict(),
+                "status_url": url_for("dataset.backup_job_status", job_id=job.id),
+            }
+        ),
+        202,
+    )
+
+
+@dataset_bp.route("/dataset/backup/jobs/<int:job_id>", methods=["GET"])
+@login_required
+def backup_job_status(job_id):
+    # Estado y progreso de una copia, consultado periódicamente por la página y por el popup
+    job = github_backup_job_repository.get_by_id(job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"error": "Backup not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+def _backup_done_response(full_name, html_url, uploaded):
+    return_url = request.args.get("return") or request.args.get("return_url")
+    if return_url:
+        # Si se abrió en popup, notificar al opener y cerrar
+        if request.args.get("popup") == "1":
+            payload = {
+                "type": "github-backup-done",
+                "repo": full_name or "",
+                "url": html_url or "",
+                "uploaded": uploaded or 0,
+            }
+            html = f"""
+            <!DOCTYPE html>
+            <html lang='en'>
+            <head><meta charset='utf-8'><title>Backup completed</title></head>
+            <body>
+            <p>Backup completed. You can close this window.</p>
+            <script>
+            (function() {{
+                var data = {json.dumps(payload)};
+                try {{
+                    if (window.opener && window.opener.location
+                        && window.opener.location.origin === window.location.origin) {{
+                        window.opener.postMessage(data, window.location.origin);
+                    }}
+                }} catch (e) {{}}
+                window.close();
+            }})();
+            </script>
+            </body>
+            </html>
+            """
+            return html
+        # Si no, añade los parámetros UX a la URL de retorno y redirige
+        split = urlsplit(return_url)
+        q = dict(parse_qsl(split.query))
+        q.update(
+            {
+                "backup": "done",
+                "repo": full_name or "",
+                "url": html_url or "",
+                "uploaded": str(uploaded or 0),
+            }
+        )
+        new_return = urlunsplit((split.scheme, split.netloc, split.path, urlencode(q), split.fragment))
+        return redirect(new_return)
+    # Si no hay URL de retorno, mostrar un mensaje simple
+    return f"Backup completed: <a href='{html_url}' target='_blank'>{html_url}</a>"
 
 
 @dataset_bp.route("/dataset/<int:dataset_id>/backup/github-ui", methods=["GET"])
@@ -430,72 +546,24 @@ def backup_dataset_github_ui(dataset_id):
         return redirect(url_for("auth.github_login", next=next_url))
 
     try:
-        title = dataset.ds_meta_data.title or f"dataset-{dataset.id}"
-        from app.modules.dataset.services import repo_name_formatting
-
-        repo_name = repo_name_formatting(title)
-        repo_service = GitHubRepoService(token=token)
-        repo_info = repo_service.create_repo(
-            name=repo_name, private=True, description=f"Backup for dataset {dataset.id}"
-        )
-        full_name = repo_info.get("full_name")
-        html_url = repo_info.get("html_url")
-        default_branch = repo_info.get("default_branch", "main")
-
-        content_service = GitHubContentService(token=token, repo_full_name=full_name, branch=default_branch)
-        result = content_service.upload_dataset(dataset)
-
-        return_url = request.args.get("return") or request.args.get("return_url")
-        if return_url:
-            # Si se abrió en popup, notificar al opener y cerrar
-            if request.args.get("popup") == "1":
-                payload = {
-                    "type": "github-backup-done",
-                    "repo": full_name or "",
-                    "url": html_url or "",
-                    "uploaded": (result or {}).get("uploaded", 0),
-                }
-                html = f"""
-                <!DOCTYPE html>
-                <html lang='en'>
-                <head><meta charset='utf-8'><title>Backup completed</title></head>
-                <body>
-                <p>Backup completed. You can close this window.</p>
-                <script>
-                (function() {{
-                    var data = {json.dumps(payload)};
-                    try {{
-                        if (window.opener && window.opener.location
-                            && window.opener.location.origin === window.location.origin) {{
-                            window.opener.postMessage(data, window.location.origin);
-                        }}
-                    }} catch (e) {{}}
-                    window.close();
-                }})();
-                </script>
-                </body>
-                </html>
-                """
-                return html
-            # Si no, añade los parámetros UX a la URL de retorno y redirige
-            split = urlsplit(return_url)
-            q = dict(parse_qsl(split.query))
-            q.update(
-                {
-                    "backup": "done",
-                    "repo": full_name or "",
-                    "url": html_url or "",
-                    "uploaded": str((result or {}).get("uploaded", 0)),
-                }
-            )
-            new_return = urlunsplit((split.scheme, split.netloc, split.path, urlencode(q), split.fragment))
-            return redirect(new_return)
-        # Si no hay URL de retorno, mostrar un mensaje simple
-        return f"Backup completed: <a href='{html_url}' target='_blank'>{html_url}</a>"
+        job = get_backup_queue().enqueue(dataset.id, current_user.id, token)
     except Exception as exc:
         logger.exception(f"GitHub UI backup failed: {exc}")
         return f"Error: {exc}", 400
 
+    if job.state == GitHubBackupJob.DONE:
+        return _backup_done_response(job.repository, job.html_url, job.files_uploaded)
+    if job.state == GitHubBackupJob.FAILED:
+        return f"Error: {job.error}", 400
+    # La copia sigue en curso: la página consulta su estado y termina igual que si hubiera acabado ya
+    return render_template(
+        "dataset/backup_progress.html",
+        job=job,
+        status_url=url_for("dataset.backup_job_status", job_id=job.id),
+        return_url=request.args.get("return") or request.args.get("return_url"),
+        popup=request.args.get("popup") == "1",
+    )
+
 
 @dataset_bp.route("/dataset/api", methods=["GET"])
 def api_datasets_view():
@@ -603,13 +671,8 @@ def hide_comment(comment_id):
     # toggle visibility
     new_visibility = not comment.visible
     try:
-        comment_service.update(comment_id, visible=new_visibility)
-        # propagate visibility change to all descendant replies
-        try:
-            comment_service.update_children_visibility(comment_id, new_visibility)
-        except Exception:
-            # don't fail the whole request if propagation has an issue; log and continue
-            logger.exception(f"Error propagating visibility to children of comment {comment_id}")
+        # the comment and all its descendant replies, in one recursive UPDATE
+        comment_service.update_thread_visibility(comment_id, new_visibility)
     except Exception as exc:
         logger.exception(f"Error toggling comment visibility: {exc}")
         return jsonify({"error": str(exc)}), 500
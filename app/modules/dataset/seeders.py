@@ -8,6 +8,7 @@ from app.modules.auth.models import User
 from app.modules.dataset.models import Author, DataSet, DSMetaData, DSMetrics, PublicationType
 from app.modules.featuremodel.models import FeatureModel, FMMetaData
 from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.storage import dataset_dir, hubfile_storage_path
 from core.seeders.BaseSeeder import BaseSeeder
 
 
@@ -96,12 +97,7 @@ class DataSetSeeder(BaseSeeder):
 
             # Copy file and create Hubfile entry
             user_id = seeded_dataset.user_id
-            dest_folder = os.path.join(
-                working_dir,
-                "uploads",
-                f"user_{user_id}",
-                f"dataset_{seeded_dataset.id}",
-            )
+            dest_folder = dataset_dir(user_id, seeded_dataset.id)
             os.makedirs(dest_folder, exist_ok=True)
             src_path = os.path.join(src_folder, dataset_file)
             dest_path = os.path.join(dest_folder, dataset_file)
@@ -112,5 +108,6 @@ class DataSetSeeder(BaseSeeder):
                 checksum=f"checksum{idx + 1}",
                 size=os.path.getsize(dest_path),
                 feature_model_id=feature_model.id,
+                storage_path=hubfile_storage_path(user_id, seeded_dataset.id, dataset_file),
             )
             self.seed([hubfile])
@@ -3,39 +3,72 @@ import hashlib
 import logging
 import os
 import shutil
+import threading
+import time
 import uuid
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import requests
-from flask import request
+import zstandard
+from flask import current_app, request
+from flask_login import current_user
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.modules.auth.services import AuthenticationService
-from app.modules.dataset.models import DataSet, DSMetaData, DSViewRecord
+from app.modules.dataset.events import get_event_pipeline
+from app.modules.dataset.models import DataSet, DSMetaData, DSViewRecord, GitHubBackup, GitHubBackupFile
 from app.modules.dataset.repositories import (
     AuthorRepository,
     DataSetRepository,
     DOIMappingRepository,
+    DSDownloadDailyRepository,
     DSDownloadRecordRepository,
     DSMetaDataRepository,
     DSViewRecordRepository,
+    GitHubBackupRepository,
 )
+from app.modules.dataset.uploads import CHUNK_SIZE, cached_upload
 from app.modules.featuremodel.repositories import FeatureModelRepository, FMMetaDataRepository
+from app.modules.hubfile import blobs
+from app.modules.hubfile.compression import (
+    compress_file,
+    content_name,
+    content_size,
+    is_compressed,
+    open_stored,
+    stored_name,
+)
 from app.modules.hubfile.repositories import (
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from app.modules.hubfile.storage import dataset_dir, hubfile_storage_path
 from core.services.BaseService import BaseService
 
 logger = logging.getLogger(__name__)
 
 
 def calculate_checksum_and_size(file_path):
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as file:
-        content = file.read()
-        hash_md5 = hashlib.md5(content).hexdigest()
-        return hash_md5, file_size
+    # Of the content: files compressed at rest are decompressed while they are hashed
+    file_size = 0
+    hash_md5 = hashlib.md5()
+    with open_stored(file_path) as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            hash_md5.update(chunk)
+            file_size += len(chunk)
+    return hash_md5.hexdigest(), file_size
+
+
+def uploaded_checksum_and_size(folder, filename):
+    """Checksum and size recorded at upload time, falling back to reading the file."""
+    info = cached_upload(folder, filename)
+    if info is not None:
+        return info["checksum"], info["size"]
+    return calculate_checksum_and_size(os.path.join(folder, filename))
 
 
 class DataSetService(BaseService):
@@ -46,6 +79,7 @@ class DataSetService(BaseService):
         self.dsmetadata_repository = DSMetaDataRepository()
         self.fmmetadata_repository = FMMetaDataRepository()
         self.dsdownloadrecord_repository = DSDownloadRecordRepository()
+        self.dsdownloaddaily_repository = DSDownloadDailyRepository()
         self.hubfiledownloadrecord_repository = HubfileDownloadRecordRepository()
         self.hubfilerepository = HubfileRepository()
         self.dsviewrecord_repostory = DSViewRecordRepository()
@@ -55,21 +89,24 @@ class DataSetService(BaseService):
         current_user = AuthenticationService().get_authenticated_user()
         source_dir = current_user.temp_folder()
 
-        working_dir = os.getenv("WORKING_DIR", "")
-        dest_dir = os.path.join(
-            working_dir,
-            "uploads",
-            f"user_{
-                current_user.id}",
-            f"dataset_{
-                dataset.id}",
-        )
+        dest_dir = dataset_dir(current_user.id, dataset.id)
 
         os.makedirs(dest_dir, exist_ok=True)
 
+        compression = current_app.config.get("FILE_STORAGE_COMPRESSION", "none")
         for feature_model in dataset.feature_models:
             uvl_filename = feature_model.fm_meta_data.uvl_filename
-            shutil.move(os.path.join(source_dir, uvl_filename), dest_dir)
+            source = os.path.join(source_dir, uvl_filename)
+            dest = os.path.join(dest_dir, stored_name(uvl_filename, compression))
+            if compression == "zstd":
+                compress_file(source, dest, level=current_app.config.get("FILE_STORAGE_ZSTD_LEVEL", 9))
+                os.remove(source)
+            else:
+                shutil.move(source, dest)
+            # Content already stored by another upload is kept once: the file becomes a link of its blob
+            for hubfile in feature_model.files:
+                blobs.store(hubfile, dest)
+        self.repository.session.commit()
 
     def get_synchronized(self, current_user_id: int) -> DataSet:
         return self.repository.get_synchronized(current_user_id)
@@ -100,13 +137,7 @@ class DataSetService(BaseService):
 
     def total_dataset_views(self) -> int:
         return self.dsviewrecord_repostory.total_dataset_views()
-    
-    @staticmethod
-    def get_total_comments(dataset_id: int) -> int:
-        """Devuelve el total de comentarios de un dataset"""
-        from app.modules.comment.models import Comment
-        return Comment.query.filter_by(dataset_id=dataset_id).count()
-    
+
     def trending_datasets_last_week(self, limit: int = 3):
         """
         WI101: Retorna los datasets más descargados en la semana anterior.
@@ -152,34 +183,9 @@ class DataSetService(BaseService):
         last_week_start = start_of_week - timedelta(days=7)
         last_week_end = start_of_week
 
-        # Obtener los dataset_id más descargados en el período
-        top = self.dsdownloadrecord_repository.top_downloaded_in_period(last_week_start, limit, until=last_week_end)
-        results = []
-        for item in top:
-            # item is (dataset_id, count)
-            dataset_id, count = item
-            dataset = self.repository.get_by_id(dataset_id)
-            if not dataset:
-                continue
-            # pick the first author if available
-            main_author = None
-            try:
-                if dataset.ds_meta_data.authors and len(dataset.ds_meta_data.authors) > 0:
-                    main_author = dataset.ds_meta_data.authors[0].name
-            except Exception:
-                main_author = None
-
-            results.append(
-                {
-                    "id": dataset.id,
-                    "title": dataset.ds_meta_data.title,
-                    "main_author": main_author,
-                    "downloads": int(count),
-                    "url": dataset.get_uvlhub_doi(),
-                }
-            )
-
-        return results
+        # Obtener los dataset_id más descargados en el período (desde los agregados diarios)
+        top = self.dsdownloaddaily_repository.top_downloaded_in_period(last_week_start, limit, until=last_week_end)
+        return self._trending_items(top)
 
     def trending_datasets_this_week(self, limit: int = 3):
         """
@@ -214,30 +220,28 @@ class DataSetService(BaseService):
         # subtract number of days since monday
         start_of_week = start_of_week - timedelta(days=now.weekday())
 
-        top = self.dsdownloadrecord_repository.top_downloaded_in_period(start_of_week, limit)
+        top = self.dsdownloaddaily_repository.top_downloaded_in_period(start_of_week, limit)
+        return self._trending_items(top)
+
+    def _trending_items(self, top) -> list:
+        """Build the trending dicts for (dataset_id, downloads) pairs, loading all datasets in one query."""
+        datasets = {dataset.id: dataset for dataset in self.repository.get_many([dataset_id for dataset_id, _ in top])}
         results = []
-        for item in top:
-            dataset_id, count = item
-            dataset = self.repository.get_by_id(dataset_id)
+        for dataset_id, count in top:
+            dataset = datasets.get(dataset_id)
             if not dataset:
                 continue
-            main_author = None
-            try:
-                if dataset.ds_meta_data.authors and len(dataset.ds_meta_data.authors) > 0:
-                    main_author = dataset.ds_meta_data.authors[0].name
-            except Exception:
-                main_author = None
-
+            # pick the first author if available
+            authors = dataset.ds_meta_data.authors
             results.append(
                 {
                     "id": dataset.id,
                     "title": dataset.ds_meta_data.title,
-                    "main_author": main_author,
+                    "main_author": authors[0].name if authors else None,
                     "downloads": int(count),
                     "url": dataset.get_uvlhub_doi(),
                 }
             )
-
         return results
 
     def create_from_form(self, form, current_user) -> DataSet:
@@ -269,11 +273,19 @@ class DataSetService(BaseService):
                 )
 
                 # associated files in feature model
-                file_path = os.path.join(current_user.temp_folder(), uvl_filename)
-                checksum, size = calculate_checksum_and_size(file_path)
+                checksum, size = uploaded_checksum_and_size(current_user.temp_folder(), uvl_filename)
 
                 file = self.hubfilerepository.create(
-                    commit=False, name=uvl_filename, checksum=checksum, size=size, feature_model_id=fm.id
+                    commit=False,
+                    name=uvl_filename,
+                    checksum=checksum,
+                    size=size,
+                    feature_model_id=fm.id,
+                    storage_path=hubfile_storage_path(
+                        current_user.id,
+                        dataset.id,
+                        stored_name(uvl_filename, current_app.config.get("FILE_STORAGE_COMPRESSION", "none")),
+                    ),
                 )
                 fm.files.append(file)
             self.repository.session.commit()
@@ -328,10 +340,12 @@ class DSViewRecordService(BaseService):
         if not user_cookie:
             user_cookie = str(uuid.uuid4())
 
-        existing_record = self.the_record_exists(dataset=dataset, user_cookie=user_cookie)
-
-        if not existing_record:
-            self.create_new_record(dataset=dataset, user_cookie=user_cookie)
+        # Duplicate (user, dataset, cookie) views are dropped when the batch is written
+        get_event_pipeline().record_dataset_view(
+            dataset_id=dataset.id,
+            user_id=current_user.id if current_user.is_authenticated else None,
+            cookie=user_cookie,
+        )
 
         return user_cookie
 
@@ -377,6 +391,97 @@ def repo_name_formatting(name: str) -> str:
     return formated_name or "dataset"
 
 
+def github_api_url() -> str:
+    # GITHUB_API_URL permite apuntar a GitHub Enterprise o a un servidor local en los tests
+    return os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+
+
+def dataset_backup_files(dataset: DataSet, prefix: str = "") -> List[Tuple[str, str]]:
+    # Pares (ruta en el repositorio, ruta local) de los ficheros de la carpeta del dataset, ordenados
+    source_dir = dataset_dir(dataset.user_id, dataset.id)
+    if not os.path.isdir(source_dir):
+        raise RuntimeError(f"Dataset folder not found: {source_dir}")
+
+    files = []
+    for root, _, filenames in os.walk(source_dir):
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(full_path, source_dir).replace("\\", "/")
+            files.append((f"{prefix}/{rel_path}" if prefix else rel_path, full_path))
+    return sorted(files)
+
+
+class GitHubRateLimit:
+    # Cuota de la API de GitHub de un token, según las cabeceras X-RateLimit-* y Retry-After de sus respuestas.
+    # Es compartida por todos los hilos y trabajos que usan el mismo token: cuando se agota (o GitHub pide
+    # esperar por un límite secundario), las peticiones esperan hasta el reinicio en lugar de fallar.
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        now = time.time()
+        with self._lock:
+            until = self.blocked_until
+            if self.remaining is not None and self.remaining <= 0:
+                until = max(until, self.reset_at)
+        return max(0.0, until - now)
+
+    def update(self, resp) -> Optional[float]:
+        """Record the quota of a response; returns the seconds to wait if it was rejected by a rate limit."""
+        headers = getattr(resp, "headers", None) or {}
+        now = time.time()
+        with self._lock:
+            if headers.get("X-RateLimit-Remaining") is not None:
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+            if headers.get("X-RateLimit-Reset") is not None:
+                self.reset_at = float(headers["X-RateLimit-Reset"])
+            if resp.status_code not in (403, 429):
+                return None
+            if headers.get("Retry-After") is not None:
+                wait = float(headers["Retry-After"])
+            elif self.remaining == 0:
+                wait = max(0.0, self.reset_at - now)
+            else:
+                # 403 de permisos, no de cuota
+                return None
+            self.blocked_until = max(self.blocked_until, now + wait)
+            return wait
+
+
+_rate_limits: Dict[str, GitHubRateLimit] = {}
+_rate_limits_lock = threading.Lock()
+
+
+def github_rate_limit(token: str) -> GitHubRateLimit:
+    key = hashlib.sha256(token.encode()).hexdigest()
+    with _rate_limits_lock:
+        return _rate_limits.setdefault(key, GitHubRateLimit())
+
+
+def github_send(token: str, send: Callable[[], requests.Response], attempts: int = 3) -> requests.Response:
+    """Run send() within the rate limit of token, waiting (up to GITHUB_RATE_LIMIT_MAX_WAIT seconds) before
+    requests once the quota is spent and retrying requests rejected by a primary or secondary rate limit."""
+    limit = github_rate_limit(token)
+    max_wait = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "900"))
+    for attempt in range(attempts):
+        wait = limit.delay()
+        if wait > max_wait:
+            raise GitHubAPIError(
+                status=429, message=f"GitHub rate limit exceeded; retry in {int(wait)} s.", reason="rate_limited"
+            )
+        if wait:
+            logger.info(f"Waiting {wait:.1f} s for the GitHub rate limit")
+            time.sleep(wait)
+        resp = send()
+        if limit.update(resp) is None or attempt == attempts - 1:
+            return resp
+    return resp
+
+
 class GitHubRepoService:
 
     # Servicio para crear repositorios en GitHub usando la API REST y un token OAuth de usuario.
@@ -402,9 +507,9 @@ class GitHubRepoService:
             "description": description or "Backup created by PC-Hub",
         }
         # Crear el repositorio en la cuenta del usuario autenticado
-        url = "https://api.github.com/user/repos"
+        url = f"{github_api_url()}/user/repos"
 
-        resp = requests.post(url, headers=self.headers, json=payload, timeout=30)
+        resp = github_send(self.token, lambda: requests.post(url, headers=self.headers, json=payload, timeout=30))
         if resp.status_code not in (201,):
             # Manejar errores de la API de GitHub
             try:
@@ -440,6 +545,16 @@ class GitHubRepoService:
             raise GitHubAPIError(status=resp.status_code, message=message, reason=reason, docs_url=docs, raw=data)
         return resp.json()
 
+    def get_repo(self, full_name: str) -> Optional[dict]:
+        # Datos del repositorio, o None si ya no existe (o el token no tiene acceso)
+        url = f"{github_api_url()}/repos/{full_name}"
+        resp = github_send(self.token, lambda: requests.get(url, headers=self.headers, timeout=30))
+        if resp.status_code in (403, 404):
+            return None
+        if resp.status_code != 200:
+            raise GitHubAPIError(status=resp.status_code, message=f"GitHub error ({resp.status_code}).")
+        return resp.json()
+
 
 class GitHubAPIError(Exception):
 
@@ -461,8 +576,10 @@ class GitHubAPIError(Exception):
 
 class GitHubContentService:
     # Servicio para subir archivos a un repositorio GitHub usando la API REST y un token OAuth de usuario.
+    # La copia de un dataset usa la Git Data API: blobs en paralelo, un árbol, un commit y una
+    # actualización de la rama, en lugar de un GET y un PUT (y un commit) por fichero.
 
-    def __init__(self, token: str, repo_full_name: str, branch: str = "main"):
+    def __init__(self, token: str, repo_full_name: str, branch: str = "main", workers: Optional[int] = None):
         if not token:
             raise RuntimeError("GitHub OAuth token is required.")
         if not repo_full_name:
@@ -470,17 +587,46 @@ class GitHubContentService:
         self.token = token
         self.repo = repo_full_name
         self.branch = branch
-        self.base_url = f"https://api.github.com/repos/{self.repo}/contents"
+        self.repo_url = f"{github_api_url()}/repos/{self.repo}"
+        self.base_url = f"{self.repo_url}/contents"
         self.headers = {
             "Authorization": f"Bearer {self.token}",
             "Accept": "application/vnd.github+json",
             "X-GitHub-Api-Version": "2022-11-28",
         }
+        self.workers = workers or int(os.getenv("GITHUB_BACKUP_WORKERS", "8"))
+        self._session: Optional[requests.Session] = None
+
+    @property
+    def session(self) -> requests.Session:
+        # Sesión con conexiones persistentes compartida por los hilos que suben blobs; reintenta los
+        # errores de conexión y las respuestas 502/503/504 con backoff exponencial
+        if self._session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=None,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=self.workers)
+            self._session = requests.Session()
+            self._session.headers.update(self.headers)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def _git(self, method: str, path: str, expected: Tuple[int, ...] = (200, 201), **kwargs) -> dict:
+        kwargs.setdefault("timeout", 60)
+        resp = github_send(self.token, lambda: self.session.request(method, f"{self.repo_url}/{path}", **kwargs))
+        if resp.status_code not in expected:
+            raise RuntimeError(f"GitHub API error {resp.status_code} on {method} {path}: {resp.text}")
+        return resp.json() if resp.content else {}
 
     def _get_file_sha(self, path: str) -> Optional[str]:
         url = f"{self.base_url}/{path}"
         params = {"ref": self.branch}
-        resp = requests.get(url, headers=self.headers, params=params, timeout=30)
+        resp = github_send(self.token, lambda: requests.get(url, headers=self.headers, params=params, timeout=30))
         if resp.status_code == 200:
             return resp.json().get("sha")
         return None
@@ -496,37 +642,199 @@ class GitHubContentService:
             body["sha"] = sha
 
         url = f"{self.base_url}/{path}"
-        resp = requests.put(url, headers=self.headers, json=body, timeout=60)
+        resp = github_send(self.token, lambda: requests.put(url, headers=self.headers, json=body, timeout=60))
         if resp.status_code not in (200, 201):
             raise RuntimeError(f"GitHub upload error {resp.status_code}: {resp.text}")
         return "updated" if sha else "uploaded"
 
-    def upload_dataset(self, dataset: DataSet, prefix: str = "") -> dict:
-        working_dir = os.getenv("WORKING_DIR", "")
-        source_dir = os.path.join(
-            working_dir,
-            "uploads",
-            f"user_{dataset.user_id}",
-            f"dataset_{dataset.id}",
+    def _dataset_files(self, dataset: DataSet, prefix: str = "") -> List[Tuple[str, str]]:
+        return dataset_backup_files(dataset, prefix)
+
+    def _head(self) -> Optional[Tuple[str, str]]:
+        # (sha del último commit de la rama, sha de su árbol), o None si el repositorio está vacío
+        resp = github_send(self.token, lambda: self.session.get(f"{self.repo_url}/commits/{self.branch}", timeout=30))
+        if resp.status_code in (404, 409):
+            return None
+        if resp.status_code != 200:
+            raise RuntimeError(f"GitHub API error {resp.status_code} reading {self.branch}: {resp.text}")
+        data = resp.json()
+        return data["sha"], data["commit"]["tree"]["sha"]
+
+    def _create_blob(self, full_path: str) -> str:
+        with open(full_path, "rb") as fh:
+            content = base64.b64encode(fh.read()).decode("ascii")
+        return self._git("POST", "git/blobs", json={"content": content, "encoding": "base64"})["sha"]
+
+    def _tree(self, tree_sha: str) -> Dict[str, str]:
+        # {ruta: sha del blob} de todo el árbol, en una sola petición
+        data = self._git("GET", f"git/trees/{tree_sha}", params={"recursive": "1"})
+        if data.get("truncated"):
+            raise RuntimeError(f"Tree {tree_sha} is too large to be listed in one request")
+        return {entry["path"]: entry["sha"] for entry in data.get("tree", []) if entry.get("type") == "blob"}
+
+    def commit_files(
+        self,
+        files: List[Tuple[str, str]],
+        message: str,
+        deleted: Iterable[str] = (),
+        head: Optional[Tuple[str, str]] = None,
+        on_blob: Optional[Callable[[int], None]] = None,
+    ) -> Optional[str]:
+        """Commit (repo_path, local_path) pairs and deletions on top of the branch as a single commit.
+
+        Blobs are created concurrently, then one tree (based on the current one, so other files are
+        kept), one commit and one ref update: N + 4 requests instead of two requests and a commit per
+        file. head is the (commit, tree) of the branch if the caller already read it; on_blob is called with
+        the number of files sent so far. Returns the new branch head, or None when there was nothing to commit.
+        """
+        deleted = list(deleted)
+        if not files and not deleted:
+            return None
+
+        sent = 0
+        head = head or self._head()
+        if head is None:
+            if not files:
+                return None
+            # La Git Data API no funciona sobre un repositorio vacío: el primer fichero crea el commit inicial
+            repo_path, full_path = files[0]
+            with open(full_path, "rb") as fh:
+                self._put_file(repo_path, fh.read(), message=message)
+            sent = 1
+            if on_blob:
+                on_blob(sent)
+            head = self._head()
+            if head is None:
+                raise RuntimeError(f"Branch {self.branch} not found after the initial commit")
+            files = files[1:]
+            if not files and not deleted:
+                return head[0]
+        parent_sha, base_tree = head
+
+        blob_shas = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="github-blob") as executor:
+            for sha in executor.map(self._create_blob, [full_path for _, full_path in files]):
+                blob_shas.append(sha)
+                if on_blob:
+                    on_blob(sent + len(blob_shas))
+
+        entries = [
+            {"path": repo_path, "mode": "100644", "type": "blob", "sha": sha}
+            for (repo_path, _), sha in zip(files, blob_shas)
+        ]
+        entries += [{"path": path, "mode": "100644", "type": "blob", "sha": None} for path in deleted]
+        tree = self._git("POST", "git/trees", json={"base_tree": base_tree, "tree": entries})
+        commit = self._git(
+            "POST", "git/commits", json={"message": message, "tree": tree["sha"], "parents": [parent_sha]}
         )
-        if not os.path.isdir(source_dir):
-            raise RuntimeError(f"Dataset folder not found: {source_dir}")
-
-        uploaded_count = 0
-
-        for root, _, files in os.walk(source_dir):
-            for filename in files:
-                full_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(full_path, source_dir).replace("\\", "/")
-                repo_path = f"{prefix}/{rel_path}" if prefix else rel_path
-                with open(full_path, "rb") as fh:
-                    content = fh.read()
-                action = self._put_file(
-                    repo_path,
-                    content,
-                    message=f"Backup dataset {dataset.id}: add {rel_path}",
-                )
-                if action == "uploaded":
-                    uploaded_count += 1
+        self._git("PATCH", f"git/refs/heads/{self.branch}", json={"sha": commit["sha"], "force": False})
+        return commit["sha"]
+
+    @staticmethod
+    def _hash_file(full_path: str, size: int) -> Tuple[str, str]:
+        # (MD5 como Hubfile.checksum, SHA del blob de git) leyendo el fichero una sola vez. En los ficheros
+        # comprimidos el MD5 es el del contenido descomprimido, como Hubfile.checksum
+        md5 = hashlib.md5()
+        git_sha = hashlib.sha1(b"blob %d\0" % size)
+        decompressor = None
+        if is_compressed(full_path):
+            decompressor = zstandard.ZstdDecompressor().decompressobj(read_across_frames=True)
+        with open(full_path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+                md5.update(decompressor.decompress(chunk) if decompressor else chunk)
+                git_sha.update(chunk)
+        return md5.hexdigest(), git_sha.hexdigest()
+
+    def _plan(self, dataset: DataSet, files: List[Tuple[str, str]], backup, head) -> dict:
+        """Split local files into changed and unchanged against the manifest and list remote deletions.
+
+        With a trusted manifest (the branch is still at the commit of the last backup) a file whose size
+        and mtime, or Hubfile checksum, match its entry is not even read. Otherwise the manifest is
+        rebuilt from the remote tree, comparing git blob SHAs.
+        """
+        entries = {entry.path: entry for entry in backup.files} if backup else {}
+        trusted = bool(backup and head and backup.branch == self.branch and backup.commit_sha == head[0])
+        remote = None if trusted or head is None else self._tree(head[1])
+        hubfiles = GitHubBackupRepository().hubfile_checksums(dataset.id)
+
+        changed, unchanged = [], {}
+        for repo_path, full_path in files:
+            stat = os.stat(full_path)
+            info = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            entry = entries.get(repo_path) if trusted else None
+            hubfile = hubfiles.get(content_name(full_path))
+
+            if entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                unchanged[repo_path] = dict(info, checksum=entry.checksum, blob_sha=entry.blob_sha)
+                continue
+            if entry and hubfile and hubfile == (entry.checksum, content_size(full_path)):
+                unchanged[repo_path] = dict(info, checksum=entry.checksum, blob_sha=entry.blob_sha)
+                continue
+
+            checksum, blob_sha = self._hash_file(full_path, stat.st_size)
+            info.update(checksum=checksum, blob_sha=blob_sha)
+            remote_sha = entry.blob_sha if trusted and entry else (remote or {}).get(repo_path)
+            if remote_sha == blob_sha:
+                unchanged[repo_path] = info
+            else:
+                changed.append((repo_path, full_path, info))
+
+        local = {repo_path for repo_path, _ in files}
+        # Solo se borran en el repositorio los ficheros que subió una copia anterior
+        deleted = [path for path in entries if path not in local and (trusted or path in (remote or {}))]
+        return {"changed": changed, "unchanged": unchanged, "deleted": sorted(deleted)}
+
+    def upload_dataset(
+        self, dataset: DataSet, prefix: str = "", on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> dict:
+        """Push the dataset folder, sending only files that are new, changed or deleted since the last backup.
+
+        Re-running the backup of an unchanged dataset costs one request (reading the branch head).
+        on_progress is called with (files sent, files to send) once the changes are known and after each file.
+        """
+        files = self._dataset_files(dataset, prefix)
+        backups = GitHubBackupRepository()
+        backup = backups.get_for(dataset.id, self.repo)
+        head = self._head()
+        plan = self._plan(dataset, files, backup, head)
+
+        changed = [(repo_path, full_path) for repo_path, full_path, _ in plan["changed"]]
+        if on_progress:
+            on_progress(0, len(changed))
+        commit_sha = self.commit_files(
+            changed,
+            message=f"Backup dataset {dataset.id}: {len(changed)} changed, {len(plan['deleted'])} deleted",
+            deleted=plan["deleted"],
+            head=head,
+            on_blob=(lambda sent: on_progress(sent, len(changed))) if on_progress else None,
+        )
+        commit_sha = commit_sha or (head[0] if head else None)
 
-        return {"uploaded": uploaded_count}
+        now = datetime.now(timezone.utc)
+        if backup is None:
+            backup = GitHubBackup(dataset_id=dataset.id, repository=self.repo)
+            backups.session.add(backup)
+        backup.branch = self.branch
+        backup.commit_sha = commit_sha
+        backup.backed_up_at = now
+
+        current = {path: dict(info, backed_up_at=None) for path, info in plan["unchanged"].items()}
+        current.update({repo_path: dict(info, backed_up_at=now) for repo_path, _, info in plan["changed"]})
+        for entry in list(backup.files):
+            info = current.pop(entry.path, None)
+            if info is None:
+                backup.files.remove(entry)
+                continue
+            for key, value in info.items():
+                if value is not None:
+                    setattr(entry, key, value)
+        for path, info in current.items():
+            backup.files.append(GitHubBackupFile(path=path, **dict(info, backed_up_at=info["backed_up_at"] or now)))
+        backups.session.commit()
+
+        return {
+            "uploaded": len(changed),
+            "deleted": len(plan["deleted"]),
+            "unchanged": len(plan["unchanged"]),
+            "commit": commit_sha,
+        }
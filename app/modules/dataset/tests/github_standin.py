@@ -0,0 +1,195 @@
+"""In-memory stand-in for the parts of the GitHub REST API used by the backups, served over real HTTP."""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+
+def git_blob_sha(content: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def _object_sha(kind: str, payload) -> str:
+    return hashlib.sha1(f"{kind}:{json.dumps(payload, sort_keys=True)}".encode()).hexdigest()
+
+
+class GitHubStandIn:
+    """Repositories are dicts of branch -> commit sha; trees are flat {path: blob sha} mappings."""
+
+    def __init__(self):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.repos = {}
+        self.calls = Counter()
+        self.fail = Counter()
+        # Requests answered with a rate-limit 403 before being served, and seconds every request takes
+        self.rate_limited = 0
+        self.latency = 0.0
+        self.lock = threading.Lock()
+        self.app = self._create_app()
+        self.server = None
+
+    # ---------------------- helpers used by the tests ----------------------
+    def create_repo(self, full_name, files=None, branch="main"):
+        self.repos[full_name] = {}
+        if files:
+            self._commit(full_name, branch, {path: self._blob(data) for path, data in files.items()}, "initial")
+
+    def files(self, full_name, branch="main"):
+        commit = self.commits[self.repos[full_name][branch]]
+        return {path: self.blobs[sha] for path, sha in self.trees[commit["tree"]].items()}
+
+    def history(self, full_name, branch="main"):
+        sha, shas = self.repos[full_name].get(branch), []
+        while sha:
+            shas.append(sha)
+            parents = self.commits[sha]["parents"]
+            sha = parents[0] if parents else None
+        return shas
+
+    def start(self):
+        self.server = make_server("127.0.0.1", 0, self.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        self.server.shutdown()
+
+    # ---------------------- object store ----------------------
+    def _blob(self, data: bytes) -> str:
+        sha = git_blob_sha(data)
+        self.blobs[sha] = data
+        return sha
+
+    def _tree(self, entries: dict) -> str:
+        sha = _object_sha("tree", entries)
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def _commit(self, full_name, branch, entries, message):
+        parent = self.repos[full_name].get(branch)
+        tree = self._tree(entries)
+        commit = {"tree": tree, "parents": [parent] if parent else [], "message": message}
+        sha = _object_sha("commit", commit)
+        self.commits[sha] = commit
+        self.repos[full_name][branch] = sha
+        return sha
+
+    def _create_app(self):
+        app = Flask(__name__)
+        standin = self
+
+        @app.before_request
+        def count():
+            kind = request.url_rule.endpoint if request.url_rule else "unknown"
+            with standin.lock:
+                standin.calls[kind] += 1
+                if standin.fail[kind] > 0:
+                    standin.fail[kind] -= 1
+                    return jsonify({"message": "Server Error"}), 500
+                if standin.rate_limited > 0:
+                    standin.rate_limited -= 1
+                    reset = int(time.time()) + 2
+                    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)}
+                    return jsonify({"message": "API rate limit exceeded"}), 403, headers
+            if standin.latency:
+                time.sleep(standin.latency)
+
+        @app.post("/user/repos")
+        def create_user_repo():
+            name = request.get_json()["name"]
+            full_name = f"owner/{name}"
+            standin.create_repo(full_name)
+            return (
+                jsonify(
+                    {"full_name": full_name, "html_url": f"https://github.test/{full_name}", "default_branch": "main"}
+                ),
+                201,
+            )
+
+        @app.get("/repos/<owner>/<repo>")
+        def get_repo(owner, repo):
+            full_name = f"{owner}/{repo}"
+            if full_name not in standin.repos:
+                return jsonify({"message": "Not Found"}), 404
+            return jsonify(
+                {"full_name": full_name, "html_url": f"https://github.test/{full_name}", "default_branch": "main"}
+            )
+
+        @app.get("/repos/<owner>/<repo>/commits/<branch>")
+        def get_commit(owner, repo, branch):
+            sha = standin.repos[f"{owner}/{repo}"].get(branch)
+            if sha is None:
+                return jsonify({"message": "Git Repository is empty."}), 409
+            return jsonify({"sha": sha, "commit": {"tree": {"sha": standin.commits[sha]["tree"]}}})
+
+        @app.get("/repos/<owner>/<repo>/contents/<path:path>")
+        def get_content(owner, repo, path):
+            sha = standin.repos[f"{owner}/{repo}"].get(request.args.get("ref", "main"))
+            blob = standin.trees[standin.commits[sha]["tree"]].get(path) if sha else None
+            if blob is None:
+                return jsonify({"message": "Not Found"}), 404
+            return jsonify({"sha": blob, "path": path})
+
+        @app.put("/repos/<owner>/<repo>/contents/<path:path>")
+        def put_content(owner, repo, path):
+            body = request.get_json()
+            full_name, branch = f"{owner}/{repo}", body.get("branch", "main")
+            head = standin.repos[full_name].get(branch)
+            entries = dict(standin.trees[standin.commits[head]["tree"]]) if head else {}
+            created = path not in entries
+            entries[path] = standin._blob(base64.b64decode(body["content"]))
+            standin._commit(full_name, branch, entries, body["message"])
+            return jsonify({"content": {"path": path, "sha": entries[path]}}), 201 if created else 200
+
+        @app.post("/repos/<owner>/<repo>/git/blobs")
+        def create_blob(owner, repo):
+            if not standin.repos[f"{owner}/{repo}"]:
+                return jsonify({"message": "Git Repository is empty."}), 409
+            body = request.get_json()
+            return jsonify({"sha": standin._blob(base64.b64decode(body["content"]))}), 201
+
+        @app.get("/repos/<owner>/<repo>/git/trees/<sha>")
+        def get_tree(owner, repo, sha):
+            entries = standin.trees.get(sha)
+            if entries is None:
+                return jsonify({"message": "Not Found"}), 404
+            tree = [{"path": path, "mode": "100644", "type": "blob", "sha": blob} for path, blob in entries.items()]
+            return jsonify({"sha": sha, "tree": tree, "truncated": False})
+
+        @app.post("/repos/<owner>/<repo>/git/trees")
+        def create_tree(owner, repo):
+            body = request.get_json()
+            entries = dict(standin.trees[body["base_tree"]]) if body.get("base_tree") else {}
+            for entry in body["tree"]:
+                if entry.get("sha") is None:
+                    entries.pop(entry["path"], None)
+                else:
+                    entries[entry["path"]] = entry["sha"]
+            return jsonify({"sha": standin._tree(entries)}), 201
+
+        @app.post("/repos/<owner>/<repo>/git/commits")
+        def create_commit(owner, repo):
+            body = request.get_json()
+            commit = {"tree": body["tree"], "parents": body["parents"], "message": body["message"]}
+            sha = _object_sha("commit", commit)
+            standin.commits[sha] = commit
+            return jsonify({"sha": sha}), 201
+
+        @app.patch("/repos/<owner>/<repo>/git/refs/heads/<branch>")
+        def update_ref(owner, repo, branch):
+            body = request.get_json()
+            refs = standin.repos[f"{owner}/{repo}"]
+            if not body.get("force") and refs.get(branch) not in standin.commits[body["sha"]]["parents"]:
+                return jsonify({"message": "Update is not a fast forward"}), 422
+            refs[branch] = body["sha"]
+            return jsonify({"ref": f"refs/heads/{branch}", "object": {"sha": body["sha"]}})
+
+        return app
@@ -0,0 +1,258 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.dataset.models import DataSet, DSMetaData, GitHubBackup, PublicationType
+from app.modules.dataset.repositories import GitHubBackupRepository
+from app.modules.dataset.services import GitHubContentService, GitHubRepoService
+from app.modules.dataset.tests.github_standin import GitHubStandIn, git_blob_sha
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import Hubfile
+
+
+@pytest.fixture()
+def github(test_client, monkeypatch, tmp_path):
+    standin = GitHubStandIn()
+    monkeypatch.setenv("GITHUB_API_URL", standin.start())
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    yield standin
+    standin.stop()
+
+
+def create_dataset(tmp_path, files, title="Backup"):
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title=title, description="backup", publication_type=PublicationType.OTHER, tags="")
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+    write_files(tmp_path, dataset, files)
+    return dataset
+
+
+def dataset_path(tmp_path, dataset, name=""):
+    return tmp_path / "uploads" / f"user_{dataset.user_id}" / f"dataset_{dataset.id}" / name
+
+
+def write_files(tmp_path, dataset, files):
+    for name, content in files.items():
+        path = dataset_path(tmp_path, dataset, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+
+def test_backup_of_a_new_repository_is_one_commit_after_the_initial_one(github, tmp_path):
+    files = {f"catalog_{i:03}.json": b'[{"name": "part %d"}]' % i for i in range(150)}
+    files["nested/extra.bin"] = bytes(range(256))
+    dataset = create_dataset(tmp_path, files)
+
+    repo = GitHubRepoService(token="tok").create_repo(name="pc-backup")
+    result = GitHubContentService(token="tok", repo_full_name=repo["full_name"]).upload_dataset(dataset)
+
+    assert result["uploaded"] == 151
+    assert github.files("owner/pc-backup") == files
+    history = github.history("owner/pc-backup")
+    # The Git Data API needs a first commit, made through the contents API with one file
+    assert len(history) == 2 and result["commit"] == history[0]
+    assert github.calls["put_content"] == 1
+    assert github.calls["create_blob"] == 150
+    assert github.calls["create_tree"] == github.calls["create_commit"] == github.calls["update_ref"] == 1
+
+    backup = GitHubBackupRepository().get_for(dataset.id, "owner/pc-backup")
+    assert backup.commit_sha == history[0]
+    manifest = {entry.path: entry for entry in backup.files}
+    assert len(manifest) == 151
+    assert manifest["nested/extra.bin"].blob_sha == git_blob_sha(files["nested/extra.bin"])
+    assert manifest["catalog_000.json"].checksum == hashlib.md5(files["catalog_000.json"]).hexdigest()
+
+
+def test_backup_keeps_existing_files_and_commits_once(github, tmp_path):
+    github.create_repo("owner/existing", files={"README.md": b"# backups", "catalog.json": b"[]"})
+    before = github.history("owner/existing")
+    dataset = create_dataset(tmp_path, {"catalog.json": b"[1]", "more.json": b"[2]"})
+
+    result = GitHubContentService(token="tok", repo_full_name="owner/existing").upload_dataset(dataset)
+
+    assert github.files("owner/existing") == {"README.md": b"# backups", "catalog.json": b"[1]", "more.json": b"[2]"}
+    assert github.history("owner/existing") == [result["commit"]] + before
+    assert github.calls["put_content"] == 0
+    # head, tree listing (no manifest yet), 2 blobs, tree, commit, ref
+    assert sum(github.calls.values()) == 7
+
+
+def test_unchanged_dataset_backs_up_for_one_request(github, tmp_path, monkeypatch):
+    github.create_repo("owner/again", files={"README.md": b"x"})
+    dataset = create_dataset(tmp_path, {f"{i}.json": b"[%d]" % i for i in range(20)})
+    service = GitHubContentService(token="tok", repo_full_name="owner/again")
+    first = service.upload_dataset(dataset)
+    github.calls.clear()
+
+    def no_reads(*args):
+        raise AssertionError("an unchanged file was read")
+
+    monkeypatch.setattr(GitHubContentService, "_hash_file", staticmethod(no_reads))
+    result = service.upload_dataset(dataset)
+
+    assert result == {"uploaded": 0, "deleted": 0, "unchanged": 20, "commit": first["commit"]}
+    assert dict(github.calls) == {"get_commit": 1}
+
+
+def test_only_new_changed_and_deleted_files_are_pushed(github, tmp_path):
+    github.create_repo("owner/delta", files={"README.md": b"kept"})
+    dataset = create_dataset(tmp_path, {"same.json": b"[0]", "edit.json": b"[1]", "gone.json": b"[2]"})
+    service = GitHubContentService(token="tok", repo_full_name="owner/delta")
+    service.upload_dataset(dataset)
+    github.calls.clear()
+
+    write_files(tmp_path, dataset, {"edit.json": b"[1, 1]", "new.json": b"[3]"})
+    dataset_path(tmp_path, dataset, "gone.json").unlink()
+    # Same content rewritten: read again, but not pushed
+    same = dataset_path(tmp_path, dataset, "same.json")
+    same.write_bytes(b"[0]")
+    os.utime(same, ns=(0, 0))
+
+    result = service.upload_dataset(dataset)
+
+    assert (result["uploaded"], result["deleted"], result["unchanged"]) == (2, 1, 1)
+    assert github.calls["create_blob"] == 2 and github.calls["create_commit"] == 1
+    assert github.files("owner/delta") == {
+        "README.md": b"kept",
+        "same.json": b"[0]",
+        "edit.json": b"[1, 1]",
+        "new.json": b"[3]",
+    }
+    manifest = {entry.path: entry for entry in GitHubBackupRepository().get_for(dataset.id, "owner/delta").files}
+    assert sorted(manifest) == ["edit.json", "new.json", "same.json"]
+    assert manifest["same.json"].mtime_ns == 0
+
+
+def test_hubfile_checksum_avoids_reading_touched_files(github, tmp_path, monkeypatch):
+    github.create_repo("owner/hub", files={"README.md": b"x"})
+    content = b'[{"name": "fan"}]'
+    dataset = create_dataset(tmp_path, {"fans.json": content})
+    fm_meta = FMMetaData(
+        uvl_filename="fans.json", title="fans", description="fm", publication_type=PublicationType.OTHER
+    )
+    db.session.add(fm_meta)
+    db.session.flush()
+    feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(feature_model)
+    db.session.flush()
+    db.session.add(
+        Hubfile(
+            name="fans.json",
+            checksum=hashlib.md5(content).hexdigest(),
+            size=len(content),
+            feature_model_id=feature_model.id,
+        )
+    )
+    db.session.commit()
+    service = GitHubContentService(token="tok", repo_full_name="owner/hub")
+    service.upload_dataset(dataset)
+
+    os.utime(dataset_path(tmp_path, dataset, "fans.json"), ns=(10**9, 10**9))
+    monkeypatch.setattr(GitHubContentService, "_hash_file", staticmethod(lambda *args: pytest.fail("file was read")))
+
+    assert service.upload_dataset(dataset)["uploaded"] == 0
+
+
+def test_hubfile_checksum_also_vouches_for_compressed_files(github, tmp_path, monkeypatch):
+    from app.modules.dataset.backups import backup_is_current
+    from app.modules.hubfile.compression import compress_file
+
+    github.create_repo("owner/zst", files={"README.md": b"x"})
+    content = b'[{"name": "cooler"}]'
+    dataset = create_dataset(tmp_path, {"coolers.json": content})
+    plain = dataset_path(tmp_path, dataset, "coolers.json")
+    compress_file(str(plain), str(plain) + ".zst")
+    plain.unlink()
+    fm_meta = FMMetaData(
+        uvl_filename="coolers.json", title="coolers", description="fm", publication_type=PublicationType.OTHER
+    )
+    db.session.add(fm_meta)
+    db.session.flush()
+    feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(feature_model)
+    db.session.flush()
+    db.session.add(
+        Hubfile(
+            name="coolers.json",
+            checksum=hashlib.md5(content).hexdigest(),
+            size=len(content),
+            feature_model_id=feature_model.id,
+        )
+    )
+    db.session.commit()
+    service = GitHubContentService(token="tok", repo_full_name="owner/zst")
+    service.upload_dataset(dataset)
+    backup = GitHubBackupRepository().get_for(dataset.id, "owner/zst")
+    assert backup.files[0].checksum == hashlib.md5(content).hexdigest()
+
+    os.utime(str(plain) + ".zst", ns=(10**9, 10**9))
+    assert backup_is_current(dataset, backup)
+    monkeypatch.setattr(GitHubContentService, "_hash_file", staticmethod(lambda *args: pytest.fail("file was read")))
+    assert service.upload_dataset(dataset)["uploaded"] == 0
+
+
+def test_manifest_is_rebuilt_when_the_branch_moved(github, tmp_path):
+    github.create_repo("owner/moved", files={"README.md": b"x"})
+    dataset = create_dataset(tmp_path, {"a.json": b"[1]", "b.json": b"[2]"})
+    service = GitHubContentService(token="tok", repo_full_name="owner/moved")
+    service.upload_dataset(dataset)
+
+    # Someone edits a backed-up file directly on GitHub
+    github.app.test_client().put(
+        "/repos/owner/moved/contents/a.json",
+        json={"message": "edit", "content": base64.b64encode(b"[9]").decode(), "branch": "main"},
+    )
+    github.calls.clear()
+
+    result = service.upload_dataset(dataset)
+
+    assert github.calls["get_tree"] == 1
+    assert (result["uploaded"], result["unchanged"]) == (1, 1)
+    assert github.files("owner/moved")["a.json"] == b"[1]"
+    assert GitHubBackupRepository().get_for(dataset.id, "owner/moved").commit_sha == result["commit"]
+
+
+def test_failures_leave_the_branch_and_manifest_alone(github, tmp_path):
+    github.create_repo("owner/flaky", files={"README.md": b"x"})
+    dataset = create_dataset(tmp_path, {"a.json": b"[]"})
+    service = GitHubContentService(token="tok", repo_full_name="owner/flaky")
+
+    github.fail["create_commit"] = 1  # 500 is not retried
+    head = github.history("owner/flaky")[0]
+    with pytest.raises(RuntimeError, match="500"):
+        service.upload_dataset(dataset)
+    db.session.rollback()
+    assert github.history("owner/flaky")[0] == head
+    assert GitHubBackupRepository().get_for(dataset.id, "owner/flaky") is None
+
+    # A prefix places the files under a folder of the repository
+    result = service.upload_dataset(dataset, prefix="backup")
+    assert github.files("owner/flaky") == {"README.md": b"x", "backup/a.json": b"[]"}
+    assert github.history("owner/flaky")[0] == result["commit"]
+
+
+def test_backup_route_reuses_the_repository_of_the_last_backup(github, test_client, tmp_path):
+    dataset = create_dataset(tmp_path, {"catalog.json": b"[1]"}, title="Route Backup")
+    login(test_client, "test@example.com", "test1234")
+    try:
+        with test_client.session_transaction() as sess:
+            sess["github_token"] = "fake-token"
+
+        first = test_client.post(f"/dataset/{dataset.id}/backup/github").get_json()
+        second = test_client.post(f"/dataset/{dataset.id}/backup/github").get_json()
+
+        assert first["repo"] == second["repo"] == "owner/route-backup"
+        assert (first["uploaded"], second["uploaded"]) == (1, 0)
+        assert github.calls["create_user_repo"] == 1
+        assert GitHubBackup.query.filter_by(dataset_id=dataset.id).count() == 1
+    finally:
+        logout(test_client)
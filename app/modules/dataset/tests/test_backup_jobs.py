@@ -0,0 +1,174 @@
+import time
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.dataset import backups
+from app.modules.dataset.backups import BackupQueue, open_token, schedule_changed_backups, seal_token
+from app.modules.dataset.models import GitHubBackupJob
+from app.modules.dataset.repositories import GitHubBackupJobRepository, GitHubBackupRepository
+from app.modules.dataset.services import GitHubAPIError, GitHubContentService, github_rate_limit
+from app.modules.dataset.tests.github_standin import GitHubStandIn
+from app.modules.dataset.tests.test_backup_git_data import create_dataset, dataset_path, write_files
+from app.modules.profile.models import UserProfile
+
+
+@pytest.fixture()
+def github(test_client, monkeypatch, tmp_path):
+    standin = GitHubStandIn()
+    monkeypatch.setenv("GITHUB_API_URL", standin.start())
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    yield standin
+    standin.stop()
+
+
+def second_user():
+    user = User.query.filter_by(email="jobs@example.com").first()
+    if user is None:
+        user = User(email="jobs@example.com", password="test1234")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserProfile(user_id=user.id, name="Jobs", surname="User"))
+        db.session.commit()
+    return user
+
+
+def wait_for(job_ids, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db.session.expire_all()
+        jobs = [GitHubBackupJobRepository().get_by_id(job_id) for job_id in job_ids]
+        if all(job.state in GitHubBackupJob.FINISHED for job in jobs):
+            return jobs
+        time.sleep(0.05)
+    raise AssertionError("backups did not finish")
+
+
+def test_backup_route_queues_a_job_that_can_be_polled(github, test_client, tmp_path):
+    dataset = create_dataset(tmp_path, {"catalog.json": b"[1]", "more.json": b"[2]"}, title="Job Backup")
+    login(test_client, "test@example.com", "test1234")
+    try:
+        with test_client.session_transaction() as sess:
+            sess["github_token"] = "job-token"
+
+        response = test_client.post(f"/dataset/{dataset.id}/backup/github")
+        assert response.status_code == 200
+        job = response.get_json()["job"]
+        assert (job["state"], job["repo"], job["uploaded"], job["files_total"]) == ("done", "owner/job-backup", 2, 2)
+
+        status = test_client.get(f"/dataset/backup/jobs/{job['id']}")
+        assert status.status_code == 200 and status.get_json()["commit"] == github.history("owner/job-backup")[0]
+        assert test_client.get("/dataset/backup/jobs/999999").status_code == 404
+
+        # The finished job forgets its token; the backup keeps it, encrypted, for scheduled runs
+        row = GitHubBackupJobRepository().get_by_id(job["id"])
+        backup = GitHubBackupRepository().get_for(dataset.id, "owner/job-backup")
+        assert row.token is None
+        assert "job-token" not in backup.token and open_token(backup.token) == "job-token"
+    finally:
+        logout(test_client)
+
+
+def test_status_of_another_users_backup_is_hidden(github, test_client, tmp_path):
+    dataset = create_dataset(tmp_path, {"a.json": b"[]"})
+    job = GitHubBackupJobRepository().create(dataset_id=dataset.id, user_id=second_user().id, token=seal_token("t"))
+    login(test_client, "test@example.com", "test1234")
+    try:
+        assert test_client.get(f"/dataset/backup/jobs/{job.id}").status_code == 404
+    finally:
+        logout(test_client)
+
+
+def test_pending_popup_backup_polls_its_status(github, test_client, tmp_path, monkeypatch):
+    dataset = create_dataset(tmp_path, {"a.json": b"[]"})
+    monkeypatch.setattr(BackupQueue, "_submit", lambda self, job_id: None)
+    login(test_client, "test@example.com", "test1234")
+    try:
+        with test_client.session_transaction() as sess:
+            sess["github_token"] = "popup-token"
+
+        response = test_client.get(f"/dataset/{dataset.id}/backup/github-ui?return=/datasets&popup=1")
+        job = GitHubBackupJobRepository().active_for_dataset(dataset.id)
+        body = response.get_data(as_text=True)
+        assert response.status_code == 200
+        assert f"/dataset/backup/jobs/{job.id}" in body and "github-backup-done" in body
+
+        # A second request while the backup is queued does not queue another one
+        response = test_client.post(f"/dataset/{dataset.id}/backup/github")
+        assert response.status_code == 202
+        assert response.get_json()["job"]["id"] == job.id
+        assert response.get_json()["status_url"] == f"/dataset/backup/jobs/{job.id}"
+    finally:
+        logout(test_client)
+
+
+def test_pool_runs_one_backup_per_user_at_a_time(github, test_client, tmp_path):
+    github.latency = 0.02
+    owner = User.query.filter_by(email="test@example.com").first()
+    other = second_user()
+    datasets = [create_dataset(tmp_path, {f"{i}.json": b"[%d]" % i}, title=f"Pool {i}") for i in range(3)]
+    foreign = create_dataset(tmp_path, {"x.json": b"[]"}, title="Pool other")
+    foreign.user_id = other.id
+    db.session.commit()
+    write_files(tmp_path, foreign, {"x.json": b"[]"})
+
+    queue = BackupQueue(test_client.application, mode="thread", workers=3, per_user=1)
+    job_ids = [queue.enqueue(dataset.id, owner.id, "pool-token").id for dataset in datasets]
+    job_ids.append(queue.enqueue(foreign.id, other.id, "other-token").id)
+    jobs = wait_for(job_ids)
+
+    assert [job.state for job in jobs] == ["done"] * 4
+    own = sorted(jobs[:3], key=lambda job: job.started_at)
+    for previous, following in zip(own, own[1:]):
+        assert following.started_at >= previous.finished_at
+    # Another user's backup is not held back by the first user's queue
+    assert jobs[3].started_at < own[-1].started_at
+
+
+def test_rate_limited_requests_wait_for_the_reset(github, test_client, tmp_path, monkeypatch):
+    github.create_repo("owner/limited", files={"README.md": b"x"})
+    dataset = create_dataset(tmp_path, {"a.json": b"[1]"})
+    github.rate_limited = 1
+
+    started = time.monotonic()
+    result = GitHubContentService(token="limited-token", repo_full_name="owner/limited").upload_dataset(dataset)
+
+    # The rejected request was retried once the quota reset, one to two seconds later
+    assert result["uploaded"] == 1 and time.monotonic() - started >= 1
+    assert github.calls["get_commit"] == 2
+    assert github.files("owner/limited")["a.json"] == b"[1]"
+
+    # A reset further away than GITHUB_RATE_LIMIT_MAX_WAIT fails the request instead of blocking a worker
+    monkeypatch.setenv("GITHUB_RATE_LIMIT_MAX_WAIT", "0")
+    github_rate_limit("limited-token").blocked_until = time.time() + 60
+    with pytest.raises(GitHubAPIError, match="rate limit"):
+        GitHubContentService(token="limited-token", repo_full_name="owner/limited").upload_dataset(dataset)
+    github_rate_limit("limited-token").blocked_until = 0
+
+
+def test_scheduler_backs_up_changed_datasets_only(github, test_client, tmp_path):
+    owner = User.query.filter_by(email="test@example.com").first()
+    changed = create_dataset(tmp_path, {"a.json": b"[1]"}, title="Scheduled changed")
+    same = create_dataset(tmp_path, {"b.json": b"[2]"}, title="Scheduled same")
+    queue = backups.get_backup_queue()
+    for dataset in (changed, same):
+        queue.enqueue(dataset.id, owner.id, "scheduled-token")
+    github.calls.clear()
+
+    write_files(tmp_path, changed, {"a.json": b"[1, 2]"})
+    jobs = schedule_changed_backups()
+
+    assert [(job.dataset_id, job.trigger, job.state) for job in jobs] == [(changed.id, "scheduled", "done")]
+    assert github.files("owner/scheduled-changed")["a.json"] == b"[1, 2]"
+    # The unchanged dataset was checked on disk only
+    assert github.calls["get_commit"] == 1
+    assert schedule_changed_backups() == []
+
+    # Without a usable token (SECRET_KEY rotated) a dataset is skipped rather than failed
+    dataset_path(tmp_path, same, "b.json").write_bytes(b"[2, 3]")
+    backup = GitHubBackupRepository().latest_for_dataset(same.id)
+    backup.token = "not-a-sealed-token"
+    db.session.commit()
+    assert schedule_changed_backups() == []
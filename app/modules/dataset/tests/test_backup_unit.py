@@ -157,18 +157,9 @@ class TestBackupUnitGithub:
         subdir.mkdir()
         (subdir / "b.txt").write_text("B")
 
-        uploaded_paths = []
-
-        with patch(
-            "app.modules.dataset.services.requests.get", return_value=DummyResponse(status_code=404, json_data={})
-        ):
-            with patch(
-                "app.modules.dataset.services.requests.put",
-                side_effect=lambda *args, **kwargs: uploaded_paths.append(args[0])
-                or DummyResponse(status_code=201, json_data={}),
-            ):
-                svc = GitHubContentService(token="tok", repo_full_name="user/repo")
-                DummyDataset = types.SimpleNamespace(id=dataset_id, user_id=user_id)
-                result = svc.upload_dataset(DummyDataset)
-                assert result["uploaded"] == 2  # a.txt y sub/b.txt
-                assert len(uploaded_paths) == 2
+        # Se recorren todos los ficheros, también los de subcarpetas (la subida se prueba en test_backup_git_data)
+        svc = GitHubContentService(token="tok", repo_full_name="user/repo")
+        DummyDataset = types.SimpleNamespace(id=dataset_id, user_id=user_id)
+        files = svc._dataset_files(DummyDataset)
+        assert [repo_path for repo_path, _ in files] == ["a.txt", "sub/b.txt"]
+        assert files[1][1] == str(subdir / "b.txt")
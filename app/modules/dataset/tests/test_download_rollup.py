@@ -0,0 +1,99 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.events import get_event_pipeline
+from app.modules.dataset.models import DataSet, DSDownloadDaily, DSDownloadRecord, DSMetaData, PublicationType
+from app.modules.dataset.repositories import DSDownloadDailyRepository
+from app.modules.dataset.services import DataSetService
+
+
+@pytest.fixture(scope="function")
+def datasets(test_client):
+    user = User.query.filter_by(email="test@example.com").first()
+    created = []
+    for title in ("Rollup A", "Rollup B"):
+        meta = DSMetaData(title=title, description="rollup", publication_type=PublicationType.OTHER)
+        db.session.add(meta)
+        db.session.flush()
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+        db.session.add(dataset)
+        created.append(dataset)
+    db.session.commit()
+    yield created
+    db.session.query(DSDownloadRecord).delete()
+    db.session.query(DSDownloadDaily).delete()
+    db.session.commit()
+
+
+def rollup():
+    db.session.expire_all()
+    return {(row.dataset_id, row.day): row.count for row in DSDownloadDaily.query.all()}
+
+
+def add_download(dataset_id, when):
+    db.session.add(DSDownloadRecord(dataset_id=dataset_id, download_date=when, download_cookie=str(uuid.uuid4())))
+
+
+def test_orm_downloads_feed_the_rollup(datasets):
+    first, second = datasets
+    day = datetime(2025, 3, 10, 23, 30, tzinfo=timezone.utc)
+    add_download(first.id, day)
+    add_download(first.id, day + timedelta(minutes=10))
+    add_download(second.id, day + timedelta(hours=1))  # next UTC day
+    db.session.commit()
+
+    add_download(first.id, day)
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    assert rollup() == {(first.id, day.date()): 2, (second.id, day.date() + timedelta(days=1)): 1}
+
+
+def test_pipeline_downloads_are_upserted(datasets):
+    first, _ = datasets
+    pipeline = get_event_pipeline()
+    pipeline.record_dataset_download(dataset_id=first.id, user_id=None, cookie="rollup-1")
+    pipeline.record_dataset_download(dataset_id=first.id, user_id=None, cookie="rollup-2")
+
+    assert rollup() == {(first.id, datetime.now(timezone.utc).date()): 2}
+
+
+def test_backfill_matches_incremental_rollup(datasets):
+    first, second = datasets
+    now = datetime.now(timezone.utc)
+    for days_ago, dataset in ((0, first), (1, first), (1, second), (8, second)):
+        add_download(dataset.id, now - timedelta(days=days_ago))
+    db.session.commit()
+    incremental = rollup()
+
+    db.session.query(DSDownloadDaily).delete()
+    db.session.commit()
+    assert DSDownloadDailyRepository().rebuild() == len(incremental)
+    assert rollup() == incremental
+
+
+def test_trending_windows_read_the_rollup(datasets):
+    first, second = datasets
+    now = datetime.now(timezone.utc)
+    start_of_week = datetime(now.year, now.month, now.day, tzinfo=timezone.utc) - timedelta(days=now.weekday())
+    for _ in range(3):
+        add_download(second.id, start_of_week - timedelta(days=2))
+    add_download(first.id, start_of_week - timedelta(days=6))
+    add_download(first.id, start_of_week)
+    db.session.commit()
+
+    # Raw records are no longer read by trending: only the rollup counts
+    db.session.query(DSDownloadRecord).delete()
+    db.session.commit()
+
+    service = DataSetService()
+    assert [(item["id"], item["downloads"]) for item in service.trending_datasets_last_week()] == [
+        (second.id, 3),
+        (first.id, 1),
+    ]
+    assert [(item["id"], item["downloads"]) for item in service.trending_datasets_this_week()] == [(first.id, 1)]
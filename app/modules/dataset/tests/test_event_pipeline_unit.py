@@ -0,0 +1,106 @@
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.events import EventPipeline
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, DSViewRecord, PublicationType
+
+
+@pytest.fixture(scope="function")
+def dataset(test_client):
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="Events", description="desc", publication_type=PublicationType.OTHER)
+    db.session.add(meta)
+    db.session.flush()
+    ds = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(ds)
+    db.session.commit()
+    return ds
+
+
+@pytest.fixture(scope="function")
+def pipeline(test_client):
+    # Buffered mode without starting the flusher thread: tests call flush() themselves
+    pipeline = EventPipeline(test_client.application, mode="thread", batch_size=100)
+    pipeline._ensure_worker = lambda: None
+    yield pipeline
+    pipeline._stopped.set()
+
+
+class TestEventPipeline:
+
+    def test_events_are_buffered_until_flush(self, dataset, pipeline):
+        pipeline.record_dataset_download(dataset_id=dataset.id, user_id=None, cookie="c1")
+
+        assert DSDownloadRecord.query.filter_by(dataset_id=dataset.id).count() == 0
+        assert pipeline.flush() == 1
+        assert DSDownloadRecord.query.filter_by(dataset_id=dataset.id).count() == 1
+
+    def test_download_counter_is_aggregated(self, dataset, pipeline):
+        for cookie in ("a", "b", "a"):
+            pipeline.record_dataset_download(dataset_id=dataset.id, user_id=None, cookie=cookie)
+        pipeline.flush()
+
+        db.session.refresh(dataset)
+        assert dataset.download_count == 3
+        assert DSDownloadRecord.query.filter_by(dataset_id=dataset.id).count() == 3
+
+    def test_views_are_deduplicated_per_cookie(self, dataset, pipeline):
+        pipeline.record_dataset_view(dataset_id=dataset.id, user_id=None, cookie="v1")
+        pipeline.record_dataset_view(dataset_id=dataset.id, user_id=None, cookie="v1")
+        pipeline.record_dataset_view(dataset_id=dataset.id, user_id=None, cookie="v2")
+        pipeline.flush()
+
+        pipeline.record_dataset_view(dataset_id=dataset.id, user_id=None, cookie="v1")
+        pipeline.flush()
+
+        cookies = sorted(r.view_cookie for r in DSViewRecord.query.filter_by(dataset_id=dataset.id))
+        assert cookies == ["v1", "v2"]
+
+    def test_a_failing_event_does_not_drop_the_batch(self, dataset, pipeline, monkeypatch):
+        from app.modules.dataset import events
+
+        write_batch = events.write_batch
+
+        def failing_write_batch(batch):
+            if any(row["download_cookie"] == "bad" for _, row in batch):
+                raise RuntimeError("FK violation")
+            return write_batch(batch)
+
+        monkeypatch.setattr(events, "write_batch", failing_write_batch)
+        for cookie in ("ok1", "bad", "ok2"):
+            pipeline.record_dataset_download(dataset_id=dataset.id, user_id=None, cookie=cookie)
+        pipeline.flush()
+
+        cookies = sorted(r.download_cookie for r in DSDownloadRecord.query.filter_by(dataset_id=dataset.id))
+        assert cookies == ["ok1", "ok2"]
+        assert len(pipeline._retrying) == 1
+
+        # Retried on the following flushes, then dropped
+        for _ in range(pipeline.max_retries):
+            pipeline.flush()
+        assert pipeline._retrying == []
+        assert DSDownloadRecord.query.filter_by(dataset_id=dataset.id).count() == 2
+
+    def test_a_batch_that_failed_is_written_on_the_next_flush(self, dataset, pipeline, monkeypatch):
+        from app.modules.dataset import events
+
+        write_batch = events.write_batch
+        outage = {"calls": 0}
+
+        def flaky_write_batch(batch):
+            outage["calls"] += 1
+            if outage["calls"] <= 4:
+                raise RuntimeError("Lost connection to MySQL server")
+            return write_batch(batch)
+
+        monkeypatch.setattr(events, "write_batch", flaky_write_batch)
+        for cookie in ("x", "y", "z"):
+            pipeline.record_dataset_download(dataset_id=dataset.id, user_id=None, cookie=cookie)
+        pipeline.flush()
+        assert DSDownloadRecord.query.filter_by(dataset_id=dataset.id).count() == 0
+
+        pipeline.flush()
+        db.session.refresh(dataset)
+        assert DSDownloadRecord.query.filter_by(dataset_id=dataset.id).count() == 3
+        assert dataset.download_count == 3
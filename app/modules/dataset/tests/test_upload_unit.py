@@ -0,0 +1,283 @@
+import errno
+import hashlib
+import io
+import os
+import shutil
+import tracemalloc
+
+import pytest
+
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.dataset import services, uploads
+from app.modules.dataset.uploads import (
+    InvalidUpload,
+    ResumableUpload,
+    UploadNotFound,
+    cached_upload,
+    clear_temp_folder,
+    record_upload,
+    save_json_upload,
+)
+
+
+class GeneratedCatalog:
+    """Readable stream producing a JSON array of `count` objects without holding it in memory."""
+
+    def __init__(self, count):
+        self.parts = self._parts(count)
+        self.pending = b""
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    @staticmethod
+    def _parts(count):
+        yield b"["
+        for i in range(count):
+            yield (b"," if i else b"") + b'{"name": "component %d", "price": 12.5, "tags": ["a", "b"]}' % i
+        yield b"]\n"
+
+    def read(self, size):
+        while len(self.pending) < size:
+            part = next(self.parts, None)
+            if part is None:
+                break
+            self.pending += part
+        chunk, self.pending = self.pending[:size], self.pending[size:]
+        self.md5.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+
+def test_save_json_upload_hashes_and_counts_in_one_pass(tmp_path):
+    content = b'[{"name": "a", "items": [1, 2]}, {"name": "b"}, 3, [4]]'
+    path = tmp_path / "catalog.json"
+
+    info = save_json_upload(io.BytesIO(content), str(path))
+
+    assert path.read_bytes() == content
+    assert info == {"checksum": hashlib.md5(content).hexdigest(), "size": len(content), "item_count": 4}
+
+
+def test_save_json_upload_counts_nothing_for_objects(tmp_path):
+    info = save_json_upload(io.BytesIO(b'{"items": [1, 2, 3]}'), str(tmp_path / "object.json"))
+
+    assert info["item_count"] is None
+
+
+@pytest.mark.parametrize("content", [b'[{"name": "a",}]', b'[{"name": "a"}', b"[1] trailing"])
+def test_invalid_json_is_rejected_and_removed(tmp_path, content):
+    path = tmp_path / "broken.json"
+
+    with pytest.raises(InvalidUpload):
+        save_json_upload(io.BytesIO(content), str(path))
+    assert not path.exists()
+
+
+def test_large_catalog_uploads_with_constant_memory(tmp_path):
+    source = GeneratedCatalog(150_000)  # ~9 MB
+
+    tracemalloc.start()
+    info = save_json_upload(source, str(tmp_path / "large.json"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert info["item_count"] == 150_000
+    assert info["size"] == source.size == os.path.getsize(tmp_path / "large.json")
+    assert info["checksum"] == source.md5.hexdigest()
+    assert peak < 2 * 1024 * 1024
+
+
+def test_cached_upload_is_dropped_when_the_file_changes(tmp_path):
+    path = tmp_path / "catalog.json"
+    info = save_json_upload(io.BytesIO(b"[1, 2]"), str(path))
+    record_upload(str(tmp_path), "catalog.json", info)
+    assert cached_upload(str(tmp_path), "catalog.json")["checksum"] == info["checksum"]
+
+    path.write_bytes(b"[1, 2, 3]")
+    assert cached_upload(str(tmp_path), "catalog.json") is None
+
+
+def test_upload_route_records_metadata_used_at_creation(test_client, monkeypatch):
+    login(test_client, "test@example.com", "test1234")
+    temp_folder = User.query.filter_by(email="test@example.com").first().temp_folder()
+    content = b'[{"name": "fan"}, {"name": "cooler"}]'
+    try:
+        response = test_client.post(
+            "/dataset/file/upload",
+            data={"file": (io.BytesIO(content), "fans.json")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        assert response.get_json()["item_count"] == 2
+
+        # create_from_form reads the recorded checksum instead of the file
+        def fail(*args):
+            raise AssertionError("the uploaded file was read again")
+
+        monkeypatch.setattr(services, "calculate_checksum_and_size", fail)
+        assert services.uploaded_checksum_and_size(temp_folder, "fans.json") == (
+            hashlib.md5(content).hexdigest(),
+            len(content),
+        )
+
+        response = test_client.post(
+            "/dataset/file/upload", data={"file": (io.BytesIO(b"[1,"), "bad.json")}, content_type="multipart/form-data"
+        )
+        assert response.status_code == 400
+        assert "Invalid JSON format" in response.get_json()["error"]
+        assert not os.path.exists(os.path.join(temp_folder, "bad.json"))
+
+        test_client.post("/dataset/file/delete", json={"file": "fans.json"})
+        assert cached_upload(temp_folder, "fans.json") is None
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        logout(test_client)
+
+
+def catalog(count):
+    return b"[" + b",".join(b'{"name": "component %d"}' % i for i in range(count)) + b"]"
+
+
+def send(upload, index, content, sha256=None):
+    offset, length = upload.expected_range(index)
+    return upload.write_chunk(index, offset, io.BytesIO(content[offset : offset + length]), sha256)
+
+
+def test_resumable_upload_accepts_chunks_in_any_order(tmp_path):
+    content = catalog(50)
+    upload = ResumableUpload.create(str(tmp_path), "parts.json", len(content), 100)
+
+    for index in reversed(range(upload.total_chunks)):
+        progress = send(upload, index, content)
+    send(upload, 0, content)  # a retried chunk replaces the stored one
+
+    assert progress["missing_chunks"] == [] and progress["progress"] == 100.0
+    filename, info = ResumableUpload.load(str(tmp_path), upload.upload_id).finalize()
+
+    assert filename == "parts.json"
+    assert (tmp_path / "parts.json").read_bytes() == content
+    assert info == {"checksum": hashlib.md5(content).hexdigest(), "size": len(content), "item_count": 50}
+    assert cached_upload(str(tmp_path), "parts.json")["checksum"] == info["checksum"]
+    with pytest.raises(UploadNotFound):
+        ResumableUpload.load(str(tmp_path), upload.upload_id)
+
+
+def test_resumable_upload_rejects_bad_chunks(tmp_path):
+    content = catalog(10)
+    upload = ResumableUpload.create(str(tmp_path), "parts.json", len(content), 64)
+
+    with pytest.raises(InvalidUpload, match="offset"):
+        upload.write_chunk(1, 0, io.BytesIO(content[:64]))
+    with pytest.raises(InvalidUpload, match="bytes long"):
+        upload.write_chunk(0, 0, io.BytesIO(content[:65]))
+    with pytest.raises(InvalidUpload, match="Checksum"):
+        send(upload, 0, content, sha256="0" * 64)
+    with pytest.raises(InvalidUpload, match="out of range"):
+        upload.expected_range(upload.total_chunks)
+    with pytest.raises(InvalidUpload, match="Missing chunks"):
+        upload.finalize()
+
+    assert upload.progress()["received_chunks"] == []
+    assert os.listdir(upload.path) == [ResumableUpload.MANIFEST]
+
+    send(upload, 0, content, sha256=hashlib.sha256(content[:64]).hexdigest())
+    assert upload.progress()["received_chunks"] == [0]
+
+
+def test_resumable_upload_discards_invalid_documents(tmp_path):
+    content = b'[{"name": "a"},' + b" " * 100
+    upload = ResumableUpload.create(str(tmp_path), "broken.json", len(content), 64)
+    for index in range(upload.total_chunks):
+        send(upload, index, content)
+
+    with pytest.raises(InvalidUpload, match="Invalid JSON format"):
+        upload.finalize()
+    assert not (tmp_path / "broken.json").exists()
+    assert not os.path.exists(upload.path)
+
+
+def test_clearing_the_temp_folder_keeps_uploads_in_progress(tmp_path):
+    content = catalog(20)
+    upload = ResumableUpload.create(str(tmp_path), "other_tab.json", len(content), 100)
+    send(upload, 0, content)
+    (tmp_path / "finished.json").write_bytes(content)
+    record_upload(str(tmp_path), "finished.json", {"checksum": "x", "size": len(content), "item_count": 20})
+
+    clear_temp_folder(str(tmp_path))
+
+    assert os.listdir(tmp_path) == [uploads.RESUMABLE_DIR]
+    assert ResumableUpload.load(str(tmp_path), upload.upload_id).filename == "other_tab.json"
+
+
+def test_assembly_falls_back_when_zero_copy_is_unavailable(tmp_path, monkeypatch):
+    def unsupported(*args, **kwargs):
+        raise OSError(errno.ENOSYS, "not supported")
+
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    parts = []
+    for i, data in enumerate((b"[1,", b"2,", b"3]")):
+        parts.append(tmp_path / f"{i}.part")
+        parts[-1].write_bytes(data)
+
+    uploads._concatenate([str(part) for part in parts], str(tmp_path / "joined"))
+
+    assert (tmp_path / "joined").read_bytes() == b"[1,2,3]"
+
+
+def test_resumable_upload_routes(test_client):
+    login(test_client, "test@example.com", "test1234")
+    temp_folder = User.query.filter_by(email="test@example.com").first().temp_folder()
+    content = catalog(2000)
+    chunk_size = 4096
+    default_chunk_size = test_client.application.config["UPLOAD_CHUNK_SIZE"]
+    test_client.application.config["UPLOAD_CHUNK_SIZE"] = chunk_size
+    try:
+        # The dropzone switches to chunked uploads above one chunk
+        page = test_client.get("/dataset/upload").get_data(as_text=True)
+        assert f"let chunkSize = {chunk_size};" in page
+
+        response = test_client.post("/dataset/file/uploads", json={"filename": "big.json", "size": len(content)})
+        assert response.status_code == 201
+        status = response.get_json()
+        base = f"/dataset/file/uploads/{status['upload_id']}"
+        assert status["chunk_size"] == chunk_size and status["missing_chunks"] == list(range(status["total_chunks"]))
+
+        def put(index):
+            start = index * chunk_size
+            data = content[start : start + chunk_size]
+            return test_client.put(
+                f"{base}/chunks/{index}",
+                data=data,
+                headers={
+                    "Content-Range": f"bytes {start}-{start + len(data) - 1}/{len(content)}",
+                    "X-Chunk-SHA256": hashlib.sha256(data).hexdigest(),
+                },
+            )
+
+        assert put(0).get_json()["received_chunks"] == [0]
+        assert test_client.put(f"{base}/chunks/1", data=b"x").status_code == 400  # no Content-Range
+        assert test_client.post(f"{base}/finalize").status_code == 409
+
+        # Resuming: the status lists what is still missing
+        for index in test_client.get(base).get_json()["missing_chunks"]:
+            assert put(index).status_code == 200
+
+        response = test_client.post(f"{base}/finalize")
+        assert response.status_code == 200
+        assert response.get_json()["filename"] == "big.json"
+        assert response.get_json()["item_count"] == 2000
+        with open(os.path.join(temp_folder, "big.json"), "rb") as f:
+            assert f.read() == content
+        assert test_client.get(base).status_code == 404
+
+        too_big = test_client.application.config["UPLOAD_MAX_SIZE"] + 1
+        response = test_client.post("/dataset/file/uploads", json={"filename": "huge.json", "size": too_big})
+        assert response.status_code == 413
+        response = test_client.post("/dataset/file/uploads", json={"filename": "../escape.json", "size": 10})
+        assert response.status_code == 400
+    finally:
+        test_client.application.config["UPLOAD_CHUNK_SIZE"] = default_chunk_size
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        logout(test_client)
@@ -0,0 +1,172 @@
+import io
+import os
+import time
+import types
+import zipfile
+
+import pytest
+
+from app.modules.dataset.zip_cache import DatasetZipCache
+
+
+def make_dataset(dataset_id=7, user_id=42, files=()):
+    hubfiles = [types.SimpleNamespace(name=name, checksum=checksum, size=size) for name, checksum, size in files]
+    return types.SimpleNamespace(id=dataset_id, user_id=user_id, files=lambda: hubfiles)
+
+
+@pytest.fixture
+def dataset_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    base_dir = tmp_path / "uploads" / "user_42" / "dataset_7"
+    base_dir.mkdir(parents=True)
+    (base_dir / "cpu.json").write_text('[{"name": "cpu"}]' * 100)
+    (base_dir / "gpu.json").write_text('[{"name": "gpu"}]')
+    dataset = make_dataset(files=[("cpu.json", "c1", 1700), ("gpu.json", "g1", 17)])
+    return dataset, tmp_path
+
+
+@pytest.mark.usefixtures("test_client")
+class TestDatasetZipCache:
+
+    def test_cache_key_depends_on_checksums(self, dataset_on_disk):
+        dataset, tmp_path = dataset_on_disk
+        cache = DatasetZipCache(cache_dir=str(tmp_path / "cache"), max_bytes=0)
+        key = cache.cache_key(dataset)
+        assert key == cache.cache_key(dataset)
+
+        changed = make_dataset(files=[("cpu.json", "c2", 1700), ("gpu.json", "g1", 17)])
+        assert cache.cache_key(changed) != key
+
+    def test_stream_build_stores_valid_archive(self, dataset_on_disk):
+        dataset, tmp_path = dataset_on_disk
+        cache = DatasetZipCache(cache_dir=str(tmp_path / "cache"), max_bytes=0)
+        key = cache.cache_key(dataset)
+        assert cache.lookup(key) is None
+
+        streamed = b"".join(cache.stream_build(dataset, key))
+
+        cached_path = cache.lookup(key)
+        assert cached_path is not None
+        with open(cached_path, "rb") as fh:
+            assert fh.read() == streamed
+        with zipfile.ZipFile(io.BytesIO(streamed)) as zf:
+            assert sorted(zf.namelist()) == ["dataset_7/cpu.json", "dataset_7/gpu.json"]
+            assert zf.read("dataset_7/gpu.json") == b'[{"name": "gpu"}]'
+
+    def test_aborted_stream_leaves_no_archive(self, dataset_on_disk):
+        dataset, tmp_path = dataset_on_disk
+        cache = DatasetZipCache(cache_dir=str(tmp_path / "cache"), max_bytes=0)
+        key = cache.cache_key(dataset)
+
+        stream = cache.stream_build(dataset, key)
+        next(stream)
+        stream.close()
+
+        assert cache.lookup(key) is None
+        assert os.listdir(tmp_path / "cache") == []
+
+    def test_evict_removes_least_recently_used(self, tmp_path):
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        now = time.time()
+        for age, name in enumerate(["new", "mid", "old"]):
+            path = cache_dir / f"{name}.zip"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (now - age * 60, now - age * 60))
+
+        cache = DatasetZipCache(cache_dir=str(cache_dir), max_bytes=200)
+        assert cache.evict() == 100
+        assert sorted(os.listdir(cache_dir)) == ["mid.zip", "new.zip"]
+
+
+def test_download_serves_cached_archive_with_range(test_client, tmp_path, monkeypatch):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="Zip cache", description="desc", publication_type=PublicationType.OTHER)
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+
+    first = test_client.get(f"/dataset/download/{dataset.id}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    second = test_client.get(f"/dataset/download/{dataset.id}")
+    assert second.status_code == 200
+    assert second.headers["ETag"] == etag
+    assert second.data == first.data
+
+    partial = test_client.get(f"/dataset/download/{dataset.id}", headers={"Range": "bytes=0-3"})
+    assert partial.status_code == 206
+    assert partial.data == first.data[:4]
+
+    not_modified = test_client.get(f"/dataset/download/{dataset.id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+
+def test_only_whole_downloads_are_counted(test_client, tmp_path, monkeypatch):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="Zip count", description="desc", publication_type=PublicationType.OTHER)
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+
+    def download_count():
+        db.session.refresh(dataset)
+        return dataset.download_count
+
+    etag = test_client.get(f"/dataset/download/{dataset.id}").headers["ETag"]
+    assert test_client.get(f"/dataset/download/{dataset.id}").status_code == 200
+    assert download_count() == 2
+
+    url = f"/dataset/download/{dataset.id}"
+    assert test_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert test_client.get(url, headers={"Range": "bytes=0-3"}).status_code == 206
+    assert test_client.get(url, headers={"Range": "bytes=4-", "If-Range": etag}).status_code == 206
+    assert download_count() == 2
+
+    # Through nginx the app answers 200 and nginx makes the 304 or 206 from the request headers
+    monkeypatch.setitem(test_client.application.config, "FILE_DELIVERY", "nginx")
+    assert "X-Accel-Redirect" in test_client.get(url, headers={"If-None-Match": etag}).headers
+    assert "X-Accel-Redirect" in test_client.get(url, headers={"Range": "bytes=0-3"}).headers
+    assert download_count() == 2
+    test_client.get(url)
+    assert download_count() == 3
+
+
+def test_cached_archives_are_handed_over_to_nginx(test_client, tmp_path, monkeypatch):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    monkeypatch.setitem(test_client.application.config, "FILE_DELIVERY", "nginx")
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="Zip nginx", description="desc", publication_type=PublicationType.OTHER)
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.commit()
+
+    # The archive is built and streamed by the app the first time, then sent by nginx from the cache
+    first = test_client.get(f"/dataset/download/{dataset.id}")
+    assert "X-Accel-Redirect" not in first.headers and first.data
+    second = test_client.get(f"/dataset/download/{dataset.id}")
+    etag = first.headers["ETag"].strip('"')
+    assert second.headers["X-Accel-Redirect"] == f"/_protected_uploads/zip_cache/{etag}.zip"
+    assert second.headers["Content-Type"] == "application/zip" and second.data == b""
+    assert second.headers["Content-Disposition"] == f'attachment; filename="dataset_{dataset.id}.zip"'
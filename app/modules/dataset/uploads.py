@@ -0,0 +1,345 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import BinaryIO, Optional
+
+import ijson
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Per-file upload metadata lives next to the files in the user's temp folder
+METADATA_DIR = ".meta"
+# Resumable uploads keep their chunks in <temp folder>/.uploads/<upload id>/ until they are finalized
+RESUMABLE_DIR = ".uploads"
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+# copy_file_range/sendfile errors meaning "not supported here" rather than a real I/O failure
+_NO_ZERO_COPY = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+class UploadNotFound(LookupError):
+    pass
+
+
+class _TeeReader:
+    """File-like reader that copies every chunk it hands out to a file, hashing and counting it on the way."""
+
+    def __init__(self, source: BinaryIO, sink: Optional[BinaryIO] = None):
+        self.source = source
+        self.sink = sink
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def read(self, size: int = CHUNK_SIZE) -> bytes:
+        if size == 0:
+            # ijson probes with read(0) to tell bytes from text streams
+            return b""
+        chunk = self.source.read(size if size > 0 else CHUNK_SIZE)
+        if chunk:
+            if self.sink is not None:
+                self.sink.write(chunk)
+            self.md5.update(chunk)
+            self.size += len(chunk)
+        return chunk
+
+
+def save_json_upload(source: BinaryIO, path: str) -> dict:
+    """Write source to path in one pass while hashing it and validating it as JSON.
+
+    Returns {"checksum", "size", "item_count"}; item_count is the number of elements of a top-level
+    array (None for any other document). Memory use does not depend on the file size. Raises
+    InvalidUpload, removing the partial file, if the content is not valid JSON.
+    """
+    try:
+        with open(path, "wb") as sink:
+            return _scan_json(_TeeReader(source, sink))
+    except Exception:
+        _remove(path)
+        raise
+
+
+def inspect_json_file(path: str) -> dict:
+    """Same result as save_json_upload for a file that is already on disk, read once in chunks."""
+    with open(path, "rb") as source:
+        return _scan_json(_TeeReader(source))
+
+
+def _scan_json(reader: _TeeReader) -> dict:
+    item_count = None
+    try:
+        for prefix, event, _ in ijson.parse(reader):
+            if prefix == "" and event == "start_array":
+                item_count = 0
+            elif prefix == "item" and event not in ("end_map", "end_array", "map_key"):
+                item_count += 1
+    except ijson.JSONError as exc:
+        raise InvalidUpload(f"Invalid JSON format: {exc}") from exc
+    # Anything after the document (normally nothing or whitespace) still belongs to the file
+    while reader.read(CHUNK_SIZE):
+        pass
+    return {"checksum": reader.md5.hexdigest(), "size": reader.size, "item_count": item_count}
+
+
+def unique_filename(folder: str, filename: str) -> str:
+    """filename, or "name (n).ext" with the first n not taken yet in folder."""
+    if not os.path.exists(os.path.join(folder, filename)):
+        return filename
+    base_name, extension = os.path.splitext(filename)
+    i = 1
+    while os.path.exists(os.path.join(folder, f"{base_name} ({i}){extension}")):
+        i += 1
+    return f"{base_name} ({i}){extension}"
+
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _metadata_path(folder: str, filename: str) -> str:
+    return os.path.join(folder, METADATA_DIR, f"{filename}.json")
+
+
+def record_upload(folder: str, filename: str, info: dict):
+    """Remember the checksum/size/item count of an uploaded file so it never has to be read again."""
+    stat = os.stat(os.path.join(folder, filename))
+    metadata = dict(info, mtime_ns=stat.st_mtime_ns)
+    os.makedirs(os.path.join(folder, METADATA_DIR), exist_ok=True)
+    with open(_metadata_path(folder, filename), "w") as f:
+        json.dump(metadata, f)
+
+
+def cached_upload(folder: str, filename: str) -> Optional[dict]:
+    """Metadata recorded for filename, or None if missing or the file changed since it was recorded."""
+    try:
+        with open(_metadata_path(folder, filename)) as f:
+            metadata = json.load(f)
+        stat = os.stat(os.path.join(folder, filename))
+    except (OSError, ValueError):
+        return None
+    if metadata.get("size") != stat.st_size or metadata.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return metadata
+
+
+def forget_upload(folder: str, filename: str):
+    _remove(_metadata_path(folder, filename))
+
+
+class ResumableUpload:
+    """A catalog sent as numbered chunks over several requests and assembled once every chunk arrived.
+
+    The manifest only holds what is fixed at initiation (name, size, chunk size); received chunks are
+    the complete part files on disk, so chunks can be sent in parallel, retried or resumed later.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, folder: str, upload_id: str, manifest: dict):
+        self.folder = folder
+        self.upload_id = upload_id
+        self.path = os.path.join(folder, RESUMABLE_DIR, upload_id)
+        self.filename = manifest["filename"]
+        self.size = manifest["size"]
+        self.chunk_size = manifest["chunk_size"]
+
+    @property
+    def total_chunks(self) -> int:
+        return max(1, -(-self.size // self.chunk_size))
+
+    @classmethod
+    def create(cls, folder: str, filename: str, size: int, chunk_size: int) -> "ResumableUpload":
+        if os.path.basename(filename) != filename or not filename.endswith(".json"):
+            raise InvalidUpload("No valid file")
+        if size <= 0 or chunk_size <= 0:
+            raise InvalidUpload("size and chunk_size must be positive")
+        upload_id = uuid.uuid4().hex
+        manifest = {"filename": filename, "size": size, "chunk_size": chunk_size}
+        path = os.path.join(folder, RESUMABLE_DIR, upload_id)
+        os.makedirs(path)
+        with open(os.path.join(path, cls.MANIFEST), "w") as f:
+            json.dump(manifest, f)
+        return cls(folder, upload_id, manifest)
+
+    @classmethod
+    def load(cls, folder: str, upload_id: str) -> "ResumableUpload":
+        if not _UPLOAD_ID.match(upload_id):
+            raise UploadNotFound(upload_id)
+        try:
+            with open(os.path.join(folder, RESUMABLE_DIR, upload_id, cls.MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise UploadNotFound(upload_id) from exc
+        return cls(folder, upload_id, manifest)
+
+    def _part_path(self, index: int) -> str:
+        return os.path.join(self.path, f"{index}.part")
+
+    def expected_range(self, index: int) -> tuple:
+        """(offset, length) chunk index must cover."""
+        if not 0 <= index < self.total_chunks:
+            raise InvalidUpload(f"Chunk {index} is out of range (0-{self.total_chunks - 1})")
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, self.size - offset)
+
+    def write_chunk(self, index: int, offset: int, source: BinaryIO, sha256: Optional[str] = None) -> dict:
+        """Store chunk index, checking its offset, its length and (if given) its SHA-256.
+
+        The chunk is written to a temporary file and renamed into place, so a retried or interrupted
+        request never leaves a partial part behind. Returns the upload progress.
+        """
+        expected_offset, length = self.expected_range(index)
+        if offset != expected_offset:
+            raise InvalidUpload(f"Chunk {index} must start at offset {expected_offset}, not {offset}")
+
+        digest = hashlib.sha256()
+        received = 0
+        tmp_path = f"{self._part_path(index)}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as part:
+                # Read one byte past the expected length to detect oversized chunks
+                while received <= length:
+                    chunk = source.read(min(CHUNK_SIZE, length + 1 - received))
+                    if not chunk:
+                        break
+                    part.write(chunk)
+                    digest.update(chunk)
+                    received += len(chunk)
+            if received != length:
+                raise InvalidUpload(f"Chunk {index} must be {length} bytes long, got {received}")
+            if sha256 is not None and digest.hexdigest() != sha256.lower():
+                raise InvalidUpload(f"Checksum mismatch for chunk {index}")
+            os.replace(tmp_path, self._part_path(index))
+        except Exception:
+            _remove(tmp_path)
+            raise
+        return self.progress()
+
+    def received_chunks(self) -> list:
+        received = []
+        for name in os.listdir(self.path):
+            stem, _, extension = name.partition(".")
+            if extension == "part" and stem.isdigit():
+                received.append(int(stem))
+        return sorted(received)
+
+    def progress(self) -> dict:
+        received = self.received_chunks()
+        received_bytes = sum(self.expected_range(index)[1] for index in received)
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "received_chunks": received,
+            "missing_chunks": sorted(set(range(self.total_chunks)) - set(received)),
+            "received_bytes": received_bytes,
+            "progress": round(100.0 * received_bytes / self.size, 2),
+        }
+
+    def finalize(self) -> tuple:
+        """Join the parts into the temp folder and validate the result like a single-request upload.
+
+        Returns (filename, info) where filename may be suffixed to avoid overwriting an existing file
+        and info is what save_json_upload returns. The upload is removed afterwards; an invalid
+        document raises InvalidUpload and is discarded as well.
+        """
+        missing = self.progress()["missing_chunks"]
+        if missing:
+            raise InvalidUpload(f"Missing chunks: {missing}")
+
+        assembled = os.path.join(self.path, "assembled")
+        try:
+            _concatenate([self._part_path(index) for index in range(self.total_chunks)], assembled)
+            info = inspect_json_file(assembled)
+        except InvalidUpload:
+            self.abort()
+            raise
+
+        filename = unique_filename(self.folder, self.filename)
+        os.replace(assembled, os.path.join(self.folder, filename))
+        record_upload(self.folder, filename, info)
+        self.abort()
+        return filename, info
+
+    def abort(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def purge_stale_uploads(folder: str, max_age: float) -> int:
+    """Remove resumable uploads of folder untouched for more than max_age seconds; returns how many."""
+    root = os.path.join(folder, RESUMABLE_DIR)
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    deadline = time.time() - max_age
+    for upload_id in os.listdir(root):
+        path = os.path.join(root, upload_id)
+        try:
+            stale = os.path.getmtime(path) < deadline
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def clear_temp_folder(folder: str):
+    """Remove what a finished dataset left in folder (its files and their metadata), but not the resumable
+    uploads still in progress, maybe for another dataset; purge_stale_uploads removes the abandoned ones."""
+    if not os.path.isdir(folder):
+        return
+    for name in os.listdir(folder):
+        if name == RESUMABLE_DIR:
+            continue
+        path = os.path.join(folder, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def _concatenate(parts: list, path: str):
+    """Join part files into path inside the kernel (copy_file_range, else sendfile) when the OS allows it."""
+    # Unbuffered, so the fallback writes land in order with the kernel-side copies
+    with open(path, "wb", buffering=0) as target:
+        for part in parts:
+            with open(part, "rb") as source:
+                size = os.fstat(source.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    copied = _copy_range(source, target, offset, size - offset)
+                    if copied == 0:
+                        raise OSError(f"Unexpected end of {part}")
+                    offset += copied
+
+
+def _copy_range(source, target, offset: int, count: int) -> int:
+    """Copy up to count bytes of source from offset to the current position of target."""
+    if hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(source.fileno(), target.fileno(), count, offset_src=offset)
+        except OSError as exc:
+            if exc.errno not in _NO_ZERO_COPY:
+                raise
+    if hasattr(os, "sendfile"):
+        try:
+            return os.sendfile(target.fileno(), source.fileno(), offset, count)
+        except OSError as exc:
+            if exc.errno not in _NO_ZERO_COPY:
+                raise
+    source.seek(offset)
+    return target.write(source.read(min(count, CHUNK_SIZE)))
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+import uuid
+import zipfile
+from typing import Iterator, Optional
+
+from flask import current_app
+
+from app.modules.dataset.models import DataSet
+from app.modules.hubfile import storage
+from app.modules.hubfile.compression import find_stored, open_stored
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamTee:
+    """Write-only stream that copies every write to a file and keeps the bytes for the next yield.
+
+    It exposes no ``seek``/``tell`` so ``ZipFile`` treats it as unseekable and writes data
+    descriptors instead of going back to patch local headers.
+    """
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.pending = []
+
+    def write(self, data) -> int:
+        self.fh.write(data)
+        self.pending.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        self.fh.flush()
+
+    def drain(self) -> bytes:
+        data = b"".join(self.pending)
+        self.pending = []
+        return data
+
+
+class DatasetZipCache:
+    """Content-addressed cache of dataset ZIP archives.
+
+    Archives are keyed by the checksums of the dataset's Hubfiles, built once and then served
+    from disk. The cache directory is trimmed by least-recently-used order to a size budget.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = (
+            cache_dir
+            or current_app.config.get("DATASET_ZIP_CACHE_DIR")
+            or os.path.join(storage.uploads_root(), "zip_cache")
+        )
+        self.max_bytes = max_bytes if max_bytes is not None else current_app.config.get("DATASET_ZIP_CACHE_MAX_BYTES")
+
+    @staticmethod
+    def dataset_dir(dataset: DataSet) -> str:
+        return storage.dataset_dir(dataset.user_id, dataset.id)
+
+    @staticmethod
+    def archive_name(dataset: DataSet) -> str:
+        return f"dataset_{dataset.id}.zip"
+
+    def entries(self, dataset: DataSet) -> list:
+        """(arcname, path) pairs for every file of the dataset that exists on disk, in a stable order."""
+        base_dir = self.dataset_dir(dataset)
+        folder = os.path.splitext(self.archive_name(dataset))[0]
+        entries = []
+        for file in sorted(dataset.files(), key=lambda f: f.name):
+            path = find_stored(os.path.join(base_dir, file.name))
+            if os.path.isfile(path):
+                entries.append((f"{folder}/{file.name}", path))
+        return entries
+
+    def cache_key(self, dataset: DataSet) -> str:
+        """Hash of the dataset id and the (name, checksum, size) of its files.
+
+        Files missing on disk are part of the key too, so the archive is rebuilt once they appear.
+        """
+        base_dir = self.dataset_dir(dataset)
+        digest = hashlib.sha256(f"dataset:{dataset.id}".encode())
+        for file in sorted(dataset.files(), key=lambda f: f.name):
+            present = os.path.isfile(find_stored(os.path.join(base_dir, file.name)))
+            digest.update(f"\0{file.name}\0{file.checksum}\0{file.size}\0{int(present)}".encode())
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.zip")
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the absolute path of the cached archive for key, marking it as recently used, or None."""
+        path = os.path.abspath(self.path_for(key))
+        if not os.path.isfile(path):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def stream_build(self, dataset: DataSet, key: str) -> Iterator[bytes]:
+        """Build the archive for key, yielding its bytes while they are written to the cache.
+
+        The archive only becomes visible under its final name once it is complete; an aborted
+        stream (e.g. client disconnect) removes the partial file. The dataset is read before the
+        first chunk, so the returned iterator does not need the request or app context.
+        """
+        return self._build(self.entries(dataset), key)
+
+    def _build(self, entries: list, key: str) -> Iterator[bytes]:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        final_path = self.path_for(key)
+        part_path = f"{final_path}.{uuid.uuid4().hex}.part"
+        completed = False
+        try:
+            with open(part_path, "wb") as fh:
+                tee = _StreamTee(fh)
+                with zipfile.ZipFile(tee, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+                    for arcname, path in entries:
+                        info = zipfile.ZipInfo.from_file(path, arcname)
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        with open_stored(path) as src, zipf.open(info, "w") as dest:
+                            while True:
+                                chunk = src.read(CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                dest.write(chunk)
+                                data = tee.drain()
+                                if data:
+                                    yield data
+                        data = tee.drain()
+                        if data:
+                            yield data
+                data = tee.drain()
+            os.replace(part_path, final_path)
+            completed = True
+            if data:
+                yield data
+        finally:
+            if not completed and os.path.exists(part_path):
+                os.remove(part_path)
+
+        self.evict(keep=final_path)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Remove least recently used archives until the cache fits in max_bytes. Returns bytes freed."""
+        if not self.max_bytes or not os.path.isdir(self.cache_dir):
+            return 0
+
+        archives = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".zip"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            archives.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in archives)
+        freed = 0
+        for _, size, path in sorted(archives):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            freed += size
+            logger.info(f"Evicted cached dataset archive {path} ({size} bytes)")
+        return freed
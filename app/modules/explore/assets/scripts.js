@@ -51,115 +51,148 @@ function send_query() {
 
             console.log(document.querySelector('#publication_type').value);
 
+            const requestId = ++latestRequestId;
+            document.getElementById('results').innerHTML = '';
+            document.getElementById("results_not_found").style.display = "none";
+            let resultCount = 0;
+            update_results_counter(resultCount);
+
+            // Results come back as NDJSON, one dataset per line, and are rendered as they arrive
             fetch('/explore', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'application/x-ndjson',
                 },
                 body: JSON.stringify(searchCriteria),
             })
-                .then(response => response.json())
-                .then(data => {
-
-                    console.log(data);
-                    document.getElementById('results').innerHTML = '';
-
-                    // results counter
-                    const resultCount = data.length;
-                    const resultText = resultCount === 1 ? 'dataset' : 'datasets';
-                    document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
-
-                    if (resultCount === 0) {
+                .then(response => read_ndjson(response, dataset => {
+                    if (requestId !== latestRequestId) {
+                        return false;
+                    }
+                    resultCount++;
+                    update_results_counter(resultCount);
+                    render_dataset(dataset);
+                    return true;
+                }))
+                .then(() => {
+                    if (requestId === latestRequestId && resultCount === 0) {
                         console.log("show not found icon");
                         document.getElementById("results_not_found").style.display = "block";
-                    } else {
-                        document.getElementById("results_not_found").style.display = "none";
                     }
-
-
-                    data.forEach(dataset => {
-                        let card = document.createElement('div');
-                        card.className = 'col-12';
-                        card.innerHTML = `
-                            <div class="card">
-                                <div class="card-body">
-                                    <div class="d-flex align-items-center justify-content-between">
-                                        <h3><a href="${dataset.url}">${dataset.title}</a></h3>
-                                        <div>
-                                            <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
-                                        </div>
-                                    </div>
-                                    <p class="text-secondary">${formatDate(dataset.created_at)}</p>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Description
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <p class="card-text">${dataset.description}</p>
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Authors
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.authors.map(author => `
-                                                <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
-                                            `).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row mb-2">
-
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Tags
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
-                                        </div>
-
-                                    </div>
-
-                                    <div class="row">
-
-                                        <div class="col-md-4 col-12">
-
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                View dataset
-                                            </a>
-                                            <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                Download (${dataset.total_size_in_human_format})
-                                            </a>
-                                        </div>
-
-
-                                    </div>
-
-                                </div>
-                            </div>
-                        `;
-
-                        document.getElementById('results').appendChild(card);
-                    });
                 });
         });
     });
 }
 
+let latestRequestId = 0;
+
+async function read_ndjson(response, onItem) {
+    // Calls onItem for every parsed line; stops reading when it returns false (a newer search started)
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const {done, value} = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), {stream: !done});
+        const lines = buffer.split('\n');
+        buffer = done ? '' : lines.pop();
+        for (const line of lines) {
+            if (line.trim() && onItem(JSON.parse(line)) === false) {
+                reader.cancel();
+                return;
+            }
+        }
+        if (done) {
+            return;
+        }
+    }
+}
+
+function update_results_counter(resultCount) {
+    const resultText = resultCount === 1 ? 'dataset' : 'datasets';
+    document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
+}
+
+function render_dataset(dataset) {
+    let card = document.createElement('div');
+    card.className = 'col-12';
+    card.innerHTML = `
+        <div class="card">
+            <div class="card-body">
+                <div class="d-flex align-items-center justify-content-between">
+                    <h3><a href="${dataset.url}">${dataset.title}</a></h3>
+                    <div>
+                        <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
+                    </div>
+                </div>
+                <p class="text-secondary">${formatDate(dataset.created_at)}</p>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Description
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <p class="card-text">${dataset.description}</p>
+                    </div>
+
+                </div>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Authors
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${dataset.authors.map(author => `
+                            <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
+                        `).join('')}
+                    </div>
+
+                </div>
+
+                <div class="row mb-2">
+
+                    <div class="col-md-4 col-12">
+                        <span class=" text-secondary">
+                            Tags
+                        </span>
+                    </div>
+                    <div class="col-md-8 col-12">
+                        ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
+                    </div>
+
+                </div>
+
+                <div class="row">
+
+                    <div class="col-md-4 col-12">
+
+                    </div>
+                    <div class="col-md-8 col-12">
+                        <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                            View dataset
+                        </a>
+                        <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                            Download (${dataset.total_size_in_human_format})
+                        </a>
+                    </div>
+
+
+                </div>
+
+            </div>
+        </div>
+    `;
+
+    document.getElementById('results').appendChild(card);
+}
+
 function formatDate(dateString) {
     const options = {day: 'numeric', month: 'long', year: 'numeric', hour: 'numeric', minute: 'numeric'};
     const date = new Date(dateString);
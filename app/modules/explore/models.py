@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+from app import db
+
+
+class DatasetSearch(db.Model):
+    """Denormalized, normalized (unidecode + lowercase) search text of a dataset.
+
+    One row per dataset, rebuilt whenever the dataset, its metadata, authors or feature models change.
+    On MariaDB the document column carries a FULLTEXT index.
+    """
+
+    __tablename__ = "dataset_search"
+
+    dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), primary_key=True)
+    document = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (db.Index("ix_dataset_search_document", "document", mysql_prefix="FULLTEXT"),)
+
+    def __repr__(self):
+        return f"DatasetSearch<{self.dataset_id}>"
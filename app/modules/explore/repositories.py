@@ -1,21 +1,96 @@
-import re
+import base64
+import json
+from datetime import datetime
 
-import unidecode
-from sqlalchemy import any_, or_
+from sqlalchemy import and_, any_, or_, select
 
+from app import db
 from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
-from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.dataset.repositories import dataset_load_options
+from app.modules.explore.models import DatasetSearch
+from app.modules.explore.search_index import query_words, search_clauses
+from app.modules.featuremodel.models import FeatureModel
 from core.repositories.BaseRepository import BaseRepository
 
 
+def encode_cursor(dataset: DataSet) -> str:
+    """Opaque keyset cursor pointing right after the given dataset."""
+    payload = json.dumps([dataset.created_at.isoformat(), dataset.id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return the (created_at, id) pair of a cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, dataset_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(dataset_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
 
-    def filter(
+    def filter(self, sorting="newest", **kwargs):
+        datasets, rank = self.search_query(**kwargs)
+        return datasets.order_by(*self._ordering(sorting, rank)).all()
+
+    def filter_page(self, limit: int, cursor=None, sorting="newest", **kwargs):
+        """One keyset page of results ordered by (created_at, id). Returns (datasets, next_cursor)."""
+        datasets, rank = self.search_query(**kwargs)
+        if sorting == "relevance" and rank is not None:
+            raise ValueError("Cursor pagination is not available when sorting by relevance")
+
+        if cursor:
+            created_at, dataset_id = decode_cursor(cursor)
+            if sorting == "oldest":
+                after = or_(
+                    self.model.created_at > created_at,
+                    and_(self.model.created_at == created_at, self.model.id > dataset_id),
+                )
+            else:
+                after = or_(
+                    self.model.created_at < created_at,
+                    and_(self.model.created_at == created_at, self.model.id < dataset_id),
+                )
+            datasets = datasets.filter(after)
+
+        # One extra row tells whether there is a next page
+        page = datasets.order_by(*self._ordering(sorting, rank)).limit(limit + 1).all()
+        next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return page[:limit], next_cursor
+
+    def iter_filter(self, page_size: int = 100, sorting="newest", **kwargs):
+        """Yield every matching dataset, loading at most page_size of them at a time."""
+        datasets, rank = self.search_query(**kwargs)
+        if sorting == "relevance" and rank is not None:
+            # Rank order cannot be resumed from a cursor, so stream a single query in batches
+            yield from datasets.order_by(*self._ordering(sorting, rank)).yield_per(page_size)
+            return
+
+        cursor = None
+        while True:
+            page, cursor = self.filter_page(page_size, cursor, sorting=sorting, **kwargs)
+            yield from page
+            if cursor is None:
+                return
+            # Serialized pages are not needed anymore; keep the identity map bounded
+            for dataset in page:
+                db.session.expunge(dataset)
+
+    def _ordering(self, sorting, rank):
+        # Order by relevance (only meaningful with a general query) or created_at, with id as tie-breaker
+        if sorting == "relevance" and rank is not None:
+            return rank.desc(), self.model.created_at.desc(), self.model.id.desc()
+        if sorting == "oldest":
+            return self.model.created_at.asc(), self.model.id.asc()
+        return self.model.created_at.desc(), self.model.id.desc()
+
+    def search_query(
         self,
         query="",
-        sorting="newest",
         publication_type="any",
         tags=[],
         filter_title="",
@@ -24,6 +99,7 @@ class ExploreRepository(BaseRepository):
         filter_publication_type="any",
         filter_date_from="",
         filter_date_to="",
+        load_profile="detail",
         **kwargs,
     ):
 
@@ -39,14 +115,16 @@ class ExploreRepository(BaseRepository):
             ]
         )
 
-        # Start building the query
+        # Start building the query. Authors and feature models are checked with subqueries instead of
+        # joins, so rows never fan out and need no de-duplication.
         datasets = (
             self.model.query.join(DataSet.ds_meta_data)
-            .join(DSMetaData.authors)
-            .join(DataSet.feature_models)
-            .join(FeatureModel.fm_meta_data)
             .filter(DSMetaData.dataset_doi.isnot(None))
+            .filter(DSMetaData.id.in_(select(Author.ds_meta_data_id)))
+            .filter(DataSet.id.in_(select(FeatureModel.data_set_id)))
+            .options(*dataset_load_options(load_profile))
         )
+        rank = None
 
         if using_advanced_search:
             # Advanced search: use individual field filters
@@ -54,7 +132,9 @@ class ExploreRepository(BaseRepository):
                 datasets = datasets.filter(DSMetaData.title.ilike(f"%{filter_title}%"))
 
             if filter_author:
-                datasets = datasets.filter(Author.name.ilike(f"%{filter_author}%"))
+                datasets = datasets.filter(
+                    DSMetaData.id.in_(select(Author.ds_meta_data_id).where(Author.name.ilike(f"%{filter_author}%")))
+                )
 
             if filter_tags:
                 datasets = datasets.filter(DSMetaData.tags.ilike(f"%{filter_tags}%"))
@@ -80,26 +160,11 @@ class ExploreRepository(BaseRepository):
                 date_to = datetime.strptime(filter_date_to, "%Y-%m-%d")
                 datasets = datasets.filter(self.model.created_at <= date_to)
         else:
-            # Regular search: use general query across multiple fields
-            if query:
-                normalized_query = unidecode.unidecode(query).lower()
-                cleaned_query = re.sub(r'[,.":\'()\[\]^;!¡¿?]', "", normalized_query)
-
-                filters = []
-                for word in cleaned_query.split():
-                    filters.append(DSMetaData.title.ilike(f"%{word}%"))
-                    filters.append(DSMetaData.description.ilike(f"%{word}%"))
-                    filters.append(Author.name.ilike(f"%{word}%"))
-                    filters.append(Author.affiliation.ilike(f"%{word}%"))
-                    filters.append(Author.orcid.ilike(f"%{word}%"))
-                    filters.append(FMMetaData.uvl_filename.ilike(f"%{word}%"))
-                    filters.append(FMMetaData.title.ilike(f"%{word}%"))
-                    filters.append(FMMetaData.description.ilike(f"%{word}%"))
-                    filters.append(FMMetaData.publication_doi.ilike(f"%{word}%"))
-                    filters.append(FMMetaData.tags.ilike(f"%{word}%"))
-                    filters.append(DSMetaData.tags.ilike(f"%{word}%"))
-
-                datasets = datasets.filter(or_(*filters))
+            # Regular search: match the words against the dataset_search index
+            words = query_words(query) if query else []
+            if words:
+                search_filter, rank = search_clauses(db.session, words)
+                datasets = datasets.join(DatasetSearch, DatasetSearch.dataset_id == DataSet.id).filter(search_filter)
 
             # Apply publication_type filter for regular search if not using advanced
             if publication_type != "any":
@@ -115,10 +180,4 @@ class ExploreRepository(BaseRepository):
         if tags:
             datasets = datasets.filter(DSMetaData.tags.ilike(any_(f"%{tag}%" for tag in tags)))
 
-        # Order by created_at
-        if sorting == "oldest":
-            datasets = datasets.order_by(self.model.created_at.asc())
-        else:
-            datasets = datasets.order_by(self.model.created_at.desc())
-
-        return datasets.all()
+        return datasets, rank
@@ -1,9 +1,34 @@
-from flask import jsonify, render_template, request
+from flask import Response, current_app, jsonify, render_template, request, stream_with_context
 
 from app.modules.explore import explore_bp
 from app.modules.explore.forms import ExploreForm
 from app.modules.explore.services import ExploreService
 
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def _page_limit(value):
+    """Validated page size from the request, or None when the client did not ask for pagination."""
+    if value is None:
+        return None
+    max_page_size = current_app.config.get("EXPLORE_MAX_PAGE_SIZE", 100)
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"limit must be an integer between 1 and {max_page_size}")
+    if not 1 <= limit <= max_page_size:
+        raise ValueError(f"limit must be an integer between 1 and {max_page_size}")
+    return limit
+
+
+def _wants_ndjson(criteria) -> bool:
+    return bool(criteria.pop("stream", False)) or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def _ndjson(datasets):
+    for dataset in datasets:
+        yield current_app.json.dumps(dataset.to_dict()) + "\n"
+
 
 @explore_bp.route("/explore", methods=["GET", "POST"])
 def index():
@@ -13,6 +38,31 @@ def index():
         return render_template("explore/index.html", form=form, query=query)
 
     if request.method == "POST":
-        criteria = request.get_json()
-        datasets = ExploreService().filter(**criteria)
-        return jsonify([dataset.to_dict() for dataset in datasets])
+        criteria = request.get_json() or {}
+        cursor = criteria.pop("cursor", None)
+        stream = _wants_ndjson(criteria)
+        service = ExploreService()
+
+        try:
+            limit = _page_limit(criteria.pop("limit", None))
+            if limit is None and cursor:
+                raise ValueError("cursor requires a limit")
+
+            if limit is None:
+                if stream:
+                    page_size = current_app.config.get("EXPLORE_STREAM_PAGE_SIZE", 100)
+                    datasets = service.iter_filter(page_size, **criteria)
+                    return Response(stream_with_context(_ndjson(datasets)), mimetype=NDJSON_MIMETYPE)
+                datasets = service.filter(**criteria)
+                return jsonify([dataset.to_dict() for dataset in datasets])
+
+            datasets, next_cursor = service.filter_page(limit, cursor, **criteria)
+        except ValueError as exc:
+            return jsonify({"message": str(exc)}), 400
+
+        if stream:
+            response = Response(stream_with_context(_ndjson(datasets)), mimetype=NDJSON_MIMETYPE)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return response
+        return jsonify({"datasets": [dataset.to_dict() for dataset in datasets], "next_cursor": next_cursor})
@@ -0,0 +1,175 @@
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Iterable, List, Set
+
+import unidecode
+from sqlalchemy import case, delete, event, insert, literal, or_, select
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from app import db
+from app.modules.dataset.models import Author, DataSet, DSMetaData
+from app.modules.dataset.repositories import dataset_load_options
+from app.modules.explore.models import DatasetSearch
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+
+logger = logging.getLogger(__name__)
+
+# Same punctuation the explore query has always stripped
+QUERY_PUNCTUATION = r'[,.":\'()\[\]^;!¡¿?]'
+
+# InnoDB FULLTEXT defaults: tokens shorter than innodb_ft_min_token_size and default stopwords are
+# never indexed, so those words add nothing to the FULLTEXT relevance.
+FULLTEXT_MIN_TOKEN_SIZE = 3
+FULLTEXT_STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or that the this to was what when "
+    "where who will with und www".split()
+)
+
+_DIRTY_KEY = "dataset_search_dirty"
+
+
+def normalize(text: str) -> str:
+    return unidecode.unidecode(text or "").lower()
+
+
+def query_words(query: str) -> List[str]:
+    return re.sub(QUERY_PUNCTUATION, "", normalize(query)).split()
+
+
+def build_document(dataset: DataSet) -> str:
+    """Text indexed for a dataset: the same fields the general explore search has always looked at."""
+    meta = dataset.ds_meta_data
+    parts = [meta.title, meta.description, meta.tags]
+    for author in meta.authors:
+        parts.extend([author.name, author.affiliation, author.orcid])
+    for fm in dataset.feature_models:
+        fm_meta = fm.fm_meta_data
+        if fm_meta:
+            parts.extend(
+                [fm_meta.uvl_filename, fm_meta.title, fm_meta.description, fm_meta.publication_doi, fm_meta.tags]
+            )
+    # One field per line so a word never matches across two fields
+    return "\n".join(normalize(part) for part in parts if part)
+
+
+def _is_fulltext_term(word: str) -> bool:
+    return word.isalnum() and len(word) >= FULLTEXT_MIN_TOKEN_SIZE and word not in FULLTEXT_STOPWORDS
+
+
+def _uses_fulltext(session) -> bool:
+    return session.get_bind().dialect.name in ("mysql", "mariadb")
+
+
+def search_clauses(session, words: List[str]):
+    """(filter, rank) expressions over DatasetSearch.document for the given normalized words.
+
+    Any word may match anywhere in the document, as a substring (same OR semantics as before: "book" finds
+    "notebook"). The rank counts matching words and, on MariaDB, adds the FULLTEXT relevance of the words.
+    """
+    like_clauses = [DatasetSearch.document.like(f"%{word}%") for word in words]
+    rank = sum((case((clause, 1), else_=0) for clause in like_clauses), literal(0))
+
+    fulltext_words = [word for word in words if _is_fulltext_term(word)]
+    if fulltext_words and _uses_fulltext(session):
+        # Ranking only: FULLTEXT matches whole words or prefixes, never the middle of a word, so filtering on
+        # it would drop datasets the substring search finds
+        fulltext = match(DatasetSearch.document, against=" ".join(f"{word}*" for word in fulltext_words))
+        rank = rank + fulltext.in_boolean_mode()
+    return or_(*like_clauses), rank
+
+
+class DatasetSearchIndex:
+    """Keeps the dataset_search table in sync and rebuilds it on demand."""
+
+    def __init__(self, session=None):
+        self.session = session or db.session
+
+    def refresh(self, dataset_ids: Iterable[int]) -> int:
+        """Rebuild the search rows of the given datasets (rows of deleted datasets are removed)."""
+        ids = sorted(set(dataset_ids))
+        if not ids:
+            return 0
+
+        datasets = (
+            self.session.query(DataSet).options(*dataset_load_options("detail")).filter(DataSet.id.in_(ids)).all()
+        )
+        now = datetime.now(timezone.utc)
+        rows = [{"dataset_id": ds.id, "document": build_document(ds), "updated_at": now} for ds in datasets]
+
+        self.session.execute(delete(DatasetSearch).where(DatasetSearch.dataset_id.in_(ids)))
+        if rows:
+            self.session.execute(insert(DatasetSearch), rows)
+        return len(rows)
+
+    def rebuild(self, batch_size: int = 500) -> int:
+        """Reindex every dataset. Returns the number of indexed datasets."""
+        self.session.execute(delete(DatasetSearch))
+        ids = [row[0] for row in self.session.execute(select(DataSet.id).order_by(DataSet.id))]
+        total = 0
+        for start in range(0, len(ids), batch_size):
+            total += self.refresh(ids[start : start + batch_size])
+        self.session.commit()
+        return total
+
+
+def _dirty(session) -> dict:
+    return session.info.setdefault(_DIRTY_KEY, {"datasets": set(), "ds_meta": set(), "fm_meta": set()})
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty(session, flush_context):
+    """Remember which datasets a flush touched; they are reindexed right before commit."""
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if not any(isinstance(obj, (DataSet, DSMetaData, Author, FeatureModel, FMMetaData)) for obj in changed):
+        return
+
+    dirty = _dirty(session)
+    for obj in changed:
+        if isinstance(obj, DataSet):
+            dirty["datasets"].add(obj.id)
+        elif isinstance(obj, DSMetaData):
+            dirty["ds_meta"].add(obj.id)
+        elif isinstance(obj, Author):
+            if obj.ds_meta_data_id:
+                dirty["ds_meta"].add(obj.ds_meta_data_id)
+        elif isinstance(obj, FeatureModel):
+            dirty["datasets"].add(obj.data_set_id)
+        elif isinstance(obj, FMMetaData):
+            dirty["fm_meta"].add(obj.id)
+
+
+@event.listens_for(Session, "before_commit")
+def _reindex_dirty(session):
+    # Flush pending objects first (commit would do it anyway) so their changes are collected and
+    # visible to the reindex queries
+    session.flush()
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+
+    dataset_ids: Set[int] = {dataset_id for dataset_id in dirty["datasets"] if dataset_id}
+    with session.no_autoflush:
+        if dirty["ds_meta"]:
+            dataset_ids.update(
+                row[0]
+                for row in session.execute(select(DataSet.id).where(DataSet.ds_meta_data_id.in_(dirty["ds_meta"])))
+            )
+        if dirty["fm_meta"]:
+            dataset_ids.update(
+                row[0]
+                for row in session.execute(
+                    select(FeatureModel.data_set_id).where(FeatureModel.fm_meta_data_id.in_(dirty["fm_meta"]))
+                )
+            )
+        try:
+            DatasetSearchIndex(session).refresh(dataset_ids)
+        except Exception as exc:
+            # A stale search row must never block saving a dataset; `rosemary search:reindex` repairs it.
+            logger.exception(f"Could not refresh the search index for datasets {sorted(dataset_ids)}: {exc}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_dirty(session, previous_transaction):
+    session.info.pop(_DIRTY_KEY, None)
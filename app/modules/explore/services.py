@@ -18,18 +18,27 @@ class ExploreService(BaseService):
         filter_publication_type="any",
         filter_date_from="",
         filter_date_to="",
+        load_profile="detail",
         **kwargs,
     ):
         return self.repository.filter(
-            query,
-            sorting,
-            publication_type,
-            tags,
-            filter_title,
-            filter_author,
-            filter_tags,
-            filter_publication_type,
-            filter_date_from,
-            filter_date_to,
+            query=query,
+            sorting=sorting,
+            publication_type=publication_type,
+            tags=tags,
+            filter_title=filter_title,
+            filter_author=filter_author,
+            filter_tags=filter_tags,
+            filter_publication_type=filter_publication_type,
+            filter_date_from=filter_date_from,
+            filter_date_to=filter_date_to,
+            load_profile=load_profile,
             **kwargs,
         )
+
+    def filter_page(self, limit: int, cursor=None, **criteria):
+        """Keyset-paginated filter. Returns (datasets, next_cursor); next_cursor is None on the last page."""
+        return self.repository.filter_page(limit, cursor, **criteria)
+
+    def iter_filter(self, page_size: int = 100, **criteria):
+        return self.repository.iter_filter(page_size, **criteria)
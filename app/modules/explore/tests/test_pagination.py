@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+
+
+@pytest.fixture(scope="module")
+def paged_datasets(test_client):
+    """Seven datasets; two of them share created_at so the id tie-breaker is exercised."""
+    user = User.query.filter_by(email="test@example.com").first()
+    base = datetime(2024, 1, 1)
+    created = [base + timedelta(days=i) for i in range(6)] + [base + timedelta(days=3)]
+    ids = []
+    for i, created_at in enumerate(created):
+        meta = DSMetaData(
+            title=f"Pagetest {i}",
+            description="pagination",
+            publication_type=PublicationType.SOFTWARE,
+            dataset_doi=f"10.1234/pagetest-{i}",
+        )
+        db.session.add(meta)
+        db.session.flush()
+        db.session.add(Author(name="Paul Page", ds_meta_data_id=meta.id))
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id, created_at=created_at)
+        db.session.add(dataset)
+        db.session.flush()
+        fm_meta = FMMetaData(
+            uvl_filename=f"page_{i}.uvl", title="fm", description="fm", publication_type=PublicationType.SOFTWARE
+        )
+        db.session.add(fm_meta)
+        db.session.flush()
+        db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+        ids.append((created_at, dataset.id))
+    db.session.commit()
+    return ids
+
+
+def expected_order(paged_datasets, sorting):
+    ordered = sorted(paged_datasets, reverse=sorting == "newest")
+    return [dataset_id for _, dataset_id in ordered]
+
+
+def walk_pages(test_client, sorting, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        response = test_client.post(
+            "/explore", json={"query": "pagetest", "sorting": sorting, "limit": limit, "cursor": cursor}
+        )
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body["datasets"]) <= limit
+        ids.extend(dataset["id"] for dataset in body["datasets"])
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize("sorting", ["newest", "oldest"])
+def test_keyset_pages_cover_all_results_once(test_client, paged_datasets, sorting):
+    ids, pages = walk_pages(test_client, sorting, limit=3)
+
+    assert ids == expected_order(paged_datasets, sorting)
+    assert pages == 3
+
+
+def test_request_without_limit_keeps_plain_list(test_client, paged_datasets):
+    response = test_client.post("/explore", json={"query": "pagetest", "sorting": "newest"})
+
+    assert response.status_code == 200
+    assert [dataset["id"] for dataset in response.get_json()] == expected_order(paged_datasets, "newest")
+
+
+def test_ndjson_stream_returns_every_result(test_client, paged_datasets, monkeypatch):
+    # Small batches so the stream spans several keyset pages
+    monkeypatch.setitem(test_client.application.config, "EXPLORE_STREAM_PAGE_SIZE", 2)
+    response = test_client.post(
+        "/explore", json={"query": "pagetest", "sorting": "oldest"}, headers={"Accept": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == expected_order(paged_datasets, "oldest")
+
+
+def test_ndjson_page_carries_next_cursor_header(test_client, paged_datasets):
+    response = test_client.post("/explore", json={"query": "pagetest", "limit": 4, "stream": True})
+
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 4
+    assert response.headers["X-Next-Cursor"]
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"query": "pagetest", "limit": 0},
+        {"query": "pagetest", "limit": "many"},
+        {"query": "pagetest", "limit": 2, "cursor": "not-a-cursor"},
+        {"query": "pagetest", "cursor": "abc"},
+        {"query": "pagetest", "limit": 2, "sorting": "relevance"},
+    ],
+)
+def test_invalid_pagination_requests_are_rejected(test_client, paged_datasets, payload):
+    response = test_client.post("/explore", json=payload)
+
+    assert response.status_code == 400
+    assert "message" in response.get_json()
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.explore.services import ExploreService
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import Hubfile
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_datasets(count, prefix):
+    user = User.query.filter_by(email="test@example.com").first()
+    for i in range(count):
+        meta = DSMetaData(
+            title=f"{prefix} dataset {i}",
+            description="query count",
+            publication_type=PublicationType.SOFTWARE,
+            dataset_doi=f"10.1234/{prefix}-{i}",
+            tags="querycount",
+        )
+        db.session.add(meta)
+        db.session.flush()
+        db.session.add_all([Author(name=f"Author {i}-{j}", ds_meta_data_id=meta.id) for j in range(2)])
+        dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+        db.session.add(dataset)
+        db.session.flush()
+        for j in range(2):
+            fm_meta = FMMetaData(
+                uvl_filename=f"{prefix}_{i}_{j}.json",
+                title="fm",
+                description="fm",
+                publication_type=PublicationType.SOFTWARE,
+            )
+            db.session.add(fm_meta)
+            db.session.flush()
+            fm = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+            db.session.add(fm)
+            db.session.flush()
+            db.session.add(Hubfile(name=fm_meta.uvl_filename, checksum="x", size=10, feature_model_id=fm.id))
+    db.session.commit()
+
+
+def explore_query_count(test_app, tag_query):
+    # Start from an empty identity map so nothing is served from previously loaded objects
+    db.session.expunge_all()
+    with test_app.test_request_context("/explore"):
+        with count_queries() as statements:
+            datasets = ExploreService().filter(query=tag_query)
+            payload = [dataset.to_dict() for dataset in datasets]
+    return len(payload), len(statements)
+
+
+@pytest.mark.usefixtures("test_client")
+def test_explore_to_dict_query_count_is_constant(test_app):
+    create_datasets(2, "small")
+    small_results, small_queries = explore_query_count(test_app, "small")
+
+    create_datasets(8, "large")
+    large_results, large_queries = explore_query_count(test_app, "large")
+
+    assert small_results == 2
+    assert large_results == 8
+    assert large_queries == small_queries
+    # main query + authors + feature models (with fm metadata) + files
+    assert large_queries <= 4
@@ -0,0 +1,135 @@
+import importlib.util
+import os
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+from app.modules.explore.models import DatasetSearch
+from app.modules.explore.search_index import DatasetSearchIndex, build_document, query_words, search_clauses
+from app.modules.explore.services import ExploreService
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+
+
+def create_dataset(title, description="", author="Jane Doe", fm_title="model", tags=""):
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(
+        title=title,
+        description=description,
+        publication_type=PublicationType.SOFTWARE,
+        dataset_doi=f"10.1234/search-{title.replace(' ', '-').lower()}",
+        tags=tags,
+    )
+    db.session.add(meta)
+    db.session.flush()
+    db.session.add(Author(name=author, ds_meta_data_id=meta.id))
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    fm_meta = FMMetaData(
+        uvl_filename=f"{dataset.id}.uvl", title=fm_title, description="fm", publication_type=PublicationType.SOFTWARE
+    )
+    db.session.add(fm_meta)
+    db.session.flush()
+    db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+    db.session.commit()
+    return dataset
+
+
+def document_of(dataset_id):
+    db.session.expire_all()
+    row = db.session.get(DatasetSearch, dataset_id)
+    return row.document if row else None
+
+
+def test_query_words_strips_accents_and_punctuation():
+    assert query_words("Árbol, (Configuración)!  ¿Linux?") == ["arbol", "configuracion", "linux"]
+
+
+@pytest.mark.usefixtures("test_client")
+def test_index_follows_dataset_changes():
+    dataset = create_dataset("Índice Automotive", author="José Pérez", fm_title="Kernel variability")
+    document = document_of(dataset.id)
+    assert "indice automotive" in document
+    assert "jose perez" in document
+    assert "kernel variability" in document
+
+    # Updating related rows reindexes the owning dataset on commit
+    dataset.ds_meta_data.authors[0].name = "Ada Lovelace"
+    dataset.feature_models[0].fm_meta_data.title = "Drone firmware"
+    db.session.commit()
+    document = document_of(dataset.id)
+    assert "ada lovelace" in document
+    assert "drone firmware" in document
+    assert "jose perez" not in document
+
+    # A rolled back change leaves the index untouched
+    dataset.ds_meta_data.title = "Discarded"
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert "discarded" not in document_of(dataset.id)
+
+    dataset_id = dataset.id
+    db.session.query(FeatureModel).filter_by(data_set_id=dataset_id).delete()
+    db.session.delete(dataset)
+    db.session.commit()
+    assert document_of(dataset_id) is None
+
+
+@pytest.mark.usefixtures("test_client")
+def test_general_query_uses_index_and_ranks_results():
+    one_word = create_dataset("Rankingtest robotics", description="robotics only")
+    two_words = create_dataset("Rankingtest robotics swarm", description="swarm robotics")
+    create_dataset("Rankingtest unrelated")
+
+    by_relevance = ExploreService().filter(query="robotics swarm", sorting="relevance")
+    ids = [dataset.id for dataset in by_relevance]
+    assert ids[:2] == [two_words.id, one_word.id]
+
+    # Accents in the query or the data do not matter
+    create_dataset("Rankingtest Señal acústica")
+    assert [d.ds_meta_data.title for d in ExploreService().filter(query="ACUSTICA")] == ["Rankingtest Señal acústica"]
+
+
+@pytest.mark.usefixtures("test_client")
+def test_words_match_inside_other_words(monkeypatch):
+    notebook = create_dataset("Substringtest Notebook", description="framework")
+    assert [d.id for d in ExploreService().filter(query="book")] == [notebook.id]
+    assert [d.id for d in ExploreService().filter(query="work substringtest")] == [notebook.id]
+
+    # On MariaDB FULLTEXT only adds to the rank: its prefix matches would miss "notebook"
+    monkeypatch.setattr("app.modules.explore.search_index._uses_fulltext", lambda session: True)
+    search_filter, rank = search_clauses(db.session, ["book"])
+    assert "MATCH" not in str(search_filter.compile(dialect=mysql.dialect()))
+    assert "MATCH" in str(rank.compile(dialect=mysql.dialect()))
+
+
+@pytest.mark.usefixtures("test_client")
+def test_rebuild_restores_missing_rows():
+    dataset = create_dataset("Rebuildtest dataset")
+    db.session.query(DatasetSearch).delete()
+    db.session.commit()
+    assert ExploreService().filter(query="rebuildtest") == []
+
+    assert DatasetSearchIndex().rebuild() >= 1
+    assert [d.id for d in ExploreService().filter(query="rebuildtest")] == [dataset.id]
+
+
+@pytest.mark.usefixtures("test_client")
+def test_migration_indexes_existing_datasets_like_the_index_does():
+    path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "migrations", "versions")
+    spec = importlib.util.spec_from_file_location("migration_006", os.path.join(path, "006_create_dataset_search.py"))
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    first = create_dataset("Migrationtest Índice", description="Señal", author="José Pérez", tags="a, b")
+    second = create_dataset("Migrationtest other", fm_title="Drone firmware")
+    db.session.add(Author(name="Ada Lovelace", affiliation="Analytical", ds_meta_data_id=second.ds_meta_data_id))
+    db.session.commit()
+
+    documents = migration.documents(db.session.connection(), [first.id, second.id])
+    db.session.expire_all()
+    assert documents == {dataset.id: build_document(dataset) for dataset in (first, second)}
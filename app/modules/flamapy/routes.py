@@ -4,6 +4,7 @@ import logging
 from flask import jsonify
 
 from app.modules.flamapy import flamapy_bp
+from app.modules.hubfile.compression import open_stored
 from app.modules.hubfile.services import HubfileService
 
 logger = logging.getLogger(__name__)
@@ -15,7 +16,7 @@ def check_json(file_id):
         hubfile = HubfileService().get_by_id(file_id)
 
         # Try to load and validate JSON format
-        with open(hubfile.get_path(), "r") as f:
+        with open_stored(hubfile.get_path()) as f:
             json.load(f)
 
         # If JSON is successfully parsed, it's valid
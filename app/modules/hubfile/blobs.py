@@ -0,0 +1,234 @@
+"""Content-addressed store of dataset files.
+
+Every distinct content is stored once, as <uploads>/blobs/<first two digits>/<checksum> (<checksum>.zst when it is
+compressed at rest, see app.modules.hubfile.compression), keyed by the MD5 that
+Hubfile.checksum already records. The file of each Hubfile, at its storage_path, is a hardlink of that blob:
+downloads, ZIP archives, backups and nginx keep reading dataset folders as before, while disk usage (and the
+volume of hardlink-aware backups of the uploads folder) follows unique content instead of upload count. Dataset
+files are only ever replaced, never written in place, so sharing an inode between datasets is safe.
+
+A FileBlob row records each blob and the number of Hubfiles referencing it (ref_count, updated when the session
+commits); collect_garbage removes the blobs nothing references any more.
+"""
+
+import filecmp
+import logging
+import os
+import re
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.modules.hubfile.compression import ZSTD_SUFFIX, content_name, is_compressed, open_stored
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.repositories import FileBlobRepository
+from app.modules.hubfile.storage import hubfile_path, uploads_root
+from app.modules.hubfile.variants import remove_blob_variants
+
+logger = logging.getLogger(__name__)
+
+_MD5 = re.compile(r"[0-9a-f]{32}")
+_BLOB_NAME = re.compile(r"[0-9a-f]{32}(\.zst)?")
+_CHUNK = 1024 * 1024
+_REFS_KEY = "file_blob_ref_counts"
+
+
+def blobs_root() -> str:
+    return os.path.join(uploads_root(), "blobs")
+
+
+def blob_path(checksum: str, compressed: bool = False) -> str:
+    return os.path.join(blobs_root(), checksum[:2], checksum + (ZSTD_SUFFIX if compressed else ""))
+
+
+def _same_content(path: str, other: str) -> bool:
+    if os.path.getsize(path) == os.path.getsize(other) and filecmp.cmp(path, other, shallow=False):
+        return True
+    if not is_compressed(path):
+        return False
+    # Frames written at another compression level differ even when their content does not
+    with open_stored(path) as a, open_stored(other) as b:
+        while True:
+            chunk = a.read(_CHUNK)
+            if chunk != b.read(_CHUNK):
+                return False
+            if not chunk:
+                return True
+
+
+def _link_over(source: str, target: str):
+    """Make target a hardlink of source, replacing the file at target atomically."""
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    os.link(source, tmp_path)
+    try:
+        os.replace(tmp_path, target)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def store(hubfile: Hubfile, path: Optional[str] = None) -> bool:
+    """Move the file of hubfile (already at path, its location on disk) into the store: it becomes the blob of
+    its checksum if that content is new, or is replaced by a link of the existing blob. Sets blob_checksum;
+    the caller commits. Returns False, leaving a plain file, when the checksum is not an MD5, the content differs
+    from the blob stored under the same checksum, or the filesystem has no hardlinks."""
+    checksum = hubfile.checksum
+    if not checksum or not _MD5.fullmatch(checksum):
+        return False
+    path = path or hubfile_path(hubfile)
+    target = blob_path(checksum, compressed=is_compressed(path))
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+        except FileExistsError:
+            if not os.path.samefile(path, target):
+                # Same MD5 is not proof of same content: compare before sharing the blob
+                if not _same_content(path, target):
+                    logger.warning(f"{path} has the checksum of blob {checksum} but other content; not deduplicated")
+                    return False
+                _link_over(target, path)
+    except OSError as exc:
+        # No hardlinks here (other filesystem, unsupported), or the blob was just collected
+        logger.warning(f"Could not link {path} into the file store: {exc}")
+        return False
+
+    FileBlobRepository().get_or_create(checksum, hubfile.size, datetime.now(timezone.utc))
+    hubfile.blob_checksum = checksum
+    return True
+
+
+def store_existing(batch_size: int = 100) -> Counter:
+    """Bring files stored before the content store into it. Each file is read to check it still matches its
+    Hubfile checksum first. Returns counts of "stored", "skipped" files and "bytes" of files stored."""
+    from app.modules.dataset.services import calculate_checksum_and_size
+
+    repository = FileBlobRepository()
+    summary = Counter()
+    last_id = 0
+    while True:
+        hubfiles = (
+            Hubfile.query.filter(Hubfile.blob_checksum.is_(None), Hubfile.id > last_id)
+            .order_by(Hubfile.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not hubfiles:
+            return summary
+        for hubfile in hubfiles:
+            path = hubfile_path(hubfile)
+            stored = (
+                os.path.isfile(path)
+                and calculate_checksum_and_size(path)[0] == hubfile.checksum
+                and store(hubfile, path)
+            )
+            summary["stored" if stored else "skipped"] += 1
+            summary["bytes"] += hubfile.size if stored else 0
+        last_id = hubfiles[-1].id
+        repository.session.commit()
+
+
+def collect_garbage(grace: timedelta, dry_run: bool = False) -> Counter:
+    """Remove blobs no Hubfile references, with no other link left on disk and not linked within grace (so
+    files being stored right now keep theirs), plus blob files without a row that are older than grace. The
+    references of those blobs are counted from the file table, and ref_count is corrected where it drifted
+    (Hubfiles written by bulk queries, which bypass the session). Returns counts of "removed" blobs, "freed"
+    bytes, unreferenced blobs a dataset folder still "linked" and "recounted" blobs."""
+    repository = FileBlobRepository()
+    cutoff = datetime.now(timezone.utc) - grace
+    summary = Counter()
+
+    blobs = repository.linked_before(cutoff)
+    references = repository.count_references([blob.checksum for blob in blobs])
+    for blob in blobs:
+        count = references.get(blob.checksum, 0)
+        if blob.ref_count != count:
+            blob.ref_count = count
+            summary["recounted"] += 1
+        if count:
+            continue
+        # The content may be stored plain, compressed, or both (uploaded before and after compression was on)
+        stats = {}
+        for path in (blob_path(blob.checksum), blob_path(blob.checksum, compressed=True)):
+            if os.path.exists(path):
+                stats[path] = os.stat(path)
+        if any(stat.st_nlink > 1 for stat in stats.values()):
+            summary["linked"] += 1
+            continue
+        freed = sum(stat.st_size for stat in stats.values())
+        if dry_run:
+            summary["removed"] += 1
+            summary["freed"] += freed
+            continue
+        repository.session.delete(blob)
+        try:
+            repository.session.commit()
+        except IntegrityError:
+            # A Hubfile started referencing it meanwhile
+            repository.session.rollback()
+            continue
+        summary["removed"] += 1
+        summary["freed"] += freed
+        for path in stats:
+            os.remove(path)
+        remove_blob_variants(blob.checksum)
+    if dry_run:
+        repository.session.rollback()
+    else:
+        repository.session.commit()
+
+    # Blob files whose row was never committed (the request storing them failed)
+    root = blobs_root()
+    for folder in os.listdir(root) if os.path.isdir(root) else ():
+        names = [name for name in os.listdir(os.path.join(root, folder)) if _BLOB_NAME.fullmatch(name)]
+        known = repository.existing([content_name(name) for name in names])
+        for name in names:
+            path = os.path.join(root, folder, name)
+            stat = os.stat(path)
+            if content_name(name) in known or stat.st_nlink > 1 or stat.st_mtime > cutoff.timestamp():
+                continue
+            summary["removed"] += 1
+            summary["freed"] += stat.st_size
+            if not dry_run:
+                os.remove(path)
+    return summary
+
+
+def pending_ref_counts(session) -> Counter:
+    """ref_count deltas per blob, applied to FileBlob right before the session commits."""
+    return session.info.setdefault(_REFS_KEY, Counter())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_ref_counts(session, flush_context):
+    """Turn flushed Hubfile inserts, deletes and blob_checksum changes into per-blob ref_count deltas."""
+    deltas = Counter()
+    for sign, objects in ((1, session.new), (-1, session.deleted)):
+        for obj in objects:
+            if isinstance(obj, Hubfile) and obj.blob_checksum:
+                deltas[obj.blob_checksum] += sign
+    for obj in session.dirty:
+        if isinstance(obj, Hubfile):
+            history = inspect(obj).attrs.blob_checksum.history
+            deltas.update(checksum for checksum in history.added if checksum)
+            deltas.subtract(checksum for checksum in history.deleted if checksum)
+    if any(deltas.values()):
+        pending_ref_counts(session).update(deltas)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_ref_counts(session):
+    session.flush()
+    deltas = session.info.pop(_REFS_KEY, None)
+    if deltas:
+        FileBlobRepository(session).increment_ref_counts(deltas, commit=False)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_ref_counts(session, previous_transaction):
+    session.info.pop(_REFS_KEY, None)
@@ -0,0 +1,146 @@
+"""Dataset files compressed at rest with zstd.
+
+With FILE_STORAGE_COMPRESSION = "zstd" a catalog is stored as <name>.zst in the zstd seekable format: independent
+frames of FRAME_SIZE bytes of content each, followed by a skippable frame with the seek table (compressed and
+content size of every frame). Any zstd decoder reads it as one stream; readers of a part of the content start at
+the frame holding it instead of at the beginning. Hubfile checksum and size always describe the uncompressed
+content. Readers go through open_stored, which decompresses while reading, so they never need the whole file in
+memory. Files compressed as one frame (before the seek table was written) can still be read, from the start.
+"""
+
+import os
+import struct
+import uuid
+from typing import BinaryIO, List, Optional, Tuple
+
+import zstandard
+
+ZSTD_SUFFIX = ".zst"
+# Content bytes per frame: the most a read at an arbitrary offset decompresses before getting there
+FRAME_SIZE = 1024 * 1024
+_CHUNK = 1024 * 1024
+# Largest zstd frame header
+_FRAME_HEADER_MAX = 18
+
+# Seekable format (zstd contrib/seekable_format): skippable frame magic and size, entries of (compressed size,
+# content size), and a footer of (frame count, descriptor, seekable magic)
+_SKIPPABLE_MAGIC = 0x184D2A5E
+_SEEKABLE_MAGIC = 0x8F92EAB1
+_SKIPPABLE_HEADER = struct.Struct("<II")
+_SEEK_ENTRY = struct.Struct("<II")
+_SEEK_FOOTER = struct.Struct("<IBI")
+_CHECKSUM_FLAG = 0x80
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(ZSTD_SUFFIX)
+
+
+def stored_name(name: str, compression: str) -> str:
+    """File name a file called name is stored under with the given FILE_STORAGE_COMPRESSION."""
+    return name + ZSTD_SUFFIX if compression == "zstd" else name
+
+
+def content_name(path: str) -> str:
+    """Name of the file stored at path, as it was uploaded."""
+    name = os.path.basename(path)
+    return name[: -len(ZSTD_SUFFIX)] if is_compressed(name) else name
+
+
+def find_stored(path: str) -> str:
+    """path, or its compressed form if only that one is on disk."""
+    if not os.path.exists(path) and os.path.exists(path + ZSTD_SUFFIX):
+        return path + ZSTD_SUFFIX
+    return path
+
+
+def seek_table(f: BinaryIO) -> Optional[List[Tuple[int, int]]]:
+    """(compressed size, content size) of every frame of the compressed file f, or None if it has no seek
+    table."""
+    end = f.seek(0, os.SEEK_END)
+    if end < _SKIPPABLE_HEADER.size + _SEEK_FOOTER.size:
+        return None
+    f.seek(end - _SEEK_FOOTER.size)
+    frames, descriptor, magic = _SEEK_FOOTER.unpack(f.read(_SEEK_FOOTER.size))
+    if magic != _SEEKABLE_MAGIC:
+        return None
+    entry_size = _SEEK_ENTRY.size + (4 if descriptor & _CHECKSUM_FLAG else 0)
+    table_size = frames * entry_size + _SEEK_FOOTER.size
+    if table_size + _SKIPPABLE_HEADER.size > end:
+        return None
+    f.seek(end - table_size - _SKIPPABLE_HEADER.size)
+    skippable, size = _SKIPPABLE_HEADER.unpack(f.read(_SKIPPABLE_HEADER.size))
+    if skippable != _SKIPPABLE_MAGIC or size != table_size:
+        return None
+    table = f.read(table_size - _SEEK_FOOTER.size)
+    return [_SEEK_ENTRY.unpack_from(table, i * entry_size) for i in range(frames)]
+
+
+def open_stored(path: str, offset: int = 0) -> BinaryIO:
+    """Binary stream of the content of the file stored at path from offset on, decompressed as it is read."""
+    if not is_compressed(path):
+        f = open(path, "rb")
+        f.seek(offset)
+        return f
+    f = open(path, "rb")
+    try:
+        start = skip = 0
+        for compressed, size in (seek_table(f) or []) if offset else []:
+            if skip + size > offset:
+                break
+            start += compressed
+            skip += size
+        f.seek(start)
+        stream = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True, closefd=True)
+    except Exception:
+        f.close()
+        raise
+    if offset > skip:
+        stream.seek(offset - skip)
+    return stream
+
+
+def content_size(path: str) -> int:
+    """Uncompressed size of the file stored at path, from its seek table or frame header when it is
+    compressed."""
+    if not is_compressed(path):
+        return os.path.getsize(path)
+    with open(path, "rb") as f:
+        table = seek_table(f)
+        if table is not None:
+            return sum(size for _, size in table)
+        f.seek(0)
+        size = zstandard.frame_content_size(f.read(_FRAME_HEADER_MAX))
+    if size == zstandard.CONTENTSIZE_UNKNOWN:
+        # Frames written without their size: count it
+        with open_stored(path) as stream:
+            size = sum(len(chunk) for chunk in iter(lambda: stream.read(_CHUNK), b""))
+    return size
+
+
+def compress_file(source: str, target: str, level: int = 3, frame_size: int = FRAME_SIZE) -> Tuple[int, int]:
+    """Write source to target in the seekable format, one frame per frame_size bytes (renamed into place once
+    complete). Returns the sizes of source and of target."""
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    compressor = zstandard.ZstdCompressor(level=level)
+    table = []
+    try:
+        with open(source, "rb") as src, open(tmp_path, "wb") as dst:
+            while True:
+                chunk = src.read(frame_size)
+                if not chunk and table:
+                    break
+                frame = compressor.compress(chunk)
+                dst.write(frame)
+                table.append((len(frame), len(chunk)))
+                if not chunk:
+                    break
+            entries = b"".join(_SEEK_ENTRY.pack(*entry) for entry in table)
+            footer = _SEEK_FOOTER.pack(len(table), 0, _SEEKABLE_MAGIC)
+            dst.write(_SKIPPABLE_HEADER.pack(_SKIPPABLE_MAGIC, len(entries) + len(footer)) + entries + footer)
+        os.replace(tmp_path, target)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sum(size for _, size in table), os.path.getsize(target)
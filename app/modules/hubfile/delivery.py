@@ -0,0 +1,128 @@
+"""Delivery of files under the uploads root: by the app itself, or handed over to nginx.
+
+FILE_DELIVERY selects how a download the app has already authorized and recorded is sent:
+
+- "python" (default): the app streams the file (send_file, with Range and conditional requests).
+- "nginx": the app answers with an empty response and an X-Accel-Redirect header pointing at the file in
+  the internal nginx location FILE_DELIVERY_INTERNAL_LOCATION, and nginx sends the bytes.
+- "signed": the app redirects to an expiring link in FILE_DELIVERY_SIGNED_LOCATION, checked by nginx's
+  secure_link module with FILE_DELIVERY_SECRET and valid for FILE_DELIVERY_LINK_TTL seconds.
+
+Files outside the uploads root (e.g. a ZIP cache configured elsewhere) are always sent by the app.
+
+A file already in a Content-Encoding (a zstd file compressed at rest, see app.modules.hubfile.compression, or a
+Brotli or gzip variant, see app.modules.hubfile.variants) is sent as is with that encoding; nginx does it from the
+internal location of the encoding, <FILE_DELIVERY_INTERNAL_LOCATION>_<encoding>/. A file compressed at rest sent
+without its encoding is decompressed by the app as it is sent. Callers choosing between encodings add
+Vary: Accept-Encoding.
+"""
+
+import base64
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, current_app, redirect, request, send_file, stream_with_context
+
+from app.modules.hubfile.compression import content_size, is_compressed, open_stored
+from app.modules.hubfile.storage import uploads_root
+
+logger = logging.getLogger(__name__)
+
+MODES = ("python", "nginx", "signed")
+CHUNK_SIZE = 256 * 1024
+
+
+def _relative_upload_path(path: str) -> Optional[str]:
+    """path relative to the uploads root with "/" separators, or None if it is not inside it."""
+    root = os.path.abspath(uploads_root())
+    path = os.path.abspath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def _content_disposition(download_name: str) -> str:
+    # Same header send_file writes: ASCII fallback plus the UTF-8 name
+    try:
+        download_name.encode("ascii")
+        return f'attachment; filename="{download_name}"'
+    except UnicodeEncodeError:
+        fallback = download_name.encode("ascii", "ignore").decode("ascii")
+        return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(download_name)}"
+
+
+def sign_link(uri: str, filename: str, expires: int, secret: str) -> str:
+    """md5 argument of a secure_link URL, as nginx computes it from
+    secure_link_md5 "$secure_link_expires$uri$arg_filename <secret>"."""
+    digest = hashlib.md5(f"{expires}{uri}{filename} {secret}".encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def _send_decompressed(path: str, download_name: str, mimetype: str) -> Response:
+    def generate():
+        with open_stored(path) as stream:
+            yield from iter(lambda: stream.read(CHUNK_SIZE), b"")
+
+    stat = os.stat(path)
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers["Content-Length"] = str(content_size(path))
+    response.headers["Content-Disposition"] = _content_disposition(download_name)
+    # Not the ETag send_file gives the stored frame: the representations differ
+    response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}-identity")
+    return response.make_conditional(request)
+
+
+def send_upload(
+    path: str,
+    download_name: str,
+    mimetype: Optional[str] = None,
+    etag: Optional[str] = None,
+    encoding: Optional[str] = None,
+) -> Response:
+    """Response sending the file at path as an attachment named download_name, in the FILE_DELIVERY mode.
+    encoding is the Content-Encoding the file at path is in, if any."""
+    mode = current_app.config.get("FILE_DELIVERY", "python")
+    if mode not in MODES:
+        raise ValueError(f"FILE_DELIVERY must be one of {', '.join(MODES)}, not {mode!r}")
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+    if encoding is None and is_compressed(path):
+        return _send_decompressed(path, download_name, mimetype)
+    relative = _relative_upload_path(path) if mode != "python" else None
+
+    # Signed links have no Content-Encoding: encoded files go through the internal location
+    if relative is not None and mode == "signed" and encoding is None:
+        secret = current_app.config.get("FILE_DELIVERY_SECRET")
+        if secret:
+            uri = current_app.config.get("FILE_DELIVERY_SIGNED_LOCATION", "/_signed_uploads/") + relative
+            expires = int(time.time()) + current_app.config.get("FILE_DELIVERY_LINK_TTL", 300)
+            filename = quote(download_name, safe="")
+            md5 = sign_link(uri, filename, expires, secret)
+            return redirect(f"{quote(uri)}?md5={md5}&expires={expires}&filename={filename}", code=302)
+        logger.warning("FILE_DELIVERY is 'signed' but FILE_DELIVERY_SECRET is not set; using X-Accel-Redirect")
+
+    if relative is not None:
+        location = current_app.config.get("FILE_DELIVERY_INTERNAL_LOCATION", "/_protected_uploads/")
+        if encoding:
+            location = f"{location.rstrip('/')}_{encoding}/"
+        response = Response(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = quote(location + relative)
+        response.headers["Content-Disposition"] = _content_disposition(download_name)
+        if etag:
+            response.set_etag(etag)
+    else:
+        response = send_file(
+            os.path.abspath(path),
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True,
+            etag=etag if etag else True,
+        )
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    return response
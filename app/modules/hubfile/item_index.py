@@ -0,0 +1,205 @@
+"""Byte ranges of the items of JSON catalogs, for reading any page of a large top-level array directly.
+
+The index of a catalog is a sidecar file: a header with the size and mtime of the catalog it was built from
+and the number of items, followed by a (start, end) pair of native uint64 per item. Reading items
+offset..offset+limit costs one seek into the index and one read of their bytes in the catalog, wherever the
+page is. An index is rebuilt when the catalog changed since it was written.
+
+Offsets are positions in the content of the catalog. For catalogs compressed at rest they are positions in the
+decompressed stream: building the index decompresses the catalog once, chunk by chunk, and reading a page
+decompresses from the frame holding its first item (see app.modules.hubfile.compression).
+"""
+
+import json
+import os
+import re
+import struct
+import uuid
+from array import array
+from typing import List, Optional, Tuple
+
+from app.modules.hubfile.compression import open_stored
+
+MAGIC = b"PCHIDX1\0"
+# magic, catalog size, catalog mtime_ns, item count (NOT_AN_ARRAY for other documents)
+HEADER = struct.Struct("<8sQqq")
+NOT_AN_ARRAY = -1
+_RANGE_SIZE = 16
+_CHUNK = 1024 * 1024
+
+# Whole strings (so brackets and commas inside them are skipped), a quote opening a string the chunk cuts, or
+# structural characters
+_TOKENS = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|"|[\[\]{},]')
+_SIGNIFICANT = re.compile(rb"[^ \t\r\n]")
+_WHITESPACE = frozenset(b" \t\r\n")
+_QUOTE, _OPEN_ARRAY = ord('"'), ord("[")
+_OPEN, _CLOSE = frozenset(b"[{"), frozenset(b"]}")
+
+
+class NotAnArray(ValueError):
+    pass
+
+
+def scan_items(path: str) -> array:
+    """Start and end offsets of every element of the top-level array of the JSON document at path, as a flat
+    array [start0, end0, start1, end1, ...]. The content is read (and decompressed) chunk by chunk, so memory
+    does not grow with the catalog. Raises NotAnArray for other documents and ValueError if the array is not
+    closed."""
+    scanner = _Scanner(path)
+    with open_stored(path) as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK), b""):
+            if scanner.feed(chunk):
+                return scanner.ranges
+    return scanner.finish()
+
+
+class _Scanner:
+    """Tokenizer state carried from one chunk of a document to the next: array depth, where the current item
+    starts and ends (its first and past-its-last non-whitespace byte) and the start of a string a chunk cut."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ranges = array("Q")
+        self.depth = 0
+        self.first: Optional[int] = None
+        self.last = 0
+        self.carry = b""
+        # Offset of carry (then of the buffer being scanned) in the content
+        self.base = 0
+
+    def _mark(self, start: int, end: int):
+        if self.first is None:
+            self.first = start
+        self.last = end
+
+    def _between(self, buffer, start: int, end: int):
+        # Bytes outside tokens: part of an item at depth 1 (numbers, literals), invalid before the array opens
+        match = _SIGNIFICANT.search(buffer, start, end)
+        if match is None:
+            return
+        if self.depth == 0:
+            raise NotAnArray(self.path)
+        if self.depth == 1:
+            last = end
+            while buffer[last - 1] in _WHITESPACE:
+                last -= 1
+            self._mark(self.base + match.start(), self.base + last)
+
+    def _end_item(self):
+        if self.first is not None:
+            self.ranges.extend((self.first, self.last))
+        self.first = None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Scan the next chunk of the content; True once the array is closed."""
+        buffer = self.carry + chunk if self.carry else chunk
+        position = 0
+        for match in _TOKENS.finditer(buffer):
+            start, end = match.span()
+            if self.depth <= 1:
+                self._between(buffer, position, start)
+            char = buffer[start]
+            if char == _QUOTE and end - start == 1:
+                # A string the chunk cuts: scanned again with the next chunk
+                self.carry = buffer[start:]
+                self.base += start
+                return False
+            position = end
+            if self.depth == 0:
+                if char != _OPEN_ARRAY:
+                    raise NotAnArray(self.path)
+                self.depth = 1
+            elif char == _QUOTE:
+                if self.depth == 1:
+                    self._mark(self.base + start, self.base + end)
+            elif char in _OPEN:
+                if self.depth == 1:
+                    self._mark(self.base + start, self.base + end)
+                self.depth += 1
+            elif char in _CLOSE:
+                self.depth -= 1
+                if self.depth == 0:
+                    self._end_item()
+                    return True
+                if self.depth == 1:
+                    self.last = self.base + end
+            elif self.depth == 1:
+                self._end_item()
+        if self.depth <= 1:
+            self._between(buffer, position, len(buffer))
+        self.carry = b""
+        self.base += len(buffer)
+        return False
+
+    def finish(self) -> array:
+        if self.depth == 0:
+            raise NotAnArray(self.path)
+        raise ValueError(f"Unterminated JSON array in {self.path}")
+
+
+def build_index(path: str, index_path: str) -> int:
+    """Write the index of the catalog at path to index_path and return its item count (NOT_AN_ARRAY if the
+    document is not an array). The file is renamed into place, so concurrent readers never see half of it."""
+    stat = os.stat(path)
+    try:
+        ranges = scan_items(path)
+        count = len(ranges) // 2
+    except NotAnArray:
+        ranges, count = array("Q"), NOT_AN_ARRAY
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, stat.st_size, stat.st_mtime_ns, count))
+            ranges.tofile(f)
+        os.replace(tmp_path, index_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def _read_ranges(path: str, index_path: str, offset: int, limit: int) -> Optional[Tuple[array, int]]:
+    """(ranges, item count) of items offset..offset+limit-1 from the index, or None if it is missing or was
+    built from another version of the catalog."""
+    try:
+        with open(index_path, "rb") as index:
+            header = index.read(HEADER.size)
+            if len(header) != HEADER.size:
+                return None
+            magic, size, mtime_ns, count = HEADER.unpack(header)
+            stat = os.stat(path)
+            if magic != MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                return None
+            if count == NOT_AN_ARRAY:
+                raise NotAnArray(path)
+            ranges = array("Q")
+            if offset < count:
+                index.seek(HEADER.size + offset * _RANGE_SIZE)
+                ranges.frombytes(index.read(min(limit, count - offset) * _RANGE_SIZE))
+            return ranges, count
+    except FileNotFoundError:
+        return None
+
+
+def read_items(path: str, index_path: str, offset: int, limit: int) -> Tuple[List, int]:
+    """Items offset..offset+limit-1 of the catalog at path, decoded, and the total number of items. The index
+    is built first if it is missing or stale. Raises NotAnArray if the catalog is not a top-level array."""
+    page = _read_ranges(path, index_path, offset, limit)
+    if page is None:
+        build_index(path, index_path)
+        page = _read_ranges(path, index_path, offset, limit)
+        if page is None:
+            raise RuntimeError(f"{path} changed while it was being indexed")
+    ranges, total = page
+    if not ranges:
+        return [], total
+
+    # The page is a contiguous slice of the catalog: one read
+    first = ranges[0]
+    with open_stored(path, first) as f:
+        data = f.read(ranges[-1] - first)
+    items = [json.loads(data[ranges[i] - first : ranges[i + 1] - first]) for i in range(0, len(ranges), 2)]
+    return items, total
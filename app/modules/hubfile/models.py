@@ -14,6 +14,10 @@ class Hubfile(db.Model):
     checksum = db.Column(db.String(120), nullable=False)
     size = db.Column(db.Integer, nullable=False)
     feature_model_id = db.Column(db.Integer, db.ForeignKey("feature_model.id"), nullable=False)
+    # user_<owner>/dataset_<id>/<name>, relative to the uploads root (see app.modules.hubfile.storage)
+    storage_path = db.Column(db.String(255))
+    # Blob of the content store the file at storage_path is a hardlink of (see app.modules.hubfile.blobs)
+    blob_checksum = db.Column(db.String(120), db.ForeignKey("file_blob.checksum"), nullable=True)
 
     def get_formatted_size(self):
         from app.modules.dataset.services import SizeService
@@ -30,10 +34,10 @@ class Hubfile(db.Model):
 
         return HubfileService().get_dataset_by_hubfile(self)
 
-    def get_path(self) -> DataSet:
-        from app.modules.hubfile.services import HubfileService
+    def get_path(self) -> str:
+        from app.modules.hubfile.storage import hubfile_path
 
-        return HubfileService().get_path_by_hubfile(self)
+        return hubfile_path(self)
 
     def to_dict(self):
         return {
@@ -49,6 +53,22 @@ class Hubfile(db.Model):
         return f"File<{self.id}>"
 
 
+class FileBlob(db.Model):
+    """Unique content of the content-addressed file store, shared by every Hubfile with that checksum."""
+
+    __tablename__ = "file_blob"
+    checksum = db.Column(db.String(120), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    # Hubfiles whose blob_checksum is this blob, kept up to date on commit
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    # Last time a file was linked to the blob; garbage collection leaves recently linked blobs alone
+    linked_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"FileBlob<{self.checksum}>"
+
+
 class HubfileViewRecord(db.Model):
     __tablename__ = "file_view_record"
     id = db.Column(db.Integer, primary_key=True)
@@ -1,10 +1,14 @@
-from sqlalchemy import func
+from datetime import datetime
+from typing import Dict, List, Set
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
-from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
+from app.modules.hubfile.models import FileBlob, Hubfile, HubfileDownloadRecord, HubfileViewRecord
 from core.repositories.BaseRepository import BaseRepository
 
 
@@ -42,3 +46,57 @@ class HubfileDownloadRecordRepository(BaseRepository):
     def total_hubfile_downloads(self) -> int:
         max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
         return max_id if max_id is not None else 0
+
+
+class FileBlobRepository(BaseRepository):
+    def __init__(self, session=None):
+        super().__init__(FileBlob)
+        if session is not None:
+            self.session = session
+
+    def get_or_create(self, checksum: str, size: int, linked_at: datetime) -> FileBlob:
+        """The blob row of checksum, created if needed (concurrent creators both end up with the same row)."""
+        blob = self.session.get(FileBlob, checksum)
+        if blob is None:
+            try:
+                with self.session.begin_nested():
+                    blob = FileBlob(checksum=checksum, size=size, ref_count=0, linked_at=linked_at)
+                    self.session.add(blob)
+            except IntegrityError:
+                blob = self.session.get(FileBlob, checksum)
+        blob.linked_at = linked_at
+        return blob
+
+    def increment_ref_counts(self, deltas: Dict[str, int], commit: bool = True):
+        for checksum, delta in deltas.items():
+            if delta:
+                self.session.execute(
+                    update(FileBlob)
+                    .where(FileBlob.checksum == checksum)
+                    .values(ref_count=FileBlob.ref_count + delta)
+                    .execution_options(synchronize_session=False)
+                )
+        if commit:
+            self.session.commit()
+
+    def linked_before(self, cutoff: datetime) -> List[FileBlob]:
+        return self.session.query(FileBlob).filter(FileBlob.linked_at < cutoff).order_by(FileBlob.checksum).all()
+
+    def count_references(self, checksums: List[str], chunk_size: int = 500) -> Dict[str, int]:
+        """{checksum: Hubfiles referencing it}, counted from the file table rather than ref_count."""
+        counts = {}
+        for start in range(0, len(checksums), chunk_size):
+            rows = (
+                self.session.query(Hubfile.blob_checksum, func.count(Hubfile.id))
+                .filter(Hubfile.blob_checksum.in_(checksums[start : start + chunk_size]))
+                .group_by(Hubfile.blob_checksum)
+                .all()
+            )
+            counts.update(rows)
+        return counts
+
+    def existing(self, checksums: List[str]) -> Set[str]:
+        """Which of checksums have a blob row."""
+        if not checksums:
+            return set()
+        return {row[0] for row in self.session.query(FileBlob.checksum).filter(FileBlob.checksum.in_(checksums))}
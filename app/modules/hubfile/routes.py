@@ -1,46 +1,51 @@
+import codecs
+import json
 import os
 import uuid
-from datetime import datetime, timezone
 
-from flask import current_app, jsonify, make_response, request, send_from_directory
+from flask import Response, abort, current_app, jsonify, make_response, request, send_file
 from flask_login import current_user
 
-from app import db
+from app.modules.dataset.events import get_event_pipeline
 from app.modules.hubfile import hubfile_bp
-from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
-from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService
+from app.modules.hubfile.compression import is_compressed, open_stored
+from app.modules.hubfile.delivery import CHUNK_SIZE, send_upload
+from app.modules.hubfile.item_index import NotAnArray, read_items
+from app.modules.hubfile.services import HubfileService
+from app.modules.hubfile.storage import item_index_path
+from app.modules.hubfile.variants import ENCODINGS, VIEW, encoded_variant, negotiate, offered_encodings
 
 
 @hubfile_bp.route("/file/download/<int:file_id>", methods=["GET"])
 def download_file(file_id):
     file = HubfileService().get_or_404(file_id)
-    filename = file.name
-
-    directory_path = f"uploads/user_{file.feature_model.data_set.user_id}/dataset_{file.feature_model.data_set_id}/"
-    parent_directory_path = os.path.dirname(current_app.root_path)
-    file_path = os.path.join(parent_directory_path, directory_path)
+    file_path = file.get_path()
+    if not os.path.isfile(file_path):
+        abort(404)
 
     # Get the cookie from the request or generate a new one if it does not exist
     user_cookie = request.cookies.get("file_download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
 
-    # Check if the download record already exists for this cookie
-    existing_record = HubfileDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None, file_id=file_id, download_cookie=user_cookie
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        HubfileDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            file_id=file_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
-        )
-
-    # Save the cookie to the user's browser
-    resp = make_response(send_from_directory(directory=file_path, path=filename, as_attachment=True))
+    # Repeated downloads with the same cookie are dropped when the batch is written
+    get_event_pipeline().record_file_download(
+        file_id=file_id,
+        user_id=current_user.id if current_user.is_authenticated else None,
+        cookie=user_cookie,
+    )
+
+    # In the best encoding the client accepts: the zstd frame of a file compressed at rest, or a Brotli or gzip
+    # variant (made on the first request for it)
+    offered = (["zstd"] if is_compressed(file_path) else []) + offered_encodings(file)
+    encoding = negotiate(offered)
+    if encoding in ENCODINGS:
+        file_path = encoded_variant(file, file_path, encoding)
+
+    # Sent by the app or handed over to nginx, depending on FILE_DELIVERY; save the cookie to the user's browser
+    resp = send_upload(file_path, download_name=file.name, encoding=encoding)
+    if offered:
+        resp.vary.add("Accept-Encoding")
     resp.set_cookie("file_download_cookie", user_cookie)
 
     return resp
@@ -49,47 +54,92 @@ def download_file(file_id):
 @hubfile_bp.route("/file/view/<int:file_id>", methods=["GET"])
 def view_file(file_id):
     file = HubfileService().get_or_404(file_id)
-    filename = file.name
-
-    directory_path = f"uploads/user_{file.feature_model.data_set.user_id}/dataset_{file.feature_model.data_set_id}/"
-    parent_directory_path = os.path.dirname(current_app.root_path)
-    file_path = os.path.join(parent_directory_path, directory_path, filename)
+    file_path = file.get_path()
 
     try:
         if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                content = f.read()
-
-            user_cookie = request.cookies.get("view_cookie")
-            if not user_cookie:
-                user_cookie = str(uuid.uuid4())
-
-            # Check if the view record already exists for this cookie
-            existing_record = HubfileViewRecord.query.filter_by(
-                user_id=current_user.id if current_user.is_authenticated else None,
-                file_id=file_id,
-                view_cookie=user_cookie,
-            ).first()
-
-            if not existing_record:
-                # Register file view
-                new_view_record = HubfileViewRecord(
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    file_id=file_id,
-                    view_date=datetime.now(),
-                    view_cookie=user_cookie,
-                )
-                db.session.add(new_view_record)
-                db.session.commit()
-
-            # Prepare response
-            response = jsonify({"success": True, "content": content})
-            if not request.cookies.get("view_cookie"):
-                response = make_response(response)
-                response.set_cookie("view_cookie", user_cookie, max_age=60 * 60 * 24 * 365 * 2)
-
-            return response
+            return _record_view(file_id, _view_response(file, file_path))
         else:
             return jsonify({"success": False, "error": "File not found"}), 404
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+
+
+@hubfile_bp.route("/file/view/<int:file_id>/items", methods=["GET"])
+def view_file_items(file_id):
+    """Items `offset`..`offset + limit - 1` of a catalog (a top-level JSON array) and its total item count.
+
+    The items are read straight from their byte ranges through the catalog's item offset index (built on
+    the first request), so every page costs the same whatever its position and the file is never loaded
+    whole. Opening the viewer (offset 0) counts as a view of the file.
+    """
+    file = HubfileService().get_or_404(file_id)
+    file_path = file.get_path()
+    max_limit = current_app.config.get("FILE_VIEW_MAX_PAGE_SIZE", 500)
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", current_app.config.get("FILE_VIEW_PAGE_SIZE", 50)))
+    except ValueError:
+        return jsonify({"success": False, "error": "offset and limit must be integers"}), 400
+    if offset < 0 or not 1 <= limit <= max_limit:
+        return jsonify({"success": False, "error": f"offset must be >= 0 and limit between 1 and {max_limit}"}), 400
+    if not os.path.exists(file_path):
+        return jsonify({"success": False, "error": "File not found"}), 404
+
+    try:
+        items, total = read_items(file_path, item_index_path(file), offset, limit)
+    except NotAnArray:
+        return jsonify({"success": False, "error": "File is not a JSON array"}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    response = jsonify({"success": True, "items": items, "offset": offset, "limit": limit, "total": total})
+    return _record_view(file_id, response) if offset == 0 else response
+
+
+def _view_chunks(file_path):
+    """{"success": true, "content": ...} of the file, streamed: its text is decoded (and decompressed, if the
+    file is compressed at rest) and JSON-escaped chunk by chunk, so the catalog is never held whole."""
+    yield b'{"success": true, "content": "'
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open_stored(file_path) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            yield json.dumps(decoder.decode(chunk), ensure_ascii=False)[1:-1].encode()
+    yield json.dumps(decoder.decode(b"", final=True), ensure_ascii=False)[1:-1].encode() + b'"}'
+
+
+def _view_response(file, file_path):
+    """The file as {"success": true, "content": ...}, in the best encoding the client accepts (a Brotli or gzip
+    variant of the response, made on the first request for it)."""
+    offered = offered_encodings(file)
+    encoding = negotiate(offered)
+    if encoding:
+        path = encoded_variant(file, file_path, encoding, kind=VIEW, render=lambda: _view_chunks(file_path))
+        response = send_file(path, mimetype="application/json", conditional=True, etag=True)
+        response.headers["Content-Encoding"] = encoding
+    else:
+        stat = os.stat(file_path)
+        response = Response(_view_chunks(file_path), mimetype="application/json")
+        response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}-view")
+        response = response.make_conditional(request)
+    if offered:
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+def _record_view(file_id, response):
+    user_cookie = request.cookies.get("view_cookie")
+    if not user_cookie:
+        user_cookie = str(uuid.uuid4())
+
+    # Register file view (deduplicated per cookie when the batch is written)
+    get_event_pipeline().record_file_view(
+        file_id=file_id,
+        user_id=current_user.id if current_user.is_authenticated else None,
+        cookie=user_cookie,
+    )
+
+    if not request.cookies.get("view_cookie"):
+        response = make_response(response)
+        response.set_cookie("view_cookie", user_cookie, max_age=60 * 60 * 24 * 365 * 2)
+    return response
@@ -1,5 +1,3 @@
-import os
-
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.hubfile.models import Hubfile
@@ -8,6 +6,7 @@ from app.modules.hubfile.repositories import (
     HubfileRepository,
     HubfileViewRecordRepository,
 )
+from app.modules.hubfile.storage import hubfile_path
 from core.services.BaseService import BaseService
 
 
@@ -24,16 +23,7 @@ class HubfileService(BaseService):
         return self.repository.get_dataset_by_hubfile(hubfile)
 
     def get_path_by_hubfile(self, hubfile: Hubfile) -> str:
-
-        hubfile_user = self.get_owner_user_by_hubfile(hubfile)
-        hubfile_dataset = self.get_dataset_by_hubfile(hubfile)
-        working_dir = os.getenv("WORKING_DIR")
-
-        path = os.path.join(
-            working_dir, "uploads", f"user_{hubfile_user.id}", f"dataset_{hubfile_dataset.id}", hubfile.name
-        )
-
-        return path
+        return hubfile_path(hubfile)
 
     def total_hubfile_views(self) -> int:
         return self.hubfile_view_record_repository.total_hubfile_views()
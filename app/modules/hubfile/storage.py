@@ -0,0 +1,69 @@
+"""Where uploaded dataset files are stored.
+
+Every file lives in <WORKING_DIR>/<UPLOADS_DIR>/user_<owner id>/dataset_<dataset id>/<name>. Hubfiles keep
+that location, relative to the uploads root, in their storage_path column, so resolving it needs no query.
+"""
+
+import os
+
+from sqlalchemy import event, select
+
+from app import db
+from app.modules.dataset.models import DataSet
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Hubfile
+from core.configuration.configuration import uploads_folder_name
+
+
+def uploads_root() -> str:
+    return os.path.join(os.getenv("WORKING_DIR", ""), uploads_folder_name())
+
+
+def dataset_storage_dir(user_id: int, dataset_id: int) -> str:
+    """Folder of a dataset's files, relative to the uploads root."""
+    return f"user_{user_id}/dataset_{dataset_id}"
+
+
+def dataset_dir(user_id: int, dataset_id: int) -> str:
+    """Folder of a dataset's files on disk."""
+    return os.path.join(uploads_root(), f"user_{user_id}", f"dataset_{dataset_id}")
+
+
+def hubfile_storage_path(user_id: int, dataset_id: int, name: str) -> str:
+    return f"{dataset_storage_dir(user_id, dataset_id)}/{name}"
+
+
+def _owner_and_dataset(feature_model_id: int):
+    return (
+        select(DataSet.user_id, DataSet.id)
+        .join(FeatureModel, FeatureModel.data_set_id == DataSet.id)
+        .where(FeatureModel.id == feature_model_id)
+    )
+
+
+def resolve_storage_path(hubfile: Hubfile) -> str:
+    """Location of a Hubfile relative to the uploads root. Rows stored before the storage_path column
+    existed cost one query."""
+    if hubfile.storage_path:
+        return hubfile.storage_path
+    user_id, dataset_id = db.session.execute(_owner_and_dataset(hubfile.feature_model_id)).one()
+    return hubfile_storage_path(user_id, dataset_id, hubfile.name)
+
+
+def hubfile_path(hubfile: Hubfile) -> str:
+    """Path of a Hubfile on disk."""
+    return os.path.join(uploads_root(), *resolve_storage_path(hubfile).split("/"))
+
+
+def item_index_path(hubfile: Hubfile) -> str:
+    """Sidecar item offset index of a catalog (see app.modules.hubfile.item_index). Indexes live outside the
+    dataset folders, so backups and ZIP archives of a dataset never include them."""
+    return os.path.join(uploads_root(), "item_index", *resolve_storage_path(hubfile).split("/")) + ".idx"
+
+
+@event.listens_for(Hubfile, "before_insert")
+def _fill_storage_path(mapper, connection, hubfile):
+    # Callers that know the owner and dataset set storage_path themselves; otherwise look it up once
+    if not hubfile.storage_path:
+        user_id, dataset_id = connection.execute(_owner_and_dataset(hubfile.feature_model_id)).one()
+        hubfile.storage_path = hubfile_storage_path(user_id, dataset_id, hubfile.name)
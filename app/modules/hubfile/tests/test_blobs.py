@@ -0,0 +1,181 @@
+import hashlib
+import os
+import uuid
+from datetime import timedelta
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.blobs import blob_path, collect_garbage, store, store_existing
+from app.modules.hubfile.models import FileBlob, Hubfile
+from app.modules.hubfile.storage import hubfile_path
+
+
+@pytest.fixture()
+def uploads(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    return tmp_path / "uploads"
+
+
+@pytest.fixture()
+def catalog():
+    """Content no other test stores (the database is shared by the whole module)."""
+    return f'[{{"name": "Ryzen 5 7600"}}, {{"name": "B650 board", "sku": "{uuid.uuid4()}"}}]'.encode()
+
+
+def dataset_file(content, name="catalog.json", checksum=None):
+    """A Hubfile of a new dataset, with its file written at its storage path."""
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="blobs", description="dedup", publication_type=PublicationType.OTHER, tags="")
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    fm_meta = FMMetaData(uvl_filename=name, title=name, description="fm", publication_type=PublicationType.OTHER)
+    db.session.add(fm_meta)
+    db.session.flush()
+    feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(feature_model)
+    db.session.flush()
+    hubfile = Hubfile(
+        name=name,
+        checksum=checksum or hashlib.md5(content).hexdigest(),
+        size=len(content),
+        feature_model_id=feature_model.id,
+    )
+    db.session.add(hubfile)
+    db.session.commit()
+
+    path = hubfile_path(hubfile)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(content)
+    return hubfile, path
+
+
+def ref_count(checksum):
+    db.session.expire_all()
+    return db.session.get(FileBlob, checksum).ref_count
+
+
+def test_identical_uploads_share_one_blob(uploads, catalog):
+    first, first_path = dataset_file(catalog)
+    second, second_path = dataset_file(catalog)
+
+    assert store(first, first_path) and store(second, second_path)
+    db.session.commit()
+
+    blob = blob_path(first.checksum)
+    assert os.path.samefile(first_path, blob) and os.path.samefile(second_path, blob)
+    assert os.stat(blob).st_nlink == 3
+    assert os.listdir(uploads / "blobs") == [first.checksum[:2]]
+    assert ref_count(first.checksum) == 2
+    with open(second_path, "rb") as f:
+        assert f.read() == catalog
+
+
+def test_same_checksum_with_other_content_is_not_shared(uploads, catalog):
+    original, original_path = dataset_file(catalog)
+    store(original, original_path)
+    forged, forged_path = dataset_file(b"[]", checksum=original.checksum)
+
+    assert store(forged, forged_path) is False
+    db.session.commit()
+    assert not os.path.samefile(forged_path, original_path) and forged.blob_checksum is None
+    with open(forged_path, "rb") as f:
+        assert f.read() == b"[]"
+    assert ref_count(original.checksum) == 1
+
+
+def test_files_without_an_md5_are_left_alone(uploads, catalog):
+    hubfile, path = dataset_file(catalog, checksum="checksum1")
+
+    assert store(hubfile, path) is False
+    assert not os.path.exists(uploads / "blobs")
+
+
+def test_ref_count_follows_hubfiles_and_garbage_is_collected(uploads, catalog):
+    first, first_path = dataset_file(catalog)
+    second, second_path = dataset_file(catalog)
+    store(first, first_path)
+    store(second, second_path)
+    db.session.commit()
+    checksum, blob = first.checksum, blob_path(first.checksum)
+
+    db.session.delete(first)
+    db.session.commit()
+    os.remove(first_path)
+    assert ref_count(checksum) == 1
+
+    db.session.delete(second)
+    db.session.commit()
+    assert ref_count(checksum) == 0
+    # Unreferenced, but a dataset folder still has it
+    assert collect_garbage(timedelta(0))["linked"] == 1 and os.path.exists(blob)
+
+    os.remove(second_path)
+    # Linked within the grace period: kept
+    assert collect_garbage(timedelta(hours=1))["removed"] == 0 and os.path.exists(blob)
+    assert collect_garbage(timedelta(0), dry_run=True)["removed"] == 1 and os.path.exists(blob)
+
+    summary = collect_garbage(timedelta(0))
+    assert summary["removed"] == 1 and summary["freed"] == len(catalog)
+    assert not os.path.exists(blob) and db.session.get(FileBlob, checksum) is None
+
+
+def test_garbage_collection_recounts_and_removes_orphan_blob_files(uploads, catalog):
+    hubfile, path = dataset_file(catalog)
+    store(hubfile, path)
+    db.session.commit()
+    # Bulk writes bypass the session events
+    Hubfile.query.filter_by(id=hubfile.id).update({"blob_checksum": None})
+    db.session.commit()
+    os.remove(path)
+
+    orphan = uploads / "blobs" / "ab" / ("ab" + "0" * 30)
+    orphan.parent.mkdir(exist_ok=True)
+    orphan.write_bytes(b"left behind")
+    os.utime(orphan, (0, 0))
+
+    summary = collect_garbage(timedelta(0))
+    assert summary["recounted"] == 1 and summary["removed"] == 2
+    assert not orphan.exists() and not os.path.exists(blob_path(hubfile.checksum))
+
+
+def test_existing_files_are_moved_into_the_store(uploads, catalog):
+    first, first_path = dataset_file(catalog)
+    second, second_path = dataset_file(catalog)
+    changed, changed_path = dataset_file(b"[1]")
+    with open(changed_path, "wb") as f:
+        f.write(b"[2]")
+
+    summary = store_existing()
+
+    assert summary["stored"] >= 2 and os.path.samefile(first_path, second_path)
+    assert changed.blob_checksum is None and ref_count(first.checksum) == 2
+
+
+def test_published_uploads_go_into_the_store(test_client, uploads, catalog):
+    from flask_login import login_user
+
+    from app.modules.dataset.services import DataSetService
+
+    hubfiles = []
+    with test_client.application.test_request_context():
+        user = User.query.filter_by(email="test@example.com").first()
+        login_user(user)
+        os.makedirs(user.temp_folder(), exist_ok=True)
+        for _ in range(2):
+            hubfile, path = dataset_file(catalog)
+            # The upload waits in the user's temp folder until the dataset is created
+            os.replace(path, os.path.join(user.temp_folder(), hubfile.name))
+            DataSetService().move_feature_models(hubfile.feature_model.data_set)
+            hubfiles.append(hubfile)
+
+    first, second = hubfiles
+    assert os.path.samefile(hubfile_path(first), hubfile_path(second))
+    assert first.blob_checksum == second.blob_checksum == first.checksum and ref_count(first.checksum) == 2
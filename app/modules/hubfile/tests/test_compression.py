@@ -0,0 +1,139 @@
+import hashlib
+import io
+import json
+import os
+import zipfile
+
+import pytest
+import zstandard
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.compression import compress_file, content_size, find_stored, open_stored
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.storage import hubfile_storage_path
+
+ITEMS = [{"name": f"Part {i}", "price": i * 10.5, "specs": {"socket": "AM5", "cores": i % 16}} for i in range(500)]
+CATALOG = json.dumps(ITEMS, indent=2).encode()
+
+
+@pytest.fixture()
+def compressed_file(test_client, tmp_path, monkeypatch):
+    """A Hubfile of a new dataset, stored as catalog.json.zst under a temporary WORKING_DIR."""
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="zstd", description="files", publication_type=PublicationType.OTHER, tags="")
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    fm_meta = FMMetaData(
+        uvl_filename="catalog.json", title="c", description="fm", publication_type=PublicationType.OTHER
+    )
+    db.session.add(fm_meta)
+    db.session.flush()
+    feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(feature_model)
+    db.session.flush()
+    hubfile = Hubfile(
+        name="catalog.json",
+        checksum=hashlib.md5(CATALOG).hexdigest(),
+        size=len(CATALOG),
+        feature_model_id=feature_model.id,
+        storage_path=hubfile_storage_path(user.id, dataset.id, "catalog.json.zst"),
+    )
+    db.session.add(hubfile)
+    db.session.commit()
+
+    folder = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+    folder.mkdir(parents=True)
+    (tmp_path / "catalog.json").write_bytes(CATALOG)
+    compress_file(str(tmp_path / "catalog.json"), str(folder / "catalog.json.zst"))
+    return hubfile, folder / "catalog.json.zst"
+
+
+def test_compressed_files_read_back_as_their_content(tmp_path):
+    source = tmp_path / "catalog.json"
+    source.write_bytes(CATALOG)
+
+    size, stored = compress_file(str(source), str(tmp_path / "catalog.json.zst"), level=9)
+
+    assert size == len(CATALOG) and stored < size / 5
+    assert content_size(str(tmp_path / "catalog.json.zst")) == len(CATALOG)
+    with open_stored(str(tmp_path / "catalog.json.zst")) as stream:
+        assert stream.read() == CATALOG
+    source.unlink()
+    assert find_stored(str(source)) == str(tmp_path / "catalog.json.zst")
+
+
+def test_zstd_clients_get_the_stored_frame(test_client, compressed_file):
+    hubfile, path = compressed_file
+
+    response = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "gzip, zstd"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "zstd" and "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["Content-Type"] == "application/json"
+    assert response.data == path.read_bytes()
+    assert zstandard.ZstdDecompressor().decompress(response.data) == CATALOG
+
+
+def test_other_clients_get_the_content_decompressed(test_client, compressed_file):
+    hubfile, _ = compressed_file
+
+    response = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "deflate"})
+
+    assert "Content-Encoding" not in response.headers and "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["Content-Length"] == str(len(CATALOG)) and response.data == CATALOG
+    assert response.headers["Content-Disposition"] == 'attachment; filename="catalog.json"'
+
+
+def test_nginx_sends_the_frame_from_the_zstd_location(test_client, compressed_file, monkeypatch):
+    hubfile, _ = compressed_file
+    monkeypatch.setitem(test_client.application.config, "FILE_DELIVERY", "signed")
+    monkeypatch.setitem(test_client.application.config, "FILE_DELIVERY_SECRET", "s3cret")
+
+    response = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "zstd"})
+    assert response.headers["X-Accel-Redirect"] == f"/_protected_uploads_zstd/{hubfile.storage_path}"
+    assert response.data == b""
+
+    # nginx cannot decompress: without zstd the app sends the content
+    response = test_client.get(f"/file/download/{hubfile.id}")
+    assert "X-Accel-Redirect" not in response.headers and response.data == CATALOG
+
+
+def test_views_pages_and_zip_archives_read_the_content(test_client, compressed_file):
+    hubfile, _ = compressed_file
+
+    assert test_client.get(f"/file/view/{hubfile.id}").get_json()["content"] == CATALOG.decode()
+    page = test_client.get(f"/file/view/{hubfile.id}/items?offset=490&limit=20").get_json()
+    assert page["total"] == 500 and page["items"] == ITEMS[490:]
+
+    dataset_id = hubfile.feature_model.data_set_id
+    archive = zipfile.ZipFile(io.BytesIO(test_client.get(f"/dataset/download/{dataset_id}").data))
+    assert archive.read(f"dataset_{dataset_id}/catalog.json") == CATALOG
+
+
+def test_published_uploads_are_compressed_with_their_checksum_unchanged(
+    test_client, compressed_file, tmp_path, monkeypatch
+):
+    from flask_login import login_user
+
+    from app.modules.dataset.services import DataSetService, calculate_checksum_and_size
+
+    hubfile, path = compressed_file
+    monkeypatch.setitem(test_client.application.config, "FILE_STORAGE_COMPRESSION", "zstd")
+    with test_client.application.test_request_context():
+        user = User.query.filter_by(email="test@example.com").first()
+        login_user(user)
+        os.makedirs(user.temp_folder(), exist_ok=True)
+        with open(os.path.join(user.temp_folder(), "catalog.json"), "wb") as f:
+            f.write(CATALOG)
+        DataSetService().move_feature_models(hubfile.feature_model.data_set)
+
+    assert not os.path.exists(os.path.join(user.temp_folder(), "catalog.json"))
+    assert calculate_checksum_and_size(str(path)) == (hubfile.checksum, hubfile.size)
+    assert hubfile.blob_checksum == hubfile.checksum
@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+from app.modules.hubfile.item_index import NotAnArray, build_index, read_items, scan_items
+
+CATALOG = os.path.join(os.path.dirname(__file__), "..", "..", "dataset", "pc_examples", "case.json")
+
+
+def write(tmp_path, text, name="catalog.json"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_items_with_tricky_strings_and_nesting(tmp_path):
+    items = [
+        {"name": 'quote " and [brackets], {braces}', "tags": ["a", ["b", {"c": "d"}]]},
+        'back\\\\slash\\\\", "',
+        12.5,
+        None,
+        [],
+        {},
+        "ünicode ✓",
+    ]
+    path = write(tmp_path, "\n  " + json.dumps(items, indent=2, ensure_ascii=False) + "\n")
+
+    raw = open(path, "rb").read()
+    ranges = scan_items(path)
+    assert [json.loads(raw[ranges[i] : ranges[i + 1]]) for i in range(0, len(ranges), 2)] == items
+
+
+@pytest.mark.parametrize("text", ["", "   ", '{"items": [1, 2]}', '"[1, 2]"', "42"])
+def test_documents_that_are_not_arrays(tmp_path, text):
+    path = write(tmp_path, text)
+
+    with pytest.raises(NotAnArray):
+        scan_items(path)
+    with pytest.raises(NotAnArray):
+        read_items(path, str(tmp_path / "catalog.idx"), 0, 10)
+
+
+def test_pages_of_a_real_catalog(tmp_path):
+    data = json.load(open(CATALOG))
+    index_path = str(tmp_path / "index" / "case.idx")
+
+    for offset in (0, 50, 5000, len(data) - 7, len(data), len(data) + 100):
+        assert read_items(CATALOG, index_path, offset, 20) == (data[offset : offset + 20], len(data))
+    assert read_items(write(tmp_path, "[]", "empty.json"), str(tmp_path / "empty.idx"), 0, 10) == ([], 0)
+
+
+def test_index_is_built_once_and_rebuilt_when_the_catalog_changes(tmp_path, monkeypatch):
+    path = write(tmp_path, json.dumps(list(range(100))))
+    index_path = str(tmp_path / "catalog.idx")
+    assert build_index(path, index_path) == 100
+
+    monkeypatch.setattr("app.modules.hubfile.item_index.scan_items", lambda path: pytest.fail("rescanned"))
+    assert read_items(path, index_path, 95, 10) == (list(range(95, 100)), 100)
+    monkeypatch.undo()
+
+    write(tmp_path, json.dumps(["new", "catalog"]))
+    os.utime(path, ns=(10**9, 10**9))
+    assert read_items(path, index_path, 0, 10) == (["new", "catalog"], 2)
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64])
+def test_chunk_boundaries_do_not_change_the_ranges(tmp_path, monkeypatch, chunk):
+    text = json.dumps([{"name": 'cut "here", [or] {there}', "n": [1, 2]}, 12345.5, "s\\\\", True, [], {}], indent=1)
+    path = write(tmp_path, "\n " + text + " \n")
+    whole = scan_items(path)
+
+    monkeypatch.setattr("app.modules.hubfile.item_index._CHUNK", chunk)
+    assert scan_items(path) == whole and len(whole) == 12
+
+
+def test_pages_of_a_compressed_catalog_start_at_their_frame(tmp_path, monkeypatch):
+    from app.modules.hubfile import compression
+
+    data = json.load(open(CATALOG))
+    path = str(tmp_path / "case.json.zst")
+    compression.compress_file(CATALOG, path, frame_size=16 * 1024)
+    with open(path, "rb") as f:
+        assert len(compression.seek_table(f)) > 10
+
+    monkeypatch.setattr("app.modules.hubfile.item_index._CHUNK", 4096)
+    index_path = str(tmp_path / "case.idx")
+    assert build_index(path, index_path) == len(data)
+
+    decompressed = []
+    stream_reader = compression.zstandard.ZstdDecompressor.stream_reader
+
+    def counting_reader(self, source, *args, **kwargs):
+        decompressed.append(source.tell())
+        return stream_reader(self, source, *args, **kwargs)
+
+    monkeypatch.setattr(compression.zstandard.ZstdDecompressor, "stream_reader", counting_reader)
+    offset = len(data) - 30
+    assert read_items(path, index_path, offset, 20) == (data[offset : offset + 20], len(data))
+    # Decompression started near the page, not at byte 0
+    assert decompressed and decompressed[0] > os.path.getsize(path) // 2
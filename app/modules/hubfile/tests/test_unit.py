@@ -1,4 +1,18 @@
+import json
+import os
+import time
+from urllib.parse import parse_qsl, urlsplit
+
 import pytest
+from sqlalchemy import event
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.delivery import sign_link
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.storage import item_index_path
 
 
 @pytest.fixture(scope="module")
@@ -22,3 +36,147 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+@pytest.fixture()
+def stored_file(test_client, tmp_path, monkeypatch):
+    """A Hubfile of a new dataset, written under a temporary WORKING_DIR."""
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="stored", description="files", publication_type=PublicationType.OTHER, tags="")
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    fm_meta = FMMetaData(uvl_filename="model.json", title="m", description="fm", publication_type=PublicationType.OTHER)
+    db.session.add(fm_meta)
+    db.session.flush()
+    feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(feature_model)
+    db.session.flush()
+    hubfile = Hubfile(name="model.json", checksum="x", size=2, feature_model_id=feature_model.id)
+    db.session.add(hubfile)
+    db.session.commit()
+
+    folder = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+    folder.mkdir(parents=True)
+    (folder / "model.json").write_text("{}")
+    return hubfile, folder / "model.json"
+
+
+def resolve_counting_queries(hubfile):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        path = hubfile.get_path()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    return path, len(statements)
+
+
+def test_storage_path_is_stored_and_resolved_without_queries(stored_file):
+    hubfile, expected = stored_file
+    # Relative to <WORKING_DIR>/uploads
+    assert hubfile.storage_path == expected.relative_to(expected.parents[2]).as_posix()
+
+    db.session.refresh(hubfile)
+    assert resolve_counting_queries(hubfile) == (str(expected), 0)
+
+
+def test_files_stored_before_the_column_cost_one_query(stored_file):
+    hubfile, expected = stored_file
+    db.session.execute(Hubfile.__table__.update().where(Hubfile.id == hubfile.id).values(storage_path=None))
+    db.session.commit()
+
+    db.session.refresh(hubfile)
+    assert resolve_counting_queries(hubfile) == (str(expected), 1)
+
+
+def test_download_and_view_read_the_resolved_path(test_client, stored_file):
+    hubfile, _ = stored_file
+
+    response = test_client.get(f"/file/download/{hubfile.id}")
+    assert response.status_code == 200 and response.data == b"{}"
+    assert test_client.get(f"/file/view/{hubfile.id}").get_json() == {"success": True, "content": "{}"}
+
+
+def test_view_is_streamed_chunk_by_chunk(test_client, stored_file, monkeypatch):
+    hubfile, path = stored_file
+    text = json.dumps({"name": 'quoted "ünicode" ✓', "lines": "a\nb\\c"}, ensure_ascii=False) * 50
+    path.write_text(text, encoding="utf-8")
+    # Chunks cut the multibyte characters
+    monkeypatch.setattr("app.modules.hubfile.routes.CHUNK_SIZE", 7)
+
+    response = test_client.get(f"/file/view/{hubfile.id}", headers={"Accept-Encoding": "identity"})
+    assert response.is_streamed
+    assert response.get_json() == {"success": True, "content": text}
+
+
+def test_catalog_items_are_paged_from_the_index(test_client, stored_file):
+    hubfile, path = stored_file
+    path.write_text(json.dumps([{"name": f"part {i}", "price": i} for i in range(1234)], indent=4))
+
+    response = test_client.get(f"/file/view/{hubfile.id}/items?offset=1200&limit=50")
+    data = response.get_json()
+    assert response.status_code == 200 and (data["total"], data["offset"], data["limit"]) == (1234, 1200, 50)
+    assert [item["name"] for item in data["items"]] == [f"part {i}" for i in range(1200, 1234)]
+    assert os.path.exists(item_index_path(hubfile))
+
+    first = test_client.get(f"/file/view/{hubfile.id}/items").get_json()
+    assert len(first["items"]) == test_client.application.config["FILE_VIEW_PAGE_SIZE"]
+    assert test_client.get(f"/file/view/{hubfile.id}/items?limit=0").status_code == 400
+    assert test_client.get(f"/file/view/{hubfile.id}/items?offset=-1").status_code == 400
+
+
+def test_documents_that_are_not_catalogs_are_not_paged(test_client, stored_file):
+    hubfile, _ = stored_file
+
+    response = test_client.get(f"/file/view/{hubfile.id}/items")
+    assert response.status_code == 400 and response.get_json()["success"] is False
+
+
+def test_downloads_are_handed_over_to_nginx(test_client, stored_file, monkeypatch):
+    hubfile, _ = stored_file
+    monkeypatch.setitem(test_client.application.config, "FILE_DELIVERY", "nginx")
+
+    response = test_client.get(f"/file/download/{hubfile.id}")
+    assert response.status_code == 200 and response.data == b""
+    assert response.headers["X-Accel-Redirect"] == f"/_protected_uploads/{hubfile.storage_path}"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="model.json"'
+    assert response.headers["Content-Type"] == "application/json"
+    assert "file_download_cookie" in response.headers["Set-Cookie"]
+
+
+def test_signed_download_links(test_client, stored_file, monkeypatch):
+    hubfile, _ = stored_file
+    config = test_client.application.config
+    monkeypatch.setitem(config, "FILE_DELIVERY", "signed")
+
+    # Without a secret there is nothing to sign with: X-Accel-Redirect instead
+    assert "X-Accel-Redirect" in test_client.get(f"/file/download/{hubfile.id}").headers
+
+    monkeypatch.setitem(config, "FILE_DELIVERY_SECRET", "s3cret")
+    before = int(time.time())
+    response = test_client.get(f"/file/download/{hubfile.id}")
+    assert response.status_code == 302
+
+    link = urlsplit(response.headers["Location"])
+    args = dict(parse_qsl(link.query))
+    assert link.path == f"/_signed_uploads/{hubfile.storage_path}" and args["filename"] == "model.json"
+    assert before + config["FILE_DELIVERY_LINK_TTL"] <= int(args["expires"]) <= time.time() + 300
+    # What nginx's secure_link_md5 computes from the link
+    assert args["md5"] == sign_link(link.path, args["filename"], int(args["expires"]), "s3cret")
+    assert args["md5"] != sign_link(link.path, args["filename"], int(args["expires"]) + 1, "s3cret")
+
+
+def test_unknown_delivery_mode_is_an_error(test_client, stored_file, monkeypatch):
+    hubfile, _ = stored_file
+    monkeypatch.setitem(test_client.application.config, "FILE_DELIVERY", "carrier-pigeon")
+
+    with pytest.raises(ValueError):
+        test_client.get(f"/file/download/{hubfile.id}")
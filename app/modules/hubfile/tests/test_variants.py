@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+import os
+import uuid
+
+import brotli
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.blobs import collect_garbage, store
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.storage import hubfile_path, resolve_storage_path
+from app.modules.hubfile.variants import VIEW, variant_path
+
+
+@pytest.fixture()
+def catalog_file(test_client, tmp_path, monkeypatch):
+    """A Hubfile of a new dataset with a catalog no other test stores, under a temporary WORKING_DIR."""
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    content = json.dumps([{"name": f"Part {i}", "sku": str(uuid.uuid4())[:8], "price": i} for i in range(300)]).encode()
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(title="variants", description="files", publication_type=PublicationType.OTHER, tags="")
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    fm_meta = FMMetaData(
+        uvl_filename="catalog.json", title="c", description="fm", publication_type=PublicationType.OTHER
+    )
+    db.session.add(fm_meta)
+    db.session.flush()
+    feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(feature_model)
+    db.session.flush()
+    hubfile = Hubfile(
+        name="catalog.json",
+        checksum=hashlib.md5(content).hexdigest(),
+        size=len(content),
+        feature_model_id=feature_model.id,
+    )
+    db.session.add(hubfile)
+    db.session.commit()
+
+    path = hubfile_path(hubfile)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(content)
+    return hubfile, path, content
+
+
+def test_downloads_are_sent_in_the_preferred_accepted_encoding(test_client, catalog_file):
+    hubfile, _, content = catalog_file
+
+    br = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "gzip, deflate, br"})
+    gz = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "gzip, br;q=0.5"})
+    identity = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "deflate"})
+
+    assert br.headers["Content-Encoding"] == "br" and brotli.decompress(br.data) == content
+    assert gz.headers["Content-Encoding"] == "gzip" and gzip.decompress(gz.data) == content
+    assert "Content-Encoding" not in identity.headers and identity.data == content
+    for response in (br, gz, identity):
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert response.headers["Content-Type"] == "application/json"
+        assert response.headers["Content-Length"] == str(len(response.data))
+    assert len(br.data) < len(gz.data) < len(content)
+    assert len({br.headers["ETag"], gz.headers["ETag"], identity.headers["ETag"]}) == 3
+
+    revalidated = test_client.get(
+        f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "br", "If-None-Match": br.headers["ETag"]}
+    )
+    assert revalidated.status_code == 304
+
+
+def test_variants_are_made_once_and_again_when_the_file_changes(test_client, catalog_file):
+    hubfile, path, content = catalog_file
+    variant = variant_path(hubfile, "br")
+
+    test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "br"})
+    made = os.stat(variant).st_ino
+    test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "br"})
+    assert os.stat(variant).st_ino == made
+
+    changed = content.replace(b"Part 1", b"Part X")
+    with open(path, "wb") as f:
+        f.write(changed)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    response = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "br"})
+    assert os.stat(variant).st_ino != made and brotli.decompress(response.data) == changed
+    assert not os.path.exists(os.path.join(os.path.dirname(path), os.path.basename(variant)))
+
+
+def test_views_are_sent_compressed(test_client, catalog_file):
+    hubfile, _, content = catalog_file
+
+    response = test_client.get(f"/file/view/{hubfile.id}", headers={"Accept-Encoding": "gzip"})
+    identity = test_client.get(f"/file/view/{hubfile.id}")
+
+    assert response.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in response.headers["Vary"]
+    assert os.path.isfile(variant_path(hubfile, "gzip", kind=VIEW))
+    assert json.loads(gzip.decompress(response.data)) == {"success": True, "content": content.decode()}
+    assert identity.get_json()["content"] == content.decode() and identity.headers["ETag"] != response.headers["ETag"]
+
+
+def test_small_files_are_sent_as_they_are(test_client, catalog_file, monkeypatch):
+    hubfile, _, content = catalog_file
+    monkeypatch.setitem(test_client.application.config, "FILE_VARIANT_MIN_SIZE", len(content) + 1)
+
+    response = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "br, gzip"})
+
+    assert "Content-Encoding" not in response.headers and "Vary" not in response.headers
+    assert response.data == content and not os.path.exists(variant_path(hubfile, "br"))
+
+
+def test_nginx_sends_variants_from_their_location(test_client, catalog_file, monkeypatch):
+    hubfile, _, _ = catalog_file
+    monkeypatch.setitem(test_client.application.config, "FILE_DELIVERY", "nginx")
+
+    response = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "br"})
+
+    assert response.headers["X-Accel-Redirect"] == f"/_protected_uploads_br/variants/{resolve_storage_path(hubfile)}.br"
+    assert "Accept-Encoding" in response.headers["Vary"] and response.data == b""
+
+
+def test_blob_variants_are_shared_and_collected_with_the_blob(test_client, catalog_file):
+    from datetime import timedelta
+
+    hubfile, path, content = catalog_file
+    assert store(hubfile, path)
+    db.session.commit()
+
+    response = test_client.get(f"/file/download/{hubfile.id}", headers={"Accept-Encoding": "br"})
+    variant = variant_path(hubfile, "br")
+    assert f"/variants/blobs/{hubfile.checksum[:2]}/" in variant and brotli.decompress(response.data) == content
+
+    db.session.delete(hubfile)
+    db.session.commit()
+    os.remove(path)
+    assert collect_garbage(timedelta(seconds=-1))["removed"] >= 1
+    assert not os.path.exists(variant)
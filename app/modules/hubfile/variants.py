@@ -0,0 +1,120 @@
+"""Precompressed Brotli and gzip variants of dataset files and of their view responses.
+
+A variant is generated the first time a client that accepts its encoding asks for it, then served as is. Variants
+are kept in <uploads>/variants/, under the blob of the file (so identical files share them, see
+app.modules.hubfile.blobs) or else under its storage_path. Like item indexes, they live outside the dataset
+folders, which are archived and backed up whole. A variant of a file outside the blob store carries the mtime of
+the file it was made from and is made again when the file changes; blobs never change.
+"""
+
+import glob
+import gzip
+import os
+import uuid
+from typing import Callable, Iterable, Optional
+
+import brotli
+from flask import current_app, request
+
+from app.modules.hubfile.compression import open_stored
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.storage import resolve_storage_path, uploads_root
+
+# Encodings variants are made in, in order of preference, and their file suffixes
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+DOWNLOAD, VIEW = "download", "view"
+_CHUNK = 1024 * 1024
+
+
+class _BrotliWriter:
+    def __init__(self, sink, quality: int):
+        self.sink = sink
+        self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def write(self, data: bytes):
+        self.sink.write(self.compressor.process(data))
+
+    def close(self):
+        self.sink.write(self.compressor.finish())
+
+
+def variants_root() -> str:
+    return os.path.join(uploads_root(), "variants")
+
+
+def _key(hubfile: Hubfile) -> str:
+    if hubfile.blob_checksum:
+        return f"blobs/{hubfile.blob_checksum[:2]}/{hubfile.blob_checksum}"
+    return resolve_storage_path(hubfile)
+
+
+def variant_path(hubfile: Hubfile, encoding: str, kind: str = DOWNLOAD) -> str:
+    """Where the encoding variant of the file of hubfile (kind DOWNLOAD) or of its view response (VIEW) is kept."""
+    base = os.path.join(variants_root(), *_key(hubfile).split("/"))
+    return base + (".view.json" if kind == VIEW else "") + ENCODINGS[encoding]
+
+
+def remove_blob_variants(checksum: str):
+    for path in glob.glob(os.path.join(variants_root(), "blobs", checksum[:2], f"{checksum}.*")):
+        os.remove(path)
+
+
+def negotiate(offered: Iterable[str]) -> Optional[str]:
+    """The encoding of offered (in order of preference) the request accepts with the highest quality, or None
+    for identity."""
+    best, best_quality = None, 0
+    for encoding in offered:
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def offered_encodings(hubfile: Hubfile) -> list:
+    """Variant encodings worth offering for hubfile: none for files too small to gain from compression."""
+    return list(ENCODINGS) if hubfile.size >= current_app.config.get("FILE_VARIANT_MIN_SIZE", 1024) else []
+
+
+def encoded_variant(
+    hubfile: Hubfile,
+    path: str,
+    encoding: str,
+    kind: str = DOWNLOAD,
+    render: Optional[Callable[[], Iterable[bytes]]] = None,
+) -> str:
+    """Path of the encoding variant of the file of hubfile, stored at path, or of the body render() yields for
+    it. The variant is made now if it does not exist yet or its file changed since; it is renamed into place
+    once complete, so concurrent requests at worst make it twice."""
+    target = variant_path(hubfile, encoding, kind)
+    source = os.stat(path)
+    try:
+        made_from = os.stat(target).st_mtime_ns
+        if hubfile.blob_checksum or made_from == source.st_mtime_ns:
+            return target
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as sink:
+            if encoding == "br":
+                writer = _BrotliWriter(sink, current_app.config.get("FILE_VARIANT_BROTLI_QUALITY", 9))
+            else:
+                level = current_app.config.get("FILE_VARIANT_GZIP_LEVEL", 9)
+                writer = gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=level, mtime=0)
+            if render is not None:
+                for chunk in render():
+                    writer.write(chunk)
+            else:
+                with open_stored(path) as stream:
+                    for chunk in iter(lambda: stream.read(_CHUNK), b""):
+                        writer.write(chunk)
+            writer.close()
+        os.utime(tmp_path, ns=(source.st_atime_ns, source.st_mtime_ns))
+        os.replace(tmp_path, target)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return target
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+from app import db
+
+
+class SiteStats(db.Model):
+    """Single-row snapshot of the homepage counters, kept current with incremental updates."""
+
+    __tablename__ = "site_stats"
+
+    SNAPSHOT_ID = 1
+    COUNTERS = (
+        "datasets",
+        "feature_models",
+        "dataset_downloads",
+        "feature_model_downloads",
+        "dataset_views",
+        "feature_model_views",
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    datasets = db.Column(db.BigInteger, nullable=False, default=0)
+    feature_models = db.Column(db.BigInteger, nullable=False, default=0)
+    dataset_downloads = db.Column(db.BigInteger, nullable=False, default=0)
+    feature_model_downloads = db.Column(db.BigInteger, nullable=False, default=0)
+    dataset_views = db.Column(db.BigInteger, nullable=False, default=0)
+    feature_model_views = db.Column(db.BigInteger, nullable=False, default=0)
+    rebuilt_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {counter: getattr(self, counter) for counter in self.COUNTERS}
+
+    def __repr__(self):
+        return f"SiteStats<{self.to_dict()}>"
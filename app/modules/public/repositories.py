@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.public.models import SiteStats
+from core.repositories.BaseRepository import BaseRepository
+
+
+class SiteStatsRepository(BaseRepository):
+    def __init__(self, session=None):
+        super().__init__(SiteStats)
+        if session is not None:
+            self.session = session
+
+    def get_snapshot(self) -> Optional[Dict[str, int]]:
+        row = self.session.execute(
+            select(*[getattr(SiteStats, counter) for counter in SiteStats.COUNTERS]).where(
+                SiteStats.id == SiteStats.SNAPSHOT_ID
+            )
+        ).first()
+        return dict(row._mapping) if row else None
+
+    def increment(self, deltas: Dict[str, int], commit: bool = True) -> int:
+        """Add deltas to the snapshot counters with one UPDATE. A missing snapshot is left for rebuild()."""
+        values = {
+            counter: getattr(SiteStats, counter) + delta
+            for counter, delta in deltas.items()
+            if delta and counter in SiteStats.COUNTERS
+        }
+        if not values:
+            return 0
+        result = self.session.execute(update(SiteStats).where(SiteStats.id == SiteStats.SNAPSHOT_ID).values(**values))
+        if commit:
+            self.session.commit()
+        return result.rowcount
+
+    def compute(self) -> Dict[str, int]:
+        """Exact counters from the source tables."""
+
+        def count(model):
+            return self.session.execute(select(func.count()).select_from(model)).scalar_one()
+
+        datasets = self.session.execute(
+            select(func.count(DataSet.id)).join(DSMetaData).where(DSMetaData.dataset_doi.isnot(None))
+        ).scalar_one()
+        return {
+            "datasets": datasets,
+            "feature_models": count(FeatureModel),
+            "dataset_downloads": count(DSDownloadRecord),
+            "feature_model_downloads": count(HubfileDownloadRecord),
+            "dataset_views": count(DSViewRecord),
+            "feature_model_views": count(HubfileViewRecord),
+        }
+
+    def rebuild(self, commit: bool = True) -> Dict[str, int]:
+        counters = self.compute()
+        self.session.execute(delete(SiteStats).where(SiteStats.id == SiteStats.SNAPSHOT_ID))
+        self.session.execute(
+            insert(SiteStats).values(id=SiteStats.SNAPSHOT_ID, rebuilt_at=datetime.now(timezone.utc), **counters)
+        )
+        if commit:
+            self.session.commit()
+        return counters
@@ -2,9 +2,8 @@ import logging
 
 from flask import render_template
 
-from app.modules.dataset.services import DataSetService
-from app.modules.featuremodel.services import FeatureModelService
 from app.modules.public import public_bp
+from app.modules.public.services import SiteStatsService
 
 logger = logging.getLogger(__name__)
 
@@ -36,32 +35,18 @@ def index():
     se renderiza en el widget de la sidebar derecha.
     """
     logger.info("Access index")
-    dataset_service = DataSetService()
-    feature_model_service = FeatureModelService()
-
-    # Statistics: total datasets and feature models
-    datasets_counter = dataset_service.count_synchronized_datasets()
-    feature_models_counter = feature_model_service.count_feature_models()
-
-    # Statistics: total downloads
-    total_dataset_downloads = dataset_service.total_dataset_downloads()
-    total_feature_model_downloads = feature_model_service.total_feature_model_downloads()
-
-    # Statistics: total views
-    total_dataset_views = dataset_service.total_dataset_views()
-    total_feature_model_views = feature_model_service.total_feature_model_views()
-
-    # WI101: Trending datasets - top downloads last week
-    trending_datasets = dataset_service.trending_datasets_last_week()
+    # Counters come from the SiteStats snapshot (one row); trending and latest lists from its cache
+    snapshot = SiteStatsService().snapshot()
+    counters = snapshot["counters"]
 
     return render_template(
         "public/index.html",
-        datasets=dataset_service.latest_synchronized(),
-        trending_datasets=trending_datasets,
-        datasets_counter=datasets_counter,
-        feature_models_counter=feature_models_counter,
-        total_dataset_downloads=total_dataset_downloads,
-        total_feature_model_downloads=total_feature_model_downloads,
-        total_dataset_views=total_dataset_views,
-        total_feature_model_views=total_feature_model_views,
+        datasets=snapshot["datasets"],
+        trending_datasets=snapshot["trending_datasets"],
+        datasets_counter=counters["datasets"],
+        feature_models_counter=counters["feature_models"],
+        total_dataset_downloads=counters["dataset_downloads"],
+        total_feature_model_downloads=counters["feature_model_downloads"],
+        total_dataset_views=counters["dataset_views"],
+        total_feature_model_views=counters["feature_model_views"],
     )
@@ -0,0 +1,168 @@
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from cachelib import SimpleCache
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.modules.dataset.models import Author, DataSet, DSDownloadRecord, DSMetaData, DSViewRecord
+from app.modules.dataset.repositories import dataset_load_options
+from app.modules.dataset.services import DataSetService
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.public.repositories import SiteStatsRepository
+from core.services.BaseService import BaseService
+
+logger = logging.getLogger(__name__)
+
+# Process-local cache of the homepage lists; every worker keeps its own copy for at most SITE_STATS_CACHE_TTL
+_lists_cache = SimpleCache(threshold=64)
+
+_DELTAS_KEY = "site_stats_deltas"
+_INVALIDATE_KEY = "site_stats_invalidate"
+
+# Each new record adds one to its counter (and each deleted one subtracts one)
+_RECORD_COUNTERS = {
+    DSDownloadRecord: "dataset_downloads",
+    DSViewRecord: "dataset_views",
+    HubfileDownloadRecord: "feature_model_downloads",
+    HubfileViewRecord: "feature_model_views",
+    FeatureModel: "feature_models",
+}
+
+
+class SiteStatsService(BaseService):
+    """Homepage data from one snapshot read plus a time-bounded cache of the trending and latest lists."""
+
+    LATEST_LIMIT = 5
+    TRENDING_LIMIT = 3
+
+    def __init__(self):
+        super().__init__(SiteStatsRepository())
+        self.dataset_service = DataSetService()
+
+    @staticmethod
+    def _ttl() -> int:
+        return current_app.config.get("SITE_STATS_CACHE_TTL", 300)
+
+    def counters(self) -> dict:
+        snapshot = self.repository.get_snapshot()
+        if snapshot is None:
+            snapshot = self.rebuild()
+        return snapshot
+
+    def trending(self, limit: int = TRENDING_LIMIT) -> list:
+        # Keyed by week so the list rolls over on Monday even if the TTL has not expired yet
+        now = datetime.now(timezone.utc)
+        week_start = (now - timedelta(days=now.weekday())).date().isoformat()
+        key = f"trending:{week_start}:{limit}"
+        trending = _lists_cache.get(key)
+        if trending is None:
+            trending = self.dataset_service.trending_datasets_last_week(limit=limit)
+            _lists_cache.set(key, trending, timeout=self._ttl())
+        return trending
+
+    def latest(self) -> list:
+        """Latest synchronized datasets. Only their ids are cached; the rows are loaded in one query."""
+        ids = _lists_cache.get("latest")
+        if ids is None:
+            ids = [dataset.id for dataset in self.dataset_service.latest_synchronized()]
+            _lists_cache.set("latest", ids, timeout=self._ttl())
+        if not ids:
+            return []
+        datasets = DataSet.query.options(*dataset_load_options("detail")).filter(DataSet.id.in_(ids)).all()
+        by_id = {dataset.id: dataset for dataset in datasets}
+        return [by_id[dataset_id] for dataset_id in ids if dataset_id in by_id]
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": self.counters(),
+            "trending_datasets": self.trending(),
+            "datasets": self.latest(),
+        }
+
+    def rebuild(self) -> dict:
+        """Recompute the counters from the source tables and drop the cached lists."""
+        try:
+            counters = self.repository.rebuild()
+        except IntegrityError:
+            # Another worker rebuilt the snapshot at the same time; use theirs
+            self.repository.session.rollback()
+            counters = self.repository.get_snapshot()
+        self.invalidate()
+        return counters
+
+    @staticmethod
+    def invalidate():
+        """Drop the cached homepage lists of this process. Called after commits that change them."""
+        _lists_cache.clear()
+
+
+def _has_doi(session, dataset: DataSet) -> bool:
+    meta = dataset.ds_meta_data or session.get(DSMetaData, dataset.ds_meta_data_id)
+    return bool(meta and meta.dataset_doi)
+
+
+def _doi_toggled(meta: DSMetaData) -> int:
+    """+1 if the metadata just got a dataset DOI, -1 if it lost it, 0 otherwise."""
+    history = inspect(meta).attrs.dataset_doi.history
+    if not history.has_changes():
+        return 0
+    before = bool(history.deleted and history.deleted[0])
+    after = bool(history.added and history.added[0])
+    return int(after) - int(before)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_deltas(session, flush_context, instances):
+    """Turn pending ORM changes into counter deltas; they are applied right before commit."""
+    deltas = Counter()
+    invalidate = False
+    with session.no_autoflush:
+        for sign, objects in ((1, session.new), (-1, session.deleted)):
+            for obj in objects:
+                counter = _RECORD_COUNTERS.get(type(obj))
+                if counter:
+                    deltas[counter] += sign
+                    invalidate = invalidate or isinstance(obj, DSDownloadRecord)
+                elif isinstance(obj, DataSet):
+                    invalidate = True
+                    if _has_doi(session, obj):
+                        deltas["datasets"] += sign
+
+        new_metas = {dataset.ds_meta_data_id for dataset in session.new if isinstance(dataset, DataSet)}
+        for obj in session.dirty:
+            if isinstance(obj, (DataSet, DSMetaData, Author)):
+                invalidate = True
+            if isinstance(obj, DSMetaData) and obj.id not in new_metas:
+                toggled = _doi_toggled(obj)
+                if toggled and session.query(DataSet.id).filter_by(ds_meta_data_id=obj.id).first():
+                    deltas["datasets"] += toggled
+
+    if deltas:
+        session.info.setdefault(_DELTAS_KEY, Counter()).update(deltas)
+    if invalidate:
+        session.info[_INVALIDATE_KEY] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_deltas(session):
+    session.flush()
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas:
+        SiteStatsRepository(session).increment(deltas, commit=False)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    if session.info.pop(_INVALIDATE_KEY, False):
+        SiteStatsService.invalidate()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_deltas(session, previous_transaction):
+    session.info.pop(_DELTAS_KEY, None)
+    session.info.pop(_INVALIDATE_KEY, None)
@@ -0,0 +1,91 @@
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.events import get_event_pipeline
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.public.repositories import SiteStatsRepository
+from app.modules.public.services import SiteStatsService
+
+
+def create_dataset(title, doi=None):
+    user = User.query.filter_by(email="test@example.com").first()
+    meta = DSMetaData(
+        title=title, description="stats", publication_type=PublicationType.OTHER, dataset_doi=doi, tags="stats"
+    )
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    fm_meta = FMMetaData(
+        uvl_filename=f"{title}.uvl", title="fm", description="fm", publication_type=PublicationType.OTHER
+    )
+    db.session.add(fm_meta)
+    db.session.flush()
+    db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+    db.session.commit()
+    return dataset
+
+
+@pytest.fixture(scope="function")
+def stats(test_client):
+    service = SiteStatsService()
+    service.rebuild()
+    return service
+
+
+def test_counters_follow_writes_without_rebuild(test_client, stats):
+    before = stats.counters()
+
+    create_dataset("stats-synced", doi="10.1234/stats-synced")
+    unsynced = create_dataset("stats-unsynced")
+    pipeline = get_event_pipeline()
+    pipeline.record_dataset_download(dataset_id=unsynced.id, user_id=None, cookie="stats-1")
+    pipeline.record_dataset_view(dataset_id=unsynced.id, user_id=None, cookie="stats-1")
+
+    after = stats.counters()
+    assert after["datasets"] == before["datasets"] + 1
+    assert after["feature_models"] == before["feature_models"] + 2
+    assert after["dataset_downloads"] == before["dataset_downloads"] + 1
+    assert after["dataset_views"] == before["dataset_views"] + 1
+
+    # Synchronizing a dataset later counts it too; incremental values match a full recount
+    unsynced.ds_meta_data.dataset_doi = "10.1234/stats-unsynced"
+    db.session.commit()
+    assert stats.counters()["datasets"] == before["datasets"] + 2
+    assert stats.counters() == SiteStatsRepository().compute()
+
+
+def test_rolled_back_changes_are_not_counted(test_client, stats):
+    before = stats.counters()
+
+    dataset = create_dataset("stats-rollback")
+    dataset.ds_meta_data.dataset_doi = "10.1234/stats-rollback"
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    assert stats.counters()["datasets"] == before["datasets"]
+    assert stats.counters() == SiteStatsRepository().compute()
+
+
+def test_latest_list_is_cached_until_invalidated(test_client, stats):
+    first = create_dataset("stats-latest-1", doi="10.1234/stats-latest-1")
+    assert stats.latest()[0].id == first.id
+
+    # Committing a dataset invalidates the cached list
+    second = create_dataset("stats-latest-2", doi="10.1234/stats-latest-2")
+    assert stats.latest()[0].id == second.id
+
+
+def test_homepage_renders_snapshot(test_client, stats):
+    create_dataset("stats-homepage", doi="10.1234/stats-homepage")
+    counters = stats.counters()
+
+    response = test_client.get("/")
+
+    assert response.status_code == 200
+    assert f"{counters['datasets']} datasets" in response.get_data(as_text=True)
+    assert b"stats-homepage" in response.data
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def run_deposition(dataset_id: int) -> dict:
+    """Deposit a dataset on Zenodo: create the deposition, upload its files concurrently, publish it and
+    store the DOI. Progress is written to its DepositionJob row after every step; returns that row."""
+    from app.modules.dataset.services import DataSetService
+    from app.modules.zenodo.models import DepositionJob
+    from app.modules.zenodo.repositories import DepositionJobRepository
+    from app.modules.zenodo.services import ZenodoService
+
+    jobs = DepositionJobRepository()
+    dataset_service = DataSetService()
+    zenodo_service = ZenodoService()
+
+    job = jobs.get_by_dataset(dataset_id) or jobs.reset(dataset_id)
+    dataset = dataset_service.get_by_id(dataset_id)
+
+    def advance(**changes):
+        for key, value in changes.items():
+            setattr(job, key, value)
+        jobs.session.commit()
+
+    try:
+        if dataset is None:
+            raise LookupError(f"Dataset {dataset_id} does not exist")
+
+        advance(state=DepositionJob.CREATING, files_total=len(dataset.feature_models))
+        deposition = zenodo_service.create_new_deposition(dataset)
+        deposition_id = deposition.get("id")
+        if not deposition.get("conceptrecid"):
+            raise RuntimeError(f"Zenodo did not return a conceptrecid: {deposition}")
+        dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
+
+        advance(state=DepositionJob.UPLOADING, deposition_id=deposition_id)
+        zenodo_service.upload_files(
+            dataset, deposition_id, dataset.user_id, on_uploaded=lambda uploaded: advance(files_uploaded=uploaded)
+        )
+
+        advance(state=DepositionJob.PUBLISHING)
+        published = zenodo_service.publish_deposition(deposition_id)
+        doi = published.get("doi") or zenodo_service.get_doi(deposition_id)
+        dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=doi)
+        advance(state=DepositionJob.DONE, doi=doi)
+    except Exception as exc:
+        logger.exception(f"Zenodo deposition of dataset {dataset_id} failed: {exc}")
+        jobs.session.rollback()
+        advance(state=DepositionJob.FAILED, error=str(exc))
+
+    return job.to_dict()
+
+
+def deposition_job(dataset_id: int) -> dict:
+    """RQ job entry point: run a deposition from a worker process."""
+    import app
+
+    with app.app.app_context():
+        return run_deposition(dataset_id)
+
+
+class DepositionQueue:
+    """Runs Zenodo depositions off the request path.
+
+    Modes (ZENODO_JOB_MODE):
+      - "thread": a pool of ZENODO_JOB_WORKERS threads in the web process (default).
+      - "rq": each deposition is enqueued as an RQ job on REDIS_URL.
+      - "inline": run the deposition before returning, used by the test suite.
+    """
+
+    def __init__(self, flask_app, mode: str = "thread", workers: int = 2):
+        self.app = flask_app
+        self.mode = mode
+        self.workers = workers
+        self._rq_queue = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        if self.mode == "rq":
+            self._rq_queue = self._connect_rq()
+            if self._rq_queue is None:
+                self.mode = "thread"
+
+    def _connect_rq(self):
+        redis_url = self.app.config.get("REDIS_URL")
+        if not redis_url:
+            logger.warning("ZENODO_JOB_MODE=rq but REDIS_URL is not set; using the in-process pool")
+            return None
+        try:
+            from redis import Redis
+            from rq import Queue
+        except ImportError:
+            logger.warning("redis/rq are not installed; using the in-process pool")
+            return None
+        return Queue(self.app.config.get("ZENODO_RQ_QUEUE", "zenodo"), connection=Redis.from_url(redis_url))
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        # Created lazily and per process, so gunicorn workers forked after app creation get their own.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="zenodo-deposition")
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run_in_app(self, dataset_id: int) -> dict:
+        with self.app.app_context():
+            return run_deposition(dataset_id)
+
+    def enqueue(self, dataset_id: int) -> Optional[Future]:
+        """Queue the deposition of dataset_id, resetting its progress. Returns the Future in thread mode."""
+        from app.modules.zenodo.repositories import DepositionJobRepository
+
+        DepositionJobRepository().reset(dataset_id)
+
+        if self.mode == "inline":
+            run_deposition(dataset_id)
+            return None
+        if self._rq_queue is not None:
+            self._rq_queue.enqueue(
+                deposition_job, dataset_id, job_timeout=self.app.config.get("ZENODO_JOB_TIMEOUT", 3600)
+            )
+            return None
+        return self._ensure_executor().submit(self._run_in_app, dataset_id)
+
+
+def get_deposition_queue() -> DepositionQueue:
+    """Return the deposition queue bound to the current Flask app, creating it on first use."""
+    deposition_queue = current_app.extensions.get("zenodo_deposition_queue")
+    if deposition_queue is None:
+        config = current_app.config
+        deposition_queue = DepositionQueue(
+            current_app._get_current_object(),
+            mode=config.get("ZENODO_JOB_MODE", "thread"),
+            workers=config.get("ZENODO_JOB_WORKERS", 2),
+        )
+        current_app.extensions["zenodo_deposition_queue"] = deposition_queue
+    return deposition_queue
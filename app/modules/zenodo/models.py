@@ -1,5 +1,52 @@
+from datetime import datetime, timezone
+
 from app import db
 
 
 class Zenodo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+
+
+class DepositionJob(db.Model):
+    """Progress of the background job that deposits a dataset on Zenodo (one row per dataset)."""
+
+    __tablename__ = "zenodo_deposition_job"
+
+    QUEUED = "queued"
+    CREATING = "creating"
+    UPLOADING = "uploading"
+    PUBLISHING = "publishing"
+    DONE = "done"
+    FAILED = "failed"
+    FINISHED = (DONE, FAILED)
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey("data_set.id", ondelete="CASCADE"), nullable=False, unique=True)
+    state = db.Column(db.String(20), nullable=False, default=QUEUED)
+    deposition_id = db.Column(db.Integer)
+    files_total = db.Column(db.Integer, nullable=False, default=0)
+    files_uploaded = db.Column(db.Integer, nullable=False, default=0)
+    doi = db.Column(db.String(120))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def to_dict(self):
+        return {
+            "dataset_id": self.dataset_id,
+            "state": self.state,
+            "deposition_id": self.deposition_id,
+            "files_total": self.files_total,
+            "files_uploaded": self.files_uploaded,
+            "doi": self.doi,
+            "error": self.error,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f"DepositionJob<dataset={self.dataset_id}, state={self.state}>"
@@ -1,7 +1,30 @@
-from app.modules.zenodo.models import Zenodo
+from typing import Optional
+
+from app.modules.zenodo.models import DepositionJob, Zenodo
 from core.repositories.BaseRepository import BaseRepository
 
 
 class ZenodoRepository(BaseRepository):
     def __init__(self):
         super().__init__(Zenodo)
+
+
+class DepositionJobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(DepositionJob)
+
+    def get_by_dataset(self, dataset_id: int) -> Optional[DepositionJob]:
+        return self.model.query.filter_by(dataset_id=dataset_id).first()
+
+    def reset(self, dataset_id: int) -> DepositionJob:
+        """Queued job for dataset_id, reusing the row of a previous run if there is one."""
+        job = self.get_by_dataset(dataset_id) or DepositionJob(dataset_id=dataset_id)
+        job.state = DepositionJob.QUEUED
+        job.deposition_id = None
+        job.files_total = 0
+        job.files_uploaded = 0
+        job.doi = None
+        job.error = None
+        self.session.add(job)
+        self.session.commit()
+        return job
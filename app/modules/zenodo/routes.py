@@ -1,6 +1,9 @@
-from flask import render_template
+from flask import abort, jsonify, render_template
+from flask_login import current_user, login_required
 
+from app.modules.dataset.services import DataSetService
 from app.modules.zenodo import zenodo_bp
+from app.modules.zenodo.repositories import DepositionJobRepository
 from app.modules.zenodo.services import ZenodoService
 
 
@@ -13,3 +16,17 @@ def index():
 def zenodo_test() -> dict:
     service = ZenodoService()
     return service.test_full_connection()
+
+
+@zenodo_bp.route("/zenodo/deposition/<int:dataset_id>", methods=["GET"])
+@login_required
+def deposition_status(dataset_id):
+    """Progress of the background deposition of one of the current user's datasets."""
+    dataset = DataSetService().get_or_404(dataset_id)
+    if dataset.user_id != current_user.id:
+        abort(404)
+
+    job = DepositionJobRepository().get_by_dataset(dataset_id)
+    if job is None:
+        return jsonify({"message": "No deposition has been started for this dataset"}), 404
+    return jsonify(job.to_dict())
@@ -1,21 +1,70 @@
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Optional
 
 import requests
 from dotenv import load_dotenv
-from flask import Response, jsonify
+from flask import Response, current_app, jsonify
 from flask_login import current_user
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.compression import content_name, find_stored, open_stored
+from app.modules.hubfile.storage import dataset_dir
 from app.modules.zenodo.repositories import ZenodoRepository
-from core.configuration.configuration import uploads_folder_name
 from core.services.BaseService import BaseService
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+class ZenodoRetry(Retry):
+    """Retry of Zenodo API calls. Idempotent requests (GET, PUT, DELETE...) are retried on failed connections,
+    read errors and 429/502/503/504 answers. POST requests (create a deposition, upload a file, publish) are
+    only retried when Zenodo certainly did not act on them: the connection could not be opened, or a 429/503
+    answer carries Retry-After. A read timeout or a 502/504 may come after Zenodo created or published, so
+    retrying those could deposit or publish twice."""
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if self._is_method_retryable(method):
+            return super().is_retry(method, status_code, has_retry_after)
+        return bool(self.total and has_retry_after and status_code in (429, 503))
+
+
+def zenodo_session() -> requests.Session:
+    """Process-wide Session to Zenodo: keep-alive connections shared by every request and upload thread.
+
+    Failed calls are retried with exponential backoff (or after Retry-After) as ZenodoRetry allows. Created
+    lazily (and again after a fork) so gunicorn and rq workers never share sockets with their parent.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            config = current_app.config
+            retry = ZenodoRetry(
+                total=config.get("ZENODO_RETRIES", 3),
+                backoff_factor=config.get("ZENODO_BACKOFF", 0.5),
+                status_forcelist=(429, 502, 503, 504),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            pool_size = max(config.get("ZENODO_UPLOAD_WORKERS", 4), 1) * max(config.get("ZENODO_JOB_WORKERS", 2), 1)
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
 
 class ZenodoService(BaseService):
 
@@ -48,6 +97,11 @@ class ZenodoService(BaseService):
         self.headers = {"Content-Type": "application/json"}
         self.params = {"access_token": self.ZENODO_ACCESS_TOKEN}
 
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pooled session; every call gets a (connect, read) timeout."""
+        kwargs.setdefault("timeout", current_app.config.get("ZENODO_TIMEOUT", 60))
+        return zenodo_session().request(method, url, **kwargs)
+
     def test_connection(self) -> bool:
         """
         Test the connection with Zenodo.
@@ -55,7 +109,7 @@ class ZenodoService(BaseService):
         Returns:
             bool: True if the connection is successful, False otherwise.
         """
-        response = requests.get(self.ZENODO_API_URL, params=self.params, headers=self.headers)
+        response = self._request("GET", self.ZENODO_API_URL, params=self.params, headers=self.headers)
         return response.status_code == 200
 
     def test_full_connection(self) -> Response:
@@ -87,7 +141,7 @@ class ZenodoService(BaseService):
             }
         }
 
-        response = requests.post(self.ZENODO_API_URL, json=data, params=self.params, headers=self.headers)
+        response = self._request("POST", self.ZENODO_API_URL, json=data, params=self.params, headers=self.headers)
 
         if response.status_code != 201:
             return jsonify(
@@ -103,7 +157,7 @@ class ZenodoService(BaseService):
         data = {"name": "test_file.txt"}
         files = {"file": open(file_path, "rb")}
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files)
+        response = self._request("POST", publish_url, params=self.params, data=data, files=files)
         files["file"].close()  # Close the file after uploading
 
         logger.info(f"Publish URL: {publish_url}")
@@ -118,24 +172,55 @@ class ZenodoService(BaseService):
             success = False
 
         # Step 3: Delete the deposition
-        response = requests.delete(f"{self.ZENODO_API_URL}/{deposition_id}", params=self.params)
+        response = self._request("DELETE", f"{self.ZENODO_API_URL}/{deposition_id}", params=self.params)
 
         if os.path.exists(file_path):
             os.remove(file_path)
 
         return jsonify({"success": success, "messages": messages})
 
-    def get_all_depositions(self) -> dict:
+    def get_all_depositions(self) -> list:
         """
         Get all depositions from Zenodo.
 
         Returns:
-            dict: The response in JSON format with the depositions.
+            list: Every deposition, fetched page by page. Prefer iter_depositions for large accounts.
         """
-        response = requests.get(self.ZENODO_API_URL, params=self.params, headers=self.headers)
-        if response.status_code != 200:
-            raise Exception("Failed to get depositions")
-        return response.json()
+        return list(self.iter_depositions())
+
+    def iter_depositions(
+        self, q: Optional[str] = None, status: Optional[str] = None, page_size: Optional[int] = None
+    ) -> Iterator[dict]:
+        """
+        Iterate over the depositions in Zenodo, requesting the next page only when the previous one has been
+        consumed, so memory stays bounded by one page (ZENODO_PAGE_SIZE depositions by default).
+
+        Args:
+            q (str): Search query, as accepted by the Zenodo `q` parameter.
+            status (str): "draft" or "published".
+            page_size (int): Depositions requested per page.
+
+        Yields:
+            dict: Each deposition in JSON format.
+        """
+        size = page_size or current_app.config.get("ZENODO_PAGE_SIZE", 100)
+        params = {**self.params, "page": 1, "size": size}
+        if q:
+            params["q"] = q
+        if status:
+            params["status"] = status
+
+        while True:
+            response = self._request("GET", self.ZENODO_API_URL, params=params, headers=self.headers)
+            if response.status_code != 200:
+                raise Exception(f"Failed to get depositions (page {params['page']})")
+            depositions = response.json()
+            yield from depositions
+            # The last page is the one without rel="next" (or, without a Link header, a short page)
+            has_next = "next" in response.links if "Link" in response.headers else len(depositions) >= size
+            if not depositions or not has_next:
+                return
+            params["page"] += 1
 
     def create_new_deposition(self, dataset: DataSet) -> dict:
         """
@@ -177,7 +262,7 @@ class ZenodoService(BaseService):
 
         data = {"metadata": metadata}
 
-        response = requests.post(self.ZENODO_API_URL, params=self.params, json=data, headers=self.headers)
+        response = self._request("POST", self.ZENODO_API_URL, params=self.params, json=data, headers=self.headers)
         if response.status_code != 201:
             error_message = f"Failed to create deposition. Error details: {response.json()}"
             raise Exception(error_message)
@@ -195,19 +280,70 @@ class ZenodoService(BaseService):
         Returns:
             dict: The response in JSON format with the details of the uploaded file.
         """
-        uvl_filename = feature_model.fm_meta_data.uvl_filename
-        data = {"name": uvl_filename}
         user_id = current_user.id if user is None else user.id
-        file_path = os.path.join(uploads_folder_name(), f"user_{str(user_id)}", f"dataset_{dataset.id}/", uvl_filename)
-        files = {"file": open(file_path, "rb")}
+        return self._upload_path(deposition_id, self.feature_model_path(dataset, feature_model, user_id))
+
+    @staticmethod
+    def feature_model_path(dataset: DataSet, feature_model: FeatureModel, user_id: int) -> str:
+        return find_stored(os.path.join(dataset_dir(user_id, dataset.id), feature_model.fm_meta_data.uvl_filename))
 
+    def _upload_path(self, deposition_id: int, file_path: str) -> dict:
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files)
+        # Zenodo gets the catalog itself, decompressed if it is compressed at rest
+        name = content_name(file_path)
+        with open_stored(file_path) as file:
+            response = self._request(
+                "POST",
+                publish_url,
+                params=self.params,
+                data={"name": name},
+                files={"file": (name, file)},
+            )
         if response.status_code != 201:
             error_message = f"Failed to upload files. Error details: {response.json()}"
             raise Exception(error_message)
         return response.json()
 
+    def upload_files(
+        self,
+        dataset: DataSet,
+        deposition_id: int,
+        user_id: int,
+        on_uploaded: Optional[Callable[[int], None]] = None,
+    ) -> List[dict]:
+        """
+        Upload every feature model of a dataset concurrently (ZENODO_UPLOAD_WORKERS at a time).
+
+        Args:
+            on_uploaded: called from the calling thread with the number of files uploaded so far.
+
+        Returns:
+            list: The responses of the uploads, in completion order. The first failure is raised once
+            the uploads already running have finished.
+        """
+        # Paths are resolved here: the ORM objects are not touched from the upload threads
+        paths = [self.feature_model_path(dataset, fm, user_id) for fm in dataset.feature_models]
+        workers = max(1, min(current_app.config.get("ZENODO_UPLOAD_WORKERS", 4), len(paths) or 1))
+        results = []
+        flask_app = current_app._get_current_object()
+
+        def upload(path):
+            with flask_app.app_context():
+                return self._upload_path(deposition_id, path)
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zenodo-upload")
+        try:
+            futures = [executor.submit(upload, path) for path in paths]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if on_uploaded:
+                    on_uploaded(len(results))
+        except Exception:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+        return results
+
     def publish_deposition(self, deposition_id: int) -> dict:
         """
         Publish a deposition in Zenodo.
@@ -219,7 +355,7 @@ class ZenodoService(BaseService):
             dict: The response in JSON format with the details of the published deposition.
         """
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/actions/publish"
-        response = requests.post(publish_url, params=self.params, headers=self.headers)
+        response = self._request("POST", publish_url, params=self.params, headers=self.headers)
         if response.status_code != 202:
             raise Exception("Failed to publish deposition")
         return response.json()
@@ -235,7 +371,7 @@ class ZenodoService(BaseService):
             dict: The response in JSON format with the details of the deposition.
         """
         deposition_url = f"{self.ZENODO_API_URL}/{deposition_id}"
-        response = requests.get(deposition_url, params=self.params, headers=self.headers)
+        response = self._request("GET", deposition_url, params=self.params, headers=self.headers)
         if response.status_code != 200:
             raise Exception("Failed to get deposition")
         return response.json()
@@ -0,0 +1,211 @@
+import threading
+import time
+
+import pytest
+from werkzeug.serving import make_server
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.zenodo import services
+from app.modules.zenodo.jobs import DepositionQueue
+from app.modules.zenodo.models import DepositionJob
+from app.modules.zenodo.repositories import DepositionJobRepository
+from fakenodo import create_app as create_fakenodo
+from fakenodo.faults import FaultProfile
+from fakenodo.store import SQLiteStore
+
+
+class FlakyFiles:
+    """WSGI wrapper answering `status` to the first `failures` file uploads: by default 503 with Retry-After,
+    like an overloaded Zenodo."""
+
+    def __init__(self, app, failures=0):
+        self.app = app
+        self.failures = failures
+        self.status = "503 Service Unavailable"
+        self.headers = [("Retry-After", "0")]
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if environ["REQUEST_METHOD"] == "POST" and environ["PATH_INFO"].endswith("/files"):
+            with self.lock:
+                fail = self.failures > 0
+                self.failures -= int(fail)
+            if fail:
+                environ["wsgi.input"].read(int(environ.get("CONTENT_LENGTH") or 0))
+                start_response(self.status, [("Content-Type", "application/json")] + self.headers)
+                return [b'{"message": "try again"}']
+        return self.app(environ, start_response)
+
+
+@pytest.fixture(scope="function")
+def fakenodo(test_client, monkeypatch, tmp_path):
+    """A real fakenodo HTTP server on a free port, with ZenodoService pointed at it."""
+    fake_app = create_fakenodo(SQLiteStore(str(tmp_path / "fakenodo")))
+    wrapper = FlakyFiles(fake_app)
+    server = make_server("127.0.0.1", 0, wrapper, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("FAKENODO_URL", f"http://127.0.0.1:{server.server_port}/api/deposit/depositions")
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path))
+    monkeypatch.setitem(test_client.application.config, "ZENODO_BACKOFF", 0)
+    monkeypatch.setattr(services, "_session", None)
+
+    yield fake_app.config["FAKENODO_STORE"], wrapper, tmp_path
+
+    server.shutdown()
+    thread.join()
+    monkeypatch.setattr(services, "_session", None)
+
+
+def create_dataset(uploads, filenames, email="test@example.com"):
+    user = User.query.filter_by(email=email).first()
+    meta = DSMetaData(title="Deposited", description="zenodo job", publication_type=PublicationType.OTHER, tags="job")
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+    folder = uploads / f"user_{user.id}" / f"dataset_{dataset.id}"
+    folder.mkdir(parents=True)
+    for filename in filenames:
+        (folder / filename).write_text(f'[{{"name": "{filename}"}}]')
+        fm_meta = FMMetaData(
+            uvl_filename=filename, title=filename, description="fm", publication_type=PublicationType.OTHER
+        )
+        db.session.add(fm_meta)
+        db.session.flush()
+        db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+    db.session.commit()
+    return dataset, folder
+
+
+def test_deposition_runs_in_the_background_against_fakenodo(test_client, fakenodo):
+    store, _, uploads = fakenodo
+    dataset, _ = create_dataset(uploads, [f"part{i}.json" for i in range(5)])
+    queue = DepositionQueue(test_client.application, mode="thread", workers=1)
+
+    result = queue.enqueue(dataset.id).result(timeout=30)
+
+    assert result["state"] == DepositionJob.DONE
+    assert result["files_uploaded"] == result["files_total"] == 5
+    deposition = store.get_deposition(result["deposition_id"])
+    assert sorted(deposition["files"]) == [f"part{i}.json" for i in range(5)]
+    db.session.expire_all()
+    assert dataset.ds_meta_data.deposition_id == result["deposition_id"]
+    assert dataset.ds_meta_data.dataset_doi == deposition["doi"] == result["doi"]
+
+
+def test_transient_upload_errors_are_retried(test_client, fakenodo):
+    _, wrapper, uploads = fakenodo
+    wrapper.failures = 2
+    dataset, _ = create_dataset(uploads, ["a.json", "b.json"])
+
+    result = DepositionQueue(test_client.application, mode="inline").enqueue(dataset.id)
+
+    assert result is None
+    job = DepositionJobRepository().get_by_dataset(dataset.id)
+    assert job.state == DepositionJob.DONE and job.files_uploaded == 2
+    assert wrapper.failures == 0
+
+
+@pytest.mark.parametrize("status", ["502 Bad Gateway", "504 Gateway Timeout", "503 Service Unavailable"])
+def test_uploads_are_not_retried_when_zenodo_may_have_processed_them(test_client, fakenodo, status):
+    _, wrapper, uploads = fakenodo
+    wrapper.failures, wrapper.status, wrapper.headers = 1, status, []
+    dataset, _ = create_dataset(uploads, ["once.json"])
+
+    DepositionQueue(test_client.application, mode="inline").enqueue(dataset.id)
+
+    job = DepositionJobRepository().get_by_dataset(dataset.id)
+    assert job.state == DepositionJob.FAILED and job.files_uploaded == 0
+
+
+def test_rate_limited_uploads_wait_for_retry_after(test_client, fakenodo, monkeypatch):
+    _, wrapper, uploads = fakenodo
+    # Seeded so the first upload is answered 429 once and every other request goes through
+    wrapper.app.config["FAKENODO_PROFILE"] = FaultProfile(
+        {"endpoints": {"upload_file": {"rate_limit_rate": 0.3, "retry_after": 1}}}, seed=3
+    )
+    monkeypatch.setitem(test_client.application.config, "ZENODO_UPLOAD_WORKERS", 1)
+    dataset, _ = create_dataset(uploads, ["a.json", "b.json"])
+
+    start = time.monotonic()
+    DepositionQueue(test_client.application, mode="inline").enqueue(dataset.id)
+
+    job = DepositionJobRepository().get_by_dataset(dataset.id)
+    assert job.state == DepositionJob.DONE and job.files_uploaded == 2
+    # ZENODO_BACKOFF is 0 here: the wait comes from the Retry-After header
+    assert time.monotonic() - start >= 1
+
+
+def test_iter_depositions_follows_pages_lazily(test_client, fakenodo, monkeypatch):
+    store, _, _ = fakenodo
+    for i in range(23):
+        dep = store.create_deposition({"title": f"reconcile {i}" if i % 2 else f"other {i}"})
+        if i < 10:
+            store.publish(dep["id"])
+    pages = []
+    send = services.ZenodoService._request
+
+    def request(self, method, url, **kwargs):
+        pages.append(kwargs["params"]["page"])
+        return send(self, method, url, **kwargs)
+
+    monkeypatch.setattr(services.ZenodoService, "_request", request)
+    zenodo = services.ZenodoService()
+
+    depositions = zenodo.iter_depositions(page_size=10)
+    assert [next(depositions)["id"] for _ in range(10)] == list(range(1, 11))
+    assert pages == [1]
+    assert [dep["id"] for dep in depositions] == list(range(11, 24))
+    assert pages == [1, 2, 3]
+
+    assert len(zenodo.get_all_depositions()) == 23
+    matching = list(zenodo.iter_depositions(q="reconcile", status="draft", page_size=2))
+    assert [dep["metadata"]["title"] for dep in matching] == [f"reconcile {i}" for i in range(11, 23, 2)]
+
+
+def test_failed_deposition_is_reported(test_client, fakenodo):
+    _, _, uploads = fakenodo
+    dataset, folder = create_dataset(uploads, ["present.json", "missing.json"])
+    (folder / "missing.json").unlink()
+
+    DepositionQueue(test_client.application, mode="inline").enqueue(dataset.id)
+
+    job = DepositionJobRepository().get_by_dataset(dataset.id)
+    assert job.state == DepositionJob.FAILED
+    assert "missing.json" in job.error
+    assert job.files_total == 2 and job.files_uploaded < 2
+    db.session.expire_all()
+    assert dataset.ds_meta_data.dataset_doi is None
+
+
+def test_status_endpoint_reports_progress_to_the_owner(test_client, fakenodo):
+    _, _, uploads = fakenodo
+    dataset, _ = create_dataset(uploads, ["status.json"])
+
+    login(test_client, "test@example.com", "test1234")
+    try:
+        assert test_client.get(f"/zenodo/deposition/{dataset.id}").status_code == 404
+
+        DepositionQueue(test_client.application, mode="inline").enqueue(dataset.id)
+        response = test_client.get(f"/zenodo/deposition/{dataset.id}")
+        assert response.status_code == 200
+        assert response.get_json()["state"] == DepositionJob.DONE
+        assert response.get_json()["doi"].startswith("10.9999/fakenodo.")
+    finally:
+        logout(test_client)
+
+    other = User(email="other-zenodo@example.com", password="test1234")
+    db.session.add(other)
+    db.session.commit()
+    login(test_client, "other-zenodo@example.com", "test1234")
+    try:
+        assert test_client.get(f"/zenodo/deposition/{dataset.id}").status_code == 404
+    finally:
+        logout(test_client)
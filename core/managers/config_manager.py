@@ -52,6 +52,78 @@ class Config:
     SESSION_TYPE = os.getenv("SESSION_TYPE", "filesystem")
     SESSION_PERMANENT = os.getenv("SESSION_PERMANENT", "false").lower() == "true"
 
+    # Dataset ZIP cache (defaults to <uploads>/zip_cache, 1 GiB budget)
+    DATASET_ZIP_CACHE_DIR = os.getenv("DATASET_ZIP_CACHE_DIR")
+    DATASET_ZIP_CACHE_MAX_BYTES = int(os.getenv("DATASET_ZIP_CACHE_MAX_BYTES", str(1024**3)))
+
+    # Download/view event pipeline: "thread" (in-process flusher), "rq" (batches go to REDIS_URL) or "inline"
+    EVENT_PIPELINE_MODE = os.getenv("EVENT_PIPELINE_MODE", "thread")
+    EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "500"))
+    EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "2.0"))
+    # Flushes an event that failed to be written is retried on before it is dropped
+    EVENT_MAX_RETRIES = int(os.getenv("EVENT_MAX_RETRIES", "3"))
+    REDIS_URL = os.getenv("REDIS_URL")
+
+    # Dataset files at rest: "none" or "zstd" (new uploads stored as <name>.zst, compressed at FILE_STORAGE_ZSTD_LEVEL)
+    FILE_STORAGE_COMPRESSION = os.getenv("FILE_STORAGE_COMPRESSION", "none")
+    FILE_STORAGE_ZSTD_LEVEL = int(os.getenv("FILE_STORAGE_ZSTD_LEVEL", "9"))
+
+    # Brotli and gzip variants of file downloads and views, made once on first request (uploads/variants/);
+    # files smaller than FILE_VARIANT_MIN_SIZE bytes are always sent as they are
+    FILE_VARIANT_MIN_SIZE = int(os.getenv("FILE_VARIANT_MIN_SIZE", "1024"))
+    FILE_VARIANT_BROTLI_QUALITY = int(os.getenv("FILE_VARIANT_BROTLI_QUALITY", "9"))
+    FILE_VARIANT_GZIP_LEVEL = int(os.getenv("FILE_VARIANT_GZIP_LEVEL", "9"))
+
+    # Content store of dataset files: seconds a blob nothing references is kept after its last link (rosemary blobs:gc)
+    FILE_BLOB_GC_GRACE_SECONDS = int(os.getenv("FILE_BLOB_GC_GRACE_SECONDS", "3600"))
+
+    # File and cached ZIP downloads: "python" (sent by the app), "nginx" (X-Accel-Redirect to the internal
+    # location) or "signed" (redirect to an expiring secure_link URL); see app/modules/hubfile/delivery.py
+    FILE_DELIVERY = os.getenv("FILE_DELIVERY", "python")
+    FILE_DELIVERY_INTERNAL_LOCATION = os.getenv("FILE_DELIVERY_INTERNAL_LOCATION", "/_protected_uploads/")
+    FILE_DELIVERY_SIGNED_LOCATION = os.getenv("FILE_DELIVERY_SIGNED_LOCATION", "/_signed_uploads/")
+    FILE_DELIVERY_SECRET = os.getenv("FILE_DELIVERY_SECRET")
+    FILE_DELIVERY_LINK_TTL = int(os.getenv("FILE_DELIVERY_LINK_TTL", "300"))
+
+    # /explore POST: largest page a client may request and batch size of NDJSON streams
+    EXPLORE_MAX_PAGE_SIZE = int(os.getenv("EXPLORE_MAX_PAGE_SIZE", "100"))
+    EXPLORE_STREAM_PAGE_SIZE = int(os.getenv("EXPLORE_STREAM_PAGE_SIZE", "100"))
+
+    # Comment pages (dataset view and /comment/api): default and largest page size
+    COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "20"))
+    COMMENTS_MAX_PAGE_SIZE = int(os.getenv("COMMENTS_MAX_PAGE_SIZE", "100"))
+
+    # Catalog viewer (/file/view/<id>/items): default and largest number of items per page
+    FILE_VIEW_PAGE_SIZE = int(os.getenv("FILE_VIEW_PAGE_SIZE", "50"))
+    FILE_VIEW_MAX_PAGE_SIZE = int(os.getenv("FILE_VIEW_MAX_PAGE_SIZE", "500"))
+
+    # Resumable catalog uploads: chunk size handed to clients, largest accepted file and how long an
+    # unfinished upload is kept (files up to one chunk keep using the single-request dropzone upload)
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024**2)))
+    UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(1024**3)))
+    UPLOAD_RESUMABLE_TTL = int(os.getenv("UPLOAD_RESUMABLE_TTL", str(24 * 3600)))
+
+    # Zenodo deposition: "thread" (in-process job pool), "rq" (jobs go to REDIS_URL) or "inline"; concurrent
+    # file uploads per job, per-request timeout in seconds and retries (with backoff) of failed calls
+    ZENODO_JOB_MODE = os.getenv("ZENODO_JOB_MODE", "thread")
+    ZENODO_JOB_WORKERS = int(os.getenv("ZENODO_JOB_WORKERS", "2"))
+    ZENODO_JOB_TIMEOUT = int(os.getenv("ZENODO_JOB_TIMEOUT", "3600"))
+    ZENODO_UPLOAD_WORKERS = int(os.getenv("ZENODO_UPLOAD_WORKERS", "4"))
+    ZENODO_TIMEOUT = float(os.getenv("ZENODO_TIMEOUT", "60"))
+    ZENODO_RETRIES = int(os.getenv("ZENODO_RETRIES", "3"))
+    ZENODO_BACKOFF = float(os.getenv("ZENODO_BACKOFF", "0.5"))
+    ZENODO_PAGE_SIZE = int(os.getenv("ZENODO_PAGE_SIZE", "100"))
+
+    # GitHub backups: "thread" (in-process job pool), "rq" (jobs go to REDIS_URL) or "inline"; concurrent backups
+    # overall and per user, and seconds after which a running backup that stopped reporting progress is failed
+    GITHUB_BACKUP_MODE = os.getenv("GITHUB_BACKUP_MODE", "thread")
+    GITHUB_BACKUP_JOB_WORKERS = int(os.getenv("GITHUB_BACKUP_JOB_WORKERS", "2"))
+    GITHUB_BACKUP_PER_USER = int(os.getenv("GITHUB_BACKUP_PER_USER", "1"))
+    GITHUB_BACKUP_JOB_TIMEOUT = int(os.getenv("GITHUB_BACKUP_JOB_TIMEOUT", "3600"))
+
+    # Seconds the homepage trending/latest lists are cached per worker
+    SITE_STATS_CACHE_TTL = int(os.getenv("SITE_STATS_CACHE_TTL", "300"))
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -67,6 +139,9 @@ class TestingConfig(Config):
         f"{os.getenv('MARIADB_TEST_DATABASE', 'default_db')}"
     )
     WTF_CSRF_ENABLED = False
+    EVENT_PIPELINE_MODE = "inline"
+    ZENODO_JOB_MODE = "inline"
+    GITHUB_BACKUP_MODE = "inline"
 
 
 class ProductionConfig(Config):
@@ -1,5 +1,7 @@
 from typing import Generic, List, NoReturn, Optional, TypeVar, Union
 
+from sqlalchemy import insert
+
 import app
 
 T = TypeVar("T")
@@ -19,6 +21,15 @@ class BaseRepository(Generic[T]):
             self.session.flush()
         return instance
 
+    def bulk_insert(self, rows: List[dict], commit: bool = True) -> int:
+        """Insert many rows with a single executemany INSERT, bypassing the ORM unit of work."""
+        if not rows:
+            return 0
+        self.session.execute(insert(self.model), rows)
+        if commit:
+            self.session.commit()
+        return len(rows)
+
     def get_by_id(self, id: int) -> Optional[T]:
         instance: Optional[T] = self.model.query.get(id)
         return instance
@@ -1,33 +1,32 @@
 import os
+from typing import Optional
 
 from flask import Flask
 
+from .faults import FaultProfile
+from .store import SQLiteStore, Store
 
-def create_app() -> Flask:
+
+def create_app(store: Optional[Store] = None, profile: Optional[FaultProfile] = None) -> Flask:
     app = Flask(__name__)
 
-    # Almacenamiento simple en memoria para depósitos de datos.
-    # Estructura:
-    # depositions = {
-    #   id: {
-    #       'id': int,
-    #       'conceptrecid': int,
-    #       'metadata': dict,
-    #       'files': {filename: checksum(str)},
-    #       'published_versions': [
-    #           {
-    #               'version': int,
-    #               'doi': str,
-    #               'files_snapshot': {filename: checksum}
-    #           }
-    #       ]
-    #   }
-    # }
-    app.config.setdefault("FAKENODO_STATE", {"next_id": 1, "depositions": {}})
+    # Almacenamiento de los depósitos (ver fakenodo.store). Por defecto SQLite y blobs en disco dentro
+    # de FAKENODO_DATA_DIR, que se conservan entre reinicios; sin FAKENODO_DATA_DIR se usa un directorio
+    # temporal nuevo en cada arranque.
+    if store is None:
+        data_dir = os.getenv("FAKENODO_DATA_DIR")
+        store = SQLiteStore(data_dir) if data_dir else SQLiteStore.temporary()
+    app.config["FAKENODO_STORE"] = store
+
+    # Perfil de latencias y fallos (ver fakenodo.faults): FAKENODO_PROFILE con el nombre de un perfil
+    # predefinido o su JSON, o FAKENODO_PROFILE_FILE; se puede cambiar en marcha en /_admin/profile
+    app.config["FAKENODO_PROFILE"] = profile or FaultProfile.from_env()
 
+    from .routes import admin_bp
     from .routes import bp as api_bp
 
     app.register_blueprint(api_bp, url_prefix="/api")
+    app.register_blueprint(admin_bp, url_prefix="/_admin")
 
     @app.get("/")
     def index():
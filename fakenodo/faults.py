@@ -0,0 +1,239 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+# Endpoints a los que se puede aplicar un perfil: los nombres de las vistas de fakenodo.routes.
+# "*" se aplica a todas y cada endpoint puede sobrescribir sus claves.
+ENDPOINTS = (
+    "list_depositions",
+    "create_deposition",
+    "get_deposition",
+    "update_deposition",
+    "delete_deposition",
+    "upload_file",
+    "list_files",
+    "download_file",
+    "publish_deposition",
+    "list_versions",
+)
+
+RULE_KEYS = {"latency", "error_rate", "error_status", "rate_limit_rate", "retry_after"}
+
+# Distribuciones de latencia (en milisegundos) y sus parámetros obligatorios
+DISTRIBUTIONS = {
+    "fixed": ("ms",),
+    "uniform": ("min_ms", "max_ms"),
+    "normal": ("mean_ms", "stddev_ms"),
+    "lognormal": ("median_ms", "sigma"),
+}
+
+# Perfiles predefinidos, seleccionables por nombre con FAKENODO_PROFILE o desde el endpoint de administración
+PRESETS = {
+    "none": {},
+    "slow": {
+        "endpoints": {
+            "*": {"latency": {"distribution": "lognormal", "median_ms": 150, "sigma": 0.6}},
+            "upload_file": {"latency": {"distribution": "lognormal", "median_ms": 400, "sigma": 0.8}},
+            "publish_deposition": {"latency": {"distribution": "uniform", "min_ms": 500, "max_ms": 1500}},
+        },
+        "upload_bytes_per_second": 512 * 1024,
+    },
+    "flaky": {
+        "endpoints": {
+            "*": {
+                "latency": {"distribution": "normal", "mean_ms": 50, "stddev_ms": 20},
+                "error_rate": 0.1,
+                "error_status": 503,
+            },
+        },
+    },
+    "rate-limited": {
+        "endpoints": {
+            "*": {"latency": {"distribution": "fixed", "ms": 20}, "rate_limit_rate": 0.2, "retry_after": 1},
+        },
+    },
+    "degraded": {
+        "endpoints": {
+            "*": {
+                "latency": {"distribution": "lognormal", "median_ms": 200, "sigma": 0.8},
+                "error_rate": 0.05,
+                "error_status": 502,
+                "rate_limit_rate": 0.05,
+                "retry_after": 2,
+            },
+        },
+        "upload_bytes_per_second": 256 * 1024,
+    },
+}
+
+
+class Fault:
+    """Respuesta inyectada en lugar de la del endpoint."""
+
+    def __init__(self, status: int, message: str, headers: Optional[dict] = None):
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class ThrottledStream:
+    """Envuelve wsgi.input para que el cuerpo de la petición no se lea más rápido que bytes_per_second."""
+
+    def __init__(self, stream, bytes_per_second: int):
+        self.stream = stream
+        self.bytes_per_second = bytes_per_second
+        # Lecturas pequeñas para que el ritmo sea uniforme y no a saltos de un bloque entero
+        self.max_read = max(1024, bytes_per_second // 10)
+        self.started = None
+        self.received = 0
+
+    def _throttle(self, data: bytes) -> bytes:
+        if self.started is None:
+            self.started = time.monotonic()
+        self.received += len(data)
+        ahead = self.received / self.bytes_per_second - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+        return data
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.max_read:
+            size = self.max_read
+        return self._throttle(self.stream.read(size))
+
+    def readline(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.max_read:
+            size = self.max_read
+        return self._throttle(self.stream.readline(size))
+
+
+class FaultProfile:
+    """Latencias, errores, respuestas 429 y límite de ancho de banda de subida que fakenodo aplica a cada petición.
+
+    Un perfil es un diccionario con:
+      - "endpoints": reglas por endpoint (ver ENDPOINTS, "*" para todos) con "latency" ({"distribution": ...}
+        y sus parámetros en ms), "error_rate" y "error_status" (500 por defecto), "rate_limit_rate" y
+        "retry_after" (segundos de la cabecera Retry-After de las respuestas 429).
+      - "upload_bytes_per_second": ritmo máximo al que se lee cada fichero subido.
+    Los valores inválidos lanzan ValueError.
+    """
+
+    def __init__(self, spec: Optional[dict] = None, name: Optional[str] = None, seed: Optional[int] = None):
+        self.spec = self._validate(spec or {})
+        self.name = name or "custom"
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._rules = {endpoint: self._merge(endpoint) for endpoint in ENDPOINTS}
+
+    @classmethod
+    def load(cls, profile, seed: Optional[int] = None) -> "FaultProfile":
+        """Perfil a partir del nombre de un perfil predefinido, de su JSON o de un diccionario."""
+        if isinstance(profile, str):
+            if profile in PRESETS:
+                return cls(PRESETS[profile], name=profile, seed=seed)
+            try:
+                profile = json.loads(profile)
+            except ValueError:
+                raise ValueError(f"Unknown profile {profile!r}; use one of {', '.join(PRESETS)} or a JSON object")
+        if not isinstance(profile, dict):
+            raise ValueError("A profile must be a JSON object")
+        return cls(profile, seed=seed)
+
+    @classmethod
+    def from_env(cls) -> "FaultProfile":
+        # FAKENODO_PROFILE: nombre de un perfil predefinido o JSON; FAKENODO_PROFILE_FILE: fichero JSON
+        seed = os.getenv("FAKENODO_SEED")
+        seed = int(seed) if seed else None
+        profile_file = os.getenv("FAKENODO_PROFILE_FILE")
+        if profile_file:
+            with open(profile_file) as fh:
+                return cls.load(json.load(fh), seed=seed)
+        return cls.load(os.getenv("FAKENODO_PROFILE") or "none", seed=seed)
+
+    @staticmethod
+    def _validate(spec: dict) -> dict:
+        unknown = set(spec) - {"endpoints", "upload_bytes_per_second"}
+        if unknown:
+            raise ValueError(f"Unknown profile keys: {', '.join(sorted(unknown))}")
+        bandwidth = spec.get("upload_bytes_per_second")
+        if bandwidth is not None and (not isinstance(bandwidth, (int, float)) or bandwidth <= 0):
+            raise ValueError("upload_bytes_per_second must be a positive number")
+
+        endpoints = spec.get("endpoints", {})
+        if not isinstance(endpoints, dict):
+            raise ValueError("endpoints must be an object")
+        for endpoint, rule in endpoints.items():
+            if endpoint != "*" and endpoint not in ENDPOINTS:
+                raise ValueError(f"Unknown endpoint {endpoint!r}")
+            if not isinstance(rule, dict) or set(rule) - RULE_KEYS:
+                raise ValueError(f"Invalid rule for {endpoint}: allowed keys are {', '.join(sorted(RULE_KEYS))}")
+            for key in ("error_rate", "rate_limit_rate"):
+                if not 0 <= rule.get(key, 0) <= 1:
+                    raise ValueError(f"{endpoint}.{key} must be between 0 and 1")
+            if rule.get("error_rate", 0) + rule.get("rate_limit_rate", 0) > 1:
+                raise ValueError(f"{endpoint}: error_rate + rate_limit_rate cannot exceed 1")
+            if not 400 <= rule.get("error_status", 500) <= 599:
+                raise ValueError(f"{endpoint}.error_status must be an HTTP error status")
+            if rule.get("retry_after", 1) < 0:
+                raise ValueError(f"{endpoint}.retry_after cannot be negative")
+            latency = rule.get("latency")
+            if latency is not None:
+                required = DISTRIBUTIONS.get(latency.get("distribution")) if isinstance(latency, dict) else None
+                if required is None:
+                    raise ValueError(f"{endpoint}.latency.distribution must be one of {', '.join(DISTRIBUTIONS)}")
+                missing = [param for param in required if not isinstance(latency.get(param), (int, float))]
+                if missing:
+                    raise ValueError(f"{endpoint}.latency needs {', '.join(missing)}")
+        return spec
+
+    def _merge(self, endpoint: str) -> dict:
+        endpoints = self.spec.get("endpoints", {})
+        return {**endpoints.get("*", {}), **endpoints.get(endpoint, {})}
+
+    @property
+    def upload_bytes_per_second(self) -> Optional[float]:
+        return self.spec.get("upload_bytes_per_second")
+
+    def _draw(self, method: str, *args) -> float:
+        # Las tiradas se serializan para que, con FAKENODO_SEED, la secuencia sea reproducible
+        with self._lock:
+            return getattr(self._random, method)(*args)
+
+    def latency(self, endpoint: str) -> float:
+        """Segundos de espera para una petición a endpoint, según su distribución."""
+        latency = self._rules[endpoint].get("latency")
+        if not latency:
+            return 0.0
+        distribution = latency["distribution"]
+        if distribution == "fixed":
+            ms = latency["ms"]
+        elif distribution == "uniform":
+            ms = self._draw("uniform", latency["min_ms"], latency["max_ms"])
+        elif distribution == "normal":
+            ms = self._draw("gauss", latency["mean_ms"], latency["stddev_ms"])
+        else:
+            ms = self._draw("lognormvariate", math.log(max(latency["median_ms"], 1e-3)), latency["sigma"])
+        return max(ms, 0) / 1000
+
+    def fault(self, endpoint: str) -> Optional[Fault]:
+        """La respuesta de error que sustituye a la de esta petición, o None si debe atenderse."""
+        rule = self._rules[endpoint]
+        rate_limit_rate = rule.get("rate_limit_rate", 0)
+        error_rate = rule.get("error_rate", 0)
+        if not rate_limit_rate and not error_rate:
+            return None
+        roll = self._draw("random")
+        if roll < rate_limit_rate:
+            retry_after = rule.get("retry_after", 1)
+            return Fault(429, "Too many requests", {"Retry-After": str(int(math.ceil(retry_after)))})
+        if roll < rate_limit_rate + error_rate:
+            return Fault(rule.get("error_status", 500), "Injected failure")
+        return None
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "seed": self.seed, "profile": self.spec, "presets": sorted(PRESETS)}
@@ -1,129 +1,159 @@
-import hashlib
 import os
-from copy import deepcopy
-from typing import Dict, Tuple
+import time
 
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, current_app, jsonify, request, send_file, url_for
+
+from .faults import FaultProfile, ThrottledStream
+from .store import CHUNK_SIZE, DepositionNotFound, Store
 
 bp = Blueprint("fakenodo_api", __name__)
+admin_bp = Blueprint("fakenodo_admin", __name__)
+
+# Tamaño de página del listado de depósitos, como en Zenodo
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+def _store() -> Store:
+    """Devuelve el almacenamiento del servicio (ver fakenodo.store)."""
+    return current_app.config["FAKENODO_STORE"]
+
+
+def _profile() -> FaultProfile:
+    """Devuelve el perfil de latencias y fallos activo (ver fakenodo.faults)."""
+    return current_app.config["FAKENODO_PROFILE"]
+
+
+@bp.before_request
+def inject_faults():
+    # Antes de atender la petición se aplica el perfil: latencia del endpoint, límite de ancho de banda
+    # al leer las subidas y, según sus probabilidades, un 429 con Retry-After o un error del servidor
+    profile = _profile()
+    endpoint = request.endpoint.rsplit(".", 1)[-1] if request.endpoint else None
+    if endpoint is None:
+        return None
 
+    delay = profile.latency(endpoint)
+    if delay:
+        time.sleep(delay)
+    if endpoint == "upload_file" and profile.upload_bytes_per_second:
+        request.environ["wsgi.input"] = ThrottledStream(request.environ["wsgi.input"], profile.upload_bytes_per_second)
 
-def _state():
-    """Devuelve el estado en memoria del servicio.
+    fault = profile.fault(endpoint)
+    if fault is None:
+        return None
+    # Se consume el cuerpo para que el cliente reciba la respuesta y no un error de conexión
+    while request.stream.read(CHUNK_SIZE):
+        pass
+    response = jsonify({"status": fault.status, "message": fault.message})
+    response.status_code = fault.status
+    response.headers.update(fault.headers)
+    return response
 
-    Estructura de datos:
-    {
-      "next_id": int,                       # Siguiente ID a asignar para un depósito
-      "depositions": {
-         <id>: {
-            "id": int,
-            "conceptrecid": int,           # Identificador de la familia de versiones (constante por depósito)
-            "metadata": dict,              # Metadatos del borrador/depósito
-            "files": { nombre: checksum }, # Ficheros del borrador con su checksum
-            "published_versions": [        # Historial de publicaciones (snapshot de ficheros)
-                { "version": int, "doi": str, "files_snapshot": { nombre: checksum } }
-            ],
-            "state": "draft"|"published",
-            "doi": str|None               # DOI de la última publicación (si existe)
-         }
-      }
-    }
-    """
-    return current_app.config["FAKENODO_STATE"]
 
+@bp.errorhandler(DepositionNotFound)
+def not_found(exc):
+    # Cualquier operación sobre un depósito que no existe devuelve 404
+    return jsonify({"message": "Not found"}), 404
 
-def _compute_checksum(file_bytes: bytes) -> str:
-    # Calcula un hash simple (MD5) del contenido del archivo para detectar cambios
 
-    return hashlib.md5(file_bytes).hexdigest()
+@admin_bp.get("/profile")
+def get_profile():
+    # Perfil de latencias y fallos activo
+    return jsonify(_profile().to_dict()), 200
 
 
-def _files_equal(a: Dict[str, str], b: Dict[str, str]) -> bool:
-    # Compara snapshots de ficheros (nombre -> checksum)
-    # Si son iguales, consideramos que no hay cambios de ficheros y, por tanto,
-    # publicar de nuevo NO debería generar nueva versión/DOI.
-    return a == b
+@admin_bp.put("/profile")
+def set_profile():
+    # Cambia el perfil sin reiniciar: {"profile": "<nombre predefinido>" | {...}, "seed": 42}
+    payload = request.get_json(silent=True) or {}
+    try:
+        seed = payload.get("seed")
+        profile = FaultProfile.load(payload.get("profile", "none"), seed=int(seed) if seed is not None else None)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"message": str(exc)}), 400
+    current_app.config["FAKENODO_PROFILE"] = profile
+    return jsonify(profile.to_dict()), 200
 
 
-def _ensure_dep(deposition_id: int) -> Tuple[dict, int]:
-    # Obtiene un depósito existente o devuelve 404 si no existe
-    dep = _state()["depositions"].get(deposition_id)
-    if not dep:
-        return None, 404
-    return dep, 200
+@admin_bp.delete("/profile")
+def reset_profile():
+    # Vuelve a atender las peticiones sin latencia ni fallos
+    current_app.config["FAKENODO_PROFILE"] = FaultProfile()
+    return jsonify(_profile().to_dict()), 200
 
 
 @bp.get("/deposit/depositions")
 def list_depositions():
-    # Lista todos los depósitos almacenados en memoria
-    deps = list(_state()["depositions"].values())
-    return jsonify(deps), 200
+    # Lista paginada como la de Zenodo: page (desde 1), size (DEFAULT_PAGE_SIZE, como mucho MAX_PAGE_SIZE),
+    # q (términos a buscar) y status (draft | published). Los enlaces a las páginas vecinas van en la
+    # cabecera Link; una página sin rel="next" es la última
+    try:
+        page = int(request.args.get("page", 1))
+        size = int(request.args.get("size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"status": 400, "message": "page and size must be integers"}), 400
+    status = request.args.get("status") or None
+    if page < 1 or not 1 <= size <= MAX_PAGE_SIZE:
+        return jsonify({"status": 400, "message": f"page must be >= 1 and size between 1 and {MAX_PAGE_SIZE}"}), 400
+    if status not in (None, "draft", "published"):
+        return jsonify({"status": 400, "message": "status must be draft or published"}), 400
+
+    # Se pide un depósito de más para saber si hay página siguiente sin contar todos
+    depositions = _store().list_depositions(
+        q=request.args.get("q"), status=status, offset=(page - 1) * size, limit=size + 1
+    )
+    links = {}
+    if len(depositions) > size:
+        links["next"] = page + 1
+    if page > 1:
+        links["prev"] = page - 1
+    response = jsonify(depositions[:size])
+    if links:
+        args = request.args.to_dict()
+        response.headers["Link"] = ", ".join(
+            f'<{url_for("fakenodo_api.list_depositions", _external=True, **{**args, "page": target, "size": size})}>; '
+            f'rel="{rel}"'
+            for rel, target in links.items()
+        )
+    return response, 200
 
 
 @bp.post("/deposit/depositions")
 def create_deposition():
     # Crea un nuevo depósito en estado borrador (draft)
-
     payload = request.get_json(silent=True) or {}
-    metadata = payload.get("metadata", {})
-
-    # ID autoincremental para el nuevo depósito
-    new_id = _state()["next_id"]
-    _state()["next_id"] += 1
-
-    deposition = {
-        "id": new_id,
-        "conceptrecid": new_id,
-        "metadata": metadata,
-        "files": {},
-        "published_versions": [],
-        "state": "draft",
-        "doi": None,
-    }
-    _state()["depositions"][new_id] = deposition
+    deposition = _store().create_deposition(payload.get("metadata", {}))
     return jsonify(deposition), 201
 
 
 @bp.get("/deposit/depositions/<int:deposition_id>")
 def get_deposition(deposition_id: int):
     # Obtiene un depósito por ID (404 si no existe)
-    dep, code = _ensure_dep(deposition_id)
-    if code != 200:
-        return jsonify({"message": "Not found"}), code
-    return jsonify(dep), 200
+    return jsonify(_store().get_deposition(deposition_id)), 200
 
 
 @bp.put("/deposit/depositions/<int:deposition_id>")
 def update_deposition(deposition_id: int):
     # Actualiza SOLO los metadatos del depósito para no crear nuevo DOI al publicar.
-
-    dep, code = _ensure_dep(deposition_id)
-    if code != 200:
-        return jsonify({"message": "Not found"}), code
     payload = request.get_json(silent=True) or {}
     metadata = payload.get("metadata")
     if isinstance(metadata, dict):
-        dep["metadata"] = metadata
-    return jsonify(dep), 200
+        return jsonify(_store().update_metadata(deposition_id, metadata)), 200
+    return jsonify(_store().get_deposition(deposition_id)), 200
 
 
 @bp.delete("/deposit/depositions/<int:deposition_id>")
 def delete_deposition(deposition_id: int):
-    # Elimina un depósito por ID (idempotente: 404 si no existe)
-    dep, code = _ensure_dep(deposition_id)
-    if code != 200:
-        return jsonify({"message": "Not found"}), code
-    del _state()["depositions"][deposition_id]
+    # Elimina un depósito por ID (404 si no existe)
+    _store().delete_deposition(deposition_id)
     return "", 204
 
 
 @bp.post("/deposit/depositions/<int:deposition_id>/files")
 def upload_file(deposition_id: int):
-    # Sube o actualiza un fichero en el borrador del depósito
-
-    dep, code = _ensure_dep(deposition_id)
-    if code != 200:
-        return jsonify({"message": "Not found"}), code
+    # Sube o actualiza un fichero en el borrador del depósito. El contenido se guarda por bloques
+    # mientras se calcula su checksum, sin leerlo entero en memoria
 
     # El nombre puede venir en 'name' o usar file.filename
     name = request.form.get("name")
@@ -131,10 +161,8 @@ def upload_file(deposition_id: int):
 
     # Camino normal: viene un fichero real en multipart/form-data
     if file:
-        file_bytes = file.read()
-        checksum = _compute_checksum(file_bytes)
         filename = name or getattr(file, "filename", None) or "uploaded"
-        dep["files"][filename] = checksum
+        stored = _store().add_file(deposition_id, filename, file.stream)
     else:
         # Fallback de robustez: aceptar una ruta local enviada como texto
         # (útil cuando algunas herramientas no adjuntan correctamente el "file" en multipart).
@@ -144,11 +172,9 @@ def upload_file(deposition_id: int):
             return jsonify({"message": "No file provided"}), 400
         try:
             with open(filepath, "rb") as fh:
-                file_bytes = fh.read()
-            checksum = _compute_checksum(file_bytes)
-            filename = name or os.path.basename(filepath) or "uploaded"
-            dep["files"][filename] = checksum
-        except Exception as exc:
+                filename = name or os.path.basename(filepath) or "uploaded"
+                stored = _store().add_file(deposition_id, filename, fh)
+        except OSError as exc:
             return (
                 jsonify(
                     {
@@ -162,8 +188,9 @@ def upload_file(deposition_id: int):
     return (
         jsonify(
             {
-                "filename": filename,
-                "checksum": checksum,
+                "filename": stored["filename"],
+                "checksum": stored["checksum"],
+                "filesize": stored["size"],
                 "deposition_id": deposition_id,
             }
         ),
@@ -171,51 +198,49 @@ def upload_file(deposition_id: int):
     )
 
 
+@bp.get("/deposit/depositions/<int:deposition_id>/files")
+def list_files(deposition_id: int):
+    # Lista los ficheros del borrador con su enlace de descarga, como Zenodo
+    files = [
+        {
+            "filename": stored["filename"],
+            "checksum": stored["checksum"],
+            "filesize": stored["size"],
+            "links": {
+                "download": url_for(
+                    "fakenodo_api.download_file",
+                    deposition_id=deposition_id,
+                    filename=stored["filename"],
+                    _external=True,
+                )
+            },
+        }
+        for stored in _store().list_files(deposition_id)
+    ]
+    return jsonify(files), 200
+
+
+@bp.get("/deposit/depositions/<int:deposition_id>/files/<path:filename>")
+def download_file(deposition_id: int, filename: str):
+    # Descarga el contenido guardado de un fichero del depósito
+    path = _store().file_path(deposition_id, filename)
+    if path is None or not os.path.exists(path):
+        return jsonify({"message": "Not found"}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(filename), conditional=True)
+
+
 @bp.post("/deposit/depositions/<int:deposition_id>/actions/publish")
 def publish_deposition(deposition_id: int):
-    # Publica el depósito
-    dep, code = _ensure_dep(deposition_id)
-    if code != 200:
-        return jsonify({"message": "Not found"}), code
-
-    current_files = deepcopy(dep["files"])
-    versions = dep["published_versions"]
-
-    if not versions:
-        # Primera publicación -> genera DOI v1
-        version_num = 1
-        doi = f"10.9999/fakenodo.{dep['conceptrecid']}.v{version_num}"
-        versions.append({"version": version_num, "doi": doi, "files_snapshot": current_files})
-        dep["doi"] = doi
-        dep["state"] = "published"
-        return jsonify(dep), 202
-
-    last = versions[-1]
-    if _files_equal(last["files_snapshot"], current_files):
-        # Sin cambios de ficheros -> mantener DOI/versión
-        dep["doi"] = last["doi"]
-        dep["state"] = "published"
-        return jsonify(dep), 202
-
-    # Con cambios de ficheros -> nueva versión y nuevo DOI
-    version_num = last["version"] + 1
-    doi = f"10.9999/fakenodo.{dep['conceptrecid']}.v{version_num}"
-    versions.append({"version": version_num, "doi": doi, "files_snapshot": current_files})
-    dep["doi"] = doi
-    dep["state"] = "published"
-    return jsonify(dep), 202
+    # Publica el depósito:
+    # - primera publicación -> DOI v1
+    # - sin cambios de ficheros desde la última versión -> se mantiene DOI/versión
+    # - con cambios de ficheros -> nueva versión y nuevo DOI
+    return jsonify(_store().publish(deposition_id)), 202
 
 
 @bp.get("/records/<int:conceptrecid>/versions")
 def list_versions(conceptrecid: int):
     # Lista las versiones publicadas para una familia (conceptrecid)
     # En este fake, conceptrecid coincide con el id del depósito base
-
-    for dep in _state()["depositions"].values():
-        if dep["conceptrecid"] == conceptrecid:
-            hits = [
-                {"version": v["version"], "doi": v["doi"], "metadata": dep.get("metadata", {})}
-                for v in dep["published_versions"]
-            ]
-            return jsonify({"hits": {"hits": hits, "total": len(hits)}}), 200
-    return jsonify({"hits": {"hits": [], "total": 0}}), 200
+    hits = _store().versions(conceptrecid)
+    return jsonify({"hits": {"hits": hits, "total": len(hits)}}), 200
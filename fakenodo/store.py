@@ -0,0 +1,443 @@
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import sqlite3
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+
+class DepositionNotFound(LookupError):
+    pass
+
+
+def search_terms(q: Optional[str]) -> List[str]:
+    """Términos de una búsqueda q: palabras sueltas o frases entre comillas."""
+    if not q:
+        return []
+    try:
+        return [term for term in shlex.split(q) if term]
+    except ValueError:
+        # Comillas sin cerrar: se busca cada palabra
+        return q.replace('"', " ").split()
+
+
+class BlobStore:
+    """Contenido de los ficheros en disco, direccionado por su MD5 (<dir>/ab/abcdef...).
+
+    Los ficheros se escriben a un temporal mientras se calcula el hash y se renombran al final, así que
+    nunca se ve un blob a medias y el mismo contenido subido dos veces ocupa una sola copia.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+
+    def path(self, checksum: str) -> str:
+        return os.path.join(self.root, checksum[:2], checksum)
+
+    def stage(self, source: BinaryIO) -> Tuple[str, str, int]:
+        """Copia source a un temporal por bloques calculando su MD5; devuelve (temporal, md5, tamaño).
+
+        El blob se hace visible con commit() dentro de la transacción que lo referencia, para que una
+        limpieza concurrente de blobs sin uso no pueda borrarlo entre medias.
+        """
+        md5 = hashlib.md5()
+        size = 0
+        tmp_path = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        try:
+            with open(tmp_path, "wb") as sink:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    md5.update(chunk)
+                    sink.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            self.discard(tmp_path)
+            raise
+        return tmp_path, md5.hexdigest(), size
+
+    def commit(self, tmp_path: str, checksum: str):
+        os.makedirs(os.path.dirname(self.path(checksum)), exist_ok=True)
+        os.replace(tmp_path, self.path(checksum))
+
+    @staticmethod
+    def discard(tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def remove(self, checksum: str):
+        try:
+            os.remove(self.path(checksum))
+        except FileNotFoundError:
+            pass
+
+
+class Store:
+    """Interfaz del almacenamiento de fakenodo. Los depósitos se devuelven con la forma de la API:
+
+    {"id", "conceptrecid", "metadata", "files": {nombre: checksum}, "state", "doi",
+     "published_versions": [{"version", "doi", "files_snapshot": {nombre: checksum}}]}
+
+    Las implementaciones deben poder usarse desde varios hilos a la vez.
+    """
+
+    def create_deposition(self, metadata: dict) -> dict:
+        raise NotImplementedError
+
+    def get_deposition(self, deposition_id: int) -> dict:
+        raise NotImplementedError
+
+    def list_depositions(
+        self, q: Optional[str] = None, status: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[dict]:
+        """Depósitos por id ascendente, filtrados por estado ("draft" / "published") y por los términos de q."""
+        raise NotImplementedError
+
+    def update_metadata(self, deposition_id: int, metadata: dict) -> dict:
+        raise NotImplementedError
+
+    def delete_deposition(self, deposition_id: int):
+        raise NotImplementedError
+
+    def add_file(self, deposition_id: int, filename: str, source: BinaryIO) -> dict:
+        raise NotImplementedError
+
+    def list_files(self, deposition_id: int) -> List[dict]:
+        raise NotImplementedError
+
+    def file_path(self, deposition_id: int, filename: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def publish(self, deposition_id: int) -> dict:
+        raise NotImplementedError
+
+    def versions(self, conceptrecid: int) -> List[dict]:
+        raise NotImplementedError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deposition (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conceptrecid INTEGER NOT NULL,
+    metadata TEXT NOT NULL,
+    state TEXT NOT NULL,
+    doi TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_deposition_conceptrecid ON deposition (conceptrecid);
+CREATE TABLE IF NOT EXISTS deposition_file (
+    deposition_id INTEGER NOT NULL REFERENCES deposition (id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (deposition_id, filename)
+);
+CREATE INDEX IF NOT EXISTS ix_deposition_file_checksum ON deposition_file (checksum);
+CREATE TABLE IF NOT EXISTS version (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    deposition_id INTEGER NOT NULL REFERENCES deposition (id) ON DELETE CASCADE,
+    conceptrecid INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    doi TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_version_deposition ON version (deposition_id);
+CREATE INDEX IF NOT EXISTS ix_version_conceptrecid ON version (conceptrecid);
+CREATE TABLE IF NOT EXISTS version_file (
+    version_id INTEGER NOT NULL REFERENCES version (id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    PRIMARY KEY (version_id, filename)
+);
+CREATE INDEX IF NOT EXISTS ix_version_file_checksum ON version_file (checksum);
+"""
+
+
+# Texto en el que busca el parámetro q del listado
+_SEARCHABLE = (
+    "(coalesce(json_extract(metadata, '$.title'), '') || ' ' || coalesce(json_extract(metadata, '$.description'), '')"
+    " || ' ' || coalesce(json_extract(metadata, '$.keywords'), '') || ' ' || coalesce(doi, ''))"
+)
+
+
+class SQLiteStore(Store):
+    """Depósitos en SQLite y contenido de los ficheros en un BlobStore, dentro de data_dir.
+
+    Cada hilo usa su propia conexión (modo WAL, así las lecturas no esperan a las escrituras) y las
+    escrituras se serializan con BEGIN IMMEDIATE, que también protege frente a otros procesos.
+    """
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.db_path = os.path.join(data_dir, "fakenodo.sqlite3")
+        self.blobs = BlobStore(os.path.join(data_dir, "blobs"))
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    @classmethod
+    def temporary(cls) -> "SQLiteStore":
+        # Almacén desechable, para cuando no se configura FAKENODO_DATA_DIR
+        return cls(tempfile.mkdtemp(prefix="fakenodo-"))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ---------------------- lectura ----------------------
+    def _row(self, conn, deposition_id: int) -> sqlite3.Row:
+        row = conn.execute("SELECT * FROM deposition WHERE id = ?", (deposition_id,)).fetchone()
+        if row is None:
+            raise DepositionNotFound(deposition_id)
+        return row
+
+    @staticmethod
+    def _files(conn, deposition_id: int) -> Dict[str, str]:
+        rows = conn.execute(
+            "SELECT filename, checksum FROM deposition_file WHERE deposition_id = ? ORDER BY filename",
+            (deposition_id,),
+        )
+        return {row["filename"]: row["checksum"] for row in rows}
+
+    def _depositions(self, conn, rows: List[sqlite3.Row]) -> List[dict]:
+        # Ficheros, versiones y ficheros de cada versión de todos los depósitos en tres consultas,
+        # no tres por depósito
+        if not rows:
+            return []
+        ids = [row["id"] for row in rows]
+        files: Dict[int, Dict[str, str]] = {deposition_id: {} for deposition_id in ids}
+        versions: Dict[int, List[dict]] = {deposition_id: [] for deposition_id in ids}
+        snapshots: Dict[int, Dict[str, str]] = {}
+
+        placeholders = ",".join("?" * len(ids))
+        for row in conn.execute(
+            f"SELECT deposition_id, filename, checksum FROM deposition_file WHERE deposition_id IN ({placeholders}) "
+            "ORDER BY filename",
+            ids,
+        ):
+            files[row["deposition_id"]][row["filename"]] = row["checksum"]
+        for row in conn.execute(
+            f"SELECT id, deposition_id, version, doi FROM version WHERE deposition_id IN ({placeholders}) "
+            "ORDER BY version",
+            ids,
+        ):
+            snapshots[row["id"]] = {}
+            versions[row["deposition_id"]].append(
+                {"version": row["version"], "doi": row["doi"], "files_snapshot": snapshots[row["id"]]}
+            )
+        if snapshots:
+            placeholders = ",".join("?" * len(snapshots))
+            for row in conn.execute(
+                f"SELECT version_id, filename, checksum FROM version_file WHERE version_id IN ({placeholders}) "
+                "ORDER BY filename",
+                list(snapshots),
+            ):
+                snapshots[row["version_id"]][row["filename"]] = row["checksum"]
+
+        return [
+            {
+                "id": row["id"],
+                "conceptrecid": row["conceptrecid"],
+                "metadata": json.loads(row["metadata"]),
+                "files": files[row["id"]],
+                "published_versions": versions[row["id"]],
+                "state": row["state"],
+                "doi": row["doi"],
+            }
+            for row in rows
+        ]
+
+    def _deposition(self, conn, row: sqlite3.Row) -> dict:
+        return self._depositions(conn, [row])[0]
+
+    def get_deposition(self, deposition_id: int) -> dict:
+        conn = self._conn()
+        return self._deposition(conn, self._row(conn, deposition_id))
+
+    def list_depositions(
+        self, q: Optional[str] = None, status: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[dict]:
+        conn = self._conn()
+        where, params = [], []
+        if status:
+            where.append("state = ?")
+            params.append(status)
+        # Cada término de q tiene que aparecer (sin distinguir mayúsculas) en el título, la descripción,
+        # las palabras clave o el DOI
+        for term in search_terms(q):
+            where.append(f"{_SEARCHABLE} LIKE ? ESCAPE '\\'")
+            params.append("%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        sql = "SELECT * FROM deposition"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id LIMIT ? OFFSET ?"
+        rows = conn.execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+        return self._depositions(conn, rows)
+
+    def list_files(self, deposition_id: int) -> List[dict]:
+        conn = self._conn()
+        self._row(conn, deposition_id)
+        rows = conn.execute(
+            "SELECT filename, checksum, size FROM deposition_file WHERE deposition_id = ? ORDER BY filename",
+            (deposition_id,),
+        )
+        return [dict(row) for row in rows]
+
+    def file_path(self, deposition_id: int, filename: str) -> Optional[str]:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT checksum FROM deposition_file WHERE deposition_id = ? AND filename = ?",
+                (deposition_id, filename),
+            )
+            .fetchone()
+        )
+        return self.blobs.path(row["checksum"]) if row else None
+
+    def versions(self, conceptrecid: int) -> List[dict]:
+        # Usa el índice por conceptrecid en lugar de recorrer todos los depósitos
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT v.version, v.doi, d.metadata FROM version v JOIN deposition d ON d.id = v.deposition_id "
+            "WHERE v.conceptrecid = ? ORDER BY v.version",
+            (conceptrecid,),
+        )
+        return [{"version": row["version"], "doi": row["doi"], "metadata": json.loads(row["metadata"])} for row in rows]
+
+    # ---------------------- escritura ----------------------
+    def create_deposition(self, metadata: dict) -> dict:
+        with self._write() as conn:
+            cursor = conn.execute(
+                "INSERT INTO deposition (conceptrecid, metadata, state) VALUES (0, ?, 'draft')", (json.dumps(metadata),)
+            )
+            # conceptrecid coincide con el id del depósito base, como en la versión en memoria
+            conn.execute("UPDATE deposition SET conceptrecid = id WHERE id = ?", (cursor.lastrowid,))
+            return self._deposition(conn, self._row(conn, cursor.lastrowid))
+
+    def update_metadata(self, deposition_id: int, metadata: dict) -> dict:
+        with self._write() as conn:
+            self._row(conn, deposition_id)
+            conn.execute("UPDATE deposition SET metadata = ? WHERE id = ?", (json.dumps(metadata), deposition_id))
+            return self._deposition(conn, self._row(conn, deposition_id))
+
+    def delete_deposition(self, deposition_id: int):
+        with self._write() as conn:
+            self._row(conn, deposition_id)
+            checksums = {
+                row["checksum"]
+                for row in conn.execute(
+                    "SELECT checksum FROM deposition_file WHERE deposition_id = ? UNION "
+                    "SELECT f.checksum FROM version_file f JOIN version v ON v.id = f.version_id "
+                    "WHERE v.deposition_id = ?",
+                    (deposition_id, deposition_id),
+                )
+            }
+            conn.execute("DELETE FROM deposition WHERE id = ?", (deposition_id,))
+            for checksum in checksums:
+                if not self._referenced(conn, checksum):
+                    self.blobs.remove(checksum)
+
+    @staticmethod
+    def _referenced(conn, checksum: str) -> bool:
+        return (
+            conn.execute(
+                "SELECT 1 FROM deposition_file WHERE checksum = ? UNION ALL "
+                "SELECT 1 FROM version_file WHERE checksum = ? LIMIT 1",
+                (checksum, checksum),
+            ).fetchone()
+            is not None
+        )
+
+    def add_file(self, deposition_id: int, filename: str, source: BinaryIO) -> dict:
+        """Guarda el contenido de source calculando su MD5 a la vez, sin cargarlo entero en memoria."""
+        self._row(self._conn(), deposition_id)
+        tmp_path, checksum, size = self.blobs.stage(source)
+        try:
+            with self._write() as conn:
+                self._row(conn, deposition_id)
+                previous = conn.execute(
+                    "SELECT checksum FROM deposition_file WHERE deposition_id = ? AND filename = ?",
+                    (deposition_id, filename),
+                ).fetchone()
+                self.blobs.commit(tmp_path, checksum)
+                conn.execute(
+                    "INSERT OR REPLACE INTO deposition_file (deposition_id, filename, checksum, size) "
+                    "VALUES (?, ?, ?, ?)",
+                    (deposition_id, filename, checksum, size),
+                )
+                # El contenido sustituido se borra si ya no lo usa ningún fichero ni versión publicada
+                if previous and previous["checksum"] != checksum and not self._referenced(conn, previous["checksum"]):
+                    self.blobs.remove(previous["checksum"])
+        finally:
+            self.blobs.discard(tmp_path)
+        return {"filename": filename, "checksum": checksum, "size": size}
+
+    def publish(self, deposition_id: int) -> dict:
+        with self._write() as conn:
+            row = self._row(conn, deposition_id)
+            files = self._files(conn, deposition_id)
+            last = conn.execute(
+                "SELECT id, version, doi FROM version WHERE deposition_id = ? ORDER BY version DESC LIMIT 1",
+                (deposition_id,),
+            ).fetchone()
+            last_files = (
+                {
+                    r["filename"]: r["checksum"]
+                    for r in conn.execute(
+                        "SELECT filename, checksum FROM version_file WHERE version_id = ?", (last["id"],)
+                    )
+                }
+                if last
+                else None
+            )
+
+            if last is not None and last_files == files:
+                # Sin cambios de ficheros -> mantener DOI/versión
+                doi = last["doi"]
+            else:
+                # Primera publicación o ficheros cambiados -> nueva versión y nuevo DOI
+                version_num = last["version"] + 1 if last else 1
+                doi = f"10.9999/fakenodo.{row['conceptrecid']}.v{version_num}"
+                cursor = conn.execute(
+                    "INSERT INTO version (deposition_id, conceptrecid, version, doi) VALUES (?, ?, ?, ?)",
+                    (deposition_id, row["conceptrecid"], version_num, doi),
+                )
+                conn.executemany(
+                    "INSERT INTO version_file (version_id, filename, checksum) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, filename, checksum) for filename, checksum in files.items()],
+                )
+            conn.execute("UPDATE deposition SET state = 'published', doi = ? WHERE id = ?", (doi, deposition_id))
+            return self._deposition(conn, self._row(conn, deposition_id))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def destroy(self):
+        """Borra todo el contenido de data_dir (para almacenes temporales)."""
+        self.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
@@ -1,13 +1,25 @@
+import hashlib
 import io
+import os
+import threading
+import tracemalloc
 
 import pytest
 
 from fakenodo import create_app
+from fakenodo.store import DepositionNotFound, SQLiteStore
 
 
 @pytest.fixture()
-def client():
-    app = create_app()
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "data"))
+    yield store
+    store.close()
+
+
+@pytest.fixture()
+def client(store):
+    app = create_app(store)
     app.config.update({"TESTING": True})
     with app.test_client() as client:
         yield client
@@ -77,4 +89,176 @@ def test_create_and_publish_versions(client):
     versions = resp.get_json()["hits"]["hits"]
     assert len(versions) == 2
     assert any(v["doi"] == doi_v1 for v in versions)
-    assert any(v["doi"] == doi_v2 for v in versions)
\ No newline at end of file
+    assert any(v["doi"] == doi_v2 for v in versions)
+
+
+def upload(client, dep_id, name, content):
+    return client.post(
+        f"/api/deposit/depositions/{dep_id}/files",
+        data={"name": name, "file": (io.BytesIO(content), name)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_files_are_stored_and_survive_a_restart(client, store):
+    dep_id = client.post("/api/deposit/depositions", json={"metadata": {"title": "Stored"}}).get_json()["id"]
+    content = b'[{"name": "fan"}]'
+    resp = upload(client, dep_id, "fans.json", content)
+    assert resp.get_json()["checksum"] == hashlib.md5(content).hexdigest()
+    client.post(f"/api/deposit/depositions/{dep_id}/actions/publish")
+
+    files = client.get(f"/api/deposit/depositions/{dep_id}/files").get_json()
+    assert [(f["filename"], f["filesize"]) for f in files] == [("fans.json", len(content))]
+    download = client.get(files[0]["links"]["download"].replace("http://localhost", ""))
+    assert download.status_code == 200 and download.data == content
+    assert client.get(f"/api/deposit/depositions/{dep_id}/files/missing.json").status_code == 404
+
+    # A new process on the same data directory sees the same depositions and contents
+    restarted = create_app(SQLiteStore(store.data_dir)).test_client()
+    dep = restarted.get(f"/api/deposit/depositions/{dep_id}").get_json()
+    assert dep["metadata"]["title"] == "Stored" and dep["doi"].endswith(".v1")
+    assert restarted.get(f"/api/deposit/depositions/{dep_id}/files/fans.json").data == content
+    assert restarted.get(f"/api/records/{dep['conceptrecid']}/versions").get_json()["hits"]["total"] == 1
+
+
+def test_missing_depositions_are_404(client):
+    assert client.get("/api/deposit/depositions/999").status_code == 404
+    assert client.delete("/api/deposit/depositions/999").status_code == 404
+    assert client.post("/api/deposit/depositions/999/actions/publish").status_code == 404
+    assert upload(client, 999, "a.json", b"[]").status_code == 404
+    assert client.get("/api/records/999/versions").get_json() == {"hits": {"hits": [], "total": 0}}
+
+
+class GeneratedContent:
+    def __init__(self, size):
+        self.left = size
+        self.md5 = hashlib.md5()
+
+    def read(self, size):
+        chunk = b"x" * min(size, self.left)
+        self.left -= len(chunk)
+        self.md5.update(chunk)
+        return chunk
+
+
+def test_uploads_are_hashed_while_streaming(store):
+    dep_id = store.create_deposition({})["id"]
+    source = GeneratedContent(32 * 1024 * 1024)
+
+    tracemalloc.start()
+    stored = store.add_file(dep_id, "big.bin", source)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert stored == {"filename": "big.bin", "checksum": source.md5.hexdigest(), "size": 32 * 1024 * 1024}
+    assert os.path.getsize(store.file_path(dep_id, "big.bin")) == 32 * 1024 * 1024
+    assert peak < 1024 * 1024
+
+
+def test_blobs_are_shared_and_removed_when_unused(store):
+    first = store.create_deposition({})["id"]
+    second = store.create_deposition({})["id"]
+    store.add_file(first, "a.json", io.BytesIO(b"[1]"))
+    store.add_file(second, "b.json", io.BytesIO(b"[1]"))
+    store.publish(second)
+    blob = store.file_path(first, "a.json")
+    assert blob == store.file_path(second, "b.json")
+
+    store.delete_deposition(first)
+    assert os.path.exists(blob)
+    # Still referenced by the published version of the second deposition
+    store.add_file(second, "b.json", io.BytesIO(b"[2]"))
+    assert os.path.exists(blob)
+    store.delete_deposition(second)
+    assert not os.path.exists(blob)
+    with pytest.raises(DepositionNotFound):
+        store.get_deposition(second)
+
+
+def test_versions_are_looked_up_by_conceptrecid_index(store):
+    ids = [store.create_deposition({"title": f"dep {i}"})["id"] for i in range(50)]
+    for dep_id in ids:
+        store.publish(dep_id)
+
+    versions = store.versions(ids[25])
+    assert versions == [{"version": 1, "doi": f"10.9999/fakenodo.{ids[25]}.v1", "metadata": {"title": "dep 25"}}]
+    plan = " ".join(
+        row[-1]
+        for row in store._conn().execute(
+            "EXPLAIN QUERY PLAN SELECT v.version FROM version v JOIN deposition d ON d.id = v.deposition_id "
+            "WHERE v.conceptrecid = ?",
+            (ids[25],),
+        )
+    )
+    assert "ix_version_conceptrecid" in plan
+
+
+def test_store_is_safe_under_concurrent_clients(store):
+    errors = []
+
+    def work(worker):
+        try:
+            dep_id = store.create_deposition({"worker": worker})["id"]
+            for i in range(5):
+                store.add_file(dep_id, f"{i}.json", io.BytesIO(b"[%d, %d]" % (worker, i)))
+            store.publish(dep_id)
+            store.add_file(dep_id, "extra.json", io.BytesIO(b"[]"))
+            store.publish(dep_id)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    depositions = store.list_depositions()
+    assert len({dep["id"] for dep in depositions}) == 16
+    for dep in depositions:
+        assert len(dep["files"]) == 6
+        assert [v["version"] for v in dep["published_versions"]] == [1, 2]
+        assert dep["doi"] == f"10.9999/fakenodo.{dep['conceptrecid']}.v2"
+
+
+def test_listing_is_paginated_and_filtered(client, store):
+    for i in range(25):
+        keywords = ["fans"] if i % 5 == 0 else ["cases"]
+        dep = store.create_deposition({"title": f"Catalog {i}", "description": "PC parts", "keywords": keywords})
+        if i % 2:
+            store.publish(dep["id"])
+
+    resp = client.get("/api/deposit/depositions")
+    assert [dep["id"] for dep in resp.get_json()] == list(range(1, 11))
+    assert 'rel="next"' in resp.headers["Link"] and 'rel="prev"' not in resp.headers["Link"]
+
+    resp = client.get("/api/deposit/depositions?page=3&size=10")
+    assert [dep["id"] for dep in resp.get_json()] == list(range(21, 26))
+    assert 'rel="next"' not in resp.headers["Link"] and "page=2" in resp.headers["Link"]
+
+    published = client.get("/api/deposit/depositions?status=published&size=100").get_json()
+    assert len(published) == 12 and all(dep["state"] == "published" for dep in published)
+    fans = client.get("/api/deposit/depositions?q=FANS&size=100").get_json()
+    assert [dep["metadata"]["title"] for dep in fans] == [f"Catalog {i}" for i in range(0, 25, 5)]
+    assert len(client.get('/api/deposit/depositions?q="catalog 1"&size=100').get_json()) == 11
+    assert client.get("/api/deposit/depositions?q=100%25").get_json() == []
+    assert "Link" not in client.get("/api/deposit/depositions?q=fans&status=draft").headers
+
+    for query in ("page=0", "size=101", "size=x", "status=done"):
+        assert client.get(f"/api/deposit/depositions?{query}").status_code == 400
+
+
+def test_listing_loads_a_page_in_a_fixed_number_of_queries(store):
+    for i in range(20):
+        dep = store.create_deposition({"title": f"d{i}"})
+        store.add_file(dep["id"], "a.json", io.BytesIO(b"[%d]" % i))
+        store.publish(dep["id"])
+
+    statements = []
+    store._conn().set_trace_callback(statements.append)
+    depositions = store.list_depositions(limit=20)
+    store._conn().set_trace_callback(None)
+
+    assert len(depositions) == 20 and all(dep["published_versions"][0]["files_snapshot"] for dep in depositions)
+    assert len(statements) == 4
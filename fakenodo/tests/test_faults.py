@@ -0,0 +1,133 @@
+import io
+import time
+
+import pytest
+
+from fakenodo import create_app
+from fakenodo.faults import PRESETS, FaultProfile
+from fakenodo.store import SQLiteStore
+
+
+@pytest.fixture()
+def make_client(tmp_path):
+    stores = []
+
+    def make(profile):
+        stores.append(SQLiteStore(str(tmp_path / f"data{len(stores)}")))
+        app = create_app(stores[-1], profile=FaultProfile.load(profile, seed=1))
+        app.config.update({"TESTING": True})
+        return app.test_client()
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def create(client):
+    return client.post("/api/deposit/depositions", json={"metadata": {"title": "t"}})
+
+
+def test_presets_and_env_profiles_are_valid(monkeypatch, tmp_path):
+    for name in PRESETS:
+        assert FaultProfile.load(name).name == name
+
+    monkeypatch.setenv("FAKENODO_PROFILE", "flaky")
+    assert FaultProfile.from_env().name == "flaky"
+
+    profile_file = tmp_path / "profile.json"
+    profile_file.write_text('{"endpoints": {"publish_deposition": {"error_rate": 0.5}}}')
+    monkeypatch.setenv("FAKENODO_PROFILE_FILE", str(profile_file))
+    monkeypatch.setenv("FAKENODO_SEED", "7")
+    profile = FaultProfile.from_env()
+    assert profile.seed == 7 and profile.spec["endpoints"]["publish_deposition"]["error_rate"] == 0.5
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "nonexistent",
+        {"endpoints": {"unknown_view": {}}},
+        {"endpoints": {"*": {"error_rate": 1.5}}},
+        {"endpoints": {"*": {"error_rate": 0.6, "rate_limit_rate": 0.6}}},
+        {"endpoints": {"*": {"latency": {"distribution": "pareto"}}}},
+        {"endpoints": {"*": {"latency": {"distribution": "uniform", "min_ms": 1}}}},
+        {"upload_bytes_per_second": 0},
+    ],
+)
+def test_invalid_profiles_are_rejected(spec):
+    with pytest.raises(ValueError):
+        FaultProfile.load(spec)
+
+
+def test_rate_limited_requests_get_retry_after(make_client):
+    client = make_client({"endpoints": {"create_deposition": {"rate_limit_rate": 1, "retry_after": 3}}})
+
+    resp = create(client)
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "3"
+    # Other endpoints are not affected
+    assert client.get("/api/deposit/depositions").status_code == 200
+
+
+def test_errors_follow_the_configured_rate(make_client):
+    client = make_client({"endpoints": {"*": {"error_rate": 0.3, "error_status": 503}}})
+
+    statuses = [client.get("/api/deposit/depositions").status_code for _ in range(200)]
+    assert set(statuses) == {200, 503}
+    assert 30 <= statuses.count(503) <= 90
+
+
+def test_same_seed_gives_the_same_faults():
+    spec = {
+        "endpoints": {"*": {"error_rate": 0.5, "latency": {"distribution": "lognormal", "median_ms": 5, "sigma": 1}}}
+    }
+    first, second = FaultProfile(spec, seed=3), FaultProfile(spec, seed=3)
+
+    def draws(profile):
+        return [(profile.latency("get_deposition"), bool(profile.fault("get_deposition"))) for _ in range(20)]
+
+    assert draws(first) == draws(second)
+
+
+def test_latency_is_added_per_endpoint(make_client):
+    client = make_client({"endpoints": {"list_depositions": {"latency": {"distribution": "fixed", "ms": 200}}}})
+
+    start = time.monotonic()
+    client.get("/api/deposit/depositions")
+    assert time.monotonic() - start >= 0.2
+
+    start = time.monotonic()
+    create(client)
+    assert time.monotonic() - start < 0.2
+
+
+def test_uploads_are_throttled(make_client):
+    client = make_client({"upload_bytes_per_second": 100 * 1024})
+    dep_id = create(client).get_json()["id"]
+
+    start = time.monotonic()
+    resp = client.post(
+        f"/api/deposit/depositions/{dep_id}/files",
+        data={"name": "big.bin", "file": (io.BytesIO(b"x" * 50 * 1024), "big.bin")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 201 and resp.get_json()["filesize"] == 50 * 1024
+    assert time.monotonic() - start >= 0.45
+
+
+def test_admin_endpoint_switches_profiles(make_client):
+    client = make_client("none")
+    assert client.get("/_admin/profile").get_json()["name"] == "none"
+
+    resp = client.put("/_admin/profile", json={"profile": {"endpoints": {"*": {"error_rate": 1}}}, "seed": 5})
+    assert resp.status_code == 200 and resp.get_json()["seed"] == 5
+    assert create(client).status_code == 500
+    # The admin endpoint itself never fails
+    assert client.get("/_admin/profile").status_code == 200
+
+    assert client.put("/_admin/profile", json={"profile": "no-such-preset"}).status_code == 400
+    assert create(client).status_code == 500
+
+    assert client.put("/_admin/profile", json={"profile": "rate-limited"}).get_json()["name"] == "rate-limited"
+    client.delete("/_admin/profile")
+    assert create(client).status_code == 201
@@ -0,0 +1,99 @@
+"""Create dataset_search table with a FULLTEXT index
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 10:00:00.000000
+
+Existing datasets are indexed here, with the same document as
+app.modules.explore.search_index.build_document (`rosemary search:reindex` rebuilds it).
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def _normalize(text):
+    return unidecode.unidecode(text or '').lower()
+
+
+def documents(bind, dataset_ids):
+    """{dataset_id: search document} of the given datasets, read from the tables as they are at this revision."""
+    ids = sa.bindparam('ids', expanding=True)
+    parts = {}
+    datasets = bind.execute(
+        sa.text(
+            'SELECT data_set.id, ds_meta_data.id, ds_meta_data.title, ds_meta_data.description, ds_meta_data.tags '
+            'FROM data_set JOIN ds_meta_data ON ds_meta_data.id = data_set.ds_meta_data_id '
+            'WHERE data_set.id IN :ids'
+        ).bindparams(ids),
+        {'ids': list(dataset_ids)},
+    ).all()
+    meta_ids = {}
+    for dataset_id, meta_id, title, description, tags in datasets:
+        parts[dataset_id] = [title, description, tags]
+        meta_ids[meta_id] = dataset_id
+    if meta_ids:
+        for meta_id, name, affiliation, orcid in bind.execute(
+            sa.text(
+                'SELECT ds_meta_data_id, name, affiliation, orcid FROM author '
+                'WHERE ds_meta_data_id IN :ids ORDER BY id'
+            ).bindparams(ids),
+            {'ids': list(meta_ids)},
+        ):
+            parts[meta_ids[meta_id]].extend([name, affiliation, orcid])
+    if parts:
+        for row in bind.execute(
+            sa.text(
+                'SELECT feature_model.data_set_id, fm_meta_data.uvl_filename, fm_meta_data.title, '
+                'fm_meta_data.description, fm_meta_data.publication_doi, fm_meta_data.tags '
+                'FROM feature_model JOIN fm_meta_data ON fm_meta_data.id = feature_model.fm_meta_data_id '
+                'WHERE feature_model.data_set_id IN :ids ORDER BY feature_model.id'
+            ).bindparams(ids),
+            {'ids': list(parts)},
+        ):
+            parts[row[0]].extend(row[1:])
+    # One field per line so a word never matches across two fields
+    return {
+        dataset_id: '\n'.join(_normalize(part) for part in fields if part) for dataset_id, fields in parts.items()
+    }
+
+
+def upgrade():
+    dataset_search = op.create_table(
+        'dataset_search',
+        sa.Column('dataset_id', sa.Integer(), nullable=False),
+        sa.Column('document', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['dataset_id'], ['data_set.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('dataset_id'),
+    )
+    op.create_index('ix_dataset_search_document', 'dataset_search', ['document'], mysql_prefix='FULLTEXT')
+
+    # Index the existing datasets, so general searches keep finding them right after the upgrade
+    bind = op.get_bind()
+    dataset_ids = [row[0] for row in bind.execute(sa.text('SELECT id FROM data_set ORDER BY id'))]
+    now = datetime.now(timezone.utc)
+    for start in range(0, len(dataset_ids), BATCH_SIZE):
+        batch = documents(bind, dataset_ids[start : start + BATCH_SIZE])
+        rows = [
+            {'dataset_id': dataset_id, 'document': document, 'updated_at': now}
+            for dataset_id, document in batch.items()
+        ]
+        if rows:
+            op.bulk_insert(dataset_search, rows)
+
+
+def downgrade():
+    op.drop_index('ix_dataset_search_document', table_name='dataset_search')
+    op.drop_table('dataset_search')
@@ -0,0 +1,36 @@
+"""Create site_stats snapshot table
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 12:00:00.000000
+
+The snapshot row is computed on the first homepage hit, or with `rosemary stats:rebuild`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'site_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('datasets', sa.BigInteger(), nullable=False),
+        sa.Column('feature_models', sa.BigInteger(), nullable=False),
+        sa.Column('dataset_downloads', sa.BigInteger(), nullable=False),
+        sa.Column('feature_model_downloads', sa.BigInteger(), nullable=False),
+        sa.Column('dataset_views', sa.BigInteger(), nullable=False),
+        sa.Column('feature_model_views', sa.BigInteger(), nullable=False),
+        sa.Column('rebuilt_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('site_stats')
@@ -0,0 +1,44 @@
+"""Create dataset_download_daily rollup and index download dates
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'dataset_download_daily',
+        sa.Column('dataset_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['dataset_id'], ['data_set.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('dataset_id', 'day'),
+    )
+    op.create_index('ix_dataset_download_daily_day', 'dataset_download_daily', ['day', 'dataset_id'])
+    op.create_index(
+        op.f('ix_ds_download_record_download_date'), 'ds_download_record', ['download_date'], unique=False
+    )
+
+    # Backfill from the existing download records (same as `rosemary downloads:backfill`)
+    op.execute(
+        "INSERT INTO dataset_download_daily (dataset_id, day, count) "
+        "SELECT dataset_id, DATE(download_date), COUNT(*) FROM ds_download_record "
+        "WHERE dataset_id IS NOT NULL GROUP BY dataset_id, DATE(download_date)"
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ds_download_record_download_date'), table_name='ds_download_record')
+    op.drop_index('ix_dataset_download_daily_day', table_name='dataset_download_daily')
+    op.drop_table('dataset_download_daily')
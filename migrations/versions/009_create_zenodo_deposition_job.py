@@ -0,0 +1,39 @@
+"""Create zenodo_deposition_job to track background Zenodo depositions
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'zenodo_deposition_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dataset_id', sa.Integer(), nullable=False),
+        sa.Column('state', sa.String(length=20), nullable=False),
+        sa.Column('deposition_id', sa.Integer(), nullable=True),
+        sa.Column('files_total', sa.Integer(), nullable=False),
+        sa.Column('files_uploaded', sa.Integer(), nullable=False),
+        sa.Column('doi', sa.String(length=120), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['dataset_id'], ['data_set.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dataset_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('zenodo_deposition_job')
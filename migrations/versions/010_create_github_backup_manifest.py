@@ -0,0 +1,52 @@
+"""Create github_backup and github_backup_file for incremental GitHub backups
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'github_backup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dataset_id', sa.Integer(), nullable=False),
+        sa.Column('repository', sa.String(length=255), nullable=False),
+        sa.Column('branch', sa.String(length=255), nullable=False),
+        sa.Column('commit_sha', sa.String(length=40), nullable=True),
+        sa.Column('backed_up_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['dataset_id'], ['data_set.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dataset_id', 'repository', name='uq_github_backup_dataset_repository'),
+    )
+    op.create_index(op.f('ix_github_backup_dataset_id'), 'github_backup', ['dataset_id'], unique=False)
+    op.create_table(
+        'github_backup_file',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('backup_id', sa.Integer(), nullable=False),
+        sa.Column('path', sa.String(length=512), nullable=False),
+        sa.Column('checksum', sa.String(length=120), nullable=False),
+        sa.Column('blob_sha', sa.String(length=40), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('mtime_ns', sa.BigInteger(), nullable=False),
+        sa.Column('backed_up_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['backup_id'], ['github_backup.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('backup_id', 'path', name='uq_github_backup_file_path'),
+    )
+
+
+def downgrade():
+    op.drop_table('github_backup_file')
+    op.drop_index(op.f('ix_github_backup_dataset_id'), table_name='github_backup')
+    op.drop_table('github_backup')
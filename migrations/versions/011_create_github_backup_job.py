@@ -0,0 +1,53 @@
+"""Create github_backup_job for queued GitHub backups and store the token of the last backup
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('github_backup', sa.Column('token', sa.Text(), nullable=True))
+    op.create_table(
+        'github_backup_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dataset_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('state', sa.String(length=20), nullable=False),
+        sa.Column('trigger', sa.String(length=20), nullable=False),
+        sa.Column('token', sa.Text(), nullable=True),
+        sa.Column('repository', sa.String(length=255), nullable=True),
+        sa.Column('html_url', sa.String(length=512), nullable=True),
+        sa.Column('files_total', sa.Integer(), nullable=False),
+        sa.Column('files_uploaded', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Integer(), nullable=False),
+        sa.Column('unchanged', sa.Integer(), nullable=False),
+        sa.Column('commit_sha', sa.String(length=40), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['dataset_id'], ['data_set.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_github_backup_job_dataset_id'), 'github_backup_job', ['dataset_id'], unique=False)
+    op.create_index(op.f('ix_github_backup_job_state'), 'github_backup_job', ['state'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_github_backup_job_state'), table_name='github_backup_job')
+    op.drop_index(op.f('ix_github_backup_job_dataset_id'), table_name='github_backup_job')
+    op.drop_table('github_backup_job')
+    op.drop_column('github_backup', 'token')
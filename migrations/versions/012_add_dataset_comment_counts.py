@@ -0,0 +1,31 @@
+"""Add denormalized comment_count and visible_comment_count to data_set
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('data_set', sa.Column('comment_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('data_set', sa.Column('visible_comment_count', sa.Integer(), nullable=False, server_default='0'))
+    op.execute(
+        'UPDATE data_set SET '
+        'comment_count = (SELECT COUNT(*) FROM comment WHERE comment.dataset_id = data_set.id), '
+        'visible_comment_count = (SELECT COUNT(*) FROM comment WHERE comment.dataset_id = data_set.id AND comment.visible)'
+    )
+
+
+def downgrade():
+    op.drop_column('data_set', 'visible_comment_count')
+    op.drop_column('data_set', 'comment_count')
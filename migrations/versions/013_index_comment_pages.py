@@ -0,0 +1,27 @@
+"""Index comment keyset pages (top-level comments of a dataset, replies of a comment)
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_comment_dataset_parent_created', 'comment', ['dataset_id', 'parent_id', 'created_at', 'id']
+    )
+    op.create_index('ix_comment_parent_created', 'comment', ['parent_id', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_comment_parent_created', table_name='comment')
+    op.drop_index('ix_comment_dataset_parent_created', table_name='comment')
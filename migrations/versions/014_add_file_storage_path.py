@@ -0,0 +1,30 @@
+"""Store each file's location relative to the uploads root
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('file', sa.Column('storage_path', sa.String(length=255), nullable=True))
+    op.execute(
+        "UPDATE file SET storage_path = ("
+        "SELECT CONCAT('user_', data_set.user_id, '/dataset_', data_set.id, '/', file.name) "
+        "FROM feature_model JOIN data_set ON data_set.id = feature_model.data_set_id "
+        "WHERE feature_model.id = file.feature_model_id)"
+    )
+
+
+def downgrade():
+    op.drop_column('file', 'storage_path')
@@ -0,0 +1,36 @@
+"""Content-addressed store of dataset files
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'file_blob',
+        sa.Column('checksum', sa.String(length=120), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('linked_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('checksum'),
+    )
+    op.add_column('file', sa.Column('blob_checksum', sa.String(length=120), nullable=True))
+    op.create_foreign_key('file_blob_checksum_fk', 'file', 'file_blob', ['blob_checksum'], ['checksum'])
+
+
+def downgrade():
+    op.drop_constraint('file_blob_checksum_fk', 'file', type_='foreignkey')
+    op.drop_column('file', 'blob_checksum')
+    op.drop_table('file_blob')
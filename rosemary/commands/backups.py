@@ -0,0 +1,13 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command("backups:schedule", help="Queues GitHub backups of the datasets that changed since their last backup.")
+@with_appcontext
+def backups_schedule():
+    from app.modules.dataset.backups import schedule_changed_backups
+
+    jobs = schedule_changed_backups()
+    for job in jobs:
+        click.echo(f"Dataset {job.dataset_id}: backup {job.id} {job.state}")
+    click.echo(click.style(f"Queued {len(jobs)} GitHub backups.", fg="green"))
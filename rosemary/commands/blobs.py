@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "blobs:store",
+    help="Moves dataset files stored before the content store into it, so identical files are kept once.",
+)
+@click.option("--batch-size", default=100, show_default=True, help="Files per transaction.")
+@with_appcontext
+def blobs_store(batch_size):
+    from app.modules.hubfile.blobs import store_existing
+
+    summary = store_existing(batch_size=batch_size)
+    click.echo(f"{summary['skipped']} files skipped (missing, or not matching their checksum).")
+    click.echo(click.style(f"{summary['stored']} files ({summary['bytes']} bytes) moved into the store.", fg="green"))
+
+
+@click.command(
+    "blobs:gc",
+    help="Removes stored files that no dataset file references any more. Blobs linked within the grace "
+    "period (FILE_BLOB_GC_GRACE_SECONDS by default) are kept.",
+)
+@click.option("--grace", type=int, default=None, help="Grace period in seconds.")
+@click.option("--dry-run", is_flag=True, help="Only report what would be removed.")
+@with_appcontext
+def blobs_gc(grace, dry_run):
+    from app.modules.hubfile.blobs import collect_garbage
+
+    if grace is None:
+        grace = current_app.config.get("FILE_BLOB_GC_GRACE_SECONDS", 3600)
+    summary = collect_garbage(timedelta(seconds=grace), dry_run=dry_run)
+    if summary["recounted"]:
+        click.echo(f"{summary['recounted']} reference counts corrected.")
+    if summary["linked"]:
+        click.echo(f"{summary['linked']} unreferenced blobs kept: a dataset folder still links them.")
+    action = "Would remove" if dry_run else "Removed"
+    click.echo(click.style(f"{action} {summary['removed']} blobs ({summary['freed']} bytes).", fg="green"))
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import shutil
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import click
+import requests
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+from app import create_app, db
+
+
+class _Occupancy:
+    """WSGI middleware timing how long the worker is busy with each request, until its body is closed."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.timings = []
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        body = self.wsgi_app(environ, start_response)
+        return ClosingIterator(body, lambda: self.timings.append((time.perf_counter() - start) * 1000))
+
+
+def _seed_download_dataset(uploads, size):
+    from app.modules.auth.models import User
+    from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+    from app.modules.featuremodel.models import FeatureModel, FMMetaData
+    from app.modules.hubfile.models import Hubfile
+    from app.modules.hubfile.storage import dataset_dir
+
+    user = User(email=f"downloads-bench-{time.time_ns()}@example.com", password="bench")
+    db.session.add(user)
+    db.session.flush()
+    meta = DSMetaData(title="Downloads benchmark", description="delivery", publication_type=PublicationType.OTHER)
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+
+    folder = dataset_dir(user.id, dataset.id)
+    os.makedirs(folder)
+    content = os.urandom(size)
+    with open(os.path.join(folder, "catalog.json"), "wb") as f:
+        f.write(content)
+    fm_meta = FMMetaData(
+        uvl_filename="catalog.json", title="catalog", description="fm", publication_type=PublicationType.OTHER
+    )
+    db.session.add(fm_meta)
+    db.session.flush()
+    feature_model = FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id)
+    db.session.add(feature_model)
+    db.session.flush()
+    hubfile = Hubfile(
+        name="catalog.json",
+        checksum=hashlib.md5(content).hexdigest(),
+        size=size,
+        feature_model_id=feature_model.id,
+    )
+    db.session.add(hubfile)
+    db.session.commit()
+    return user, dataset, hubfile
+
+
+def _delete_download_dataset(user, dataset):
+    from app.modules.featuremodel.models import FeatureModel
+    from app.modules.hubfile.models import Hubfile
+
+    for feature_model in FeatureModel.query.filter_by(data_set_id=dataset.id):
+        Hubfile.query.filter_by(feature_model_id=feature_model.id).delete()
+        meta = feature_model.fm_meta_data
+        db.session.delete(feature_model)
+        db.session.delete(meta)
+    meta = dataset.ds_meta_data
+    db.session.delete(dataset)
+    db.session.delete(meta)
+    db.session.delete(user)
+    db.session.commit()
+
+
+def _slow_download(url, rate):
+    # A client on a slow link: reads the body at `rate` bytes per second, with a small receive buffer so the
+    # kernel does not absorb the download for it
+    parts = urlsplit(url)
+    start = time.perf_counter()
+    with socket.socket() as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+        sock.connect((parts.hostname, parts.port))
+        sock.sendall(f"GET {parts.path} HTTP/1.0\r\nHost: {parts.netloc}\r\n\r\n".encode())
+        received, head = 0, b""
+        while data := sock.recv(max(rate // 20, 1)):
+            received += len(data)
+            if b"\r\n\r\n" not in head:
+                head += data
+            time.sleep(max(0.0, received / rate - (time.perf_counter() - start)))
+    status, *headers = head.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+    if " 200 " not in status:
+        raise click.ClickException(f"{url}: {status}")
+    accel = any(header.lower().startswith("x-accel-redirect:") for header in headers)
+    return (time.perf_counter() - start) * 1000, accel
+
+
+@click.command(
+    "downloads:bench",
+    help="Measures how long a worker is busy with a file download and a cached dataset ZIP download, sent by "
+    "the app (FILE_DELIVERY=python) and handed over to nginx (FILE_DELIVERY=nginx), for a client reading at "
+    "--client-rate. In nginx mode nginx itself is not run: the worker time is what the app spends before "
+    "nginx takes over. Runs against the testing database; the synthetic dataset is deleted at the end.",
+)
+@click.option("--runs", default=5, show_default=True, help="Downloads per mode and kind.")
+@click.option("--file-size", default=16 * 1024 * 1024, show_default=True, help="Size of the file in bytes.")
+@click.option("--client-rate", default=8 * 1024 * 1024, show_default=True, help="Client read rate in bytes/s.")
+def downloads_bench(runs, file_size, client_rate):
+    # Only the table is printed: not one log line per request
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    uploads = tempfile.mkdtemp(prefix="downloads-bench-")
+    previous_env = {name: os.environ.get(name) for name in ("UPLOADS_DIR", "WORKING_DIR")}
+    os.environ["UPLOADS_DIR"] = uploads
+    os.environ["WORKING_DIR"] = ""
+
+    app = create_app("testing")
+    app.logger.setLevel(logging.WARNING)
+    app.config["DATASET_ZIP_CACHE_DIR"] = None
+    occupancy = _Occupancy(app.wsgi_app)
+    app.wsgi_app = occupancy
+    # One worker, like a sync gunicorn worker: a request occupies it until its body is sent
+    server = make_server("127.0.0.1", 0, app, threaded=False)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    with app.app_context():
+        db.create_all()
+        user, dataset, hubfile = _seed_download_dataset(uploads, file_size)
+        try:
+            urls = {
+                "file": f"{base_url}/file/download/{hubfile.id}",
+                "zip": f"{base_url}/dataset/download/{dataset.id}",
+            }
+            # The first ZIP download builds the cache; the benchmark measures cache hits
+            requests.get(urls["zip"]).raise_for_status()
+
+            click.echo(
+                f"Downloading a {file_size} byte file and its dataset ZIP at {client_rate} bytes/s, {runs} times"
+            )
+            click.echo(f"{'kind':<6}{'mode':<8}{'worker mean ms':>16}{'p50 ms':>10}{'p99 ms':>10}{'client ms':>12}")
+            for kind, url in urls.items():
+                for mode in ("python", "nginx"):
+                    app.config["FILE_DELIVERY"] = mode
+                    occupancy.timings.clear()
+                    client = []
+                    for _ in range(runs):
+                        elapsed, accel = _slow_download(url, client_rate)
+                        if mode == "nginx" and not accel:
+                            raise click.ClickException(f"{url} was not handed over to nginx")
+                        client.append(elapsed)
+                    busy = occupancy.timings
+                    cuts = statistics.quantiles(busy, n=100, method="inclusive") if len(busy) > 1 else busy * 99
+                    click.echo(
+                        f"{kind:<6}{mode:<8}{statistics.mean(busy):>16.1f}{cuts[49]:>10.1f}{cuts[98]:>10.1f}"
+                        f"{statistics.mean(client):>12.0f}"
+                    )
+        finally:
+            _delete_download_dataset(user, dataset)
+            server.shutdown()
+            thread.join()
+            shutil.rmtree(uploads, ignore_errors=True)
+            for name, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
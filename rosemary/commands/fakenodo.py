@@ -0,0 +1,141 @@
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+import click
+import requests
+from werkzeug.serving import make_server
+
+from app import create_app, db
+
+
+def _percentiles(timings):
+    if len(timings) < 2:
+        return timings * 3
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return [cuts[49], cuts[89], cuts[98]]
+
+
+def _seed_publish_dataset(uploads, files, size):
+    from app.modules.auth.models import User
+    from app.modules.dataset.models import DataSet, DSMetaData, PublicationType
+    from app.modules.featuremodel.models import FeatureModel, FMMetaData
+
+    user = User(email=f"fakenodo-bench-{time.time_ns()}@example.com", password="bench")
+    db.session.add(user)
+    db.session.flush()
+    meta = DSMetaData(title="Fakenodo benchmark", description="publish latency", publication_type=PublicationType.OTHER)
+    db.session.add(meta)
+    db.session.flush()
+    dataset = DataSet(user_id=user.id, ds_meta_data_id=meta.id)
+    db.session.add(dataset)
+    db.session.flush()
+
+    folder = os.path.join(uploads, f"user_{user.id}", f"dataset_{dataset.id}")
+    os.makedirs(folder)
+    for i in range(files):
+        filename = f"catalog_{i}.json"
+        with open(os.path.join(folder, filename), "wb") as f:
+            f.write(os.urandom(size))
+        fm_meta = FMMetaData(
+            uvl_filename=filename, title=filename, description="fm", publication_type=PublicationType.OTHER
+        )
+        db.session.add(fm_meta)
+        db.session.flush()
+        db.session.add(FeatureModel(data_set_id=dataset.id, fm_meta_data_id=fm_meta.id))
+    db.session.commit()
+    return user, dataset
+
+
+def _delete_publish_dataset(user, dataset):
+    from app.modules.zenodo.models import DepositionJob
+
+    DepositionJob.query.filter_by(dataset_id=dataset.id).delete()
+    meta = dataset.ds_meta_data
+    db.session.delete(dataset)
+    db.session.delete(meta)
+    db.session.delete(user)
+    db.session.commit()
+
+
+@click.command(
+    "fakenodo:bench",
+    help="Measures end-to-end dataset publish latency (create deposition, upload files, publish) against an "
+    "in-process fakenodo under each latency and fault profile. Runs against the testing database; the "
+    "synthetic dataset is deleted at the end.",
+)
+@click.option("--profile", "profiles", multiple=True, help="Fakenodo profile (preset name or JSON, repeatable).")
+@click.option("--runs", default=20, show_default=True, help="Publishes per profile.")
+@click.option("--files", default=5, show_default=True, help="Files in the published dataset.")
+@click.option("--file-size", default=64 * 1024, show_default=True, help="Size of each file in bytes.")
+@click.option("--seed", default=42, show_default=True, help="Seed of the fault profiles, for repeatable runs.")
+def fakenodo_bench(profiles, runs, files, file_size, seed):
+    from app.modules.zenodo import services
+    from app.modules.zenodo.jobs import DepositionQueue
+    from app.modules.zenodo.models import DepositionJob
+    from fakenodo import create_app as create_fakenodo
+    from fakenodo.faults import PRESETS
+    from fakenodo.store import SQLiteStore
+
+    profiles = profiles or tuple(PRESETS)
+    # Only the table is printed: not one log line per request
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    store = SQLiteStore.temporary()
+    server = make_server("127.0.0.1", 0, create_fakenodo(store), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fakenodo_url = f"http://127.0.0.1:{server.server_port}"
+    uploads = tempfile.mkdtemp(prefix="fakenodo-bench-")
+    previous_env = {name: os.environ.get(name) for name in ("FAKENODO_URL", "UPLOADS_DIR")}
+    os.environ["FAKENODO_URL"] = f"{fakenodo_url}/api/deposit/depositions"
+    os.environ["UPLOADS_DIR"] = uploads
+
+    app = create_app("testing")
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        services._session = None
+        queue = DepositionQueue(app, mode="inline")
+        user, dataset = _seed_publish_dataset(uploads, files, file_size)
+        try:
+            click.echo(f"Publishing a dataset of {files} x {file_size} bytes, {runs} times per profile")
+            click.echo(f"{'profile':<16}{'ok':>6}{'failed':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+            for profile in profiles:
+                response = requests.put(f"{fakenodo_url}/_admin/profile", json={"profile": profile, "seed": seed})
+                if response.status_code != 200:
+                    click.echo(click.style(f"{profile}: {response.json()['message']}", fg="red"))
+                    continue
+                name = response.json()["name"]
+
+                timings, failed = [], 0
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    queue.enqueue(dataset.id)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    if DepositionJob.query.filter_by(dataset_id=dataset.id).one().state == DepositionJob.DONE:
+                        timings.append(elapsed)
+                    else:
+                        failed += 1
+
+                if timings:
+                    p50, p90, p99 = _percentiles(timings)
+                    stats = f"{p50:>10.0f}{p90:>10.0f}{p99:>10.0f}{max(timings):>10.0f}"
+                else:
+                    stats = f"{'-':>10}" * 4
+                click.echo(f"{name:<16}{len(timings):>6}{failed:>8}{stats}")
+        finally:
+            _delete_publish_dataset(user, dataset)
+            services._session = None
+            server.shutdown()
+            thread.join()
+            store.destroy()
+            shutil.rmtree(uploads, ignore_errors=True)
+            for name, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
@@ -0,0 +1,164 @@
+import random
+import statistics
+import time
+
+import click
+import unidecode
+from flask.cli import with_appcontext
+from sqlalchemy import or_
+
+from app import create_app, db
+
+
+@click.command("search:reindex", help="Rebuilds the dataset_search full-text index from the datasets.")
+@click.option("--batch-size", default=500, show_default=True, help="Datasets indexed per batch.")
+@with_appcontext
+def search_reindex(batch_size):
+    from app.modules.explore.search_index import DatasetSearchIndex
+
+    indexed = DatasetSearchIndex().rebuild(batch_size=batch_size)
+    click.echo(click.style(f"Indexed {indexed} datasets.", fg="green"))
+
+
+def _legacy_filter(words, user_id):
+    """The general explore query before dataset_search: eleven ILIKEs per word over five joined tables (here
+    limited to the datasets of user_id)."""
+    from app.modules.dataset.models import Author, DataSet, DSMetaData
+    from app.modules.dataset.repositories import dataset_load_options
+    from app.modules.featuremodel.models import FeatureModel, FMMetaData
+
+    filters = []
+    for word in words:
+        for column in (
+            DSMetaData.title,
+            DSMetaData.description,
+            Author.name,
+            Author.affiliation,
+            Author.orcid,
+            FMMetaData.uvl_filename,
+            FMMetaData.title,
+            FMMetaData.description,
+            FMMetaData.publication_doi,
+            FMMetaData.tags,
+            DSMetaData.tags,
+        ):
+            filters.append(column.ilike(f"%{word}%"))
+    return (
+        DataSet.query.join(DataSet.ds_meta_data)
+        .join(DSMetaData.authors)
+        .join(DataSet.feature_models)
+        .join(FeatureModel.fm_meta_data)
+        .filter(DSMetaData.dataset_doi.isnot(None))
+        .filter(DataSet.user_id == user_id)
+        .filter(or_(*filters))
+        .options(*dataset_load_options("detail"))
+        .order_by(DataSet.created_at.desc())
+        .all()
+    )
+
+
+def _seed_benchmark_datasets(count, vocabulary, batch_size=500):
+    """Create and commit `count` published datasets of a new user (the search index is refreshed on each commit,
+    and InnoDB FULLTEXT indexes only see committed rows). Returns the user."""
+    from app.modules.auth.models import User
+    from app.modules.dataset.models import Author, DataSet, DSMetaData, PublicationType
+    from app.modules.featuremodel.models import FeatureModel, FMMetaData
+
+    rng = random.Random(42)
+    user = User(email=f"search-bench-{time.time_ns()}@example.com", password="bench")
+    db.session.add(user)
+    db.session.commit()
+
+    for i in range(count):
+        words = rng.sample(vocabulary, 6)
+        meta = DSMetaData(
+            title=f"{words[0].title()} {words[1]} dataset {i}",
+            description=" ".join(words),
+            publication_type=PublicationType.SOFTWARE,
+            dataset_doi=f"10.9999/search-bench-{i}",
+            tags=", ".join(words[2:4]),
+        )
+        meta.authors.append(Author(name=f"Author {words[4].title()}", affiliation="University"))
+        dataset = DataSet(user_id=user.id, ds_meta_data=meta)
+        fm_meta = FMMetaData(
+            uvl_filename=f"{words[5]}_{i}.uvl",
+            title=words[5],
+            description="feature model",
+            publication_type=PublicationType.SOFTWARE,
+        )
+        dataset.feature_models.append(FeatureModel(fm_meta_data=fm_meta))
+        db.session.add(dataset)
+        if (i + 1) % batch_size == 0:
+            db.session.commit()
+    db.session.commit()
+    return user
+
+
+def _delete_benchmark_datasets(user, batch_size=500):
+    """Delete the datasets _seed_benchmark_datasets created, their search rows and the user."""
+    from app.modules.dataset.models import DataSet
+
+    db.session.rollback()
+    while True:
+        datasets = DataSet.query.filter_by(user_id=user.id).limit(batch_size).all()
+        if not datasets:
+            break
+        for dataset in datasets:
+            meta = dataset.ds_meta_data
+            db.session.delete(dataset)
+            db.session.delete(meta)
+        db.session.commit()
+    db.session.delete(user)
+    db.session.commit()
+
+
+def _time_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+@click.command(
+    "search:bench",
+    help="Compares the dataset_search index with the legacy ILIKE explore query on synthetic datasets. "
+    "The datasets are committed to the testing database (FULLTEXT indexes only see committed rows) and deleted "
+    "at the end. Fails if both queries do not find the same benchmark datasets.",
+)
+@click.option("--datasets", "count", default=5000, show_default=True, help="Synthetic datasets to create.")
+@click.option("--repeat", default=5, show_default=True, help="Runs per query (the median is reported).")
+@click.option("--query", "queries", multiple=True, help="Query to time (repeatable).")
+def search_bench(count, repeat, queries):
+    from app.modules.explore.search_index import query_words
+    from app.modules.explore.services import ExploreService
+
+    vocabulary = (
+        "automotive linux kernel product line variability configuration feature model software hardware "
+        "embedded sensor network cloud security robotics medical drone smart home energy banking "
+        "compiler database framework testing mobile android web server game"
+    ).split()
+    queries = queries or ("framework", "linux kernel", "smart home energy", "nomatch")
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        click.echo(click.style(f"Seeding {count} datasets...", fg="yellow"))
+        user = _seed_benchmark_datasets(count, vocabulary)
+        try:
+            click.echo(f"{'query':<24}{'legacy ms':>12}{'index ms':>12}{'speedup':>10}{'results':>10}")
+            for query in queries:
+                words = query_words(unidecode.unidecode(query))
+                legacy_ms, legacy = _time_ms(lambda: _legacy_filter(words, user.id), repeat)
+                index_ms, found = _time_ms(lambda: ExploreService().filter(query=query), repeat)
+                # Other datasets in the testing database may match too: compare the benchmark ones
+                indexed = {dataset.id for dataset in found if dataset.user_id == user.id}
+                speedup = legacy_ms / index_ms if index_ms else float("inf")
+                click.echo(f"{query:<24}{legacy_ms:>12.1f}{index_ms:>12.1f}{speedup:>9.1f}x{len(indexed):>10}")
+                if indexed != {dataset.id for dataset in legacy}:
+                    raise click.ClickException(
+                        f"{query!r}: the index found {len(indexed)} benchmark datasets, the legacy query {len(legacy)}"
+                    )
+        finally:
+            _delete_benchmark_datasets(user)
@@ -0,0 +1,31 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command("stats:rebuild", help="Recomputes the homepage SiteStats snapshot from the database.")
+@with_appcontext
+def stats_rebuild():
+    from app.modules.public.services import SiteStatsService
+
+    counters = SiteStatsService().rebuild()
+    for name, value in counters.items():
+        click.echo(f"{name}: {value}")
+    click.echo(click.style("SiteStats snapshot rebuilt.", fg="green"))
+
+
+@click.command("downloads:backfill", help="Rebuilds the daily download rollup used by trending from the raw records.")
+@with_appcontext
+def downloads_backfill():
+    from app.modules.dataset.repositories import DSDownloadDailyRepository
+
+    rows = DSDownloadDailyRepository().rebuild()
+    click.echo(click.style(f"Rebuilt {rows} daily download rows.", fg="green"))
+
+
+@click.command("comments:recount", help="Recomputes the comment counters of every dataset from the comment table.")
+@with_appcontext
+def comments_recount():
+    from app.modules.dataset.repositories import DataSetRepository
+
+    fixed = DataSetRepository().recount_comments()
+    click.echo(click.style(f"Fixed the comment counters of {fixed} datasets.", fg="green"))
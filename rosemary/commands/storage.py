@@ -0,0 +1,109 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import click
+
+PC_EXAMPLES = os.path.join("app", "modules", "dataset", "pc_examples")
+
+
+def _vary(item, copy, rng):
+    # Another part of the same kind: numbered name and prices/specs within 20% of the original
+    varied = {}
+    for key, value in item.items():
+        if isinstance(value, float):
+            value = round(value * rng.uniform(0.8, 1.2), 2)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            value = max(0, round(value * rng.uniform(0.8, 1.2)))
+        varied[key] = value
+    varied["name"] = f"{item.get('name')} #{copy}"
+    return varied
+
+
+def _scaled_corpus(folder, scale, seed=42):
+    """Write every pc_examples catalog with `scale` varied copies of each item (so the copies are not
+    byte-identical, which would compress unrealistically well) and return the paths."""
+    rng = random.Random(seed)
+    paths = []
+    for filename in sorted(os.listdir(PC_EXAMPLES)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(PC_EXAMPLES, filename)) as f:
+            items = json.load(f)
+        if not isinstance(items, list):
+            continue
+        scaled = [item if copy == 0 else _vary(item, copy, rng) for copy in range(scale) for item in items]
+        path = os.path.join(folder, filename)
+        with open(path, "w") as f:
+            json.dump(scaled, f, indent=4)
+        paths.append(path)
+    return paths
+
+
+def _read_all(path):
+    from app.modules.hubfile.compression import open_stored
+
+    start = time.perf_counter()
+    with open_stored(path) as stream:
+        while stream.read(1024 * 1024):
+            pass
+    return time.perf_counter() - start
+
+
+def _middle_page(path, index_path, limit=50):
+    from app.modules.hubfile.item_index import build_index, read_items
+
+    total = build_index(path, index_path)
+    start = time.perf_counter()
+    read_items(path, index_path, max(0, total // 2), limit)
+    return (time.perf_counter() - start) * 1000
+
+
+@click.command(
+    "storage:bench",
+    help="Compares storing dataset files as plain JSON and compressed with zstd (FILE_STORAGE_COMPRESSION), on "
+    "the pc_examples catalogs scaled up: disk usage, compression speed, the bytes read from disk and the time "
+    "to read every file, and the time to read a page from the middle of the largest catalog. Reads are served "
+    "from the page cache, so times show CPU cost; bytes read show the I/O saved.",
+)
+@click.option("--scale", default=10, show_default=True, help="Times the items of each catalog are repeated.")
+@click.option("--level", "levels", multiple=True, type=int, help="zstd level (repeatable; default 1, 3 and 9).")
+def storage_bench(scale, levels):
+    from app.modules.hubfile.compression import compress_file
+
+    levels = levels or (1, 3, 9)
+    folder = tempfile.mkdtemp(prefix="storage-bench-")
+    try:
+        paths = _scaled_corpus(folder, scale)
+        raw_bytes = sum(os.path.getsize(path) for path in paths)
+        largest = max(paths, key=os.path.getsize)
+        click.echo(
+            f"{len(paths)} catalogs, {raw_bytes / 1e6:.1f} MB as JSON (x{scale}); "
+            f"largest {os.path.basename(largest)}, {os.path.getsize(largest) / 1e6:.1f} MB"
+        )
+        click.echo(f"{'storage':<10}{'on disk MB':>12}{'saved':>8}{'write MB/s':>12}{'read all ms':>13}{'page ms':>10}")
+        read_ms = sum(_read_all(path) for path in paths) * 1000
+        page_ms = _middle_page(largest, os.path.join(folder, "plain.idx"))
+        click.echo(f"{'json':<10}{raw_bytes / 1e6:>12.1f}{'-':>8}{'-':>12}{read_ms:>13.0f}{page_ms:>10.2f}")
+
+        for level in levels:
+            stored_bytes, elapsed, stored_paths = 0, 0.0, []
+            for path in paths:
+                start = time.perf_counter()
+                stored_bytes += compress_file(path, f"{path}.{level}.zst", level=level)[1]
+                elapsed += time.perf_counter() - start
+                stored_paths.append(f"{path}.{level}.zst")
+            read_ms = sum(_read_all(path) for path in stored_paths) * 1000
+            page_ms = _middle_page(f"{largest}.{level}.zst", os.path.join(folder, f"{level}.idx"))
+            click.echo(
+                f"{f'zstd -{level}':<10}{stored_bytes / 1e6:>12.1f}{1 - stored_bytes / raw_bytes:>8.0%}"
+                f"{raw_bytes / 1e6 / elapsed:>12.0f}{read_ms:>13.0f}{page_ms:>10.2f}"
+            )
+            for path in stored_paths:
+                os.remove(path)
+        click.echo("Bytes read from disk per download, view or ZIP build are the on-disk sizes above.")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)